@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 """
+ Computes GMM posteriors
+
  Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
 """
-"""
-Computes GMM posteriors
-"""
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
@@ -29,19 +28,15 @@ from hyperion.pdfs import DiagGMM
 
 
 def to_sparse(r, num_comp):
-    index = np.argsort(r, axis=1)[:,-num_comp:]
-    r_sparse = np.zeros((r.shape[0], num_comp), dtype=float_cpu())
-    for i, index_i in enumerate(index):
-        r_sparse[i] = r[i, index_i]
+    index = np.argpartition(r, -num_comp, axis=1)[:,-num_comp:]
+    r_sparse = np.take_along_axis(r, index, axis=1).astype(float_cpu(), copy=False)
     r_sparse = r_sparse/np.sum(r_sparse, axis=-1, keepdims=True)
     return r_sparse, index
 
 
 def to_dense(r_sparse, index, num_comp):
     r = np.zeros((r_sparse.shape[0], num_comp), dtype=float_cpu())
-    for i in xrange(r_sparse.shape[0]):
-        r[i, index[i]] = r_sparse[i]
-
+    np.put_along_axis(r, index, r_sparse, axis=1)
     return r
 
 
@@ -71,14 +66,11 @@ def compute_gmm_post(seq_file, file_list, model_file, preproc_file, output_path,
     for i in xrange(sr.num_seqs):
         x, key = sr.read_next_seq()
         logging.info('Extracting i-vector %d/%d for %s, num_frames: %d' % (i, sr.num_seqs, key, x.shape[0]))
-        r = gmm.compute_z(x)
-        r_s, index = to_sparse(r, num_comp)
+        r_s, index = gmm.compute_pz_nbest(x, nbest=num_comp)
         if i==0:
-            r2 = to_dense(r_s, index, r.shape[1])
-            logging.degug(np.sort(r[0,:])[-12:])
-            logging.degug(np.sort(r2[0,:])[-12:])
-            logging.degug(np.argsort(r[0,:])[-12:])
-            logging.degug(np.argsort(r2[0,:])[-12:])
+            r2 = to_dense(r_s, index, gmm.num_comp)
+            logging.debug(np.sort(r2[0,:])[-12:])
+            logging.debug(np.argsort(r2[0,:])[-12:])
 
         hw.write([key], '.r', [r_s])
         hw.write([key], '.index', [index])
@@ -99,7 +91,7 @@ if __name__ == "__main__":
     parser.add_argument('--preproc-file', dest='preproc_file', default=None)
     parser.add_argument('--model-file', dest='model_file', required=True)
     parser.add_argument('--output-path', dest='output_path', required=True)
-    parser.add_argument('--num-comp', dest='num_comp', default=10)
+    parser.add_argument('--num-comp', dest='num_comp', default=10, type=int)
 
     SR.add_argparse_eval_args(parser)
     parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
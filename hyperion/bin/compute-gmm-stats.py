@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+ Computes Baum-Welch statistics w.r.t. a diagonal covariance GMM
+
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import sys
+import os
+import argparse
+import time
+import logging
+
+import numpy as np
+
+from hyperion.hyp_defs import config_logger
+from hyperion.io import SequentialDataReaderFactory as DRF
+from hyperion.io import DataWriterFactory as DWF
+from hyperion.helpers import BaumWelchStatsExtractor as BWSE
+from hyperion.pdfs import DiagGMM, GaussianSelector
+
+
+def compute_gmm_stats(input_path, output_path, model_file, ubm_type,
+                      use_gselect, **kwargs):
+
+    if ubm_type == 'diag-gmm':
+        gmm = DiagGMM.load(model_file)
+    else:
+        gmm = DiagGMM.load_from_kaldi(model_file)
+    gmm.initialize()
+
+    reader_args = DRF.filter_args(**kwargs)
+    reader = DRF.create(input_path, **reader_args)
+    writer = DWF.create(output_path, scp_sep=' ')
+
+    gselect = None
+    if use_gselect:
+        gselect_args = GaussianSelector.filter_args(prefix='gselect', **kwargs)
+        gselect = GaussianSelector(gmm, **gselect_args)
+
+    bwse_args = BWSE.filter_args(**kwargs)
+    extractor = BWSE(gmm, gselect=gselect, **bwse_args)
+
+    t1 = time.time()
+    extractor.write(reader, writer)
+    writer.close()
+    logging.info('Extract elapsed time: %.2f' % (time.time() - t1))
+
+
+
+if __name__ == "__main__":
+
+    parser=argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        fromfile_prefix_chars='@',
+        description='Compute Baum-Welch statistics')
+
+    parser.add_argument('--input', dest='input_path', required=True)
+    parser.add_argument('--output', dest='output_path', required=True)
+    parser.add_argument('--model-file', dest='model_file', required=True)
+    parser.add_argument('--ubm-type', dest='ubm_type', default='diag-gmm',
+                        choices=['diag-gmm', 'kaldi-diag-gmm'])
+
+    DRF.add_argparse_args(parser)
+    BWSE.add_argparse_args(parser)
+    parser.add_argument('--use-gselect', dest='use_gselect', default=False, action='store_true',
+                        help='preselects the gaussian components with a coarse GMM')
+    GaussianSelector.add_argparse_args(parser, prefix='gselect')
+    parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
+
+    args=parser.parse_args()
+    config_logger(args.verbose)
+    del args.verbose
+    logging.debug(args)
+
+    compute_gmm_stats(**vars(args))
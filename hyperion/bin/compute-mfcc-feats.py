@@ -20,7 +20,21 @@ from hyperion.io import SequentialAudioReader as AR
 from hyperion.io import SequentialDataReaderFactory as DRF
 from hyperion.io import DataWriterFactory as DWF
 from hyperion.io import compression_methods
-from hyperion.feats import MFCC
+from hyperion.feats import MFCC, BatchFeatureExtractor
+
+def compute_sequential(mfcc, reader):
+    for key, x in reader:
+        logging.info('Extracting MFCC for %s' % (key))
+        t1 = time.time()
+        y = mfcc.compute(x)
+        dt = (time.time() - t1)*1000
+        rtf = mfcc.frame_shift*y.shape[0]/dt
+        logging.info('Extracted MFCC for %s num-frames=%d elapsed-time=%.2f ms. real-time-factor=%.2f' %
+                     (key, y.shape[0], dt, rtf))
+        yield key, y
+        mfcc.reset()
+
+
 
 def compute_mfcc_feats(input_path, output_path,
                        compress, compression_method, write_num_frames, **kwargs):
@@ -42,25 +56,19 @@ def compute_mfcc_feats(input_path, output_path,
     if write_num_frames is not None:
         f_num_frames = open(write_num_frames, 'w')
     
-    for data in reader:
-        if mfcc.input_step == 'wave':
-            key, x, fs = data
-        else:
-            key, x = data
-        logging.info('Extracting MFCC for %s' % (key))
-        t1 = time.time()
-        y = mfcc.compute(x)
-        dt = (time.time() - t1)*1000
-        rtf = mfcc.frame_shift*y.shape[0]/dt
-        logging.info('Extracted MFCC for %s num-frames=%d elapsed-time=%.2f ms. real-time-factor=%.2f' %
-                     (key, y.shape[0], dt, rtf))
+    if mfcc.input_step == 'wave':
+        batch_args = BatchFeatureExtractor.filter_args(**kwargs)
+        extractor = BatchFeatureExtractor(mfcc, **batch_args)
+        feats = extractor.extract(reader)
+    else:
+        feats = compute_sequential(mfcc, reader)
+
+    for key, y in feats:
         writer.write([key], [y])
-        
+
         if write_num_frames is not None:
             f_num_frames.write('%s %d\n' % (key, y.shape[0]))
 
-        mfcc.reset()
-            
     if write_num_frames is not None:
         f_num_frames.close()
     
@@ -78,6 +86,7 @@ if __name__ == "__main__":
 
     DRF.add_argparse_args(parser)
     MFCC.add_argparse_args(parser)
+    BatchFeatureExtractor.add_argparse_args(parser)
     parser.add_argument('--compress', dest='compress', default=False, action='store_true', help='Compress the features')
     parser.add_argument('--compression-method', dest='compression_method', default='auto',
                         choices=compression_methods, help='Compression method')
@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 """
+ Evals cosine scoring
+
  Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
 """
-"""
-Evals cosine scoring
-"""
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
@@ -23,9 +22,14 @@ from hyperion.hyp_defs import set_float_cpu, float_cpu, config_logger
 from hyperion.utils.trial_ndx import TrialNdx
 from hyperion.utils.trial_scores import TrialScores
 from hyperion.helpers import TrialDataReader as TDR
+from hyperion.helpers import ParallelTrialScorer as PTS
 from hyperion.transforms import TransformList, LNorm
 
 
+def cosine_scorer(x_e, x_t):
+    return np.dot(x_e, x_t.T)
+
+
 def eval_cos(iv_file, ndx_file, enroll_file, test_file,
              preproc_file, score_file, **kwargs):
     
@@ -42,15 +46,17 @@ def eval_cos(iv_file, ndx_file, enroll_file, test_file,
     x_e = lnorm.predict(x_e)
     x_t = lnorm.predict(x_t)
     
+    pts_args = PTS.filter_args(**kwargs)
+    scorer = PTS(cosine_scorer, **pts_args)
+
     t1 = time.time()
-    scores = np.dot(x_e, x_t.T)
+    s = scorer.score(x_e, x_t, enroll, ndx.seg_set)
     
     dt = time.time() - t1
     num_trials = x_e.shape[0] * x_t.shape[0]
     logging.info('Elapsed time: %.2f s. Elapsed time per trial: %.2f ms.'
                  % (dt, dt/num_trials*1000))
 
-    s = TrialScores(enroll, ndx.seg_set, scores)
     s.save(score_file)
 
     
@@ -68,6 +74,7 @@ if __name__ == "__main__":
     parser.add_argument('--preproc-file', dest='preproc_file', default=None)
 
     TDR.add_argparse_args(parser)
+    PTS.add_argparse_args(parser)
     parser.add_argument('--score-file', dest='score_file', required=True)
     parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
     
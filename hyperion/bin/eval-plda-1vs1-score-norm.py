@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+ Evals PLDA LLR with score normalization,
+ the cohort scores are computed on the fly.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import sys
+import os
+import argparse
+import time
+import logging
+
+import numpy as np
+import os.path as path
+
+from hyperion.hyp_defs import set_float_cpu, float_cpu, config_logger
+from hyperion.utils.utt2info import Utt2Info
+from hyperion.utils.list_utils import ismember
+from hyperion.utils.trial_scores import TrialScores
+from hyperion.helpers import TrialDataReader as TDR
+from hyperion.helpers import PLDAFactory as F
+from hyperion.io import RandomAccessDataReaderFactory as DRF
+from hyperion.score_norm import ChunkedScoreNorm
+from hyperion.transforms import TransformList
+
+
+
+def eval_plda(iv_file, ndx_file, enroll_file, test_file,
+              preproc_file, coh_iv_file, coh_file,
+              model_file, score_file, plda_type, **kwargs):
+
+    if preproc_file is not None:
+        preproc = TransformList.load(preproc_file)
+    else:
+        preproc = None
+
+    tdr_args = TDR.filter_args(**kwargs)
+    tdr = TDR(iv_file, ndx_file, enroll_file, test_file, preproc, **tdr_args)
+    x_e, x_t, enroll, ndx = tdr.read()
+
+    if coh_iv_file is None:
+        coh_iv_file = iv_file
+    coh = Utt2Info.load(coh_file)
+    x_coh = DRF.create(coh_iv_file).read(coh.key, squeeze=True)
+    if preproc is not None:
+        x_coh = preproc.predict(x_coh)
+
+    model = F.load_plda(plda_type, model_file)
+
+    # all vectors are projected once, the scorer only computes
+    # the dot products between projections
+    consts = model.compute_llr_1vs1_consts()
+    def project(x):
+        gamma, Q = model.project_llr_1vs1(x, consts)
+        return np.hstack((gamma, Q[:, None]))
+
+    def scorer(p1, p2):
+        return model.llr_1vs1_from_proj(
+            p1[:, :-1], p1[:, -1], p2[:, :-1], p2[:, -1], consts[2])
+
+    norm_args = ChunkedScoreNorm.filter_args(**kwargs)
+    norm = ChunkedScoreNorm(**norm_args)
+
+    _, idx = ismember(enroll, ndx.model_set)
+    trial_mask = ndx.trial_mask[idx]
+
+    t1 = time.time()
+    if path.splitext(score_file)[1] == '.txt':
+        scores = norm.predict_from_vectors(
+            scorer, project(x_e), project(x_t), project(x_coh), trial_mask)
+        s = TrialScores(enroll, ndx.seg_set, scores, trial_mask)
+        s.save(score_file)
+    else:
+        norm.predict_from_vectors_to_file(
+            score_file, enroll, ndx.seg_set, scorer,
+            project(x_e), project(x_t), project(x_coh), trial_mask)
+
+    dt = time.time() - t1
+    num_trials = len(enroll) * x_t.shape[0]
+    logging.info('Elapsed time: %.2f s. Elapsed time per trial: %.2f ms.'
+          % (dt, dt/num_trials*1000))
+
+
+
+if __name__ == "__main__":
+
+    parser=argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        fromfile_prefix_chars='@',
+        description='Eval PLDA with score normalization')
+
+    parser.add_argument('--iv-file', dest='iv_file', required=True)
+    parser.add_argument('--ndx-file', dest='ndx_file', default=None)
+    parser.add_argument('--enroll-file', dest='enroll_file', required=True)
+    parser.add_argument('--test-file', dest='test_file', default=None)
+    parser.add_argument('--coh-iv-file', dest='coh_iv_file', default=None,
+                        help=('cohort vectors file, if None it uses iv-file'))
+    parser.add_argument('--coh-file', dest='coh_file', required=True,
+                        help=('cohort list in utt2spk format'))
+    parser.add_argument('--preproc-file', dest='preproc_file', default=None)
+
+    TDR.add_argparse_args(parser)
+    F.add_argparse_eval_args(parser)
+    ChunkedScoreNorm.add_argparse_args(parser)
+    parser.add_argument('--score-file', dest='score_file', required=True)
+    parser.add_argument('-v', '--verbose', dest='verbose', default=1,
+                        choices=[0, 1, 2, 3], type=int)
+
+    args=parser.parse_args()
+    config_logger(args.verbose)
+    del args.verbose
+    logging.debug(args)
+
+    assert args.test_file is not None or args.ndx_file is not None
+    eval_plda(**vars(args))
@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 """
+ Evals PDDA LLR
+
  Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
 """
-"""
-Evals PDDA LLR
-"""
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
@@ -18,12 +17,14 @@ import time
 import logging
 
 import numpy as np
+import os.path as path
 
 from hyperion.hyp_defs import set_float_cpu, float_cpu, config_logger
 from hyperion.utils.trial_ndx import TrialNdx
 from hyperion.utils.trial_scores import TrialScores
 from hyperion.helpers import TrialDataReader as TDR
 from hyperion.helpers import PLDAFactory as F
+from hyperion.helpers import PLDABlockScorer as BS
 from hyperion.transforms import TransformList
 
 
@@ -42,17 +43,21 @@ def eval_plda(iv_file, ndx_file, enroll_file, test_file,
     x_e, x_t, enroll, ndx = tdr.read()
 
     model = F.load_plda(plda_type, model_file)
+    bs_args = BS.filter_args(**kwargs)
+    scorer = BS(model, **bs_args)
     
     t1 = time.time()
-    scores = model.llr_1vs1(x_e, x_t)
+    if path.splitext(score_file)[1] == '.txt':
+        s = scorer.score(x_e, x_t, enroll, ndx.seg_set, ndx)
+        num_trials = np.sum(s.score_mask)
+        s.save(score_file)
+    else:
+        num_trials = scorer.score_to_file(
+            x_e, x_t, enroll, ndx.seg_set, score_file, ndx)
     
     dt = time.time() - t1
-    num_trials = x_e.shape[0] * x_t.shape[0]
     logging.info('Elapsed time: %.2f s. Elapsed time per trial: %.2f ms.'
-          % (dt, dt/num_trials*1000))
-
-    s = TrialScores(enroll, ndx.seg_set, scores)
-    s.save(score_file)
+          % (dt, dt/max(num_trials, 1)*1000))
 
     
 if __name__ == "__main__":
@@ -70,6 +75,7 @@ if __name__ == "__main__":
 
     TDR.add_argparse_args(parser)
     F.add_argparse_eval_args(parser)
+    BS.add_argparse_args(parser)
     parser.add_argument('--score-file', dest='score_file', required=True)
     parser.add_argument('-v', '--verbose', dest='verbose', default=1,
                         choices=[0, 1, 2, 3], type=int)
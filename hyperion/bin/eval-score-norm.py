@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 """
+ Score Normalization
+
  Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
 """
-"""
-Score Normalization
-"""
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
@@ -13,86 +12,93 @@ from six.moves import xrange
 
 import sys
 import os
+import os.path as path
 import argparse
 import time
 import logging
+from contextlib import ExitStack
 
 import numpy as np
+import h5py
 
 from hyperion.hyp_defs import config_logger
-from hyperion.score_norm import *
-from hyperion.utils.trial_scroes import TrialScores
+from hyperion.score_norm import ChunkedScoreNorm
+from hyperion.utils.trial_scores import TrialScores
 from hyperion.utils.trial_ndx import TrialNdx
 
 
 
-def load_scores(score_file, enr_coh_file, coh_test_file, coh_coh_file):
+def read_ids(score_file):
+    if score_file.endswith('.txt'):
+        scores = TrialScores.load(score_file)
+        return scores.model_set, scores.seg_set
+
+    with h5py.File(score_file, 'r') as f:
+        row_ids = np.asarray([t.decode('utf-8') for t in f['ID/row_ids']])
+        column_ids = np.asarray([t.decode('utf-8') for t in f['ID/column_ids']])
+    return row_ids, column_ids
+
+
+
+def load_scores(score_file, model_set, seg_set, stack):
+    """Returns score matrix and mask with rows/columns sorted as model_set/seg_set.
+       If the file is h5 and it is already sorted, the h5 datasets are returned,
+       so they are read by chunks, the file is closed when the ExitStack stack
+       is closed.
+    """
+    if score_file is None:
+        return None, None
+
+    if not score_file.endswith('.txt'):
+        row_ids, column_ids = read_ids(score_file)
+        if (len(row_ids) == len(model_set) and np.all(row_ids == model_set) and
+            len(column_ids) == len(seg_set) and np.all(column_ids == seg_set)):
+            f = stack.enter_context(h5py.File(score_file, 'r'))
+            return f['scores'], f['score_mask']
 
     scores = TrialScores.load(score_file)
-    scores_enr_coh = None
-    scores_coh_test = None
-    scores_coh_coh = None
-    
-    if enr_coh_file is not None:
-        ndx = TrialNdx(scores.model_set, scores_enr_coh.seg_set)
-        scores_enr_coh = TrialScores.load(enr_coh_file)
-        scores_enr_coh = scores_enr_coh.align_with_ndx(ndx)
+    ndx = TrialNdx(model_set, seg_set)
+    scores = scores.align_with_ndx(ndx)
+    return scores.scores, scores.score_mask
 
+
+
+def eval_score_norm(score_file, output_file,
+                    enr_coh_file=None, coh_test_file=None, coh_coh_file=None,
+                    **kwargs):
+
+    scores = TrialScores.load(score_file)
     if coh_test_file is not None:
-        ndx = TrialNdx(scores_coh_test.model_set, scores.seg_set)
-        scores_coh_test = TrialScores.load(coh_test_file)
-        scores_coh_test = scores_coh_test.align_with_ndx(ndx)
-
-    if coh_coh_file is not None:
-        assert scores_enr_coh is not None and scores_coh_test is not None
-        ndx = TrialNdx(scores_coh_test.model_set, scores_enr_coh.seg_set)
-        scores_coh_coh = TrialScores.load(coh_coh_file)
-        scores_coh_coh = scores_coh_coh.align_with_ndx(ndx)
-
-    return scores, scores_enr_coh, scores_coh_test, scores_coh_coh
-
-
-
-def score_norm(score_file, ouput_file, norm_type,
-               enr_coh_file=None, coh_test_file=None, coh_coh_file=None,
-               adapt_coh=None):
-
-    scores, scores_enr_coh, scores_coh_test, scores_coh_coh = load_scores(
-        score_file, enr_coh_file, coh_test_file, coh_coh_file)
-
-    if norm_type == 't_norm':
-        assert scores_coh_test is not None
-        norm = TNorm()
-        scores_norm = norm.predict(scores.scores, scores_coh_test.scores)
-
-    if norm_type == 'z_norm':
-        assert scores_enr_coh is not None
-        norm = ZNorm()
-        scores_norm = norm.predict(scores.scores, scores_enr_coh.scores)
-
-    if norm_type == 'zt_norm':
-        assert(scores_enr_coh is not None and scores_coh_test is not None
-               and scores_coh_coh is not None)
-        norm = ZTNorm()
-        scores_norm = norm.predict(scores.scores,
-                                   scores_coh_test.scores,
-                                   scores_enr_coh.scores,
-                                   scores_coh_coh.scores)
-
-    if norm_type == 's_norm':
-        assert(scores_enr_coh is not None and scores_coh_test is not None
-               and scores_coh_coh is not None)
-        norm = SNorm()
-        scores_norm = norm.predict(scores.scores,
-                                   scores_coh_test.scores,
-                                   scores_enr_coh.scores,
-                                   scores_coh_coh.scores)
-
-    scores.scores = scores_norm
-    scores.save(ouput_file)
-    
+        coh_set = read_ids(coh_test_file)[0]
+    else:
+        coh_set = read_ids(enr_coh_file)[1]
+
+    with ExitStack() as stack:
+        scores_coh_test, mask_coh_test = load_scores(
+            coh_test_file, coh_set, scores.seg_set, stack)
+        scores_enr_coh, mask_enr_coh = load_scores(
+            enr_coh_file, scores.model_set, coh_set, stack)
+        scores_coh_coh, mask_coh_coh = load_scores(
+            coh_coh_file, coh_set, coh_set, stack)
+
+        norm_args = ChunkedScoreNorm.filter_args(**kwargs)
+        norm = ChunkedScoreNorm(**norm_args)
+        t1 = time.time()
+        file_base, file_ext = path.splitext(output_file)
+        if file_ext == '.txt':
+            scores.scores = norm.predict(
+                scores.scores, scores_coh_test, scores_enr_coh, scores_coh_coh,
+                mask_coh_test, mask_enr_coh, mask_coh_coh, scores.score_mask)
+            scores.save_txt(output_file)
+        else:
+            norm.predict_to_file(
+                output_file, scores.model_set, scores.seg_set, scores.scores,
+                scores_coh_test, scores_enr_coh, scores_coh_coh,
+                mask_coh_test, mask_enr_coh, mask_coh_coh, scores.score_mask)
+        logging.info('score normalization elapsed-time=%.2f s' % (time.time()-t1))
+
+
 
-    
 if __name__ == "__main__":
 
     parser=argparse.ArgumentParser(
@@ -105,9 +111,7 @@ if __name__ == "__main__":
     parser.add_argument('--enr-coh-file', dest='enr_coh_file', default=None)
     parser.add_argument('--coh-test-file', dest='coh_test_file', default=None)
     parser.add_argument('--coh-coh-file', dest='coh_coh_file', default=None)
-    parser.add_argument('--norm-type', dest='norm_type', default='s-norm',
-                        choices=['t-norm', 'z-norm', 'zt-norm', 's-norm'])
-    parser.add_argument('--adapt-coh', dest='adapt_coh', default=None, type=int)
+    ChunkedScoreNorm.add_argparse_args(parser)
     parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
     
     args=parser.parse_args()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import sys
+import os
+import argparse
+import time
+import logging
+
+import numpy as np
+
+from hyperion.hyp_defs import config_logger
+from hyperion.io import SequentialDataReaderFactory as DRF
+from hyperion.pdfs import JFATotal
+from hyperion.helpers import JFATotalEMTrainer
+
+
+def train_jfa_total(shards_file, init_model_file, num_comp, y_dim, output_path,
+                    epochs, ml_md, batch_size, num_clusters, **kwargs):
+
+    with open(shards_file, 'r') as f:
+        shards = [line.strip() for line in f if len(line.strip()) > 0]
+
+    if init_model_file is None:
+        with DRF.create(shards[0]) as reader:
+            _, stats = reader.read(1)
+        model = JFATotal(num_comp, y_dim=y_dim)
+        model.T = np.random.randn(y_dim, stats[0].shape[0] - num_comp)
+    else:
+        model = JFATotal.load(init_model_file)
+    model.batch_size = batch_size
+    model.num_clusters = num_clusters
+
+    trainer_args = JFATotalEMTrainer.filter_args(**kwargs)
+    trainer = JFATotalEMTrainer(model, ml_md=ml_md, **trainer_args)
+
+    t1 = time.time()
+    elbo, elbo_norm = trainer.fit(shards, epochs=epochs)
+    logging.info('Train elapsed time: %.2f' % (time.time() - t1))
+
+    trainer.model.save(output_path)
+    np.savetxt(os.path.splitext(output_path)[0] + '.elbo', np.vstack((elbo, elbo_norm)).T)
+
+
+
+if __name__ == "__main__":
+
+    parser=argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        fromfile_prefix_chars='@',
+        description='Trains total variability matrix')
+
+    parser.add_argument('--shards-file', dest='shards_file', required=True,
+                        help='file with one stats rspecifier per line')
+    parser.add_argument('--init-model', dest='init_model_file', default=None)
+    parser.add_argument('--num-comp', dest='num_comp', default=2048, type=int)
+    parser.add_argument('--y-dim', dest='y_dim', default=400, type=int)
+    parser.add_argument('--output-path', dest='output_path', required=True)
+    parser.add_argument('--epochs', dest='epochs', default=10, type=int)
+    parser.add_argument('--ml-md', dest='ml_md', default='ml+md',
+                        choices=['ml+md', 'ml', 'md'])
+    parser.add_argument('--batch-size', dest='batch_size', default=256, type=int,
+                        help='number of utterances processed at once')
+    parser.add_argument('--num-clusters', dest='num_clusters', default=0, type=int,
+                        help=('number of clusters of zero order stats sharing '
+                              'the posterior precision, if 0 the posteriors are exact'))
+    JFATotalEMTrainer.add_argparse_args(parser)
+    parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
+
+    args=parser.parse_args()
+    config_logger(args.verbose)
+    del args.verbose
+    logging.debug(args)
+
+    train_jfa_total(**vars(args))
@@ -1,11 +1,10 @@
 #!/usr/bin/env python
 """
+ Trains NDA
+
  Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
  Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
 """
-"""
-Trains NDA
-"""
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
@@ -25,7 +24,7 @@ from hyperion.transforms import TransformList, NDA, NSbSw
 
 
 def train_nda(iv_file, train_list, preproc_file,
-              nda_dim, K, alpha, 
+              nda_dim, K, alpha, num_neighbor_classes, num_workers,
               name, save_tlist, append_tlist, output_path, **kwargs):
 
     
@@ -40,7 +39,8 @@ def train_nda(iv_file, train_list, preproc_file,
 
     t1 = time.time()
 
-    s_mat = NSbSw(K=K, alpha=alpha)
+    s_mat = NSbSw(K=K, alpha=alpha, num_neighbor_classes=num_neighbor_classes,
+                  num_workers=num_workers)
     s_mat.fit(x, class_ids)
 
     model = NDA(name=name)
@@ -50,7 +50,7 @@ def train_nda(iv_file, train_list, preproc_file,
     
     x = model.predict(x)
 
-    s_mat = NSbSw()
+    s_mat = NSbSw(num_workers=num_workers)
     s_mat.fit(x, class_ids)
     logging.debug(s_mat.Sb[:4,:4])
     logging.debug(s_mat.Sw[:4,:4])
@@ -86,6 +86,12 @@ if __name__ == "__main__":
                         default=10)
     parser.add_argument('--alpha', dest='alpha', type=float,
                         default=1)
+    parser.add_argument('--num-neighbor-classes', dest='num_neighbor_classes', type=int,
+                        default=None,
+                        help=('number of closest classes used in the between class '
+                              'scatter of each class, if None it uses all of them'))
+    parser.add_argument('--num-workers', dest='num_workers', type=int,
+                        default=1)
 
     parser.add_argument('--no-save-tlist', dest='save_tlist',
                         default=True, action='store_false')
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import sys
+import os
+import argparse
+import time
+import logging
+
+import numpy as np
+
+from hyperion.hyp_defs import config_logger
+from hyperion.pdfs import DiagGMM
+from hyperion.helpers import MixtureEMTrainer
+
+
+def train_ubm(shards_file, init_model_file, output_path, epochs, batch_size, **kwargs):
+
+    with open(shards_file, 'r') as f:
+        shards = [line.strip() for line in f if len(line.strip()) > 0]
+
+    model = DiagGMM.load(init_model_file)
+    trainer_args = MixtureEMTrainer.filter_args(**kwargs)
+    trainer = MixtureEMTrainer(model, batch_size=batch_size, **trainer_args)
+
+    t1 = time.time()
+    elbo, elbo_norm = trainer.fit(shards, epochs=epochs)
+    logging.info('Train elapsed time: %.2f' % (time.time() - t1))
+
+    trainer.model.save(output_path)
+    np.savetxt(os.path.splitext(output_path)[0] + '.elbo', np.vstack((elbo, elbo_norm)).T)
+
+
+
+if __name__ == "__main__":
+
+    parser=argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        fromfile_prefix_chars='@',
+        description='Trains UBM')
+
+    parser.add_argument('--shards-file', dest='shards_file', required=True,
+                        help='file with one feature rspecifier per line')
+    parser.add_argument('--init-model', dest='init_model_file', required=True)
+    parser.add_argument('--output-path', dest='output_path', required=True)
+    parser.add_argument('--epochs', dest='epochs', default=10, type=int)
+    parser.add_argument('--batch-size', dest='batch_size', default=100000, type=int,
+                        help='number of frames processed at once')
+    MixtureEMTrainer.add_argparse_args(parser)
+    parser.add_argument('-v', '--verbose', dest='verbose', default=1, choices=[0, 1, 2, 3], type=int)
+
+    args=parser.parse_args()
+    config_logger(args.verbose)
+    del args.verbose
+    logging.debug(args)
+
+    train_ubm(**vars(args))
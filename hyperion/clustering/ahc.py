@@ -12,6 +12,7 @@ import h5py
 from copy import copy
 
 from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import squareform
 from sklearn.metrics import homogeneity_score, completeness_score
 
 from ..hyp_defs import float_cpu
@@ -19,6 +20,22 @@ from ..hyp_model import HypModel
 
 
 class AHC(HypModel):
+    """Agglomerative hierarchical clustering.
+
+       Flat clusterings are obtained by walking the linkage matrix
+       with a union-find structure. When merging two clusters,
+       the leaves of the smaller cluster are relabeled, so
+       sweeping all the cut levels costs O(N log N)
+       plus the relabeling of each requested level.
+
+    Attributes:
+      method: Linkage method, e.g., average, single, complete.
+      metric: Type of the input scores in [llr, prob] or
+              any distance metric supported by scipy linkage.
+      Z: Linkage matrix.
+      flat_clusters: Flat clusters for all the cut levels
+                     (only if compute_flat_clusters was called).
+    """
 
     def __init__(self,  method='average', metric='llr', **kwargs):
         super(AHC, self).__init__(**kwargs)
@@ -29,14 +46,27 @@ class AHC(HypModel):
 
         
     def fit(self, x, mask=None):
+        """Computes the linkage matrix.
+
+        Args:
+          x: Symmetric score matrix (N x N) or scores of the upper triangle
+             in condensed form (N*(N-1)/2,), as returned by
+             scipy.spatial.distance.squareform.
+          mask: Boolean mask of the same shape as x, scores where
+                mask is False are ignored.
+        """
+        if x.ndim == 2:
+            scores = squareform(x, checks=False)
+            if mask is not None:
+                mask = squareform(mask, checks=False)
+        else:
+            scores = x
 
         if mask is not None:
-            x = copy(x)
-            x[mask==False] = -1e10
-
-        idx = np.triu(np.ones_like(x, dtype=bool), k=1)
-        scores = x[idx]
+            scores = np.copy(scores)
+            scores[mask==False] = -1e10
 
+        self.flat_clusters = None
         if self.metric == 'llr':
             max_score = np.max(scores)
             scores = - scores + max_score
@@ -60,61 +90,117 @@ class AHC(HypModel):
 
         
     def get_flat_clusters_from_num_clusters(self, num_clusters):
-        N = self.Z.shape[0] + 1
-        num_clusters = min(N, num_clusters)
-        p_idx = N - num_clusters
+        p_idx = self._num_clusters_to_num_merges(num_clusters)
         if self.flat_clusters is not None:
             return self.flat_clusters[p_idx]
 
-        flat_clusters = np.arange(N, dtype=int)
-        for i in xrange(p_idx):
-            segm_idx = np.logical_or(flat_clusters==self.Z[i,0],
-                                     flat_clusters==self.Z[i,1])
-            flat_clusters[segm_idx] = N + i
-
-        _, flat_clusters = np.unique(flat_clusters, return_inverse=True)
-        return flat_clusters
+        return next(self._iter_flat_clusters([p_idx]))
 
     
     
     def get_flat_clusters_from_thr(self, thr):
+        return self.get_flat_clusters_from_num_clusters(
+            self._thr_to_num_clusters(thr))
+
+
+
+    def _num_clusters_to_num_merges(self, num_clusters):
+        N = self.Z.shape[0] + 1
+        num_clusters = min(N, num_clusters)
+        return N - num_clusters
+
+
+
+    def _thr_to_num_clusters(self, thr):
         if self.metric == 'llr' or self.metric == 'prob':
             idx = self.Z[:,2] >= thr
         else:
             idx = self.Z[:,2] <= thr
-        num_clusters = self.Z.shape[0] + 1 - np.sum(idx)
-        return self.get_flat_clusters_from_num_clusters(num_clusters)
+        return self.Z.shape[0] + 1 - np.sum(idx)
 
-    
 
-    def compute_flat_clusters():
-        N = self.Z.shape[0]+1
-        flat_clusters = np.zeros((N,N), dtype=int)
-        flat_clusters[0] = np.arange(N, dtype=int)
-        for i in xrange(N-1):
-            flat_clusters[i+1] = flat_clusters[i]
-            segm_idx = np.logical_or(flat_clusters[i]==self.Z[i,0],
-                                     flat_clusters[i]==self.Z[i,1])
-            flat_clusters[i+1][segm_idx] = N + i
 
-        for i in xrange(1,N):
-            _, flat_clusters[i] = np.unique(flat_clusters, return_inverse=True)
-        self.flat_clusters = flat_clusters
+    def sweep_flat_clusters(self, t, criterion='threshold'):
+        """Generator that returns the flat clusters for several
+           thresholds or numbers of clusters, walking the linkage
+           only once.
+
+        Args:
+          t: List of thresholds or numbers of clusters.
+          criterion: 'threshold' or 'num_clusters'.
+
+        Returns:
+          Threshold or number of clusters,
+          sorted from more to fewer clusters.
+          Flat clusters.
+        """
+        if criterion == 'threshold':
+            num_clusters = [self._thr_to_num_clusters(t_i) for t_i in t]
+        else:
+            num_clusters = t
+        num_merges = np.array(
+            [self._num_clusters_to_num_merges(n) for n in num_clusters], dtype=int)
+        order = np.argsort(num_merges, kind='stable')
+        for i, flat_clusters in zip(order, self._iter_flat_clusters(num_merges[order])):
+            yield t[i], flat_clusters
+
+
+
+    def _iter_flat_clusters(self, num_merges):
+        """Generator that returns the flat clusters after applying
+           the first num_merges[i] merges of the linkage.
+           num_merges must be sorted in ascending order.
+        """
+        N = self.Z.shape[0] + 1
+        # representative leaf of the cluster of each leaf
+        leaf2rep = np.arange(N, dtype=int)
+        # representative leaf of each node of the tree
+        node2rep = np.arange(2*N-1, dtype=int)
+        # tree node of the cluster of each representative leaf
+        rep2node = np.arange(N, dtype=int)
+        members = [[i] for i in xrange(N)]
+        Z = self.Z[:, :2].astype(int)
+        p = 0
+        for p_target in num_merges:
+            while p < p_target:
+                a = node2rep[Z[p, 0]]
+                b = node2rep[Z[p, 1]]
+                if len(members[a]) < len(members[b]):
+                    a, b = b, a
+                leaf2rep[members[b]] = a
+                members[a].extend(members[b])
+                members[b] = None
+                node2rep[N+p] = a
+                rep2node[a] = N + p
+                p += 1
+
+            _, flat_clusters = np.unique(rep2node[leaf2rep], return_inverse=True)
+            yield flat_clusters
+
+        
+
+    def compute_flat_clusters(self):
+        """Computes the flat clusters for all the cut levels,
+           flat_clusters[i] contains the clusters after i merges.
+        """
+        N = self.Z.shape[0] + 1
+        self.flat_clusters = np.vstack(list(self._iter_flat_clusters(xrange(N))))
 
 
 
     def evaluate_impurity_det(self, labels_true):
         if self.flat_clusters is None:
-            self.compute_flat_clusters()
+            flat_clusters_iter = self._iter_flat_clusters(xrange(self.Z.shape[0]+1))
+        else:
+            flat_clusters_iter = iter(self.flat_clusters)
 
         # homogeneity: each cluster contains only members of a single class. (cluster purity)
         # completeness: all members of a given class are assigned to the same cluster. (class purity)
-        N = self.flat_clusters.shape[0]
+        N = self.Z.shape[0] + 1
         h = np.zeros((N,), dtype=float_cpu())
         c = np.zeros((N,), dtype=float_cpu())
-        for i in xrange(self.flat_clusters.shape[0]):
-            h[i] = homogeneity_score(labels_true, self.flat_clusters[i])
-            c[i] = completeness_score(labels_true, self.flat_clusters[i])
+        for i, flat_clusters in enumerate(flat_clusters_iter):
+            h[i] = homogeneity_score(labels_true, flat_clusters)
+            c[i] = completeness_score(labels_true, flat_clusters)
 
         return 1-h, 1-c
-    
@@ -11,66 +11,252 @@ import sys
 import logging
 import numpy as np
 import h5py
+import scipy.sparse as sparse
+from concurrent.futures import ThreadPoolExecutor
 
 from ..hyp_defs import float_cpu
 from ..hyp_model import HypModel
 
 
 class KMeans(HypModel):
+    """K-means clustering.
 
-    def __init__(self, num_clusters, mu=None, rtol=0.001, **kwargs):
+       Distances are computed as ||x||^2 - 2 x mu^T + ||mu||^2,
+       i.e., with one matrix product per chunk of data.
+       Data is processed by chunks to limit the memory
+       of the distance matrix, the chunks are distributed
+       among several threads.
+
+    Attributes:
+      num_clusters: Number of clusters.
+      mu: Cluster centroids (num_clusters x x_dim).
+      rtol: Relative tolerance of the loss to stop the iterations.
+      init_method: Seeding method in ['kmeans++', 'max-dist'].
+      chunk_size: Number of samples processed at once.
+      num_workers: Number of threads.
+      rng_seed: Seed of the random number generator.
+    """
+    valid_init_methods = ['kmeans++', 'max-dist']
+
+    def __init__(self, num_clusters, mu=None, rtol=0.001,
+                 init_method='kmeans++', chunk_size=10000, num_workers=1,
+                 rng_seed=1024, **kwargs):
         super(KMeans, self).__init__(**kwargs)
+        assert init_method in self.valid_init_methods, (
+            'init_method=%s not in %s' % (init_method, self.valid_init_methods))
         self.num_clusters = num_clusters
         self.mu = mu
         self.rtol = rtol
+        self.init_method = init_method
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.rng = np.random.RandomState(seed=rng_seed)
+        self._counts = None
+
 
 
     def fit(self, x, epochs=100):
+        """Lloyd's algorithm.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+          epochs: Maximum number of iterations.
+
+        Returns:
+          Mean squared distance to the centroids per epoch.
+          Cluster index of each sample.
+        """
         loss = np.zeros((epochs,), dtype=float_cpu())
         self.mu = self._choose_seeds(x)
-        cluster_index, err2 = self.predict(x)
         for epoch in xrange(epochs):
-            self.mu = self._compute_centroids(x, cluster_index)
-            cluster_index, err2 = self.predict(x)
+            cluster_index, err2, N, F = self._accum_stats(x)
             loss[epoch] = np.mean(err2)
             if epoch > 0:
                 delta = np.abs(loss[epoch-1]-loss[epoch])/loss[epoch-1]
                 if delta < self.rtol:
                     loss = loss[:epoch+1]
                     break
+            if epoch < epochs - 1:
+                self.mu = self._compute_centroids(N, F)
 
         return loss, cluster_index
 
 
-    
+
+    def fit_minibatch(self, x_batches, epochs=1):
+        """Mini-batch k-means, it only needs one batch of data
+           in memory at a time.
+
+        Args:
+          x_batches: Iterable of data batches (batch_size x x_dim).
+                     To run several epochs, it needs to be re-iterable,
+                     e.g., a list or a batch generator object.
+          epochs: Number of passes over the data.
+
+        Returns:
+          Mean squared distance to the centroids per epoch.
+        """
+        loss = np.zeros((epochs,), dtype=float_cpu())
+        for epoch in xrange(epochs):
+            num_samples = 0
+            for x in x_batches:
+                err2 = self.partial_fit(x)
+                loss[epoch] += np.sum(err2)
+                num_samples += x.shape[0]
+            loss[epoch] /= num_samples
+
+        return loss
+
+
+
+    def partial_fit(self, x):
+        """Updates the centroids with a mini-batch,
+           each centroid moves towards the mean of its samples
+           in the batch with learning rate 1/(num. samples assigned so far).
+           The centroids are seeded with the first batch.
+
+        Args:
+          x: Data batch (batch_size x x_dim).
+
+        Returns:
+          Squared distance of the samples to their centroid
+          before the update.
+        """
+        if self.mu is None:
+            self.mu = self._choose_seeds(x)
+        if self._counts is None:
+            self._counts = np.zeros((self.num_clusters,), dtype=float_cpu())
+
+        _, err2, N, F = self._accum_stats(x)
+        self._counts += N
+        nz = N > 0
+        eta = N[nz]/self._counts[nz]
+        self.mu[nz] += eta[:, None]*(F[nz]/N[nz, None] - self.mu[nz])
+        return err2
+
+
+
     def _choose_seeds(self, x):
+        if self.init_method == 'kmeans++':
+            return self._choose_seeds_kmeanspp(x)
+        return self._choose_seeds_max_dist(x)
+
+
+
+    def _choose_seeds_kmeanspp(self, x):
+        """k-means++ seeding, each new seed is sampled with probability
+           proportional to its squared distance to the closest seed.
+        """
+        num_samples = x.shape[0]
         mu = np.zeros((self.num_clusters, x.shape[-1]), dtype=float_cpu())
+        x2 = np.sum(x*x, axis=-1)
+        mu[0] = x[self.rng.randint(num_samples)]
+        d = self._sqdist_to_seed(x, x2, mu[0])
+        for i in xrange(1, self.num_clusters):
+            cum_d = np.cumsum(d)
+            if cum_d[-1] > 0:
+                index = np.searchsorted(cum_d, self.rng.uniform()*cum_d[-1],
+                                        side='right')
+                index = min(index, num_samples-1)
+            else:
+                index = self.rng.randint(num_samples)
+            mu[i] = x[index]
+            d = np.minimum(d, self._sqdist_to_seed(x, x2, mu[i]))
+        return mu
+
+
+
+    def _choose_seeds_max_dist(self, x):
+        """Each new seed is the sample with maximum
+           sum of squared distances to the previous seeds.
+        """
+        mu = np.zeros((self.num_clusters, x.shape[-1]), dtype=float_cpu())
+        x2 = np.sum(x*x, axis=-1)
         mu[0] = x[0]
+        d = np.zeros((x.shape[0],), dtype=float_cpu())
         for i in xrange(1, self.num_clusters):
-            d = np.zeros((x.shape[0],), dtype=float_cpu())
-            for j in xrange(i):
-                d += np.sum(np.square(x-mu[j]), axis=-1)
+            d += self._sqdist_to_seed(x, x2, mu[i-1])
             index = np.argmax(d)
             mu[i] = x[index]
         return mu
 
 
-    
-    def _compute_centroids(self, x, index):
-        mu = np.zeros((self.num_clusters, x.shape[-1]), dtype=float_cpu())
-        for k in xrange(self.num_clusters):
-            r = index == k
-            if np.sum(r)>0:
-                mu[k] = np.mean(x[index==k], axis=0)
+
+    @staticmethod
+    def _sqdist_to_seed(x, x2, mu):
+        d = x2 - 2*np.dot(x, mu.astype(x.dtype, copy=False))
+        d += np.dot(mu, mu)
+        return np.maximum(d, 0)
+
+
+
+    def _compute_centroids(self, N, F):
+        # empty clusters keep their previous centroid
+        mu = np.copy(self.mu)
+        nz = N > 0
+        mu[nz] = F[nz]/N[nz, None]
         return mu
 
 
-    def predict(self, x):
-        err2 = np.zeros((x.shape[0], self.num_clusters), dtype=float_cpu())
-        for k in xrange(self.num_clusters):
-            err2[:,k] = np.sum(np.square(x-self.mu[k]), axis=-1)
 
+    def _predict_chunk(self, x, mu, mu2):
+        err2 = np.dot(x, -2*mu.T)
+        err2 += mu2
         index = np.argmin(err2, axis=-1)
-        return index, err2[np.arange(x.shape[0]),index]
-        
-        
+        err2 = err2[np.arange(x.shape[0]), index]
+        err2 += np.sum(x*x, axis=-1)
+        return index, np.maximum(err2, 0)
+
+
+
+    def _accum_stats_chunk(self, x, mu, mu2):
+        index, err2 = self._predict_chunk(x, mu, mu2)
+        N = np.bincount(index, minlength=self.num_clusters).astype(float_cpu())
+        # sum of the samples of each cluster as a sparse one-hot product
+        R = sparse.csr_matrix(
+            (np.ones((x.shape[0],), dtype=x.dtype), (index, np.arange(x.shape[0]))),
+            shape=(self.num_clusters, x.shape[0]))
+        F = R.dot(x)
+        return index, err2, N, F
+
+
+
+    def _map_chunks(self, f, x):
+        mu = self.mu.astype(x.dtype, copy=False)
+        mu2 = np.sum(mu*mu, axis=-1)
+        chunks = [x[first:first+self.chunk_size]
+                  for first in xrange(0, x.shape[0], self.chunk_size)]
+        if self.num_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                return list(pool.map(lambda x_i: f(x_i, mu, mu2), chunks))
+        return [f(x_i, mu, mu2) for x_i in chunks]
+
+
+
+    def _accum_stats(self, x):
+        """Assigns the samples to the closest centroids and
+           accumulates zero and first order statistics per cluster.
+        """
+        results = self._map_chunks(self._accum_stats_chunk, x)
+        index = np.concatenate([r[0] for r in results])
+        err2 = np.concatenate([r[1] for r in results])
+        N = np.sum([r[2] for r in results], axis=0)
+        F = np.sum([r[3] for r in results], axis=0)
+        return index, err2, N, F
+
+
+
+    def predict(self, x):
+        """Assigns the samples to the closest centroids.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+
+        Returns:
+          Cluster index of each sample.
+          Squared distance of each sample to its centroid.
+        """
+        results = self._map_chunks(self._predict_chunk, x)
+        index = np.concatenate([r[0] for r in results])
+        err2 = np.concatenate([r[1] for r in results])
+        return index, err2
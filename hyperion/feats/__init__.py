@@ -8,6 +8,7 @@ from .filter_banks import FilterBankFactory
 from .feature_windows import FeatureWindowFactory
 from .stft import *
 from .mfcc import MFCC
+from .batch_feature_extractor import BatchFeatureExtractor
 from .energy_vad import EnergyVAD
 from .frame_selector import FrameSelector
 from .feature_normalization import MeanVarianceNorm
@@ -0,0 +1,166 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from six.moves import queue
+
+
+class BatchFeatureExtractor(object):
+    """Extracts features for a list of waveforms in batches using
+       several threads.
+
+       A reader thread reads the waveforms and packs them in batches,
+       a pool of threads computes the features of the batches with
+       feat_extractor.compute_batch, and the results are returned
+       in the original order to the caller, which usually writes them
+       to disk. Then, reading, computing and writing overlap.
+       The heavy steps (FFT, filter-bank, DCT) release the GIL, so threads
+       run in parallel.
+
+    Attributes:
+      feat_extractor: Object with compute_batch method, e.g., MFCC.
+      batch_size: Maximum number of waveforms per batch.
+      max_batch_samples: Maximum number of samples per batch.
+      num_threads: Number of threads computing features.
+      queue_size: Maximum number of batches waiting to be computed.
+    """
+
+    def __init__(self, feat_extractor, batch_size=32, max_batch_samples=16000*600,
+                 num_threads=1, queue_size=4):
+        self.feat_extractor = feat_extractor
+        self.batch_size = batch_size
+        self.max_batch_samples = max_batch_samples
+        self.num_threads = num_threads
+        self.queue_size = queue_size
+
+
+
+    def _read_batches(self, reader, batch_queue, stop_event):
+        try:
+            batch_keys = []
+            batch_x = []
+            batch_samples = 0
+            for data in reader:
+                if stop_event.is_set():
+                    return
+                key, x = data[0], data[1]
+                batch_keys.append(key)
+                batch_x.append(x)
+                batch_samples += len(x)
+                if (len(batch_keys) == self.batch_size or
+                    batch_samples >= self.max_batch_samples):
+                    batch_queue.put((batch_keys, batch_x))
+                    batch_keys = []
+                    batch_x = []
+                    batch_samples = 0
+
+            if len(batch_keys) > 0:
+                batch_queue.put((batch_keys, batch_x))
+            batch_queue.put(None)
+        except Exception as e:
+            batch_queue.put(e)
+
+
+
+    def _compute_batch(self, keys, x):
+        t1 = time.time()
+        y = self.feat_extractor.compute_batch(x)
+        dt = time.time() - t1
+        return keys, y, dt
+
+
+
+    def extract(self, reader):
+        """Generator that extracts the features for all
+           the waveforms in the reader.
+
+        Args:
+          reader: Iterable that returns tuples (key, waveform, ...),
+                  e.g., SequentialAudioReader.
+
+        Returns:
+          Key of the waveform.
+          Feature matrix.
+        """
+        batch_queue = queue.Queue(maxsize=self.queue_size)
+        stop_event = threading.Event()
+        read_thread = threading.Thread(
+            target=self._read_batches, args=(reader, batch_queue, stop_event))
+        read_thread.daemon = True
+        read_thread.start()
+
+        pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        pending = deque()
+        eof = False
+        try:
+            while not eof or len(pending) > 0:
+                # keep all the threads busy
+                while not eof and len(pending) < self.num_threads + 1:
+                    batch = batch_queue.get()
+                    if batch is None:
+                        eof = True
+                    elif isinstance(batch, Exception):
+                        raise batch
+                    else:
+                        pending.append(pool.submit(self._compute_batch, *batch))
+
+                if len(pending) > 0:
+                    keys, y, dt = pending.popleft().result()
+                    logging.info('extracted features for %d waveforms '
+                                 'elapsed-time=%.2f s' % (len(keys), dt))
+                    for key, y_i in zip(keys, y):
+                        yield key, y_i
+        finally:
+            stop_event.set()
+            # unblocks the reader thread if it is waiting to put a batch
+            while read_thread.is_alive():
+                try:
+                    batch_queue.get_nowait()
+                except queue.Empty:
+                    read_thread.join(0.01)
+            pool.shutdown(wait=True)
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('batch_size', 'max_batch_samples', 'num_threads', 'queue_size')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'batch-size', dest=(p2+'batch_size'),
+                            default=32, type=int,
+                            help=('maximum number of waveforms per batch'))
+        parser.add_argument(p1+'max-batch-samples', dest=(p2+'max_batch_samples'),
+                            default=16000*600, type=int,
+                            help=('maximum number of samples per batch'))
+        parser.add_argument(p1+'num-threads', dest=(p2+'num_threads'),
+                            default=1, type=int,
+                            help=('number of threads computing features'))
+        parser.add_argument(p1+'queue-size', dest=(p2+'queue_size'),
+                            default=4, type=int,
+                            help=('maximum number of batches waiting to be computed'))
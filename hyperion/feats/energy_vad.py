@@ -13,6 +13,7 @@ import numpy as np
 from scipy.signal import lfilter
 
 from ..hyp_defs import float_cpu
+from ..utils.misc import str2bool
 from .stft import st_logE
 
 
@@ -59,9 +60,22 @@ class EnergyVAD(object):
         self.reset()
 
 
-    def reset(self):
-        """Resets the internal states of the filters """
+    def reset(self, num_samples=None):
+        """Resets the internal states of the filters and the streaming buffers.
+
+           Args:
+             num_samples: Length of the full recording, if known, it is used to
+                          seed the dither when streaming, as in compute().
+        """
         self._dc_zi = np.array([0], dtype=float_cpu())
+        self._buffer = np.zeros((0,), dtype=float_cpu())
+        self._dither_rng = np.random.RandomState(
+            seed=0 if num_samples is None else num_samples)
+        self._sum_logE = 0
+        self._num_logE = 0
+        self._vad_buffer = np.zeros((0,), dtype=bool)
+        self._vad_buffer_first = 0
+        self._num_vad_out = 0
 
 
     def compute(self, x, return_loge=False):
@@ -105,19 +119,17 @@ class EnergyVAD(object):
             
 
         # compute VAD from logE
-        print(np.mean(logE))
         e_thr = self.vad_energy_threshold + self.vad_energy_mean_scale * np.mean(logE)
-        print(e_thr)
-        print(logE)
         vad = (logE > e_thr)
 
         context = self.vad_frames_context
+        window = 2*context + 1
+        if len(vad) < window:
+            context = int((len(vad)-1)/2)
+            window = 2*context + 1
+
         if context == 0:
             return vad
- 
-        window = 2*context + 1
-        if len(vad0) < window:
-            context = int(len(vad0)-1/2)
 
         h = np.ones((window,), dtype='float32')
         num_count = np.convolve(vad.astype('float32'), h, 'same')
@@ -128,6 +140,92 @@ class EnergyVAD(object):
         
         vad = num_count > self.vad_proportion_threshold
         return vad
+
+
+
+    def push(self, x):
+        """ Streaming version of compute, it evaluates the VAD for a chunk
+            of a long recording with constant memory.
+            Call reset() before starting a new recording and
+            flush() after the last chunk.
+
+            The energy threshold uses the running mean of the log-energy
+            up to the current frame instead of the mean of the full
+            recording, so decisions can differ from compute()
+            at the beginning of the recording.
+            If vad_frames_context > 0, the decisions of the last
+            vad_frames_context frames are delayed until the next call.
+
+            Args:
+              x: Chunk of wave (only for snip_edges=True) or
+                 chunk of features with log-e in the first coeff.
+
+            Returns:
+              Binary VAD of the frames completed by this chunk.
+        """
+        if x.ndim == 1:
+            assert self.snip_edges, 'push needs snip_edges=True'
+            if self.dither > 0:
+                x = x + self.dither*self._dither_rng.randn(len(x)).astype(
+                    float_cpu(), copy=False)
+
+            x, self._dc_zi = lfilter(self._dc_b, self._dc_a, x, zi=self._dc_zi)
+            x = np.concatenate((self._buffer, x))
+            logE = st_logE(x, self._length, self._shift)
+            self._buffer = x[len(logE)*self._shift:].copy()
+        elif x.ndim == 2:
+            logE = x[:, 0]
+        else:
+            raise Exception('Wrong input dimension ndim=%d' % x.ndim)
+
+        # running mean of the log-energy
+        sum_logE = self._sum_logE + np.cumsum(logE)
+        num_logE = self._num_logE + np.arange(1, len(logE)+1)
+        if len(logE) > 0:
+            self._sum_logE = sum_logE[-1]
+            self._num_logE = num_logE[-1]
+
+        e_thr = self.vad_energy_threshold + self.vad_energy_mean_scale * sum_logE/num_logE
+        vad = (logE > e_thr)
+        return self._push_context(vad)
+
+
+
+    def flush(self):
+        """Returns the VAD decisions delayed by push() at the end of the
+           recording.
+        """
+        return self._push_context(np.zeros((0,), dtype=bool), last=True)
+
+
+
+    def _push_context(self, vad, last=False):
+        """Applies the context window to the streaming decisions."""
+        context = self.vad_frames_context
+        if context == 0:
+            return vad
+
+        vad = np.concatenate((self._vad_buffer, vad))
+        first = self._vad_buffer_first
+        end = first + len(vad)
+        ready = end if last else end - context
+        if ready <= self._num_vad_out:
+            self._vad_buffer = vad
+            return np.zeros((0,), dtype=bool)
+
+        t = np.arange(self._num_vad_out, ready)
+        lo = np.maximum(t - context, 0)
+        hi = np.minimum(t + context + 1, end)
+        count = np.concatenate(([0], np.cumsum(vad)))
+        prop = (count[hi-first] - count[lo-first])/(hi - lo)
+        vad_out = prop > self.vad_proportion_threshold
+
+        # keep the decisions needed as left context of next frames
+        self._num_vad_out = ready
+        keep_first = max(ready - context, first)
+        self._vad_buffer = vad[keep_first-first:]
+        self._vad_buffer_first = keep_first
+        return vad_out
         
     
 
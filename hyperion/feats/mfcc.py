@@ -18,7 +18,7 @@ from ..hyp_defs import float_cpu
 from ..utils.misc import str2bool
 from .feature_windows import FeatureWindowFactory as FWF
 from .filter_banks import FilterBankFactory as FBF
-from .stft import strft, st_logE
+from .stft import st_frames, st_logE
 
 
 class MFCCSteps(Enum):
@@ -155,10 +155,20 @@ class MFCC(object):
 
 
 
-    def reset(self):
-        """Resets the internal states of the filters """
+    def reset(self, num_samples=None):
+        """Resets the internal states of the filters and the streaming buffers.
+
+           Args:
+             num_samples: Length of the full recording, if known, it is used to
+                          seed the dither when streaming, so the output
+                          of push() matches compute().
+        """
         self._dc_zi = np.array([0], dtype=float_cpu())
         self._preemph_zi = np.array([0], dtype=float_cpu())
+        self._buffer = np.zeros((0,), dtype=float_cpu())
+        self._buffer_e = np.zeros((0,), dtype=float_cpu())
+        self._dither_rng = np.random.RandomState(
+            seed=0 if num_samples is None else num_samples)
 
         
         
@@ -203,6 +213,133 @@ class MFCC(object):
 
 
     
+    def _wave_to_frames(self, x, dc_zi, preemph_zi):
+        """Applies the time domain processing to the wave and
+           splits it into windowed frames.
+
+           Args:
+             x: wave signal
+             dc_zi: Initial state of the DC removal filter.
+             preemph_zi: Initial state of the preemphasis filter.
+
+           Returns:
+             Windowed frames (num_frames x frame_length).
+             Raw log-energy (None if not needed).
+             Final state of the DC removal filter.
+             Final state of the preemphasis filter.
+        """
+        if not self.snip_edges:
+            num_frames = int(np.round(len(x)/self._shift))
+            len_x = (num_frames-1)*self._shift + self._length
+            dlen_x = len_x - len(x)
+            #x = np.pad(x, (0, dlen_x), mode='reflect')
+            dlen1_x = int(np.floor((self._length-self._shift)/2))
+            dlen2_x = int(dlen_x - dlen1_x)
+            x = np.pad(x, (dlen1_x, dlen2_x), mode='reflect')
+
+        # add dither
+        if self.dither > 0:
+            n = self.dither*np.random.RandomState(
+                seed=len(x)).randn(len(x)).astype(float_cpu(), copy=False)
+            x = x + n
+
+        x_e, x, dc_zi, preemph_zi = self._filter_wave(x, dc_zi, preemph_zi)
+
+        # Compute raw energy
+        logE = None
+        if self.use_energy and self.raw_energy:
+            logE = self.compute_raw_logE(x_e)
+
+        frames = st_frames(x, self._length, self._shift)*self._window
+        return frames, logE, dc_zi, preemph_zi
+
+
+
+    def _filter_wave(self, x, dc_zi, preemph_zi):
+        """Applies DC removal and preemphasis filters.
+
+           Returns:
+             Wave after DC removal (used for raw energy).
+             Wave after DC removal and preemphasis.
+             Final state of the DC removal filter.
+             Final state of the preemphasis filter.
+        """
+        # Remove offset
+        if self.remove_dc_offset:
+            x, dc_zi = lfilter(self._dc_b, self._dc_a, x, zi=dc_zi)
+        x_e = x
+
+        # Apply preemphasis filter
+        if self.preemph_coeff > 0:
+            x, preemph_zi = lfilter(self._preemph_b, [1], x, zi=preemph_zi)
+
+        return x_e, x, dc_zi, preemph_zi
+
+
+
+    def _frames_to_output(self, frames, logE):
+        """Evaluates the pipeline from windowed frames."""
+        X = np.fft.rfft(frames, n=self.fft_length).astype('complex64', copy=False)
+        F = np.abs(X).astype(dtype=float_cpu(), copy=False)
+
+        # Compute no-raw energy
+        if self.use_energy and not self.raw_energy:
+            logE = np.log(np.mean(F**2, axis=-1)+1e-10)
+
+        R, _, _ = self._fft_to_output(X, F, None, logE)
+        return R
+
+
+
+    def _fft_to_output(self, X, F, B, logE):
+        """Evaluates the steps of the pipeline after the FFT.
+
+           Returns:
+             Stfft, spectrogram, log-filter-bank or MFCC depending on output_step.
+             |X(f)| or |X(f)|^2 spectrogram.
+             Log-filter-bank.
+        """
+        # Compute |X(f)|^2
+        if self._input_step <= MFCCSteps.FFT and self._output_step >= MFCCSteps.FFT_MAG:
+            if self.use_fft2:
+                F = F**2
+
+        # Compute log-filter-bank
+        if self._input_step <= MFCCSteps.LOG_SPEC and self._output_step >= MFCCSteps.LOGFB:
+            B = np.log(np.dot(F, self._fb) + 1e-10)
+            #B = np.maximum(B, np.log(self.energy_floor+1e-15))
+
+        # Compute MFCC
+        if self._input_step <= MFCCSteps.LOGFB and self._output_step == MFCCSteps.CEPSTRUM:
+            P = dct(B, type=2, norm='ortho')[:,:self.num_ceps]
+
+            if self.cepstral_lifter > 0:
+                P *= self._lifter
+
+        #Select the right output type
+        if self._output_step == MFCCSteps.FFT:
+            R = X
+        elif self._output_step == MFCCSteps.FFT_MAG:
+            R = F
+        elif self._output_step == MFCCSteps.LOG_SPEC:
+            R = np.log(F+1e-10)
+        elif self._output_step == MFCCSteps.LOGFB:
+            R = B
+        else:
+            R = P
+
+        if self.use_energy:
+            #append energy
+            logE = np.maximum(logE, np.log(self.energy_floor+1e-15))
+            if self._output_step == MFCCSteps.LOGFB:
+                R = np.hstack((logE[:, None], R))
+            else:
+                R[:,0] = logE
+
+        return R, F, B
+
+
+
     def compute(self, x, return_fft=False, return_fft_mag=False, return_logfb=False):
         """ Evaluates the MFCC pipeline.
 
@@ -220,6 +357,10 @@ class MFCC(object):
         assert not(return_fft_mag and (self._input_step > MFCCSteps.FFT_MAG or self._output_step < MFCCSteps.FFT_MAG))
         assert not(return_logfb and self._output_step < MFCCSteps.LOGFB)
 
+        X = None
+        F = None
+        B = None
+        logE = None
         # Prepare input
         if self._input_step == MFCCSteps.FFT:
             X = x
@@ -240,42 +381,12 @@ class MFCC(object):
                 logE = x[:,0]
 
         if self._input_step == MFCCSteps.WAVE:
-            if self.snip_edges:
-                num_frames = int(np.floor((len(x) - self._length + self._shift)/self._shift))
-            else:
-                num_frames = int(np.round(len(x)/self._shift))
-                len_x = (num_frames-1)*self._shift + self._length
-                dlen_x = len_x - len(x)
-                #x = np.pad(x, (0, dlen_x), mode='reflect')
-                dlen1_x = int(np.floor((self._length-self._shift)/2))
-                dlen2_x = int(dlen_x - dlen1_x)
-                x = np.pad(x, (dlen1_x, dlen2_x), mode='reflect')
-
-            # add dither
-            if self.dither > 0:
-                n = self.dither*np.random.RandomState(
-                    seed=len(x)).randn(len(x)).astype(float_cpu(), copy=False)
-                x = x + n
-                
-            # Remove offset
-            if self.remove_dc_offset:
-                x, self._dc_zi = lfilter(self._dc_b, self._dc_a, x, zi=self._dc_zi)
-
-            # Compute raw energy
-            if self.use_energy and self.raw_energy:
-                logE = self.compute_raw_logE(x)
-
-            # Apply preemphasis filter
-            if self.preemph_coeff > 0:
-                x, self._preemph_zi = lfilter(self._preemph_b, [1], x, zi=self._preemph_zi)
+            frames, logE, self._dc_zi, self._preemph_zi = self._wave_to_frames(
+                x, self._dc_zi, self._preemph_zi)
 
             #Comptue STFFT
-            #_, _, X = stft(x, window=self._window, nperseg=self._nperseg, noverlap=self._overlap, nfft=self.fft_length, boundary=None)
-            # Fix scale of FFT
-            #X = self._fft_scale * X[:, :num_frames].T
+            X = np.fft.rfft(frames, n=self.fft_length).astype('complex64', copy=False)
 
-            X = strft(x, self._length, self._shift, self.fft_length, self._window)
-            
             # Compute |X(f)|
             F = np.abs(X).astype(dtype=float_cpu(), copy=False)
 
@@ -284,43 +395,7 @@ class MFCC(object):
                 # Use Paserval's theorem
                 logE = np.log(np.mean(F**2, axis=-1)+1e-10)
 
-                
-        # Compute |X(f)|^2
-        if self._input_step <= MFCCSteps.FFT and self._output_step >= MFCCSteps.FFT_MAG:
-            if self.use_fft2:
-                F = F**2
-
-        # Compute log-filter-bank
-        if self._input_step <= MFCCSteps.LOG_SPEC and self._output_step >= MFCCSteps.LOGFB:
-            B = np.log(np.dot(F, self._fb) + 1e-10)
-            #B = np.maximum(B, np.log(self.energy_floor+1e-15))
-
-        # Compute MFCC
-        if self._input_step <= MFCCSteps.LOGFB and self._output_step == MFCCSteps.CEPSTRUM:
-            P = dct(B, type=2, norm='ortho')[:,:self.num_ceps]
-
-            if self.cepstral_lifter > 0:
-                P *= self._lifter
-
-        #Select the right output type
-        if self._output_step == MFCCSteps.FFT:
-            R = X
-        elif self._output_step == MFCCSteps.FFT_MAG:
-            R = F
-        elif self._output_step == MFCCSteps.LOG_SPEC:
-            R = np.log(F+1e-10)
-        elif self._output_step == MFCCSteps.LOGFB:
-            R = B
-        else:
-            R = P
-
-        if self.use_energy:
-            #append energy
-            logE = np.maximum(logE, np.log(self.energy_floor+1e-15))
-            if self._output_step == MFCCSteps.LOGFB:
-                R = np.hstack((logE[:, None], R))
-            else:
-                R[:,0] = logE
+        R, F, B = self._fft_to_output(X, F, B, logE)
 
         if not(return_fft or return_fft_mag or return_logfb):
             return R
@@ -336,7 +411,85 @@ class MFCC(object):
 
         return tuple(R)
 
-        
+
+
+    def compute_batch(self, x):
+        """ Evaluates the MFCC pipeline for a batch of waveforms.
+            The frames of all the waveforms are packed in a single matrix,
+            so FFT, filter-bank and DCT are computed with one call for the
+            full batch.
+            Each waveform is processed from the initial filter states, as
+            if calling reset() before compute(), and the object state
+            is not modified, so it can be called from several threads.
+
+            Args:
+              x: List of waveforms.
+
+            Returns:
+              List of stfft, spectrogram, log-filter-bank or MFCC matrices
+              depending on output_step.
+        """
+        assert self._input_step == MFCCSteps.WAVE, (
+            'compute_batch needs input_step=wave')
+
+        frames = []
+        logE = []
+        for x_i in x:
+            dc_zi = np.zeros((1,), dtype=float_cpu())
+            preemph_zi = np.zeros((1,), dtype=float_cpu())
+            frames_i, logE_i, _, _ = self._wave_to_frames(x_i, dc_zi, preemph_zi)
+            frames.append(frames_i)
+            logE.append(logE_i)
+
+        num_frames = [f.shape[0] for f in frames]
+        if self.use_energy and self.raw_energy:
+            logE = np.concatenate(logE)
+        R = self._frames_to_output(np.vstack(frames), logE)
+        return np.split(R, np.cumsum(num_frames)[:-1])
+
+
+
+    def push(self, x):
+        """ Streaming version of compute, it evaluates the MFCC pipeline
+            for a chunk of a long recording. The samples that don't
+            complete a frame are kept for the next call, so memory
+            doesn't depend on the length of the recording.
+            Call reset() before starting a new recording.
+            Only for input_step=wave and snip_edges=True,
+            the concatenated outputs are the same as calling compute()
+            with the full recording if dither=0 or if reset was called
+            with the length of the recording.
+
+            Args:
+              x: Chunk of wave.
+
+            Returns:
+              Stfft, spectrogram, log-filter-bank or MFCC for the
+              frames completed by this chunk.
+        """
+        assert self._input_step == MFCCSteps.WAVE, 'push needs input_step=wave'
+        assert self.snip_edges, 'push needs snip_edges=True'
+
+        if self.dither > 0:
+            x = x + self.dither*self._dither_rng.randn(len(x)).astype(
+                float_cpu(), copy=False)
+
+        x_e, x, self._dc_zi, self._preemph_zi = self._filter_wave(
+            x, self._dc_zi, self._preemph_zi)
+
+        x = np.concatenate((self._buffer, x))
+        frames = st_frames(x, self._length, self._shift)
+        num_frames = frames.shape[0]
+        logE = None
+        if self.use_energy and self.raw_energy:
+            x_e = np.concatenate((self._buffer_e, x_e))
+            logE = self.compute_raw_logE(x_e)
+            self._buffer_e = x_e[num_frames*self._shift:].copy()
+
+        self._buffer = x[num_frames*self._shift:].copy()
+        return self._frames_to_output(frames*self._window, logE)
+
+
 
     @staticmethod
     def filter_args(prefix=None, **kwargs):
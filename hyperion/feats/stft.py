@@ -13,6 +13,25 @@ import numpy as np
 
 from ..hyp_defs import float_cpu
 
+def st_frames(x, frame_length, frame_shift):
+    """Splits the signal into overlapping frames without copying it.
+
+       Args:
+         x: wave signal
+         frame_length: frame length in samples
+         frame_shift: frame shift in samples
+
+       Returns:
+         Read-only matrix with the frames (num_frames x frame_length)
+    """
+    num_frames = max(int(np.floor((len(x) - frame_length + frame_shift)/frame_shift)), 0)
+    x = np.ascontiguousarray(x)
+    return np.lib.stride_tricks.as_strided(
+        x, shape=(num_frames, frame_length),
+        strides=(frame_shift*x.strides[0], x.strides[0]), writeable=False)
+
+
+
 def stft(x, frame_length, frame_shift, fft_length, window=None):
 
     if window is None:
@@ -58,14 +77,8 @@ def strft(x, frame_length, frame_shift, fft_length, window=None):
     if window is None:
         window = 1
         
-    num_frames = int(np.floor((len(x) - frame_length + frame_shift)/frame_shift))
-    X = np.zeros((num_frames, int(fft_length/2+1)), dtype='complex64')
-    j = 0
-    for i in xrange(num_frames):
-        X[i,:] = np.fft.rfft(x[j:j+frame_length]*window, n=fft_length)
-        j += frame_shift
-            
-    return X
+    X = np.fft.rfft(st_frames(x, frame_length, frame_shift)*window, n=fft_length)
+    return X.astype('complex64', copy=False)
 
 
 
@@ -103,13 +116,5 @@ def st_logE(x, frame_length, frame_shift):
          Log-energy
      """
         
-    num_frames = int(np.floor((len(x) - frame_length + frame_shift)/frame_shift))
-        
-    x2 = x**2
-    e = np.zeros((num_frames,), dtype=float_cpu())
-    j = 0
-    for i in xrange(num_frames):
-        e[i] = np.sum(x2[j:j+frame_length])
-        j += frame_shift
-            
-    return np.log(e+1e-15)
+    e = np.sum(st_frames(x, frame_length, frame_shift)**2, axis=-1)
+    return np.log(e+1e-15).astype(float_cpu(), copy=False)
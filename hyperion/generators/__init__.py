@@ -9,3 +9,5 @@ from .sequence_batch_generator_v1 import SequenceBatchGeneratorV1
 from .sequence_batch_generator_v2 import SequenceBatchGeneratorV2
 from .adapt_sequence_batch_generator import AdaptSequenceBatchGenerator
 
+from .prefetch_batch_generator import PrefetchBatchGenerator
+from .bucket_batch_sampler import BucketBatchSampler
@@ -19,13 +19,22 @@ from sklearn.utils.class_weight import compute_class_weight
 
 from ..hyp_defs import float_cpu
 from ..io import RandomAccessDataReaderFactory as RF
-from ..utils.scp_list import SCPList
+from ..utils.utt2info import Utt2Info
+from ..utils.list_utils import ismember
 from ..utils.tensors import to3D_by_seq
 from ..transforms import TransformList
 from .sequence_batch_generator_v1 import SequenceBatchGeneratorV1 as SBG
 
 
 class AdaptSequenceBatchGenerator(SBG):
+    """Sequence batch generator where each batch contains
+       batch_size - r_adapt sequences of the training data and
+       r_adapt sequences of the adaptation data.
+
+       The adaptation utterances are appended to the keys and class_ids
+       arrays after the training utterances, so plan_batch returns
+       indices in the same index space as SequenceBatchGeneratorV1.
+    """
 
     def __init__(self, rspecifier,
                  key_file, key_file_adapt,
@@ -40,87 +49,78 @@ class AdaptSequenceBatchGenerator(SBG):
                  prune_min_length=0,
                  return_class = True,
                  class_weight = None,
+                 max_class_imbalance=2,
                  seq_weight = 'balanced',
                  shuffle_seqs=True,
                  transform=None,
                  init_epoch=0,
                  sg_seed=1024, reset_rng=False,
-                 scp_sep=' ', 
+                 scp_sep=' ', use_mmap=False,
                  part_idx=1, num_parts=1):
 
 
-        self.scp_adapt = SCPList.load(key_file_adapt, sep=scp_sep)
+        self.u2c_adapt = Utt2Info.load(key_file_adapt, sep=scp_sep)
         if num_parts > 1:
-            self.scp_adapt = self.scp_adapt.split(part_idx, num_parts, group_by_key=False)
+            self.u2c_adapt = self.u2c_adapt.split(part_idx, num_parts, group_by_key=False)
 
         assert r_adapt < batch_size
         self.r_adapt = r_adapt
 
         self._init_seq_lengths_adapt = None
         self._seq_lengths_adapt = None
-
-        self.init_scp_adapt = self.scp_adapt
+        self._index_adapt = None
 
         self.cur_seq_adapt = 0
         self.cur_frame_adapt = None
-
-        self.cur_subseq = None
+        self.cur_subseq_adapt = None
         self._init_num_subseqs_adapt = None
         self.num_subseqs_adapt = None
 
         
         super(AdaptSequenceBatchGenerator, self).__init__(
-            rspecifier, key_file, class_list, path_prefix, batch_size,
-            iters_per_epoch, gen_method, min_seq_length, max_seq_length, seq_overlap,
-            prune_min_length, return_class, class_weight, seq_weight,
-            shuffle_seqs, transform, init_epoch, sg_seed, reset_rng, scp_sep,
-            part_idx,num_parts)
+            rspecifier, key_file, class_list=class_list, path_prefix=path_prefix,
+            batch_size=batch_size, iters_per_epoch=iters_per_epoch,
+            gen_method=gen_method, min_seq_length=min_seq_length,
+            max_seq_length=max_seq_length, seq_overlap=seq_overlap,
+            prune_min_length=prune_min_length, return_class=return_class,
+            class_weight=class_weight, max_class_imbalance=max_class_imbalance,
+            seq_weight=seq_weight, shuffle_seqs=shuffle_seqs, transform=transform,
+            init_epoch=init_epoch, sg_seed=sg_seed, reset_rng=reset_rng,
+            scp_sep=scp_sep, use_mmap=use_mmap,
+            part_idx=part_idx, num_parts=num_parts)
 
 
 
-    @property
-    def num_seqs(self):
-        return len(self.scp)
+    def _init_keys(self):
+        super(AdaptSequenceBatchGenerator, self)._init_keys()
+        # adaptation utterances go after the training utterances
+        self.adapt_offset = len(self.init_u2c)
+        self.keys = np.concatenate((self.keys, self.u2c_adapt.key))
+        self.class_ids = np.concatenate((self.class_ids, self.class_ids_adapt))
 
 
     
     @property
     def num_seqs_adapt(self):
-        return len(self.scp_adapt)
+        return len(self.u2c_adapt)
 
 
     
-    @property
-    def seq_lengths(self):
-        if self._seq_lengths is None:
-            self._init_seq_lengths = self.r.read_num_rows(self.scp.file_path)
-            self._seq_lengths = self._init_seq_lengths
-        return self._seq_lengths
-
-
-
     @property
     def seq_lengths_adapt(self):
         if self._seq_lengths_adapt is None:
-            self._init_seq_lengths_adapt = self.r.read_num_rows(self.scp_adapt.file_path)
+            self._init_seq_lengths_adapt = self.r.read_num_rows(self.u2c_adapt.key)
             self._seq_lengths_adapt = self._init_seq_lengths_adapt
         return self._seq_lengths_adapt
 
 
     
-    @property
-    def total_length(self):
-        return np.sum(self.seq_lengths)
-
-
-
     @property
     def total_length_adapt(self):
         return np.sum(self.seq_lengths_adapt)
 
 
 
-    
     @property
     def min_seq_length(self):
         if self._min_seq_length is None:
@@ -154,62 +154,38 @@ class AdaptSequenceBatchGenerator(SBG):
         return self._steps_per_epoch
 
 
-        
-    @property
-    def num_total_subseqs(self):
-        return self.steps_per_epoch * self.batch_size
-
-
     
     def _prune_min_length(self, min_length):
-        keep_idx = self.seq_lengths >= min_length
-        self.scp = self.scp.filter_index(keep_idx)
+        super(AdaptSequenceBatchGenerator, self)._prune_min_length(min_length)
         keep_idx = self.seq_lengths_adapt >= min_length
-        self.scp_adapt = self.scp_adapt.filter_index(keep_idx)
-
-        self._seq_lengths = None
+        self.u2c_adapt = self.u2c_adapt.filter_index(keep_idx)
         self._seq_lengths_adapt = None
 
 
         
     def _prepare_class_info(self, class_list):
         if class_list is None:
-            class_dict = {k:i for i, k in enumerate(np.unique(self.scp.key))}
-            class_dict.update({k:i for i, k in enumerate(np.unique(self.scp_adapt.key))})
+            classes = np.unique(np.concatenate((self.u2c.info, self.u2c_adapt.info)))
         else:
             with open(class_list) as f:
-                class_dict={line.rstrip().split()[0]: i for i, line in enumerate(f)}
-
-        self.num_classes = len(class_dict)
-        self.key2class = {p: class_dict[k] for k, p in zip(self.scp.key, self.scp.file_path)}
-        self.key2class.update({p: class_dict[k] for k, p in zip(self.scp_adapt.key, self.scp_adapt.file_path)})
+                classes = [line.rstrip().split()[0] for line in f]
 
+        self.num_classes = len(classes)
+        _, self.class_ids = ismember(self.u2c.info, classes)
+        _, self.class_ids_adapt = ismember(self.u2c_adapt.info, classes)
 
-        
-    def _balance_class_weight(self):
-        super(AdaptSequenceBatchGenerator, self)._balance_class_weight()
-        classes, class_ids = np.unique(self.scp_adapt.key, return_inverse=True)
 
-        idx = self._balance_class_weigth_helper(class_ids)
         
-        self.scp_adapt = self.scp_adapt.filter_index(idx)
-        assert len(self.scp_adapt) == len(num_samples)*max_samples
-                   
+    def _balance_class_weight(self, max_class_imbalance):
+        super(AdaptSequenceBatchGenerator, self)._balance_class_weight(max_class_imbalance)
+        idx = self._balance_class_weight_helper(self.class_ids_adapt, max_class_imbalance)
+        self.u2c_adapt = self.u2c_adapt.filter_index(idx)
+        self.class_ids_adapt = self.class_ids_adapt[idx]
         if self._init_seq_lengths_adapt is not None:
-            self._init_seq_legths_adapt = self._init_seq_lengths_adapt[idx]
-            self._seq_lengths_adapt = self._init_seq_legths_adapt
+            self._init_seq_lengths_adapt = self._init_seq_lengths_adapt[idx]
+            self._seq_lengths_adapt = self._init_seq_lengths_adapt
         
 
-            
-
-    def _prepare_full_seqs(self):
-        pass
-
-
-    def _prepare_random_subseqs(self):
-        pass
-
-
     
     def _prepare_sequential_subseqs(self):
         super(AdaptSequenceBatchGenerator, self)._prepare_sequential_subseqs()
@@ -228,16 +204,14 @@ class AdaptSequenceBatchGenerator(SBG):
         
         self.cur_seq_adapt = 0
 
+        if self._init_seq_lengths_adapt is None:
+            self.seq_lengths_adapt
+        self._index_adapt = np.arange(self.num_seqs_adapt)
         if self.shuffle_seqs:
-            if self._init_seq_lengths_adapt is None:
-                self.seq_lengths_adapt
-                
-            self.scp_adapt = self.init_scp_adapt.copy()
-            index = self.scp_adapt.shuffle(rng=self.rng)
-            self._seq_lengths_adapt = self._init_seq_lengths_adapt[index]
+            self.rng.shuffle(self._index_adapt)
+            self._seq_lengths_adapt = self._init_seq_lengths_adapt[self._index_adapt]
             if self._init_num_subseqs_adapt is not None:
-                self.num_subseqs_adapt = self._init_num_subseqs_adapt[index]
-
+                self.num_subseqs_adapt = self._init_num_subseqs_adapt[self._index_adapt]
                 
         if self.gen_method == 'sequential':
             self.cur_subseq_adapt[:] = 0
@@ -245,118 +219,46 @@ class AdaptSequenceBatchGenerator(SBG):
             
 
 
-    
-
-    
-    def _read_full_seqs(self):
-        batch_size = self.batch_size - self.r_adapt
-        keys = list(self.scp.file_path[self.cur_seq:self.cur_seq+batch_size])
-        self.cur_seq += batch_size
-        if len(keys) < batch_size:
-            delta = batch_size - len(keys)
-            keys += self.scp.file_path[:delta]
-            self.cur_seq = delta
-            assert len(keys) == batch_size
-
-        batch_size = self.r_adapt
-        keys_adapt = list(self.scp_adapt.file_path[self.cur_seq_adapt:self.cur_seq_adapt+batch_size])
-        self.cur_seq_adapt += batch_size
-        if len(keys_adapt) < batch_size:
-            delta = batch_size - len(keys)
-            keys_adapt += self.scp_adapt.file_path[:delta]
-            self.cur_seq_adapt = delta
-            assert len(keys_adapt) == batch_size
-
-        keys += keys_adapt
-            
-        return keys, self.r.read(keys)
-
+    def _adapt_index(self, pos):
+        """Indices in the keys array of the adaptation sequences."""
+        return self.adapt_offset + self._index_adapt[pos]
 
-    
-    def _read_random_subseqs(self):
-        
-        keys = []
-        seq_lengths =[]
-        first_frames = []
-        for i in xrange(self.batch_size-self.r_adapt):
-            key = self.scp.file_path[self.cur_seq]
-            full_seq_length = self.seq_lengths[self.cur_seq]
-            max_seq_length = min(full_seq_length, self.max_seq_length)
-            min_seq_length = min(full_seq_length, self.min_seq_length)
-            
-            seq_length = self.rng.randint(low=min_seq_length, high=max_seq_length+1)
-            first_frame = self.rng.randint(
-                low=0, high=full_seq_length-seq_length+1)
 
-            keys.append(key)
-            seq_lengths.append(seq_length)
-            first_frames.append(first_frame)
 
-            self.cur_seq = (self.cur_seq + 1) % self.num_seqs
+    def _plan_full_seqs(self):
+        index, _, _ = super(AdaptSequenceBatchGenerator, self)._plan_full_seqs(
+            self.batch_size - self.r_adapt)
 
-        for i in xrange(self.r_adapt):
-            key = self.scp_adapt.file_path[self.cur_seq_adapt]
-            full_seq_length = self.seq_lengths_adapt[self.cur_seq_adapt]
-            max_seq_length = min(full_seq_length, self.max_seq_length)
-            min_seq_length = min(full_seq_length, self.min_seq_length)
-            
-            seq_length = self.rng.randint(low=min_seq_length, high=max_seq_length+1)
-            first_frame = self.rng.randint(
-                low=0, high=full_seq_length-seq_length+1)
+        pos = (self.cur_seq_adapt + np.arange(self.r_adapt)) % self.num_seqs_adapt
+        self.cur_seq_adapt = (self.cur_seq_adapt + self.r_adapt) % self.num_seqs_adapt
+        return np.concatenate((index, self._adapt_index(pos))), 0, 0
 
-            keys.append(key)
-            seq_lengths.append(seq_length)
-            first_frames.append(first_frame)
 
-            self.cur_seq_adapt = (self.cur_seq_adapt + 1) % self.num_seqs_adapt
-            
-        return keys, self.r.read(keys, row_offset=first_frames,
-                                 num_rows=seq_lengths)
+    
+    def _plan_random_subseqs(self):
+        index, first_frames, seq_lengths = super(
+            AdaptSequenceBatchGenerator, self)._plan_random_subseqs(
+                self.batch_size - self.r_adapt)
+
+        pos = (self.cur_seq_adapt + np.arange(self.r_adapt)) % self.num_seqs_adapt
+        self.cur_seq_adapt = (self.cur_seq_adapt + self.r_adapt) % self.num_seqs_adapt
+        first_frames_adapt, seq_lengths_adapt = self._draw_random_subseqs(
+            self.seq_lengths_adapt[pos])
+
+        return (np.concatenate((index, self._adapt_index(pos))),
+                np.concatenate((first_frames, first_frames_adapt)),
+                np.concatenate((seq_lengths, seq_lengths_adapt)))
             
 
     
-    def _read_sequential_subseqs(self):
+    def _plan_sequential_subseqs(self):
+        index, first_frames, seq_lengths = super(
+            AdaptSequenceBatchGenerator, self)._plan_sequential_subseqs(
+                self.batch_size - self.r_adapt)
 
-        keys = []
-        seq_lengths =[]
-        first_frames = []
+        index = list(index)
         count = 0
-        while count < self.batch_size - self.r_adapt:
-            key = self.scp.file_path[self.cur_seq]
-            first_frame = self.cur_frame[self.cur_seq]
-            full_seq_length = self.seq_lengths[self.cur_seq]
-            remainder_seq_length =  full_seq_length - first_frame
-            if self.cur_subseq[self.cur_seq] == self.num_subseqs[self.cur_seq]:
-                self.cur_seq = (self.cur_seq + 1) % self.num_seqs
-                continue
-            if self.cur_subseq[self.cur_seq] == self.num_subseqs[self.cur_seq]-1:
-                seq_length = min(remainder_seq_length, self.max_seq_length)
-                self.cur_frame[self.cur_seq] = 0
-            else:
-                max_seq_length = min(
-                    max(self.min_seq_length,
-                        remainder_seq_length-self.min_seq_length),
-                    self.max_seq_length)
-                min_seq_length = min(remainder_seq_length, self.min_seq_length)
-                seq_length = self.rng.randint(low=min_seq_length, high=max_seq_length+1)
-                self.cur_frame[self.cur_seq] = min(
-                    full_seq_length - self.min_seq_length,
-                    first_frame + seq_length - self.seq_overlap)
-            
-            keys.append(key)
-            seq_lengths.append(seq_length)
-            first_frames.append(first_frame)
-
-            self.cur_subseq[self.cur_seq] += 1
-            if self.seq_weight == 'balanced':
-                self.cur_subseq[self.cur_seq] %= self.num_subseqs[self.cur_seq]
-
-            self.cur_seq = (self.cur_seq + 1) % self.num_seqs
-            count += 1
-
-
-        while count < self.batch_size:
-            key = self.scp_adapt.file_path[self.cur_seq_adapt]
+        while count < self.r_adapt:
             first_frame = self.cur_frame_adapt[self.cur_seq_adapt]
             full_seq_length = self.seq_lengths_adapt[self.cur_seq_adapt]
             remainder_seq_length =  full_seq_length - first_frame
@@ -377,7 +279,7 @@ class AdaptSequenceBatchGenerator(SBG):
                     full_seq_length - self.min_seq_length,
                     first_frame + seq_length - self.seq_overlap)
             
-            keys.append(key)
+            index.append(self._adapt_index(self.cur_seq_adapt))
             seq_lengths.append(seq_length)
             first_frames.append(first_frame)
 
@@ -388,10 +290,8 @@ class AdaptSequenceBatchGenerator(SBG):
             self.cur_seq_adapt = (self.cur_seq_adapt + 1) % self.num_seqs_adapt
             count += 1
 
-            
-        assert len(keys) == self.batch_size
-        return keys, self.r.read(keys, row_offset=first_frames,
-                                 num_rows=seq_lengths)
+        assert len(index) == self.batch_size
+        return np.array(index), first_frames, seq_lengths
         
     
     
@@ -410,6 +310,9 @@ class AdaptSequenceBatchGenerator(SBG):
         new_args = dict((k, kwargs[p+k])
                         for k in valid_args if p+k in kwargs)
         args.update(new_args)
+        # bucketing is not supported with adaptation data
+        args.pop('bucketing', None)
+        args.pop('max_batch_frames', None)
         return args
 
 
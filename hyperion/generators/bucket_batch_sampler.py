@@ -0,0 +1,107 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import numpy as np
+
+
+class BucketBatchSampler(object):
+    """Groups sequences with similar lengths into the same batch
+       to reduce the number of padding frames.
+
+       The sequences are sorted by length and split into batches of
+       consecutive sequences. The sort is stable, so sequences with the
+       same length keep the order of the input list, which can be shuffled
+       beforehand to randomize the batches. Then, the order of the batches
+       is shuffled.
+
+       The batches have at most batch_size sequences and, if max_batch_frames
+       is given, at most max_batch_frames frames including padding,
+       i.e., num_seqs x max length in the batch.
+       Then, batches of short sequences have more sequences than batches
+       of long sequences.
+
+    Attributes:
+      batch_size: Maximum number of sequences per batch.
+      max_batch_frames: Maximum number of padded frames per batch,
+                        if None, all the batches have batch_size sequences
+                        except the last one.
+      shuffle: If True, it shuffles the order of the batches.
+      padding_ratio: Fraction of padding frames in the last batches created.
+    """
+
+    def __init__(self, batch_size=1, max_batch_frames=None, shuffle=True):
+        self.batch_size = batch_size
+        self.max_batch_frames = max_batch_frames
+        self.shuffle = shuffle
+        self.padding_ratio = None
+
+
+
+    def make_batches(self, seq_lengths, rng=None):
+        """Splits the sequences into batches.
+
+        Args:
+          seq_lengths: Number of frames of each sequence.
+          rng: Random number generator to shuffle the batches.
+
+        Returns:
+          List of int arrays with the indices of the sequences in each batch.
+        """
+        seq_lengths = np.asarray(seq_lengths)
+        index = np.argsort(seq_lengths, kind='stable')
+        sorted_lengths = seq_lengths[index]
+
+        batches = []
+        first = 0
+        num_seqs = len(index)
+        while first < num_seqs:
+            last = min(first + self.batch_size, num_seqs)
+            if self.max_batch_frames is not None:
+                # lengths are sorted, so the cost of the batch
+                # [first, i] is (i - first + 1) * sorted_lengths[i]
+                cost = (np.arange(1, last - first + 1) *
+                        sorted_lengths[first:last])
+                last = first + max(1, np.sum(cost <= self.max_batch_frames))
+            batches.append(index[first:last])
+            first = last
+
+        if self.shuffle:
+            if rng is None:
+                rng = np.random.RandomState()
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        self.padding_ratio = self.compute_padding_ratio(seq_lengths, batches)
+        return batches
+
+
+
+    @staticmethod
+    def compute_padding_ratio(seq_lengths, batches, pad_length=0):
+        """Computes the fraction of padding frames in a list of batches.
+
+        Args:
+          seq_lengths: Number of frames of each sequence.
+          batches: List of arrays with the indices of the sequences in each batch.
+          pad_length: Length of the padded batches, if 0, each batch
+                      is padded to its longest sequence.
+
+        Returns:
+          Padding frames / total padded frames.
+        """
+        seq_lengths = np.asarray(seq_lengths)
+        num_frames = 0
+        num_padded_frames = 0
+        for idx in batches:
+            lengths = seq_lengths[idx]
+            num_frames += np.sum(lengths)
+            length = np.max(lengths) if pad_length == 0 else pad_length
+            num_padded_frames += len(idx)*length
+        if num_padded_frames == 0:
+            return 0.
+        return 1 - float(num_frames)/num_padded_frames
@@ -0,0 +1,252 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+
+import numpy as np
+
+from ..io import RandomAccessDataReaderFactory as RF
+from ..utils.parallel import ForkPool
+
+
+def _make_batch_loader(reader_args):
+    # each worker process opens its own reader the first time it loads a batch
+    reader = []
+    def load_batch(batch):
+        if len(reader) == 0:
+            reader.append(RF.create(**reader_args))
+        return _load_batch(reader[0], batch)
+    return load_batch
+
+
+
+def _load_batch(reader, batch):
+    """Reads a batch and pads it directly into a shared memory block,
+       so the main process receives it with a single copy instead of
+       pickling the data through a pipe.
+    """
+    keys, first_frames, seq_lengths, max_seq_length = batch
+    x = reader.read(
+        keys, row_offset=first_frames, num_rows=seq_lengths)
+
+    num_seqs = len(x)
+    dim = x[0].shape[1]
+    if max_seq_length == 0:
+        max_seq_length = max(x_i.shape[0] for x_i in x)
+    dtype = x[0].dtype
+    x_shape = (num_seqs, max_seq_length, dim)
+    x_size = int(np.prod(x_shape))*dtype.itemsize
+    shm = shared_memory.SharedMemory(
+        create=True, size=x_size + num_seqs*max_seq_length*dtype.itemsize)
+    try:
+        x3d, sample_weight = _shared_views(shm, x_shape, dtype)
+        x3d[:] = 0
+        sample_weight[:] = 0
+        for i in xrange(num_seqs):
+            num_i = x[i].shape[0]
+            x3d[i, :num_i] = x[i]
+            sample_weight[i, :num_i] = 1
+        del x3d, sample_weight
+    except:
+        shm.close()
+        shm.unlink()
+        raise
+
+    shm.close()
+    return shm.name, x_shape, dtype.str
+
+
+
+def _shared_views(shm, x_shape, dtype):
+    x_size = int(np.prod(x_shape))*dtype.itemsize
+    x3d = np.ndarray(x_shape, dtype=dtype, buffer=shm.buf)
+    sample_weight = np.ndarray(x_shape[:2], dtype=dtype, buffer=shm.buf, offset=x_size)
+    return x3d, sample_weight
+
+
+
+class PrefetchBatchGenerator(object):
+    """Prefetches the batches of a sequence batch generator
+       (SequenceBatchGeneratorV1, SequenceBatchGeneratorV2) in
+       background worker processes.
+
+       The main process plans the batches (keys, first frames and
+       lengths of the sub-sequences) ahead of time with
+       generator.plan_batch. The worker processes, with their own
+       reader instances, read and pad several batches in parallel into
+       shared memory blocks. The batches are returned in the planned
+       order, so they are the same batches that generator.read()
+       would return, the random choices only depend on the generator
+       seed and epoch, not on the number of workers.
+
+       Note that the generator state (cur_step, cur_epoch) runs
+       queue_size batches ahead of the batches returned by read.
+
+    Attributes:
+      generator: Sequence batch generator object.
+      num_workers: Number of worker processes, if 0 the batches are
+                   read in the main process when they are requested.
+      queue_size: Number of batches planned and read ahead.
+      max_seq_length: Length of the padded tensors, if None, it uses
+                      the generator pad_length, if 0, the length of
+                      the longest sequence in each batch.
+    """
+
+    def __init__(self, generator, num_workers=1, queue_size=4, max_seq_length=None):
+        self.generator = generator
+        self.num_workers = num_workers
+        self.queue_size = max(queue_size, num_workers)
+        if max_seq_length is None:
+            max_seq_length = generator.pad_length
+        self.max_seq_length = max_seq_length
+        self._pool = None
+        self._pending = deque()
+
+
+
+    @property
+    def steps_per_epoch(self):
+        return self.generator.steps_per_epoch
+
+
+
+    def _start(self):
+        # workers need to share the resource tracker of the main process,
+        # otherwise they report the blocks unlinked by the main process as leaked
+        resource_tracker.ensure_running()
+        self._pool = ForkPool(
+            _make_batch_loader(self.generator.reader_args), self.num_workers)
+
+
+
+    def _submit(self):
+        index, first_frames, seq_lengths = self.generator.plan_batch()
+        keys = self.generator.keys[index].tolist()
+        result = self._pool.submit(
+            (keys, first_frames, seq_lengths, self.max_seq_length))
+        self._pending.append((index, keys, result))
+
+
+
+    @staticmethod
+    def _from_shared(name, x_shape, dtype):
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            x, sample_weight = _shared_views(shm, x_shape, np.dtype(dtype))
+            x = np.array(x)
+            sample_weight = np.array(sample_weight)
+        finally:
+            shm.close()
+            shm.unlink()
+        return x, sample_weight
+
+
+
+    def read(self):
+        """Returns the next batch.
+
+        Returns:
+          Tuple with keys, padded data (batch_size x max_seq_length x dim),
+          sample weights (batch_size x max_seq_length) and
+          labels (see generator.get_labels).
+        """
+        if self.num_workers == 0:
+            return self.generator.read(squeeze=True, max_seq_length=self.max_seq_length)
+
+        if self._pool is None:
+            self._start()
+
+        while len(self._pending) < self.queue_size + 1:
+            self._submit()
+
+        index, keys, result = self._pending.popleft()
+        x, sample_weight = self._from_shared(*result.get())
+        return tuple([keys, x, sample_weight] + self.generator.get_labels(index))
+
+
+
+    def __iter__(self):
+        return self
+
+
+
+    def __next__(self):
+        return self.read()
+
+
+
+    def next(self):
+        return self.read()
+
+
+
+    def close(self):
+        """Stops the workers and releases the batches not consumed."""
+        if getattr(self, '_pool', None) is None:
+            return
+
+        while len(self._pending) > 0:
+            _, _, result = self._pending.popleft()
+            try:
+                name, _, _ = result.get()
+                shm = shared_memory.SharedMemory(name=name)
+                shm.close()
+                shm.unlink()
+            except Exception as e:
+                logging.warning('error releasing prefetched batch: %s' % str(e))
+
+        self._pool.close()
+        self._pool = None
+
+
+
+    def __enter__(self):
+        return self
+
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+    def __del__(self):
+        self.close()
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('num_workers', 'queue_size')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'num-workers', dest=(p2+'num_workers'),
+                            default=1, type=int,
+                            help=('number of processes reading batches, '
+                                  'if 0 batches are read in the main process'))
+        parser.add_argument(p1+'queue-size', dest=(p2+'queue_size'),
+                            default=4, type=int,
+                            help=('number of batches read ahead'))
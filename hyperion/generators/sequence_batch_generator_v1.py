@@ -20,8 +20,10 @@ from sklearn.utils.class_weight import compute_class_weight
 from ..hyp_defs import float_cpu
 from ..io import RandomAccessDataReaderFactory as RF
 from ..utils.utt2info import Utt2Info
+from ..utils.list_utils import ismember
 from ..utils.tensors import to3D_by_seq
 from ..transforms import TransformList
+from .bucket_batch_sampler import BucketBatchSampler
 
 
 class SequenceBatchGeneratorV1(object):
@@ -43,10 +45,14 @@ class SequenceBatchGeneratorV1(object):
                  transform=None,
                  init_epoch=0,
                  sg_seed=1024, reset_rng=False,
-                 scp_sep=' ', 
+                 scp_sep=' ', use_mmap=False,
+                 bucketing=False, max_batch_frames=None,
                  part_idx=1, num_parts=1):
         
-        self.r = RF.create(rspecifier, path_prefix=path_prefix, transform=transform, scp_sep=scp_sep)
+        # arguments to open other instances of the reader in worker processes
+        self.reader_args = dict(rspecifier=rspecifier, path_prefix=path_prefix,
+                                transform=transform, scp_sep=scp_sep, use_mmap=use_mmap)
+        self.r = RF.create(**self.reader_args)
         self.u2c = Utt2Info.load(key_file, sep=scp_sep)
         if num_parts > 1:
             self.u2c = self.u2c.split(part_idx, num_parts, group_by_key=False)
@@ -77,7 +83,8 @@ class SequenceBatchGeneratorV1(object):
         self.reset_rng = reset_rng
         self.rng = None
 
-        self.init_u2c = self.u2c
+        self._init_keys()
+        self._index = None
         
         self.cur_seq = 0
         self.cur_step = 0
@@ -89,6 +96,15 @@ class SequenceBatchGeneratorV1(object):
 
         self._steps_per_epoch = None
 
+        self.bucketing = bucketing
+        self.sampler = None
+        self._batches = None
+        self.padding_ratio = None
+        if bucketing:
+            assert gen_method == 'full_seqs', 'bucketing needs gen_method=full_seqs'
+            self.sampler = BucketBatchSampler(
+                batch_size, max_batch_frames=max_batch_frames, shuffle=shuffle_seqs)
+
         self._prepare_subseqs()
         if iters_per_epoch == 'auto':
             self._compute_iters_auto()
@@ -98,11 +114,42 @@ class SequenceBatchGeneratorV1(object):
         self.reset()
 
                 
+    def _init_keys(self):
+        # keys are interned to their index in init_u2c, the epoch order
+        # is a permutation of those indices
+        self.init_u2c = self.u2c
+        self.keys = self.init_u2c.key
+
+
+
+    @property
+    def u2c(self):
+        """Utt2Info in the order of the current epoch."""
+        if self._u2c is None:
+            self._u2c = self.init_u2c.filter_index(self._index)
+        return self._u2c
+
+
+    @u2c.setter
+    def u2c(self, u2c):
+        self._u2c = u2c
+        self._index = None
+
+
+
     @property
     def num_seqs(self):
+        if self._index is not None:
+            return len(self._index)
         return len(self.u2c)
 
 
+
+    @property
+    def key2class(self):
+        return dict(zip(self.keys, self.class_ids))
+
+
     
     @property
     def seq_lengths(self):
@@ -133,9 +180,26 @@ class SequenceBatchGeneratorV1(object):
         return self._max_seq_length
     
 
+    @property
+    def pad_length(self):
+        """Length of the padded batches, 0 if each batch is padded
+           to its longest sequence.
+        """
+        if self.bucketing:
+            return 0
+        return self.max_seq_length
+
+
+
     @property
     def steps_per_epoch(self):
         if self._steps_per_epoch is None:
+            if self.bucketing:
+                # the number of batches only depends on the sorted lengths
+                num_batches = len(self.sampler.make_batches(self.seq_lengths))
+                self._steps_per_epoch = int(self.iters_per_epoch * num_batches)
+                return self._steps_per_epoch
+
             if self.gen_method == 'sequential':
                 if self.seq_weight == 'balanced':
                     seqs_per_iter = self.num_seqs*np.max(self.num_subseqs)
@@ -172,41 +236,45 @@ class SequenceBatchGeneratorV1(object):
                 class_dict={line.rstrip().split()[0]: i for i, line in enumerate(f)}
 
         self.num_classes = len(class_dict)
-        self.key2class = {p: class_dict[k] for k, p in zip(self.u2c.info, self.u2c.key)}
+        if class_list is None:
+            _, self.class_ids = np.unique(self.u2c.info, return_inverse=True)
+        else:
+            _, self.class_ids = ismember(self.u2c.info, list(class_dict.keys()))
+            self.class_ids = np.array(list(class_dict.values()))[self.class_ids]
 
 
 
     @staticmethod
     def _balance_class_weight_helper(class_ids, max_class_imbalance):
+        """Returns the indices of the samples sorted by class where
+           the samples of the classes with less than
+           max_samples = max(num_samples)/max_class_imbalance
+           are repeated cyclically up to max_samples.
+        """
         num_samples = np.bincount(class_ids)
         max_samples = int(np.ceil(np.max(num_samples)/max_class_imbalance))
-        idx = []
-        for i, num_samples_i in enumerate(num_samples):
-            idx_i = (class_ids == i).nonzero()[0]
-            r = float(max_samples)/num_samples_i
-            if r > 1:
-                idx_i = np.tile(idx_i, int(np.ceil(r)))
-                idx_i = idx_i[:max_samples]
-            idx.append(idx_i)
-            
-        idx = np.hstack(tuple(idx))
-        assert idx.shape[0] >= len(num_samples)*max_samples
+        # samples grouped by class, CSR style
+        class_idx = np.argsort(class_ids, kind='stable')
+        offsets = np.cumsum(num_samples) - num_samples
+
+        num_samples_out = np.maximum(num_samples, max_samples)
+        num_samples_out[num_samples == 0] = 0
+        out_class = np.repeat(np.arange(len(num_samples)), num_samples_out)
+        out_pos = (np.arange(len(out_class)) -
+                   np.repeat(np.cumsum(num_samples_out) - num_samples_out, num_samples_out))
+        idx = class_idx[offsets[out_class] + out_pos % num_samples[out_class]]
+        assert idx.shape[0] >= np.sum(num_samples > 0)*max_samples
         return idx
     
 
     
     def _balance_class_weight(self, max_class_imbalance):
-        classes, class_ids = np.unique(self.u2c.info, return_inverse=True)
-        #class_weights = compute_class_weights('balanced', classes, class_ids)
-        #num_samples = class_weights/np.min(class_weights)
-
-        idx = self._balance_class_weight_helper(class_ids, max_class_imbalance)
+        idx = self._balance_class_weight_helper(self.class_ids, max_class_imbalance)
         self.u2c = self.u2c.filter_index(idx)
-        # self.u2c.save('tmp.u2c')
-        # self.u2c.save('/tmp.u2c')
+        self.class_ids = self.class_ids[idx]
         if self._init_seq_lengths is not None:
-            self._init_seq_legths = self._init_seq_lengths[idx]
-            self._seq_lengths = self._init_seq_legths
+            self._init_seq_lengths = self._init_seq_lengths[idx]
+            self._seq_lengths = self._init_seq_lengths
         
 
             
@@ -263,106 +331,168 @@ class SequenceBatchGeneratorV1(object):
             self.rng = np.random.RandomState(seed=self.seed+self.cur_epoch)
 
 
+        if self._init_seq_lengths is None:
+            self.seq_lengths
+        self._index = np.arange(len(self.init_u2c))
         if self.shuffle_seqs:
-            if self._init_seq_lengths is None:
-                self.seq_lengths
-                
-            self.u2c = self.init_u2c.copy()
-            index = self.u2c.shuffle(rng=self.rng)
-            self._seq_lengths = self._init_seq_lengths[index]
+            self.rng.shuffle(self._index)
+            # the shuffled Utt2Info is only created if it is accessed
+            self._u2c = None
+            self._seq_lengths = self._init_seq_lengths[self._index]
             if self._init_num_subseqs is not None:
-                self.num_subseqs = self._init_num_subseqs[index]
+                self.num_subseqs = self._init_num_subseqs[self._index]
 
                 
         if self.gen_method == 'sequential':
             self.cur_subseq[:] = 0
             self.cur_frame[:] = 0
+
+        if self.bucketing:
+            self._batches = self.sampler.make_batches(self.seq_lengths, rng=self.rng)
+            self.padding_ratio = self.sampler.padding_ratio
+            logging.info('bucketing %d batches padding-ratio=%.3f' % (
+                len(self._batches), self.padding_ratio))
             
 
 
     
-    def read(self, squeeze=True, max_seq_length=None):
-        
+    def plan_batch(self):
+        """Chooses the sequences/sub-sequences of the next batch
+           and advances the generator state, without reading any data.
+           Reading is done by read_batch, so the batches can be planned
+           ahead and read by other processes (see PrefetchBatchGenerator).
+
+        Returns:
+          Indices of the sequences in the keys array.
+          First frame of each sub-sequence (0 for full sequences).
+          Number of frames of each sub-sequence (0 for full sequences).
+        """
         if self.gen_method == 'full_seqs':
-            keys, x = self._read_full_seqs()
+            batch = self._plan_full_seqs()
         elif self.gen_method == 'random':
-            keys, x = self._read_random_subseqs()
+            batch = self._plan_random_subseqs()
         else:
-            keys, x = self._read_sequential_subseqs()
+            batch = self._plan_sequential_subseqs()
 
         self.cur_step = (self.cur_step + 1) % self.steps_per_epoch
         if self.cur_step == 0:
             self.reset()
             self.cur_epoch += 1
 
+        return batch
+
+
+
+    def get_labels(self, index):
+        """Returns the list of label matrices of a batch,
+           i.e., the class one-hot matrix if return_class is True.
+
+        Args:
+          index: Indices of the sequences in the keys array.
+        """
+        if not self.return_class:
+            return []
+        y = np.zeros((len(index), self.num_classes), dtype=float_cpu())
+        y[np.arange(len(index)), self.class_ids[index]] = 1
+        return [y]
+
+
+
+    def read_batch(self, index, first_frames, seq_lengths, squeeze=True, max_seq_length=None):
+        """Reads a batch planned by plan_batch.
+
+        Args:
+          index, first_frames, seq_lengths: Batch returned by plan_batch.
+          squeeze: If True, it pads the sequences to a 3D tensor.
+          max_seq_length: Length of the padded tensor, if None it uses
+                          the generator pad_length.
+
+        Returns:
+          Tuple with keys, padded data, sample weights and labels,
+          if squeeze is False, the data is returned as a list of matrices
+          without sample weights.
+        """
+        keys = self.keys[index].tolist()
+        x = self.r.read(keys, row_offset=first_frames, num_rows=seq_lengths)
         r = [keys]
-            
         if squeeze:
-            max_seq_length = (self.max_seq_length if max_seq_length is None
+            max_seq_length = (self.pad_length if max_seq_length is None
                               else max_seq_length)
             x, sample_weight = to3D_by_seq(x, max_length=max_seq_length)
             r += [x, sample_weight]
         else:
             r.append(x)
 
-        if self.return_class:
-            y=np.zeros((len(keys), self.num_classes), dtype=float_cpu())
-            for i,k in enumerate(keys):
-                y[i, self.key2class[k]] = 1
-            r.append(y)
-            
+        r += self.get_labels(index)
         return tuple(r)
 
 
+
+    def read(self, squeeze=True, max_seq_length=None):
+        index, first_frames, seq_lengths = self.plan_batch()
+        return self.read_batch(index, first_frames, seq_lengths,
+                               squeeze=squeeze, max_seq_length=max_seq_length)
+
+
     
-    def _read_full_seqs(self):
-        keys = list(self.u2c.key[self.cur_seq:self.cur_seq+self.batch_size])
-        self.cur_seq += self.batch_size
+    def _plan_full_seqs(self, batch_size=None):
+        if self.bucketing:
+            return self._plan_bucket_seqs()
+
+        if batch_size is None:
+            batch_size = self.batch_size
+        index = self._index[self.cur_seq:self.cur_seq+batch_size]
+        self.cur_seq += batch_size
         
-        if len(keys) < self.batch_size:
-            delta = self.batch_size - len(keys)
-            keys += self.u2c.key[:delta]
+        if len(index) < batch_size:
+            delta = batch_size - len(index)
+            index = np.concatenate((index, self._index[:delta]))
             self.cur_seq = delta
-            assert len(keys) == self.batch_size
+            assert len(index) == batch_size
 
-        return keys, self.r.read(keys)
+        return index, 0, 0
 
 
     
-    def _read_random_subseqs(self):
-        
-        keys = []
-        seq_lengths =[]
-        first_frames = []
-        for i in xrange(self.batch_size):
-            key = self.u2c.key[self.cur_seq]
-            full_seq_length = self.seq_lengths[self.cur_seq]
-            max_seq_length = min(full_seq_length, self.max_seq_length)
-            min_seq_length = min(full_seq_length, self.min_seq_length)
-            
-            seq_length = self.rng.randint(low=min_seq_length, high=max_seq_length+1)
-            first_frame = self.rng.randint(
-                low=0, high=full_seq_length-seq_length+1)
+    def _plan_bucket_seqs(self):
+        batch = self._batches[self.cur_seq % len(self._batches)]
+        self.cur_seq += 1
+        return self._index[batch], 0, 0
+
+
+
+    def _draw_random_subseqs(self, full_seq_lengths):
+        """Draws the lengths and first frames of random sub-sequences."""
+        max_seq_lengths = np.minimum(full_seq_lengths, self.max_seq_length)
+        min_seq_lengths = np.minimum(full_seq_lengths, self.min_seq_length)
+        seq_lengths = self.rng.randint(low=min_seq_lengths, high=max_seq_lengths+1)
+        first_frames = self.rng.randint(
+            low=0, high=full_seq_lengths-seq_lengths+1)
+        return first_frames, seq_lengths
 
-            keys.append(key)
-            seq_lengths.append(seq_length)
-            first_frames.append(first_frame)
 
-            self.cur_seq = (self.cur_seq + 1) % self.num_seqs
 
-        return keys, self.r.read(keys, row_offset=first_frames,
-                                 num_rows=seq_lengths)
+    def _plan_random_subseqs(self, batch_size=None):
+        
+        if batch_size is None:
+            batch_size = self.batch_size
+        pos = (self.cur_seq + np.arange(batch_size)) % self.num_seqs
+        self.cur_seq = (self.cur_seq + batch_size) % self.num_seqs
+        first_frames, seq_lengths = self._draw_random_subseqs(self.seq_lengths[pos])
+
+        return self._index[pos], first_frames, seq_lengths
             
 
     
-    def _read_sequential_subseqs(self):
+    def _plan_sequential_subseqs(self, batch_size=None):
 
-        keys = []
+        if batch_size is None:
+            batch_size = self.batch_size
+        index = []
         seq_lengths =[]
         first_frames = []
         count = 0
-        while count < self.batch_size:
-            key = self.u2c.key[self.cur_seq]
+        while count < batch_size:
             first_frame = self.cur_frame[self.cur_seq]
             full_seq_length = self.seq_lengths[self.cur_seq]
             remainder_seq_length =  full_seq_length - first_frame
@@ -383,7 +513,7 @@ class SequenceBatchGeneratorV1(object):
                     full_seq_length - self.min_seq_length,
                     first_frame + seq_length - self.seq_overlap)
             
-            keys.append(key)
+            index.append(self._index[self.cur_seq])
             seq_lengths.append(seq_length)
             first_frames.append(first_frame)
 
@@ -394,9 +524,8 @@ class SequenceBatchGeneratorV1(object):
             self.cur_seq = (self.cur_seq + 1) % self.num_seqs
             count += 1
 
-        assert len(keys) == self.batch_size
-        return keys, self.r.read(keys, row_offset=first_frames,
-                                 num_rows=seq_lengths)
+        assert len(index) == batch_size
+        return np.array(index), first_frames, seq_lengths
         
     
 
@@ -410,7 +539,8 @@ class SequenceBatchGeneratorV1(object):
         if p+'no_shuffle_seqs' in kwargs:
             kwargs[p+'shuffle_seqs'] = not kwargs[p+'no_shuffle_seqs']
             
-        valid_args = ('scp_sep', 'path_prefix','batch_size',
+        valid_args = ('scp_sep', 'path_prefix', 'use_mmap', 'batch_size',
+                      'bucketing', 'max_batch_frames',
                       'iters_per_epoch',
                       'gen_method',
                       'class_list', 'shuffle_seqs', 
@@ -440,9 +570,23 @@ class SequenceBatchGeneratorV1(object):
                             default='',
                             help=('path prefix for rspecifier scp file'))
 
+        parser.add_argument(p1+'use-mmap', dest=(p2+'use_mmap'),
+                            default=False, action='store_true',
+                            help=('memory maps the feature files, random sub-sequences '
+                                  'are read without copies or system calls'))
+
         parser.add_argument(p1+'batch-size', dest=(p2+'batch_size'),
                             default=128, type=int,
                             help=('batch size'))
+        parser.add_argument(p1+'bucketing', dest=(p2+'bucketing'),
+                            default=False, action='store_true',
+                            help=('groups sequences with similar lengths in the same '
+                                  'batch to reduce padding, needs gen-method=full_seqs'))
+        parser.add_argument(p1+'max-batch-frames', dest=(p2+'max_batch_frames'),
+                            default=None, type=int,
+                            help=('maximum number of padded frames per batch '
+                                  'when bucketing, batches of short sequences '
+                                  'get more sequences'))
         parser.add_argument(p1+'class-list', dest=(p2+'class_list'), 
                             default=None,
                             help=('ordered list of classes keys'))
@@ -20,6 +20,7 @@ from sklearn.utils.class_weight import compute_class_weight
 from ..hyp_defs import float_cpu
 from ..io import RandomAccessDataReaderFactory as RF
 from ..utils.utt2info import Utt2Info
+from ..utils.list_utils import ismember
 from ..utils.tensors import to3D_by_seq
 from ..transforms import TransformList
 
@@ -46,7 +47,10 @@ class SequenceBatchGeneratorV2(object):
                  part_idx=1, num_parts=1):
 
         logging.info('opening reader %s' % rspecifier)
-        self.r = RF.create(rspecifier, path_prefix=path_prefix, transform=transform, scp_sep=scp_sep)
+        # arguments to open other instances of the reader in worker processes
+        self.reader_args = dict(rspecifier=rspecifier, path_prefix=path_prefix,
+                                transform=transform, scp_sep=scp_sep)
+        self.r = RF.create(**self.reader_args)
         logging.info('loading utt2info file %s' % key_file)
         self.u2c = Utt2Info.load(key_file, sep=scp_sep)
         if num_parts > 1:
@@ -148,6 +152,12 @@ class SequenceBatchGeneratorV2(object):
 
 
     
+    @property
+    def pad_length(self):
+        return self.max_seq_length
+
+
+
     def _prune_min_length(self, min_length):
         keep_idx = self.seq_lengths >= min_length
         self.u2c = self.u2c.filter_index(keep_idx)
@@ -163,20 +173,35 @@ class SequenceBatchGeneratorV2(object):
         else:
             with open(class_list) as f:
                 class_dict={line.rstrip().split()[0]: i for i, line in enumerate(f)}
-                class_idx = np.array([class_dict[k] for k in self.u2c.info], dtype=int)
+            _, class_idx = ismember(self.u2c.info, list(class_dict.keys()))
+            class_idx = np.array(list(class_dict.values()))[class_idx]
 
         self.num_classes = len(class_dict)
+        # keys are interned to their index in u2c
+        self.keys = self.u2c.key
+        self.class_ids = class_idx
+
+        # utterances of each class, CSR style:
+        # class2utt_idx[k] = class_utt_idx[class_utt_offsets[k]:class_utt_offsets[k+1]]
+        self.class2num_utt = np.bincount(class_idx, minlength=self.num_classes)
+        self.class_utt_idx = np.argsort(class_idx, kind='stable')
+        self.class_utt_offsets = np.zeros((self.num_classes+1,), dtype=int)
+        self.class_utt_offsets[1:] = np.cumsum(self.class2num_utt)
+        self.num_class_zero_utt = np.sum(self.class2num_utt==0)
+        self._nonzero_classes = (self.class2num_utt > 0).nonzero()[0]
 
-        self.class2utt = {}
-        self.class2utt_idx = {}
-        self.class2num_utt = np.zeros((self.num_classes,), dtype=int)
-        for k in xrange(self.num_classes):
-            idx = (class_idx == k).nonzero()[0]
-            self.class2utt[k] = [f for f in self.u2c.key[idx]]
-            self.class2utt_idx[k] = idx
-            self.class2num_utt[k] = len(idx)
 
-        self.num_class_zero_utt = np.sum(self.class2num_utt==0)
+
+    @property
+    def class2utt_idx(self):
+        return {k: self.class_utt_idx[self.class_utt_offsets[k]:self.class_utt_offsets[k+1]]
+                for k in xrange(self.num_classes)}
+
+
+
+    @property
+    def class2utt(self):
+        return {k: list(self.keys[idx]) for k, idx in self.class2utt_idx.items()}
 
 
             
@@ -216,84 +241,111 @@ class SequenceBatchGeneratorV2(object):
 
 
     
-    def read(self, squeeze=True, max_seq_length=None):
-        
-        keys, x, classes, utt_idx = self._read_random_subseqs()
-        
+    def plan_batch(self):
+        """Chooses the sub-sequences of the next batch
+           and advances the generator state, without reading any data.
+
+        Returns:
+          Indices of the sub-sequences in the keys array.
+          First frame of each sub-sequence.
+          Number of frames of each sub-sequence.
+        """
+        index, first_frames, seq_lengths = self._plan_random_subseqs()
+
         self.cur_step = (self.cur_step + 1) % self.steps_per_epoch
         if self.cur_step == 0:
             self.reset()
             self.cur_epoch += 1
 
+        return index, first_frames, seq_lengths
+
+
+
+    def get_labels(self, index):
+        """Returns the list of label matrices of a batch:
+           class one-hot if return_class is True and
+           utterance one-hot if return_utt1hot is True.
+
+        Args:
+          index: Indices of the sub-sequences in the keys array.
+        """
+        r = []
+        if self.return_class:
+            y = np.zeros((len(index), self.num_classes), dtype=float_cpu())
+            y[np.arange(len(index)), self.class_ids[index]] = 1
+            r.append(y)
+
+        if self.return_utt1hot:
+            num_utts = int(np.ceil(self.batch_size/self.num_egs_per_utt))
+            _, utt_ids = np.unique(index, return_inverse=True)
+            z = np.zeros((len(index), num_utts), dtype=float_cpu())
+            z[np.arange(len(index)), utt_ids] = 1
+            r.append(z)
+
+        return r
+
+
+
+    def read_batch(self, index, first_frames, seq_lengths, squeeze=True, max_seq_length=None):
+        """Reads a batch planned by plan_batch.
+
+        Args:
+          index, first_frames, seq_lengths: Batch returned by plan_batch.
+          squeeze: If True, it pads the sequences to a 3D tensor.
+          max_seq_length: Length of the padded tensor, if None it uses
+                          the generator max_seq_length.
+
+        Returns:
+          Tuple with keys, padded data, sample weights and labels,
+          if squeeze is False, the data is returned as a list of matrices
+          without sample weights.
+        """
+        keys = self.keys[index].tolist()
+        x = self.r.read(keys, row_offset=first_frames, num_rows=seq_lengths)
         r = [keys]
-            
         if squeeze:
-            max_seq_length = (self.max_seq_length if max_seq_length is None
+            max_seq_length = (self.pad_length if max_seq_length is None
                               else max_seq_length)
             x, sample_weight = to3D_by_seq(x, max_length=max_seq_length)
             r += [x, sample_weight]
         else:
             r.append(x)
 
-        if self.return_class:
-            y = np.zeros((len(keys), self.num_classes), dtype=float_cpu())
-            for i in xrange(len(keys)):
-                y[i, classes[i]] = 1
-            r.append(y)
-
-        if self.return_utt1hot:
-            num_utts = int(np.ceil(self.batch_size/self.num_egs_per_utt))
-            _, utt_ids = np.unique(utt_idx, return_inverse=True)
-            z = np.zeros((len(keys), self.num_utts), dtype=float_cpu())
-            for i,k in enumerate(utt_ids):
-                z[i,k] = 1
-            r.append(z)
-            
+        r += self.get_labels(index)
         return tuple(r)
 
 
+
+    def read(self, squeeze=True, max_seq_length=None):
+        index, first_frames, seq_lengths = self.plan_batch()
+        return self.read_batch(index, first_frames, seq_lengths,
+                               squeeze=squeeze, max_seq_length=max_seq_length)
+
+
     
-    
-    def _read_random_subseqs(self):
+    def _plan_random_subseqs(self):
         
-        keys = []
-        seq_lengths =[]
-        first_frames = []
         num_classes_per_batch = int(np.ceil(self.batch_size/self.num_egs_per_class/self.num_egs_per_utt))
         if self.num_class_zero_utt == 0:
             classes = self.rng.randint(low=0, high=self.num_classes, size=(num_classes_per_batch,))
         else:
-            classes = np.zeros((num_classes_per_batch,), dtype=int)
-            count = 0
-            while count < num_classes_per_batch:
-                c = self.rng.randint(low=0, high=self.num_classes)
-                if self.class2num_utt[c] > 0:
-                    classes[count] = c
-                    count += 1
-                
-        classes = np.repeat(classes, self.num_egs_per_class)
-        utt_idx= np.array([self.class2utt_idx[c][self.rng.randint(low=0, high=self.class2num_utt[c])] for c in classes], dtype=np.int)
-        utt_idx = np.repeat(utt_idx, self.num_egs_per_utt)
-        classes = np.repeat(classes, self.num_egs_per_utt)
-
-        for i in xrange(self.batch_size):
-            key = self.u2c.key[utt_idx[i]]
-            full_seq_length = self.seq_lengths[utt_idx[i]]
-            max_seq_length = min(full_seq_length, self.max_seq_length)
-            min_seq_length = min(full_seq_length, self.min_seq_length)
-            
-            seq_length = self.rng.randint(low=min_seq_length, high=max_seq_length+1)
-            first_frame = self.rng.randint(
-                low=0, high=full_seq_length-seq_length+1)
-
-            keys.append(key)
-            seq_lengths.append(seq_length)
-            first_frames.append(first_frame)
+            classes = self._nonzero_classes[self.rng.randint(
+                low=0, high=len(self._nonzero_classes), size=(num_classes_per_batch,))]
 
-
-
-        return keys, self.r.read(keys, row_offset=first_frames,
-                                 num_rows=seq_lengths), classes, utt_idx
+        # samples num_egs_per_class utterances of each class
+        classes = np.repeat(classes, self.num_egs_per_class)
+        utt_pos = self.rng.randint(low=0, high=self.class2num_utt[classes])
+        utt_idx = self.class_utt_idx[self.class_utt_offsets[classes] + utt_pos]
+        utt_idx = np.repeat(utt_idx, self.num_egs_per_utt)[:self.batch_size]
+
+        full_seq_lengths = self.seq_lengths[utt_idx]
+        max_seq_lengths = np.minimum(full_seq_lengths, self.max_seq_length)
+        min_seq_lengths = np.minimum(full_seq_lengths, self.min_seq_length)
+        seq_lengths = self.rng.randint(low=min_seq_lengths, high=max_seq_lengths+1)
+        first_frames = self.rng.randint(
+            low=0, high=full_seq_lengths-seq_lengths+1)
+
+        return utt_idx, first_frames, seq_lengths
             
     
 
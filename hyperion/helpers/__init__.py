@@ -11,3 +11,7 @@ from .sequence_class_reader import SequenceClassReader
 from .sequence_post_reader import SequencePostReader
 from .sequence_post_class_reader import SequencePostClassReader
 from .plda_factory import PLDAFactory
+from .plda_block_scorer import PLDABlockScorer
+from .parallel_trial_scorer import ParallelTrialScorer
+from .baum_welch_stats_extractor import BaumWelchStatsExtractor
+from .em_trainer import EMTrainer, MixtureEMTrainer, JFATotalEMTrainer
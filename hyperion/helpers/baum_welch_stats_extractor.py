@@ -0,0 +1,280 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+import time
+
+import numpy as np
+import scipy.sparse as sparse
+
+from ..hyp_defs import float_cpu
+from ..utils.parallel import fork_map
+
+
+
+class BaumWelchStatsExtractor(object):
+    """Computes zero and first order Baum-Welch statistics
+       of utterances w.r.t. a diagonal covariance GMM
+       (GMMDiagCov, GMMTiedDiagCov), e.g., to train and extract i-vectors.
+
+       The frames of several utterances are concatenated into blocks,
+       the posteriors of each block are computed with one matrix product per
+       chunk of frames. If nbest is given, only the nbest components
+       of each frame are kept (selected with argpartition) and the
+       statistics are accumulated with a sparse product.
+       If gselect is given, the posteriors are computed only for the
+       components preselected by a GaussianSelector.
+       The blocks are distributed among a pool of worker processes.
+
+    Attributes:
+      gmm: GMMDiagCov or GMMTiedDiagCov object.
+      nbest: Number of components selected per frame, if None
+             it uses all the components or the gselect default.
+      normalize: If True, it centers the first order stats
+                 w.r.t. the GMM means and whitens them with the GMM
+                 precisions, i.e., Lambda^(1/2) (F - N mu).
+      max_block_frames: Maximum number of frames per block, a block
+                        contains at least one utterance.
+      chunk_size: Number of frames whose posteriors are computed at once.
+      num_workers: Number of worker processes, if <= 1 the blocks
+                   are processed in the main process.
+      gselect: GaussianSelector object for gmm or None.
+    """
+
+    def __init__(self, gmm, nbest=None, normalize=False,
+                 max_block_frames=100000, chunk_size=10000, num_workers=1,
+                 gselect=None):
+        self.gmm = gmm
+        self.nbest = nbest
+        self.normalize = normalize
+        self.max_block_frames = max_block_frames
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.gselect = gselect
+
+
+
+    @property
+    def num_comp(self):
+        return self.gmm.num_comp
+
+
+
+    def _accum_chunk_dense(self, x, utt_idx, N, F):
+        z = self.gmm.compute_pz_nat(x)
+        # runs of consecutive frames of the same utterance
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(utt_idx)) + 1))
+        ends = np.append(starts[1:], len(utt_idx))
+        utts = utt_idx[starts]
+        N[utts] += np.add.reduceat(z, starts, axis=0)
+        for u, i1, i2 in zip(utts, starts, ends):
+            F[u] += np.dot(z[i1:i2].T, x[i1:i2])
+
+
+
+    def _accum_chunk_nbest(self, x, utt_idx, N, F):
+        num_utts, num_comp, x_dim = F.shape
+        if self.gselect is None:
+            z, index = self.gmm.compute_pz_nbest(x, nbest=self.nbest)
+        else:
+            z, index = self.gselect.compute_pz_nbest(x, nbest=self.nbest)
+        nbest = index.shape[1]
+        # row utt*K + k of the frame-to-stats matrix
+        rows = (utt_idx[:, None]*num_comp + index).ravel()
+        z = z.ravel()
+        N += np.bincount(
+            rows, weights=z, minlength=num_utts*num_comp).reshape(num_utts, num_comp)
+        R = sparse.csr_matrix(
+            (z, (rows, np.repeat(np.arange(x.shape[0]), nbest))),
+            shape=(num_utts*num_comp, x.shape[0]))
+        F += R.dot(x).reshape(num_utts, num_comp, x_dim)
+
+
+
+    def compute_block(self, x, seq_lengths):
+        """Computes the statistics of a block of utterances.
+
+        Args:
+          x: Concatenated frames of the utterances (num_frames x x_dim).
+          seq_lengths: Number of frames of each utterance.
+
+        Returns:
+          Zero order stats (num_utts x num_comp).
+          First order stats (num_utts x num_comp*x_dim).
+        """
+        seq_lengths = np.asarray(seq_lengths, dtype=int)
+        num_utts = len(seq_lengths)
+        x_dim = x.shape[1]
+        utt_idx = np.repeat(np.arange(num_utts), seq_lengths)
+        N = np.zeros((num_utts, self.num_comp), dtype=float_cpu())
+        F = np.zeros((num_utts, self.num_comp, x_dim), dtype=float_cpu())
+        use_nbest = (self.gselect is not None or
+                     self.nbest is not None and self.nbest < self.num_comp)
+        for i1 in xrange(0, x.shape[0], self.chunk_size):
+            i2 = min(i1 + self.chunk_size, x.shape[0])
+            if use_nbest:
+                self._accum_chunk_nbest(x[i1:i2], utt_idx[i1:i2], N, F)
+            else:
+                self._accum_chunk_dense(x[i1:i2], utt_idx[i1:i2], N, F)
+
+        if self.normalize:
+            F = self.gmm.cholLambda*(F - N[:, :, None]*self.gmm.mu)
+
+        return N, F.reshape(num_utts, -1)
+
+
+
+    def compute(self, x):
+        """Computes the statistics of a list of utterances
+           in the main process.
+
+        Args:
+          x: List of feature matrices (num_frames_i x x_dim).
+
+        Returns:
+          Zero order stats (num_utts x num_comp).
+          First order stats (num_utts x num_comp*x_dim).
+        """
+        N = []
+        F = []
+        for _, x_b, seq_lengths in self._make_blocks(
+                (i, x_i) for i, x_i in enumerate(x)):
+            N_b, F_b = self.compute_block(x_b, seq_lengths)
+            N.append(N_b)
+            F.append(F_b)
+        return np.concatenate(N, axis=0), np.concatenate(F, axis=0)
+
+
+
+    def _make_blocks(self, reader):
+        keys = []
+        x = []
+        num_frames = 0
+        for data in reader:
+            key, x_i = data[0], data[1]
+            if len(keys) > 0 and num_frames + x_i.shape[0] > self.max_block_frames:
+                yield keys, np.concatenate(x, axis=0), [x_j.shape[0] for x_j in x]
+                keys = []
+                x = []
+                num_frames = 0
+            keys.append(key)
+            x.append(x_i)
+            num_frames += x_i.shape[0]
+
+        if len(keys) > 0:
+            yield keys, np.concatenate(x, axis=0), [x_j.shape[0] for x_j in x]
+
+
+
+    def extract(self, reader):
+        """Generator that computes the statistics of all
+           the utterances in the reader.
+
+        Args:
+          reader: Iterable that returns tuples (key, features, ...),
+                  e.g., SequentialDataReader.
+
+        Returns:
+          Key of the utterance.
+          Zero order stats (num_comp,).
+          First order stats (num_comp*x_dim,).
+        """
+        blocks = self._make_blocks(reader)
+        # blocks are read lazily, just enough to keep all the workers busy
+        results = fork_map(self._compute_block, blocks, self.num_workers,
+                           max_pending=self.num_workers + 1)
+        for result in results:
+            for r in self._split_result(*result):
+                yield r
+
+
+
+    def _compute_block(self, block):
+        keys, x, seq_lengths = block
+        t1 = time.time()
+        N, F = self.compute_block(x, seq_lengths)
+        dt = time.time() - t1
+        return keys, N, F, dt
+
+
+
+    @staticmethod
+    def _split_result(keys, N, F, dt):
+        logging.info('computed stats for %d utterances '
+                     'elapsed-time=%.2f s' % (len(keys), dt))
+        for i, key in enumerate(keys):
+            yield key, N[i], F[i]
+
+
+
+    def write(self, reader, writer):
+        """Computes the statistics of all the utterances in the reader
+           and writes them as vectors [N, F] (num_comp*(1+x_dim),).
+
+        Args:
+          reader: Iterable that returns tuples (key, features, ...).
+          writer: Data writer object, e.g., H5DataWriter.
+        """
+        for key, N, F in self.extract(reader):
+            writer.write([key], [np.concatenate((N, F))])
+
+
+
+    @staticmethod
+    def split_stats(stats, num_comp):
+        """Splits stats vectors written by write into N and F.
+
+        Args:
+          stats: Stats vector or matrix (num_utts x num_comp*(1+x_dim)).
+          num_comp: Number of GMM components.
+
+        Returns:
+          Zero order stats (num_utts x num_comp).
+          First order stats (num_utts x num_comp*x_dim).
+        """
+        return stats[..., :num_comp], stats[..., num_comp:]
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('nbest', 'normalize', 'max_block_frames',
+                      'chunk_size', 'num_workers')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'nbest', dest=(p2+'nbest'),
+                            default=None, type=int,
+                            help=('number of components selected per frame, '
+                                  'if None all the components are used'))
+        parser.add_argument(p1+'normalize', dest=(p2+'normalize'),
+                            default=False, action='store_true',
+                            help=('centers and whitens the first order stats'))
+        parser.add_argument(p1+'max-block-frames', dest=(p2+'max_block_frames'),
+                            default=100000, type=int,
+                            help=('maximum number of frames per block of utterances'))
+        parser.add_argument(p1+'chunk-size', dest=(p2+'chunk_size'),
+                            default=10000, type=int,
+                            help=('number of frames whose posteriors are computed at once'))
+        parser.add_argument(p1+'num-workers', dest=(p2+'num_workers'),
+                            default=1, type=int,
+                            help=('number of processes computing stats'))
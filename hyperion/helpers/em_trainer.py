@@ -0,0 +1,348 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import os
+import glob
+import logging
+import time
+
+import numpy as np
+
+from ..hyp_defs import float_cpu
+from ..io import SequentialDataReaderFactory as DRF
+from ..utils.parallel import fork_map, sum_reduce
+from .baum_welch_stats_extractor import BaumWelchStatsExtractor
+
+
+class EMTrainer(object):
+    """Base class for map-reduce EM training with data that
+       does not fit in memory.
+
+       The data is split into shards stored on disk. In each iteration,
+       a pool of worker processes computes the E-step accumulators of
+       each shard, the accumulators are summed up
+       and the main process runs the M-step.
+       The model is saved after each iteration in checkpoint_dir, when
+       fit is called again, it resumes from the last checkpoint.
+
+    Attributes:
+      model: Model to train.
+      num_workers: Number of worker processes, if <= 1 the shards
+                   are processed in the main process.
+      checkpoint_dir: Directory to save the checkpoints, if None
+                      it does not save checkpoints.
+      reader_args: Extra arguments for SequentialDataReaderFactory.create.
+    """
+
+    def __init__(self, model, num_workers=1, checkpoint_dir=None, reader_args={}):
+        self.model = model
+        self.num_workers = num_workers
+        self.checkpoint_dir = checkpoint_dir
+        self.reader_args = reader_args
+
+
+
+    def estep_shard(self, shard):
+        """Computes the E-step accumulators of a shard.
+
+        Args:
+          shard: rspecifier of the shard.
+
+        Returns:
+          Tuple of accumulators, they need to support +.
+          Number of frames in the shard.
+        """
+        raise NotImplementedError()
+
+
+
+    def mstep(self, stats, epoch):
+        """Updates the model given the accumulators of all the shards."""
+        raise NotImplementedError()
+
+
+
+    def elbo(self, stats):
+        """Computes the ELBO before the M-step."""
+        raise NotImplementedError()
+
+
+
+    def _open_shard(self, shard):
+        return DRF.create(shard, **self.reader_args)
+
+
+
+    def estep(self, shards):
+        """Computes the E-step accumulators of all the shards.
+
+        Args:
+          shards: List of rspecifiers.
+
+        Returns:
+          Tuple with the sum of the accumulators.
+          Total number of frames.
+        """
+        # the pool is forked in every iteration, so the workers
+        # inherit the current model without pickling it
+        results = fork_map(self._estep_shard, shards,
+                           min(self.num_workers, len(shards)), ordered=False)
+        return self._reduce(results)
+
+
+
+    def _estep_shard(self, shard):
+        t1 = time.time()
+        stats, num_frames = self.estep_shard(shard)
+        return stats, num_frames, time.time() - t1
+
+
+
+    @staticmethod
+    def _reduce(results):
+        def flatten():
+            for stats_s, num_frames_s, dt in results:
+                logging.debug('E-step shard num-frames=%d elapsed-time=%.2f s' %
+                              (num_frames_s, dt))
+                yield tuple(stats_s) + (num_frames_s,)
+
+        stats = sum_reduce(flatten())
+        return stats[:-1], stats[-1]
+
+
+
+    def fit(self, shards, epochs=10):
+        """Trains the model.
+
+        Args:
+          shards: List of rspecifiers with the training data.
+          epochs: Total number of iterations, including the
+                  ones done before resuming.
+
+        Returns:
+          ELBO per epoch.
+          ELBO per epoch normalized by the number of frames.
+        """
+        first_epoch, elbo, elbo_norm = self.load_last_checkpoint()
+        elbo = np.concatenate((elbo, np.zeros((epochs - len(elbo),), dtype=float_cpu())))
+        elbo_norm = np.concatenate(
+            (elbo_norm, np.zeros((epochs - len(elbo_norm),), dtype=float_cpu())))
+        for epoch in xrange(first_epoch, epochs):
+            t1 = time.time()
+            stats, num_frames = self.estep(shards)
+            elbo[epoch] = self.elbo(stats)
+            elbo_norm[epoch] = elbo[epoch]/num_frames
+            self.mstep(stats, epoch)
+            logging.info('epoch: %d elbo: %f elbo-norm: %f elapsed-time=%.2f s' % (
+                epoch, elbo[epoch], elbo_norm[epoch], time.time() - t1))
+            self.save_checkpoint(epoch, elbo[:epoch+1], elbo_norm[:epoch+1])
+
+        return elbo, elbo_norm
+
+
+
+    def _checkpoint_path(self, epoch):
+        return os.path.join(self.checkpoint_dir, 'model.%04d.h5' % (epoch))
+
+
+
+    def save_checkpoint(self, epoch, elbo, elbo_norm):
+        if self.checkpoint_dir is None:
+            return
+        # written to temporary files first, so an interrupted
+        # save does not leave a corrupted checkpoint
+        file_path = self._checkpoint_path(epoch)
+        self.model.save(file_path + '.tmp')
+        elbo_path = os.path.join(self.checkpoint_dir, 'elbo.%04d.txt' % (epoch))
+        np.savetxt(elbo_path + '.tmp', np.vstack((elbo, elbo_norm)).T)
+        os.replace(elbo_path + '.tmp', elbo_path)
+        os.replace(file_path + '.tmp', file_path)
+
+
+
+    def load_last_checkpoint(self):
+        """Loads the last checkpoint in checkpoint_dir.
+
+        Returns:
+          First epoch to train.
+          ELBO of the previous epochs.
+          Normalized ELBO of the previous epochs.
+        """
+        empty = np.zeros((0,), dtype=float_cpu())
+        if self.checkpoint_dir is None:
+            return 0, empty, empty
+        checkpoints = sorted(glob.glob(os.path.join(self.checkpoint_dir, 'model.*.h5')))
+        if len(checkpoints) == 0:
+            return 0, empty, empty
+
+        file_path = checkpoints[-1]
+        epoch = int(os.path.basename(file_path).split('.')[1])
+        logging.info('resuming training from %s' % (file_path))
+        self.model = self.restore_model(self.model.load(file_path))
+        elbo = np.loadtxt(
+            os.path.join(self.checkpoint_dir, 'elbo.%04d.txt' % (epoch)), ndmin=2)
+        return epoch + 1, elbo[:, 0].astype(float_cpu()), elbo[:, 1].astype(float_cpu())
+
+
+
+    def restore_model(self, model):
+        """Copies to a model loaded from a checkpoint the attributes
+           that are not saved in the model file.
+        """
+        return model
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('num_workers', 'checkpoint_dir')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'num-workers', dest=(p2+'num_workers'),
+                            default=1, type=int,
+                            help=('number of processes computing the E-step'))
+        parser.add_argument(p1+'checkpoint-dir', dest=(p2+'checkpoint_dir'),
+                            default=None,
+                            help=('directory to save the model after each iteration, '
+                                  'training resumes from the last model in it'))
+
+
+
+class MixtureEMTrainer(EMTrainer):
+    """Map-reduce EM for mixture models (GMMDiagCov, GMMTiedDiagCov, GMM)
+       with feature files as shards.
+
+    Attributes:
+      model: ExpFamilyMixture object, it needs to be initialized.
+      batch_size: Number of frames processed at once.
+      num_workers: Number of worker processes.
+      checkpoint_dir: Directory to save the checkpoints.
+      reader_args: Extra arguments for SequentialDataReaderFactory.create.
+    """
+
+    def __init__(self, model, batch_size=100000, **kwargs):
+        super(MixtureEMTrainer, self).__init__(model, **kwargs)
+        self.batch_size = batch_size
+
+
+
+    def _accum_stats(self, x):
+        x = np.concatenate(x, axis=0)
+        N, u_x = self.model.Estep(x, batch_size=self.batch_size)
+        return N, u_x, self.model.accum_log_h(x)
+
+
+
+    def estep_shard(self, shard):
+        stats = None
+        num_frames = 0
+        x = []
+        num_frames_x = 0
+        with self._open_shard(shard) as reader:
+            for _, x_i in reader:
+                x.append(x_i)
+                num_frames_x += x_i.shape[0]
+                if num_frames_x >= self.batch_size:
+                    stats = self._add_stats(stats, self._accum_stats(x))
+                    num_frames += num_frames_x
+                    x = []
+                    num_frames_x = 0
+
+        if num_frames_x > 0:
+            stats = self._add_stats(stats, self._accum_stats(x))
+            num_frames += num_frames_x
+        return stats, num_frames
+
+
+
+    @staticmethod
+    def _add_stats(stats, stats_b):
+        if stats is None:
+            return stats_b
+        return sum_reduce((stats, stats_b))
+
+
+
+    def mstep(self, stats, epoch):
+        N, u_x, _ = stats
+        self.model.Mstep(N, u_x)
+
+
+
+    def elbo(self, stats):
+        N, u_x, log_h = stats
+        return self.model.elbo(None, N=N, u_x=u_x, log_h=log_h)
+
+
+
+class JFATotalEMTrainer(EMTrainer):
+    """Map-reduce EM for the total variability model (JFATotal)
+       with shards of Baum-Welch stats written by
+       BaumWelchStatsExtractor with normalize=True.
+
+    Attributes:
+      model: JFATotal object, it needs to be initialized.
+      ml_md: Type of M-step in ['ml', 'md', 'ml+md'].
+      md_epochs: Epochs where the minimum divergence step is done,
+                 if None, it is done in all epochs.
+      num_workers: Number of worker processes.
+      checkpoint_dir: Directory to save the checkpoints.
+      reader_args: Extra arguments for SequentialDataReaderFactory.create.
+    """
+
+    def __init__(self, model, ml_md='ml+md', md_epochs=None, **kwargs):
+        super(JFATotalEMTrainer, self).__init__(model, **kwargs)
+        self.ml_md = ml_md
+        self.md_epochs = md_epochs
+
+
+
+    def estep_shard(self, shard):
+        with self._open_shard(shard) as reader:
+            _, stats = reader.read(squeeze=True)
+        N, F = BaumWelchStatsExtractor.split_stats(stats, self.model.K)
+        if self.num_workers > 1:
+            # the shards are already distributed among processes,
+            # this only changes the model copy of the worker
+            self.model.num_workers = 1
+        return self.model.Estep(N, F), np.sum(N)
+
+
+
+    def mstep(self, stats, epoch):
+        if self.ml_md != 'md':
+            self.model.MstepML(stats)
+        if self.ml_md != 'ml' and (self.md_epochs is None or epoch in self.md_epochs):
+            self.model.MstepMD(stats)
+
+
+
+    def elbo(self, stats):
+        return stats[0]
+
+
+
+    def restore_model(self, model):
+        model.batch_size = self.model.batch_size
+        model.num_clusters = self.model.num_clusters
+        return model
@@ -0,0 +1,205 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+import time
+import mmap
+
+import numpy as np
+import scipy.sparse as sparse
+
+from ..hyp_defs import float_cpu
+from ..utils.list_utils import ismember
+from ..utils.trial_scores import TrialScores
+from ..utils.parallel import fork_map
+
+
+def _score_block(scorer, x_e, x_t, mask, scores, block):
+    b, i1, i2, j1, j2 = block
+    t1 = time.time()
+    mask_b = None if mask is None else mask[i1:i2, j1:j2]
+    num_trials = (i2-i1)*(j2-j1) if mask_b is None else int(np.sum(mask_b))
+    if num_trials > 0:
+        x_e_b = np.arange(i1, i2) if x_e is None else x_e[i1:i2]
+        scores_b = scorer(x_e_b, x_t[j1:j2])
+        if mask_b is not None:
+            scores_b = scores_b*mask_b
+        scores[i1:i2, j1:j2] = scores_b
+    dt = time.time() - t1
+    return b, dt, num_trials
+
+
+
+class ParallelTrialScorer(object):
+    """Evaluates trials in parallel with any scoring back-end.
+
+       The trial list is split into num_model_parts x num_seg_parts
+       blocks, the blocks are scored by a pool of forked worker processes.
+       The workers inherit the enrollment/test vectors and the trial mask
+       from the parent process without copying them, and write the scores
+       directly into a shared score matrix, so the partial results
+       don't need to be merged. The shared score matrix is returned
+       without copying it.
+
+       The scorer is a callable scorer(x_e, x_t) that returns the
+       score matrix (num_enroll x num_test) of a block, e.g.:
+         PLDA: plda.llr_1vs1
+         cosine scoring: lambda x_e, x_t: np.dot(x_e, x_t.T)
+       For classifiers, like LinearGBE, x_e is None in the call to score and
+       the scorer receives the indices of the models (classes) of the block
+       instead of the enrollment vectors, e.g.:
+         lambda idx, x_t: gbe.predict(x_t)[:, idx].T
+
+       Worker processes are forked, so the scorer doesn't need to be
+       picklable (e.g. keras models).
+
+    Attributes:
+      scorer: Scoring function.
+      num_model_parts: Number of parts to split the model list.
+      num_seg_parts: Number of parts to split the test segment list.
+      num_workers: Number of worker processes, if 1 it runs in the main process.
+    """
+
+    def __init__(self, scorer, num_model_parts=1, num_seg_parts=1, num_workers=1):
+        self.scorer = scorer
+        self.num_model_parts = num_model_parts
+        self.num_seg_parts = num_seg_parts
+        self.num_workers = num_workers
+        self.block_stats = None
+
+
+
+    def _make_blocks(self, num_models, num_segs):
+        m_bounds = np.floor(
+            np.arange(self.num_model_parts+1)*num_models/self.num_model_parts).astype(int)
+        s_bounds = np.floor(
+            np.arange(self.num_seg_parts+1)*num_segs/self.num_seg_parts).astype(int)
+        blocks = []
+        for i in xrange(self.num_model_parts):
+            for j in xrange(self.num_seg_parts):
+                blocks.append((len(blocks), m_bounds[i], m_bounds[i+1],
+                               s_bounds[j], s_bounds[j+1]))
+        return blocks
+
+
+
+    @staticmethod
+    def _shared_zeros(shape, dtype):
+        # anonymous shared mapping, the forked workers write into it and
+        # it is released when the last array referencing it is deleted
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape))*dtype.itemsize
+        buf = mmap.mmap(-1, max(nbytes, 1))
+        return np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+
+    def _get_mask(self, model_set, ndx):
+        if ndx is None:
+            return None
+        f, idx = ismember(model_set, ndx.model_set)
+        assert np.all(f), 'some models are not in the ndx'
+        mask = ndx.trial_mask[idx]
+        if sparse.issparse(mask):
+            # dense mask, so it can be sliced by blocks
+            mask = mask.toarray()
+        return mask
+
+
+
+    def score(self, x_e, x_t, model_set, seg_set, ndx=None):
+        """Evaluates the trials.
+
+        Args:
+          x_e: Enrollment vectors (num_models x x_dim),
+               None for classifiers back-ends.
+          x_t: Test vectors (num_segs x x_dim), sorted as ndx.seg_set.
+          model_set: Model names of the rows of x_e.
+          seg_set: Segment names of the rows of x_t.
+          ndx: TrialNdx object with the trial mask,
+               if None all trials are evaluated.
+
+        Returns:
+          TrialScores object.
+        """
+        num_models = len(model_set)
+        num_segs = x_t.shape[0]
+        mask = self._get_mask(model_set, ndx)
+        blocks = self._make_blocks(num_models, num_segs)
+        shape = (num_models, num_segs)
+
+        t1 = time.time()
+        if self.num_workers <= 1:
+            scores = np.zeros(shape, dtype=float_cpu())
+        else:
+            # only the output needs to be shared, the workers are forked
+            # after creating it, so they inherit the shared mapping
+            scores = self._shared_zeros(shape, float_cpu())
+        stats = self._score_blocks(x_e, x_t, mask, scores, blocks)
+        dt = time.time() - t1
+
+        self._log_stats(blocks, stats, dt)
+        if mask is None:
+            mask = np.ones(shape, dtype=bool)
+        return TrialScores(model_set, seg_set, scores, mask)
+
+
+
+    def _score_blocks(self, x_e, x_t, mask, scores, blocks):
+        score_block = lambda block: _score_block(
+            self.scorer, x_e, x_t, mask, scores, block)
+        return list(fork_map(score_block, blocks, self.num_workers))
+
+
+
+    def _log_stats(self, blocks, stats, dt):
+        self.block_stats = []
+        total_trials = 0
+        for block, (b, dt_b, num_trials) in zip(blocks, stats):
+            _, i1, i2, j1, j2 = block
+            trials_per_sec = num_trials/dt_b if dt_b > 0 else 0
+            self.block_stats.append((i1, i2, j1, j2, num_trials, dt_b, trials_per_sec))
+            total_trials += num_trials
+            logging.info('block %d models=[%d,%d) segs=[%d,%d) trials=%d '
+                         'elapsed-time=%.2f s trials/s=%.2f'
+                         % (b, i1, i2, j1, j2, num_trials, dt_b, trials_per_sec))
+
+        logging.info('total trials=%d elapsed-time=%.2f s trials/s=%.2f'
+                     % (total_trials, dt, total_trials/dt if dt > 0 else 0))
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('num_model_parts', 'num_seg_parts', 'num_workers')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'num-model-blocks', dest=(p2+'num_model_parts'),
+                            default=1, type=int,
+                            help=('number of blocks in which we divide the model list'))
+        parser.add_argument(p1+'num-seg-blocks', dest=(p2+'num_seg_parts'),
+                            default=1, type=int,
+                            help=('number of blocks in which we divide the test list'))
+        parser.add_argument(p1+'num-workers', dest=(p2+'num_workers'),
+                            default=1, type=int,
+                            help=('number of worker processes'))
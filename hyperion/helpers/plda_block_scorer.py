@@ -0,0 +1,198 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+
+import numpy as np
+import scipy.sparse as sparse
+
+from ..hyp_defs import float_cpu
+from ..utils.list_utils import ismember
+from ..utils.trial_scores import TrialScores
+from ..utils.trial_scores_writer import TrialScoresWriter
+
+
+class PLDABlockScorer(object):
+    """Evaluates PLDA 1vs1 trials by blocks of enrollment x test vectors.
+
+       The enrollment and test vectors are projected once, then
+       the score matrix is computed block by block only for the
+       blocks/trials included in the trial mask.
+       Memory is bounded by the block size.
+
+    Attributes:
+      model: PLDA, SPLDA or FRPLDA object.
+      model_block_size: Number of enrollment vectors per block.
+      seg_block_size: Number of test vectors per block.
+      min_block_density: If the fraction of trials in a block is lower
+                         than this, we only compute the scores of
+                         the trials instead of the full block.
+    """
+
+    def __init__(self, model, model_block_size=1000, seg_block_size=10000,
+                 min_block_density=0.05):
+        self.model = model
+        self.model_block_size = model_block_size
+        self.seg_block_size = seg_block_size
+        self.min_block_density = min_block_density
+
+
+
+    def _get_trial_mask_idx(self, model_set, ndx, num_segs):
+        if ndx is None:
+            return None
+        assert ndx.trial_mask.shape[1] == num_segs
+        f, idx = ismember(model_set, ndx.model_set)
+        assert np.all(f), 'some models are not in the ndx'
+        return idx
+
+
+
+    def _score_block(self, gamma_1, Q_1, gamma_2, Q_2, const, mask):
+        if mask is None or np.mean(mask) >= self.min_block_density:
+            scores = self.model.llr_1vs1_from_proj(gamma_1, Q_1, gamma_2, Q_2, const)
+            if mask is not None:
+                scores[np.logical_not(mask)] = 0
+            return scores
+
+        scores = np.zeros(mask.shape, dtype=float_cpu())
+        i, j = mask.nonzero()
+        if len(i) > 0:
+            scores[i, j] = self.model.llr_1vs1_trials_from_proj(
+                gamma_1[i], Q_1[i], gamma_2[j], Q_2[j], const)
+        return scores
+
+
+
+    def score_blocks(self, x_e, x_t, model_set=None, ndx=None):
+        """Generator that evaluates the trials block by block.
+
+        Args:
+          x_e: Enrollment vectors (num_models x x_dim).
+          x_t: Test vectors (num_segs x x_dim),
+               sorted as ndx.seg_set.
+          model_set: Model names of the rows of x_e,
+                     required when ndx is not None.
+          ndx: TrialNdx or SparseTrialNdx object with the trial mask,
+               if None all trials are evaluated.
+
+        Returns:
+          Index of the first model of the block.
+          Index of the first segment of the block.
+          Score matrix of the block.
+          Trial mask of the block (None if ndx is None).
+        """
+        mask_idx = self._get_trial_mask_idx(model_set, ndx, x_t.shape[0])
+
+        consts = self.model.compute_llr_1vs1_consts()
+        gamma_e, Q_e = self.model.project_llr_1vs1(x_e, consts)
+        gamma_t, Q_t = self.model.project_llr_1vs1(x_t, consts)
+        const = consts[2]
+
+        num_models = x_e.shape[0]
+        num_segs = x_t.shape[0]
+        for i in xrange(0, num_models, self.model_block_size):
+            i_end = min(i + self.model_block_size, num_models)
+            for j in xrange(0, num_segs, self.seg_block_size):
+                j_end = min(j + self.seg_block_size, num_segs)
+                if mask_idx is None:
+                    mask = None
+                else:
+                    mask = ndx.trial_mask[mask_idx[i:i_end], j:j_end]
+                    if sparse.issparse(mask):
+                        mask = mask.toarray()
+                    if not np.any(mask):
+                        continue
+                scores = self._score_block(
+                    gamma_e[i:i_end], Q_e[i:i_end],
+                    gamma_t[j:j_end], Q_t[j:j_end], const, mask)
+                yield i, j, scores, mask
+
+
+
+    def score(self, x_e, x_t, model_set, seg_set, ndx=None):
+        """Evaluates the trials and returns them in memory.
+
+        Args:
+          x_e: Enrollment vectors (num_models x x_dim).
+          x_t: Test vectors (num_segs x x_dim).
+          model_set: Model names of the rows of x_e.
+          seg_set: Segment names of the rows of x_t.
+          ndx: TrialNdx object with the trial mask,
+               if None all trials are evaluated.
+
+        Returns:
+          TrialScores object.
+        """
+        scores = np.zeros((x_e.shape[0], x_t.shape[0]), dtype=float_cpu())
+        score_mask = np.zeros(scores.shape, dtype='bool')
+        for i, j, scores_ij, mask_ij in self.score_blocks(x_e, x_t, model_set, ndx):
+            i_end = i + scores_ij.shape[0]
+            j_end = j + scores_ij.shape[1]
+            scores[i:i_end, j:j_end] = scores_ij
+            score_mask[i:i_end, j:j_end] = True if mask_ij is None else mask_ij
+
+        return TrialScores(model_set, seg_set, scores, score_mask)
+
+
+
+    def score_to_file(self, x_e, x_t, model_set, seg_set, score_file, ndx=None):
+        """Evaluates the trials and writes the blocks directly to h5 file.
+
+        Args:
+          x_e: Enrollment vectors (num_models x x_dim).
+          x_t: Test vectors (num_segs x x_dim).
+          model_set: Model names of the rows of x_e.
+          seg_set: Segment names of the rows of x_t.
+          score_file: Output h5 score file.
+          ndx: TrialNdx object with the trial mask,
+               if None all trials are evaluated.
+
+        Returns:
+          Number of evaluated trials.
+        """
+        num_trials = 0
+        with TrialScoresWriter(score_file, model_set, seg_set) as w:
+            for i, j, scores_ij, mask_ij in self.score_blocks(x_e, x_t, model_set, ndx):
+                w.write(i, j, scores_ij, mask_ij)
+                num_trials += scores_ij.size if mask_ij is None else np.sum(mask_ij)
+                logging.debug('scored block model=%d seg=%d' % (i, j))
+        return num_trials
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('model_block_size', 'seg_block_size', 'min_block_density')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'model-block-size', dest=(p2+'model_block_size'),
+                            default=1000, type=int,
+                            help=('number of enrollment vectors per scoring block'))
+        parser.add_argument(p1+'seg-block-size', dest=(p2+'seg_block_size'),
+                            default=10000, type=int,
+                            help=('number of test vectors per scoring block'))
+        parser.add_argument(p1+'min-block-density', dest=(p2+'min_block_density'),
+                            default=0.05, type=float,
+                            help=('if the fraction of trials in a block is lower than this, '
+                                  'only the trials are scored instead of the full block'))
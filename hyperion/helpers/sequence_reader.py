@@ -19,6 +19,7 @@ from ..io import HypDataReader
 from ..utils.scp_list import SCPList
 from ..utils.tensors import to3D_by_seq
 from ..transforms import TransformList
+from ..generators.bucket_batch_sampler import BucketBatchSampler
 
 class SequenceReader(object):
     """Class to read sequences (deprecated).
@@ -31,6 +32,7 @@ class SequenceReader(object):
                  min_seq_length=1, max_seq_length=None,
                  seq_split_mode='random_slice', seq_split_overlap=0,
                  seqr_seed=1024, reset_rng=False,
+                 bucketing=False, max_batch_frames=None,
                  part_idx=1, num_parts=1):
         
         self.r = HypDataReader(data_file)
@@ -59,6 +61,15 @@ class SequenceReader(object):
         self.cur_subseq = None
         self.cur_batch = -1
         self.cur_frame = None
+
+        # bucketing groups full sequences with similar lengths
+        self.sampler = None
+        self._batches = None
+        self.padding_ratio = None
+        if bucketing:
+            assert max_seq_length is None, 'bucketing needs max_seq_length=None'
+            self.sampler = BucketBatchSampler(
+                batch_size, max_batch_frames=max_batch_frames, shuffle=shuffle_seqs)
         
         if max_seq_length is not None:
             self.cur_subseq = np.zeros((self.scp.len(),), dtype='int64')
@@ -121,6 +132,9 @@ class SequenceReader(object):
     @property
     def num_batches(self):
         if self._num_batches is None:
+            if self.sampler is not None:
+                self._num_batches = len(self._make_bucket_batches())
+                return self._num_batches
             num_seqs = np.sum(self.num_subseqs)
             self._num_batches = int(np.floor(num_seqs/self.batch_size))
         return self._num_batches
@@ -148,6 +162,18 @@ class SequenceReader(object):
         if self.reset_rng:
             self.rng = np.random.RandomState(seed=self.seed)
 
+        if self.sampler is not None:
+            self._batches = self._make_bucket_batches(self.rng)
+            self.padding_ratio = self.sampler.padding_ratio
+
+
+
+    def _make_bucket_batches(self, rng=None):
+        # sequences shorter than min_seq_length are discarded as in read_full_seqs
+        index = (self.seq_length > self.min_seq_length).nonzero()[0]
+        batches = self.sampler.make_batches(self.seq_length[index], rng=rng)
+        return [index[b] for b in batches]
+
 
     
     def read(self, return_3d=False,
@@ -184,7 +210,9 @@ class SequenceReader(object):
 
     
     def read_full_seqs(self):
-        if self.min_seq_length == 0:
+        if self.sampler is not None:
+            keys = list(self.scp.file_path[self._batches[self.cur_batch]])
+        elif self.min_seq_length == 0:
             keys = self.scp.file_path[self.cur_seq:self.cur_seq+self.batch_size]
             self.cur_seq += self.batch_size
         else:
@@ -302,7 +330,8 @@ class SequenceReader(object):
         valid_args = ('scp_sep', 'seq_field', 'shuffle_seqs', 'subsample',
                       'min_seq_length', 'max_seq_length',
                       'seq_split_mode', 'seq_split_overlap',
-                      'seqr_seed', 'part_idx', 'num_parts')
+                      'seqr_seed', 'bucketing', 'max_batch_frames',
+                      'part_idx', 'num_parts')
         return dict((k, kwargs[p+k])
                     for k in valid_args if p+k in kwargs)
 
@@ -361,6 +390,14 @@ class SequenceReader(object):
                             default=0, help=('overlap between subsequences'))
         parser.add_argument(p1+'seqr-seed', dest=(p2+'seqr_seed'), type=int,
                             default=1024, help=('seed for rng in sequence reader'))
+        parser.add_argument(p1+'bucketing', dest=(p2+'bucketing'),
+                            default=False, action='store_true',
+                            help=('groups sequences with similar lengths in the same '
+                                  'batch to reduce padding, needs max-seq-length=None'))
+        parser.add_argument(p1+'max-batch-frames', dest=(p2+'max_batch_frames'),
+                            default=None, type=int,
+                            help=('maximum number of padded frames per batch '
+                                  'when bucketing'))
         parser.add_argument(p1+'part-idx', dest=(p2+'part_idx'), type=int, default=1,
                             help=('splits the list of files in num-parts and process part_idx'))
         parser.add_argument(p1+'num-parts', dest=(p2+'num_parts'), type=int, default=1,
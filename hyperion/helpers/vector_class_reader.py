@@ -107,6 +107,19 @@ class VectorClassReader(object):
 
 
     
+    @staticmethod
+    def _group_by_class(class_ids, num_spc):
+        """Returns the indices of the samples sorted by class and the
+           offset of each class in that array, CSR style, so the samples of
+           class i are class_idx[offsets[i]:offsets[i+1]] in ascending order.
+        """
+        class_idx = np.argsort(class_ids, kind='stable')
+        offsets = np.zeros((len(num_spc)+1,), dtype=int)
+        offsets[1:] = np.cumsum(num_spc)
+        return class_idx, offsets
+
+
+
     @staticmethod
     def _filter_by_spc(u2c, min_spc=1, max_spc=None, spc_pruning_mode='last', rng=None):
         if min_spc <= 1 and max_spc==None:
@@ -123,20 +136,20 @@ class VectorClassReader(object):
             
             if np.all(num_spc <= max_spc):
                 return u2c
+            class_idx, offsets = VectorClassReader._group_by_class(class_ids, num_spc)
             f = np.ones_like(class_ids, dtype=bool)
-            for i in xrange(np.max(class_ids)+1):
-                if num_spc[i] > max_spc:
-                    indx = np.where(class_ids == i)[0]
-                    num_reject = len(indx) - max_spc
-                    if spc_pruning_mode == 'random':
-                        #indx = rng.permutation(indx)
-                        #indx = indx[-num_reject:]
-                        indx = rng.choice(indx, size=num_reject, replace=False)
-                    if spc_pruning_mode == 'last':
-                        indx = indx[-num_reject:]
-                    if spc_pruning_mode == 'first':
-                        indx = indx[:num_reject]
-                    f[indx] = False
+            for i in (num_spc > max_spc).nonzero()[0]:
+                indx = class_idx[offsets[i]:offsets[i+1]]
+                num_reject = len(indx) - max_spc
+                if spc_pruning_mode == 'random':
+                    #indx = rng.permutation(indx)
+                    #indx = indx[-num_reject:]
+                    indx = rng.choice(indx, size=num_reject, replace=False)
+                if spc_pruning_mode == 'last':
+                    indx = indx[-num_reject:]
+                if spc_pruning_mode == 'first':
+                    indx = indx[:num_reject]
+                f[indx] = False
 
             if np.any(f==False):
                 u2c = Utt2Info.create(u2c.key[f], u2c.info[f])
@@ -157,6 +170,7 @@ class VectorClassReader(object):
             return VectorClassReader._filter_by_spc(u2c, min_spc)
 
         num_classes = np.max(class_ids)+1
+        class_idx, offsets = VectorClassReader._group_by_class(class_ids, num_spc)
 
         shift = max_spc-overlap
         new_indx = np.zeros(max_spc*int(np.max(num_spc)*num_classes/shift+1), dtype=int)
@@ -165,7 +179,7 @@ class VectorClassReader(object):
         j = 0
         new_i = 0
         for i in xrange(num_classes):
-            indx_i = np.where(class_ids == i)[0]
+            indx_i = class_idx[offsets[i]:offsets[i+1]]
             if num_spc[i] > max_spc:
                 num_subclass = int(np.ceil((num_spc[i] - max_spc)/shift + 1))
                 if mode == 'sequential':
@@ -433,12 +433,16 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
            permissive: If True, if the data that we want to read is not in the file 
                        it returns an empty matrix, if False it raises an exception.
            scp_sep: Separator for scp files (default ' ').
+           use_mmap: If True, the Ark files are memory mapped and uncompressed
+                     matrices are returned as read-only views of the file,
+                     without copies. Compressed matrices are read as usual.
     """
         
     def __init__(self, file_path, path_prefix=None,
-                 transform=None, permissive=False, scp_sep=' '):
+                 transform=None, permissive=False, scp_sep=' ', use_mmap=False):
         super(RandomAccessArkDataReader, self).__init__(
             file_path, transform, permissive)
+        self.use_mmap = use_mmap
         
         self.scp = SCPList.load(self.file_path, sep=scp_sep)
         if path_prefix is not None:
@@ -449,6 +453,8 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
         self.archives = archives
         self.archive_idx = archive_idx
         self.f = [None] * len(self.archives)
+        self._mm = [None] * len(self.archives)
+        self._mm_headers = {}
         
 
         
@@ -458,6 +464,9 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
             if f is not None:
                 f.close()
         self.f = [None] * len(self.f)
+        # the maps are released when there are no views left
+        self._mm = [None] * len(self._mm)
+        self._mm_headers = {}
 
 
 
@@ -484,6 +493,85 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
         return f
 
 
+
+    
+    def _read_mmap_header(self, key_idx, offset):
+        """Parses the header of a matrix in the memory mapped Ark file.
+        
+        Args:
+          key_idx: Integer position of the feature matrix in the scp file.
+          offset: Byte where we can find the feature matrix in the Ark file.
+
+        Returns:
+          Memory mapped Ark file, data type, shape and byte where the data starts
+          or None if the matrix is not stored as binary uncompressed matrix/vector.
+        """
+        if key_idx in self._mm_headers:
+            return self._mm_headers[key_idx]
+
+        archive_idx = self.archive_idx[key_idx]
+        if self._mm[archive_idx] is None:
+            self._mm[archive_idx] = self._mmap_archive(self.archives[archive_idx])
+        buf = self._mm[archive_idx]
+
+        header = None
+        pos = offset
+        token = buf[pos:pos+5].tobytes()
+        if token[:2] == b'\0B' and token[2:] in (b'FM ', b'DM ', b'FV ', b'DV '):
+            dtype = np.dtype('<f4') if token[2:3] == b'F' else np.dtype('<f8')
+            pos += 5
+            shape = []
+            for i in xrange(2 if token[3:4] == b'M' else 1):
+                assert buf[pos] == 4, 'Wrong size %d' % buf[pos]
+                shape.append(int(buf[pos+1:pos+5].view('<i4')[0]))
+                pos += 5
+            header = (buf, dtype, tuple(shape), pos)
+
+        self._mm_headers[key_idx] = header
+        return header
+
+
+
+    def _read_mmap(self, key_idx, offset, row_offset=0, num_rows=0):
+        """Reads a matrix/vector as a view of the memory mapped Ark file.
+
+        Args:
+          key_idx: Integer position of the feature matrix in the scp file.
+          offset: Byte where we can find the feature matrix in the Ark file.
+          row_offset: Reads matrix starting from a given row instead of row 0.
+          num_rows: Num. of rows to read, if 0 if read all the rows.
+
+        Returns:
+          Read-only numpy array or None if the matrix cannot be mapped.
+        """
+        header = self._read_mmap_header(key_idx, offset)
+        if header is None:
+            return None
+
+        buf, dtype, shape, pos = header
+        if len(shape) == 1:
+            num_rows = 1
+            row_offset = 0
+        else:
+            total_rows = shape[0]
+            assert row_offset <= total_rows, (
+                'row_offset (%d) > num_rows (%d)' %
+                (row_offset, total_rows))
+            if num_rows == 0:
+                num_rows = total_rows - row_offset
+            else:
+                assert num_rows <= total_rows - row_offset, (
+                    'requested rows (%d) > available rows (%d)' %
+                    (num_rows, total_rows - row_offset))
+
+        row_size = shape[-1]*dtype.itemsize
+        first = pos + row_offset*row_size
+        data = buf[first:first+num_rows*row_size].view(dtype)
+        if len(shape) == 2:
+            data = np.reshape(data, (num_rows, shape[-1]))
+        return data
+
+
     
     def read_num_rows(self, keys, assert_same_dim=True):
         """Reads the number of rows in the feature matrices of the dataset.
@@ -555,10 +643,16 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
             row_offset_i, num_rows_i = self._combine_ranges(
                 range_spec, 0, 0)
             
-            f = self._open_archive(index, offset)
-            binary = init_kaldi_input_stream(f)
-            shape_i = KaldiMatrix.read_shape(
-                f, binary, sequential_mode=False)
+            header = None
+            if self.use_mmap:
+                header = self._read_mmap_header(index, offset)
+            if header is None:
+                f = self._open_archive(index, offset)
+                binary = init_kaldi_input_stream(f)
+                shape_i = KaldiMatrix.read_shape(
+                    f, binary, sequential_mode=False)
+            else:
+                shape_i = header[2]
 
             shape_i = self._apply_range_to_shape(
                 shape_i, row_offset_i, num_rows_i)
@@ -621,11 +715,15 @@ class RandomAccessArkDataReader(RandomAccessDataReader):
             row_offset_i, num_rows_i = self._combine_ranges(
                 range_spec, row_offset_i, num_rows_i)
             
-            f = self._open_archive(index, offset)
-            binary = init_kaldi_input_stream(f)
-            data_i = KaldiMatrix.read(
-                f, binary, row_offset_i, num_rows_i,
-                sequential_mode=False).to_ndarray()
+            data_i = None
+            if self.use_mmap:
+                data_i = self._read_mmap(index, offset, row_offset_i, num_rows_i)
+            if data_i is None:
+                f = self._open_archive(index, offset)
+                binary = init_kaldi_input_stream(f)
+                data_i = KaldiMatrix.read(
+                    f, binary, row_offset_i, num_rows_i,
+                    sequential_mode=False).to_ndarray()
 
             assert num_rows_i == 0 or data_i.shape[0] == num_rows_i
 
@@ -12,6 +12,7 @@ import os
 import logging
 import io
 import subprocess
+from collections import OrderedDict
 import soundfile as sf
 
 import numpy as np
@@ -29,9 +30,16 @@ class AudioReader(object):
             file_path:     scp file with formant file_key wavspecifier (audio_file/pipe).
             segments_path: segments file with format: segment_id file_id tbeg tend
             scale:        Multiplies signal by scale factor
+            wav_cache_size: Maximum number of decoded recordings kept in memory
+                            to read their segments. Only recordings read from
+                            pipes are cached, audio files are read by seeking
+                            to the start of the segment. The sequential reader
+                            evicts the recording whose next segment is furthest
+                            ahead, so interleaved segments of up to wav_cache_size
+                            recordings are read decoding each recording once.
     """
     
-    def __init__(self, file_path, segments_path=None, wav_scale=2**15):
+    def __init__(self, file_path, segments_path=None, wav_scale=2**15, wav_cache_size=2):
         self.file_path = file_path
         if isinstance(file_path, SCPList):
             self.scp = file_path
@@ -44,12 +52,14 @@ class AudioReader(object):
             self.with_segments = False
         else:
             self.with_segments = True
-            if isinstance(file_path, SegmentList):
+            if isinstance(segments_path, SegmentList):
                 self.segments = segments_path
             else:
                 self.segments = SegmentList.load(segments_path, sep=' ', index_by_file=False)
 
         self.scale = wav_scale
+        self.wav_cache_size = wav_cache_size
+        self._wav_cache = OrderedDict()
 
         
 
@@ -114,6 +124,81 @@ class AudioReader(object):
         return x, fs
 
 
+    @staticmethod
+    def is_seekable(wavspecifier):
+        """Returns True if the audio specifier is a file
+           that can be read from any sample, False if it is a pipe.
+        """
+        wavspecifier = wavspecifier.strip()
+        if wavspecifier[-1] == '|':
+            return False
+        return os.path.splitext(wavspecifier)[1] in valid_ext
+
+    
+
+    @staticmethod
+    def _segment_to_samples(segment, num_samples, fs):
+        """Converts segment times to sample indexes."""
+        t_beg = segment['tbeg']
+        t_end = segment['tend']
+        s_beg = int(t_beg * fs)
+        if s_beg >= num_samples:
+            raise Exception('segment %s tbeg=%.2f (num_sample=%d) longer that wav file %s (num_samples=%d)' % (
+                segment['segment_id'], t_beg, s_beg, segment['file_id'], num_samples))
+
+        s_end = int(t_end * fs)
+        if s_end > num_samples or t_end < 0:
+            s_end = num_samples
+        return s_beg, s_end
+
+    
+
+    def _read_file_segment(self, segment, file_path):
+        """Reads a segment from an audio file decoding only
+           the samples of the segment.
+        """
+        with sf.SoundFile(file_path.strip()) as f:
+            fs_i = f.samplerate
+            s_beg, s_end = self._segment_to_samples(segment, f.frames, fs_i)
+            f.seek(s_beg)
+            x_i = f.read(s_end - s_beg, dtype=float_cpu())
+        x_i *= self.scale
+        return x_i, fs_i
+
+
+
+    def _read_wav_cached(self, file_id, file_path):
+        """Reads a full recording using the cache of
+           decoded recordings.
+        """
+        if file_id in self._wav_cache:
+            x_i, fs_i = self._wav_cache.pop(file_id)
+            self._wav_cache[file_id] = (x_i, fs_i)
+            return x_i, fs_i
+
+        x_i, fs_i = self.read_wavspecifier(file_path, self.scale)
+        if self.wav_cache_size > 0:
+            self._wav_cache[file_id] = (x_i, fs_i)
+            while len(self._wav_cache) > self.wav_cache_size:
+                del self._wav_cache[self._wav_to_evict()]
+        return x_i, fs_i
+
+
+
+    def _wav_to_evict(self):
+        """Returns the recording removed when the cache is full,
+           the least recently used one.
+        """
+        return next(iter(self._wav_cache))
+
+
+
+    def _release_wav(self, file_id):
+        """Removes a recording from the cache."""
+        self._wav_cache.pop(file_id, None)
+
+        
+
     def _read_segment(self, segment):
         """Reads a wave segment
 
@@ -123,22 +208,13 @@ class AudioReader(object):
           Wave, sampling frequency
         """
         file_id = segment['file_id']
-        t_beg = segment['tbeg']
-        t_end = segment['tend']
         file_path, _, _ = self.scp[file_id]
-        x_i, fs_i = self.read_wavspecifier(file_path, self.scale)
-        num_samples_i = len(x_i)
-        s_beg = int(t_beg * fs_i)
-        if s_beg >= num_samples_i:
-            raise Exception('segment %s tbeg=%.2f (num_sample=%d) longer that wav file %s (num_samples=%d)' % (
-                key, tbeg, sbeg, file_id, num_samples_i))
+        if self.is_seekable(file_path):
+            return self._read_file_segment(segment, file_path)
 
-        s_end = int(t_end * fs_i)
-        if s_end > num_samples_i or t_end < 0:
-            s_end = num_samples_i
-                    
-        x_i = x_i[s_beg:s_end]
-        return x_i, fs_i
+        x_i, fs_i = self._read_wav_cached(file_id, file_path)
+        s_beg, s_end = self._segment_to_samples(segment, len(x_i), fs_i)
+        return x_i[s_beg:s_end], fs_i
         
         
     def read(self):
@@ -148,8 +224,10 @@ class AudioReader(object):
 
 class SequentialAudioReader(AudioReader):
 
-    def __init__(self, file_path, segments_path=None, wav_scale=2**15, part_idx=1, num_parts=1):
-        super(SequentialAudioReader, self).__init__(file_path, segments_path, wav_scale=wav_scale)
+    def __init__(self, file_path, segments_path=None, wav_scale=2**15,
+                 wav_cache_size=2, part_idx=1, num_parts=1):
+        super(SequentialAudioReader, self).__init__(
+            file_path, segments_path, wav_scale=wav_scale, wav_cache_size=wav_cache_size)
         self.cur_item = 0
         self.part_idx = part_idx
         self.num_parts = num_parts
@@ -159,6 +237,39 @@ class SequentialAudioReader(AudioReader):
             else:
                 self.scp = self.scp.split(self.part_idx, self.num_parts)
 
+        self._init_segments_left()
+
+
+
+    def _init_segments_left(self):
+        # number of segments left to read per recording,
+        # recordings are removed from the cache after reading
+        # their last segment
+        self._wav_cache.clear()
+        self._num_segments_left = {}
+        self._next_use = {}
+        if self.with_segments:
+            file_ids = np.asarray(self.segments.file_id)
+            u_file_ids, first_pos, counts = np.unique(
+                file_ids, return_index=True, return_counts=True)
+            self._num_segments_left = dict(zip(u_file_ids, counts))
+            # position of the next segment of each recording,
+            # len(segments) if it is the last one
+            order = np.argsort(file_ids, kind='stable')
+            same = file_ids[order[1:]] == file_ids[order[:-1]]
+            self._next_pos = np.full((len(file_ids),), len(file_ids), dtype=int)
+            self._next_pos[order[:-1][same]] = order[1:][same]
+            self._next_use = dict(zip(u_file_ids, first_pos))
+
+
+
+    def _wav_to_evict(self):
+        # the recording needed furthest in the future is evicted,
+        # which minimizes the number of times recordings are decoded
+        if not self.with_segments:
+            return super(SequentialAudioReader, self)._wav_to_evict()
+        return max(self._wav_cache, key=lambda k: self._next_use[k])
+
 
         
     def __iter__(self):
@@ -195,6 +306,7 @@ class SequentialAudioReader(AudioReader):
            then we can start reading the features again.
         """
         self.cur_item=0
+        self._init_segments_left()
 
 
 
@@ -220,7 +332,10 @@ class SequentialAudioReader(AudioReader):
           data: List of waveforms
         """
         if num_records == 0:
-            num_records = len(self.scp) - self.cur_item
+            if self.with_segments:
+                num_records = len(self.segments) - self.cur_item
+            else:
+                num_records = len(self.scp) - self.cur_item
 
         keys = []
         data = []
@@ -233,6 +348,11 @@ class SequentialAudioReader(AudioReader):
                 segment = self.segments[self.cur_item]
                 key = segment['segment_id']
                 x_i, fs_i = self._read_segment(segment)
+                file_id = segment['file_id']
+                self._next_use[file_id] = self._next_pos[self.cur_item]
+                self._num_segments_left[file_id] -= 1
+                if self._num_segments_left[file_id] == 0:
+                    self._release_wav(file_id)
             else:
                 key, file_path, _, _ = self.scp[self.cur_item]
                 x_i, fs_i = self.read_wavspecifier(file_path, self.scale)
@@ -251,7 +371,7 @@ class SequentialAudioReader(AudioReader):
             p = ''
         else:
             p = prefix + '_'
-        valid_args = ('part_idx', 'num_parts')
+        valid_args = ('wav_cache_size', 'part_idx', 'num_parts')
         return dict((k, kwargs[p+k])
                     for k in valid_args if p+k in kwargs)
 
@@ -267,6 +387,9 @@ class SequentialAudioReader(AudioReader):
             
         parser.add_argument(p1+'wav-scale', dest=(p2+'wav_scale'), default=2**15, type=float,
                              help=('multiplicative factor for waveform'))
+        parser.add_argument(p1+'wav-cache-size', dest=(p2+'wav_cache_size'), default=2, type=int,
+                            help=('maximum number of recordings read from pipes '
+                                  'kept in memory to read their segments'))
         parser.add_argument(p1+'part-idx', dest=(p2+'part_idx'), type=int, default=1,
                             help=('splits the list of files in num-parts and process part_idx'))
         parser.add_argument(p1+'num-parts', dest=(p2+'num_parts'), type=int, default=1,
@@ -276,8 +399,9 @@ class SequentialAudioReader(AudioReader):
 
 class RandomAccessAudioReader(AudioReader):
 
-    def __init__(self, file_path, segments_path=None, wav_scale=2**15):
-        super(RandomAccessAudioReader, self).__init__(file_path, segments_path, wav_scale)
+    def __init__(self, file_path, segments_path=None, wav_scale=2**15, wav_cache_size=2):
+        super(RandomAccessAudioReader, self).__init__(
+            file_path, segments_path, wav_scale, wav_cache_size)
         
 
 
@@ -326,3 +450,6 @@ class RandomAccessAudioReader(AudioReader):
             
         parser.add_argument(p1+'wav-scale', dest=(p2+'wav_scale'), default=2**15, type=float,
                              help=('multiplicative factor for waveform'))
+        parser.add_argument(p1+'wav-cache-size', dest=(p2+'wav_cache_size'), default=2, type=int,
+                            help=('maximum number of recordings read from pipes '
+                                  'kept in memory to read their segments'))
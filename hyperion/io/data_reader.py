@@ -9,6 +9,7 @@ from six.moves import xrange
 from six import string_types
 
 import logging
+import mmap
 from abc import ABCMeta, abstractmethod
 import numpy as np
 
@@ -337,6 +338,24 @@ class RandomAccessDataReader(DataReader):
             file_path, transform, permissive)
 
 
+
+    
+    @staticmethod
+    def _mmap_archive(file_path):
+        """Memory maps a file.
+
+        Args:
+          file_path: File to map.
+
+        Returns:
+          Read-only uint8 numpy array backed by the file,
+          slices of it don't copy the data.
+        """
+        with open(file_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(mm, dtype=np.uint8)
+
+
         
     @abstractmethod
     def read_num_rows(self, keys=None, assert_same_dim=True):
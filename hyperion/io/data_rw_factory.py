@@ -146,7 +146,7 @@ class SequentialDataReaderFactory(object):
 class RandomAccessDataReaderFactory(object):
 
     @staticmethod
-    def create(rspecifier, path_prefix=None, transform=None, scp_sep=' '):
+    def create(rspecifier, path_prefix=None, transform=None, scp_sep=' ', use_mmap=False):
         if isinstance(rspecifier, string_types):
             rspecifier = RSpecifier.create(rspecifier)
         logging.debug(rspecifier.__dict__)
@@ -154,7 +154,8 @@ class RandomAccessDataReaderFactory(object):
             if rspecifier.archive_type == ArchiveType.H5:
                 return RH5FDR(rspecifier.archive,
                               transform=transform,
-                              permissive=rspecifier.permissive)
+                              permissive=rspecifier.permissive,
+                              use_mmap=use_mmap)
             else:
                 raise ValueError(
                     'Random access to Ark file %s needs a script file' %
@@ -164,12 +165,12 @@ class RandomAccessDataReaderFactory(object):
                 return RH5SDR(rspecifier.archive, path_prefix,
                               transform=transform,
                               permissive=rspecifier.permissive,
-                              scp_sep=scp_sep)
+                              scp_sep=scp_sep, use_mmap=use_mmap)
             else:
                 return RADR(rspecifier.script, path_prefix,
                             transform=transform,
                             permissive=rspecifier.permissive,
-                            scp_sep=scp_sep)
+                            scp_sep=scp_sep, use_mmap=use_mmap)
 
 
     @staticmethod
@@ -178,7 +179,7 @@ class RandomAccessDataReaderFactory(object):
             p = ''
         else:
             p = prefix + '_'
-        valid_args = ('scp_sep', 'path_prefix')
+        valid_args = ('scp_sep', 'path_prefix', 'use_mmap')
         return dict((k, kwargs[p+k])
                     for k in valid_args if p+k in kwargs)
 
@@ -197,5 +198,8 @@ class RandomAccessDataReaderFactory(object):
                             help=('scp file field separator'))
         parser.add_argument(p1+'path-prefix', dest=(p2+'path_prefix'), default=None,
                             help=('scp file_path prefix'))
+        parser.add_argument(p1+'use-mmap', dest=(p2+'use_mmap'), default=False,
+                            action='store_true',
+                            help=('memory maps the feature files'))
 
 
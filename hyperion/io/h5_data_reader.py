@@ -51,8 +51,7 @@ def _read_h5_data(dset, row_offset=0, num_rows=0, transform=None):
     if 'data_format' in dset.attrs:
         if not isinstance(data, np.ndarray):
             data = np.asarray(data)
-        data = KaldiCompressedMatrix.build_from_data_attrs(
-            data, dset.attrs).to_ndarray()
+        data = KaldiCompressedMatrix.data_attrs_to_ndarray(data, dset.attrs)
 
     assert num_rows == 0 or data.shape[0] == num_rows
 
@@ -430,11 +429,75 @@ class RandomAccessH5DataReader(RandomAccessDataReader):
                       features after reading them from disk.
            permissive: If True, if the data that we want to read is not in the file 
                        it returns an empty matrix, if False it raises an exception.
+           use_mmap: If True, the hdf5 files are memory mapped and contiguous 
+                     (not chunked) datasets are read as views of the file, 
+                     without copies. If the dataset type is float_cpu, 
+                     the matrices are returned as read-only views. 
     """
 
-    def __init__(self, file_path, transform=None, permissive = False):
+    def __init__(self, file_path, transform=None, permissive=False, use_mmap=False):
         super(RandomAccessH5DataReader, self).__init__(file_path, transform, permissive)
         self.f = None
+        self.use_mmap = use_mmap
+        self._mm = {}
+        self._mm_dsets = {}
+
+
+
+    def _close_mmaps(self):
+        # the maps are released when there are no views left
+        self._mm = {}
+        self._mm_dsets = {}
+
+
+
+    def _read_dset(self, f, file_path, key, row_offset=0, num_rows=0):
+        """Reads a dataset from the hdf5 file.
+
+        Args:
+          f: hdf5 file object.
+          file_path: Path of the hdf5 file.
+          key: Dataset name.
+          row_offset: First row to read from the feature matrix.
+          num_rows: Number of rows to read from the feature matrix.
+                    If 0 it reads all the rows.
+
+        Returns:
+          Numpy array with feature matrix/vector.
+        """
+        if not self.use_mmap:
+            return _read_h5_data(f[key], row_offset, num_rows, self.transform)
+
+        if key not in self._mm_dsets:
+            dset = f[key]
+            offset = dset.id.get_offset()
+            if dset.chunks is None and offset is not None:
+                attrs = dict(dset.attrs) if 'data_format' in dset.attrs else None
+                self._mm_dsets[key] = (file_path, offset, dset.shape, dset.dtype, attrs)
+            else:
+                self._mm_dsets[key] = None
+
+        dset_info = self._mm_dsets[key]
+        if dset_info is None:
+            return _read_h5_data(f[key], row_offset, num_rows, self.transform)
+
+        file_path, offset, shape, dtype, attrs = dset_info
+        if file_path not in self._mm:
+            self._mm[file_path] = self._mmap_archive(file_path)
+        buf = self._mm[file_path]
+        size = int(np.prod(shape))*dtype.itemsize
+        data = np.reshape(buf[offset:offset+size].view(dtype), shape)
+        if row_offset > 0 or num_rows > 0:
+            last_row = row_offset+num_rows if num_rows > 0 else shape[0]
+            data = data[row_offset:last_row]
+        assert num_rows == 0 or data.shape[0] == num_rows
+
+        if attrs is not None:
+            data = KaldiCompressedMatrix.data_attrs_to_ndarray(data, attrs)
+        data = np.asarray(data, dtype=float_cpu())
+        if self.transform is not None:
+            data = self.transform.predict(data)
+        return data
 
 
         
@@ -500,6 +563,7 @@ class RandomAccessH5FileDataReader(RandomAccessH5DataReader):
         if self.f is not None:
             self.f.close()
             self.f = None
+        self._close_mmaps()
 
             
         
@@ -590,8 +654,7 @@ class RandomAccessH5FileDataReader(RandomAccessH5DataReader):
             row_offset_i = row_offset[i] if row_offset_is_list else row_offset
             num_rows_i = num_rows[i] if num_rows_is_list else num_rows
 
-            dset_i = self.f[key]
-            data_i = _read_h5_data(dset_i, row_offset_i, num_rows_i, self.transform)
+            data_i = self._read_dset(self.f, self.file_path, key, row_offset_i, num_rows_i)
             data.append(data_i)
 
         if squeeze:
@@ -621,7 +684,7 @@ class RandomAccessH5ScriptDataReader(RandomAccessH5DataReader):
     """
     
     def __init__(self, file_path, path_prefix=None, scp_sep=' ', **kwargs):
-        super(RandomAccessH5DataReader, self).__init__(
+        super(RandomAccessH5ScriptDataReader, self).__init__(
             file_path, **kwargs)
         
         self.scp = SCPList.load(self.file_path, sep=scp_sep)
@@ -642,6 +705,7 @@ class RandomAccessH5ScriptDataReader(RandomAccessH5DataReader):
             if f is not None:
                 f.close()
         self.f = [None] * len(self.f)
+        self._close_mmaps()
 
 
 
@@ -772,8 +836,8 @@ class RandomAccessH5ScriptDataReader(RandomAccessH5DataReader):
                 else:
                     raise Exception('Key %s not found' % key)
 
-            dset_i = f[key]
-            data_i = _read_h5_data(dset_i, row_offset_i, num_rows_i, self.transform)
+            data_i = self._read_dset(
+                f, self.archives[self.archive_idx[index]], key, row_offset_i, num_rows_i)
             data.append(data_i)
 
         if squeeze:
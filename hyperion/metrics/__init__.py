@@ -11,6 +11,7 @@ from .acc import compute_accuracy
 from .confusion_matrix import *
 from .eer import compute_eer, compute_prbep
 from .dcf import compute_dcf, compute_min_dcf, compute_act_dcf, fast_eval_dcf_eer
+from .score_evaluator import ScoreEvaluator
 
 
 
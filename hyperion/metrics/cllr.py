@@ -11,6 +11,7 @@ import numpy as np
 
 from ..utils.math import neglogsigmoid
 from .utils import opt_loglr
+from .score_evaluator import ScoreEvaluator
 
 def compute_cllr(tar, non):
     """ CLLR: Measure of goodness of log-likelihood-ratio detection output. This measure          ps both:        
@@ -25,12 +26,20 @@ def compute_cllr(tar, non):
 
     """
     c1 = np.mean(neglogsigmoid(tar))/np.log(2)
-    c2 = np.mean(neglogsigmoid(non))/np.log(2)
+    c2 = np.mean(neglogsigmoid(-non))/np.log(2)
 
     return (c1 + c2)/2
 
 
 def compute_min_cllr(tar, non):
+    """ Minimum CLLR, i.e., CLLR after optimal (PAV) calibration.
+        It is computed from the ROC convex hull segments, which are
+        the PAV bins, so it doesn't need to compute the calibrated LLRs.
+    Args:
+      tar: Scores of target trials.
+      non: Scores of non-target trials.
 
-    tar_llr, non_llr = opt_loglr(tar, non, 'raw')
-    return compute_cllr(tar_llr,non_llr)
+    Returns:
+      Minimum CLLR
+    """
+    return ScoreEvaluator.from_tar_non(tar, non).min_cllr()
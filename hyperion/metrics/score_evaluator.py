@@ -0,0 +1,292 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import numpy as np
+from scipy.spatial import ConvexHull
+
+
+class ScoreEvaluator(object):
+    """Evaluates binary detection performance sorting the scores only once.
+
+       Scores are sorted when the object is created, after that,
+       EER, min/act DCF for any number of priors, min Cllr and
+       ROC/ROCCH points are obtained from the cumulative
+       miss/false-alarm counts without sorting again.
+       Subsets of trials (conditions) are evaluated by
+       selecting them from the sorted list, which keeps the order,
+       so they don't need to be sorted either.
+
+       Scores that are the same are sorted with targets first, as in
+       compute_roc and compute_rocch.
+
+    Attributes:
+      scores: Sorted scores.
+      is_tar: Boolean vector, True for the target trials in the sorted list.
+      trial_idx: Index of the sorted trials in the input trial list.
+    """
+
+    def __init__(self, scores, is_tar, trial_idx=None, is_sorted=False):
+        scores = np.asarray(scores)
+        is_tar = np.asarray(is_tar, dtype=bool)
+        if not is_sorted:
+            sort_idx = np.lexsort((np.logical_not(is_tar), scores))
+            scores = scores[sort_idx]
+            is_tar = is_tar[sort_idx]
+            if trial_idx is None:
+                trial_idx = sort_idx
+            else:
+                trial_idx = trial_idx[sort_idx]
+        elif trial_idx is None:
+            trial_idx = np.arange(len(scores))
+
+        self.scores = scores
+        self.is_tar = is_tar
+        self.trial_idx = trial_idx
+        self.num_tar = int(np.sum(is_tar))
+        self.num_non = len(is_tar) - self.num_tar
+        assert self.num_tar > 0
+        assert self.num_non > 0
+
+        # number of targets/non-targets below each threshold
+        self._cum_tar = np.zeros((len(is_tar)+1,), dtype='int64')
+        self._cum_tar[1:] = np.cumsum(is_tar)
+        self._cum_non = np.arange(len(is_tar)+1, dtype='int64') - self._cum_tar
+        self._rocch = None
+
+
+
+    @classmethod
+    def from_tar_non(cls, tar, non):
+        """Creates the object from target and non-target scores vectors."""
+        scores = np.concatenate((tar, non))
+        is_tar = np.zeros((len(scores),), dtype=bool)
+        is_tar[:len(tar)] = True
+        return cls(scores, is_tar)
+
+
+
+    @classmethod
+    def from_key(cls, scr, key):
+        """Creates the object from TrialScores and TrialKey objects.
+           trial_idx contains the flat index of the trials in the
+           key.tar/key.non matrices, so conditions can be selected
+           with masks with the same shape as the key.
+        """
+        scr = scr.align_with_ndx(key)
+        tar_mask = np.logical_and(scr.score_mask, key.tar).ravel()
+        non_mask = np.logical_and(scr.score_mask, key.non).ravel()
+        trial_idx = np.logical_or(tar_mask, non_mask).nonzero()[0]
+        return cls(scr.scores.ravel()[trial_idx], tar_mask[trial_idx], trial_idx)
+
+
+
+    def select(self, mask):
+        """Returns ScoreEvaluator object for a subset of trials,
+           without sorting again.
+
+        Args:
+          mask: Boolean mask indicating the trials in the subset.
+                It can be a vector with length equal to the number of
+                trials in the input trial list or
+                a matrix with the shape of the key if the
+                object was created using from_key.
+
+        Returns:
+          ScoreEvaluator object.
+        """
+        mask = np.asarray(mask, dtype=bool).ravel()[self.trial_idx]
+        return ScoreEvaluator(self.scores[mask], self.is_tar[mask],
+                              self.trial_idx[mask], is_sorted=True)
+
+
+
+    def roc(self):
+        """Returns miss and false alarm probabilities for all thresholds,
+           as compute_roc.
+        """
+        p_miss = self._cum_tar/self.num_tar
+        p_fa = (self.num_non - self._cum_non)/self.num_non
+        return p_miss, p_fa
+
+
+
+    def _rocch_counts(self):
+        if self._rocch is not None:
+            return self._rocch
+
+        # only the points where the ROC goes from a non-target to a target
+        # can be vertices of the convex hull
+        is_tar = self.is_tar
+        idx = np.logical_and(np.logical_not(is_tar[:-1]), is_tar[1:]).nonzero()[0] + 1
+        idx = np.concatenate(([0], idx, [len(is_tar)]))
+        n_miss = self._cum_tar[idx]
+        n_fa = self.num_non - self._cum_non[idx]
+
+        # we add the point (1,1) so the hull is never degenerate
+        points = np.vstack((np.append(n_fa, self.num_non),
+                            np.append(n_miss, self.num_tar))).T.astype('float64')
+        hull = ConvexHull(points)
+        v = hull.vertices
+        v = v[v < len(idx)]
+        v = np.sort(v)
+        self._rocch = (n_miss[v], n_fa[v])
+        return self._rocch
+
+
+
+    def rocch(self):
+        """Returns miss and false alarm probabilities at the vertices of
+           the ROC convex hull, as compute_rocch.
+        """
+        n_miss, n_fa = self._rocch_counts()
+        return n_miss/self.num_tar, n_fa/self.num_non
+
+
+
+    @staticmethod
+    def _rocch2eer(p_miss, p_fa):
+        x1 = p_fa[:-1]
+        x2 = p_fa[1:]
+        y1 = p_miss[:-1]
+        y2 = p_miss[1:]
+        det = x1*y2 - x2*y1
+        den = (y2 - y1) + (x1 - x2)
+        valid = np.logical_and(x1 != x2, y1 != y2)
+        eer = np.zeros_like(det)
+        eer[valid] = det[valid]/den[valid]
+        return np.max(eer) if len(eer) > 0 else 0
+
+
+
+    def eer(self):
+        """Returns the EER from the ROC convex hull."""
+        p_miss, p_fa = self.rocch()
+        return self._rocch2eer(p_miss, p_fa)
+
+
+
+    def prbep(self):
+        """Returns the precission-recall break-even point."""
+        n_miss, n_fa = self._rocch_counts()
+        return self._rocch2eer(n_miss.astype('float64'), n_fa.astype('float64'))
+
+
+
+    def min_dcf(self, prior, normalize=True):
+        """Computes minimum DCF for a vector of priors.
+
+        Returns:
+          Vector Minimum DCF for each prior.
+          Vector of P_miss corresponding to each min DCF.
+          Vector of P_fa corresponding to each min DCF.
+        """
+        p_miss, p_fa = self.rocch()
+        prior = np.asarray(prior)
+        prior_2d = prior[:, None] if prior.ndim == 1 else prior
+        dcf = prior_2d*p_miss + (1-prior_2d)*p_fa
+        if normalize:
+            dcf /= np.minimum(prior_2d, 1-prior_2d)
+        idx = np.argmin(dcf, axis=-1)
+        if prior.ndim == 1:
+            min_dcf = dcf[np.arange(len(prior)), idx]
+        else:
+            min_dcf = dcf[idx]
+        return min_dcf, p_miss[idx], p_fa[idx]
+
+
+
+    def act_dcf(self, prior, normalize=True):
+        """Computes actual DCF for a vector of priors assuming that
+           scores are log-likelihood ratios.
+
+        Returns:
+          Vector actual DCF for each prior.
+          Vector of P_miss corresponding to each act DCF.
+          Vector of P_fa corresponding to each act DCF.
+        """
+        prior = np.asarray(prior)
+        t = - np.log(prior) + np.log(1-prior)
+        # we accept trials with score >= t
+        idx = np.searchsorted(self.scores, t, side='left')
+        n_miss = self._cum_tar[idx]
+        n_fa = self.num_non - self._cum_non[idx]
+        p_miss = n_miss/self.num_tar
+        p_fa = n_fa/self.num_non
+        act_dcf = prior * p_miss + (1-prior)*p_fa
+        if normalize:
+            act_dcf /= np.minimum(prior, 1-prior)
+        return act_dcf, p_miss, p_fa
+
+
+
+    def cllr(self):
+        """Returns Cllr assuming that scores are log-likelihood ratios."""
+        tar = self.scores[self.is_tar]
+        non = self.scores[np.logical_not(self.is_tar)]
+        c1 = np.mean(np.logaddexp(0, -tar))
+        c2 = np.mean(np.logaddexp(0, non))
+        return (c1 + c2)/2/np.log(2)
+
+
+
+    def min_cllr(self):
+        """Returns minimum Cllr, i.e. the Cllr after optimal monotonic
+           calibration. The PAV calibration corresponds to the segments
+           of the ROC convex hull, all trials in a segment get
+           the same posterior.
+        """
+        n_miss, n_fa = self._rocch_counts()
+        d_tar = np.diff(n_miss).astype('float64')
+        d_non = -np.diff(n_fa).astype('float64')
+        valid = d_tar + d_non > 0
+        d_tar = d_tar[valid]
+        d_non = d_non[valid]
+        with np.errstate(divide='ignore'):
+            llr = (np.log(d_tar) - np.log(d_non) -
+                   np.log(self.num_tar) + np.log(self.num_non))
+        c_tar = np.zeros_like(llr)
+        c_non = np.zeros_like(llr)
+        f = d_tar > 0
+        c_tar[f] = d_tar[f]*np.logaddexp(0, -llr[f])
+        f = d_non > 0
+        c_non[f] = d_non[f]*np.logaddexp(0, llr[f])
+        return (np.sum(c_tar)/self.num_tar + np.sum(c_non)/self.num_non)/2/np.log(2)
+
+
+
+    def eval(self, prior, normalize_dcf=True):
+        """Computes all the metrics.
+
+        Returns:
+          Dictionary with EER, min/act DCF vectors, min Cllr, Cllr and PRBEP.
+        """
+        return {'eer': self.eer(),
+                'min_dcf': self.min_dcf(prior, normalize_dcf)[0],
+                'act_dcf': self.act_dcf(prior, normalize_dcf)[0],
+                'min_cllr': self.min_cllr(),
+                'cllr': self.cllr(),
+                'prbep': self.prbep()}
+
+
+
+    def eval_conditions(self, masks, prior, normalize_dcf=True):
+        """Evaluates several conditions (subsets of trials) without sorting.
+
+        Args:
+          masks: List of boolean masks selecting the trials of each condition,
+                 see select.
+          prior: Target prior or vector of target priors.
+          normalize_dcf: if true, return normalized DCF, else unnormalized.
+
+        Returns:
+          Dictionary with the metrics, each entry is an array with
+          one row per condition.
+        """
+        results = [self.select(mask).eval(prior, normalize_dcf) for mask in masks]
+        return dict((k, np.array([r[k] for r in results])) for k in results[0])
@@ -151,7 +151,7 @@ def opt_loglr(tar, non, method='laplace'):
     llr = post_log_odds - prior_log_odds
     llr += 1e-6 * np.arange(n)/n
 
-    llr[sort_idx] = llr
+    llr[sort_idx] = np.copy(llr)
     tar_llr = llr[:ntar]
     non_llr = llr[ntar:]
     
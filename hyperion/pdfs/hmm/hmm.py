@@ -8,58 +8,88 @@ from __future__ import division
 from six.moves import xrange
 
 import numpy as np
+import scipy.sparse as sparse
 
 from ...hyp_defs import float_cpu
-from ...utils.math import softmax, logsumexp
 from ..core import PDF
 
 class HMM(PDF):
-
-    def __init__(self, **kwargs):
-        super(HMM, self).__init__(num_states=1, pi=None, trans=None, trans_mask=None,
-                                  update_pi=True, update_trans=True,
-                                  tied_trans = False,
-                                  left_to_right = False,
-                                  **kwargs)
+    """Hidden Markov model with discrete states.
+
+    The observations are given as log-likelihoods log p(x_t|z_t) with shape
+    (num_frames, num_states), or (num_seqs, num_frames, num_states) to process
+    a batch of sequences of the same length at once.
+
+    Inference uses the scaled-probability recursions, i.e., each frame is one
+    matrix-vector product with the transition matrix followed by a
+    normalization. For models with many states, tied transitions are applied
+    in O(num_states) and transition matrices with few non-zero elements,
+    e.g. left-to-right models, are applied as sparse matrices.
+
+    Attributes:
+      num_states: Number of states.
+      pi: Initial state probabilities.
+      trans: Transition matrix, trans[i, j] = P(z_t=j|z_{t-1}=i).
+      trans_mask: Mask with the allowed transitions.
+      update_pi: If True, pi is updated in the M-step.
+      update_trans: If True, trans is updated in the M-step.
+      tied_trans: If True, all the states share the same self-loop probability
+                  and the same probability of jumping to any other state.
+      left_to_right: If True, only transitions to states with higher index
+                     are allowed.
+      chunk_size: If not None, the forward-backward only keeps chunk_size frames
+                  of intermediate results in memory.
+    """
+
+    # transition matrices with lower density are applied as sparse matrices
+    sparse_trans_density = 0.25
+    structured_trans_min_states = 32
+
+    def __init__(self, num_states=1, pi=None, trans=None, trans_mask=None,
+                 update_pi=True, update_trans=True,
+                 tied_trans=False, left_to_right=False, chunk_size=None,
+                 **kwargs):
+        super(HMM, self).__init__(**kwargs)
         if pi is not None:
             num_states = len(pi)
-            
+
         self.num_states = num_states
         self.pi = pi
         self.trans = trans
         self.trans_mask = trans_mask
-        
+
         self.update_pi = update_pi
         self.update_trans = update_trans
         self.tied_trans = tied_trans
         self.left_to_right = left_to_right
-        
-        if left_to_rigth and (trans_mask is None):
-            self.trans_mask = np.triu(np.ones_like(self.trans))
+        self.chunk_size = chunk_size
 
-        self._log_pi = None
-        self._log_trans = None
+        if left_to_right and (trans_mask is None):
+            self.trans_mask = np.triu(np.ones((num_states, num_states), dtype=float_cpu()))
+
+        self.reset_aux()
 
 
 
-    def reset_aux():
+    def reset_aux(self):
         self._log_pi = None
         self._log_trans = None
+        self._trans_sparse = None
+
 
-        
     @property
     def is_init(self):
         if self._is_init:
             return True
-        
+
         if self.pi is not None and self.trans is not None:
             self.validate()
-            self._is_init =True
+            self._is_init = True
 
         return self._is_init
-            
-    
-        
+
+
+
     @property
     def log_pi(self):
         if self._log_pi is None:
@@ -72,9 +102,23 @@ class HMM(PDF):
         if self._log_trans is None:
             self._log_trans = np.log(self.trans+1e-15)
         return self._log_trans
-    
 
-    
+
+
+    @property
+    def trans_sparse(self):
+        """Transition matrix in CSR format or None if it is not sparse enough."""
+        if self._trans_sparse is None:
+            self._trans_sparse = False
+            if (self.num_states >= self.structured_trans_min_states and
+                np.mean(self.trans > 0) <= self.sparse_trans_density):
+                self._trans_sparse = sparse.csr_matrix(self.trans)
+        if self._trans_sparse is False:
+            return None
+        return self._trans_sparse
+
+
+
     def validate(self):
         assert(len(self.pi) == self.num_states)
         assert(self.trans.shape[0] == self.num_states)
@@ -82,181 +126,452 @@ class HMM(PDF):
         if self.trans_mask is not None:
             assert self.trans_mask.shape == self.trans.shape
 
-        
+
+
+    def _tied_trans_probs(self):
+        p_loop = self.trans[0, 0]
+        p_jump = self.trans[0, 1] if self.num_states > 1 else 0
+        return p_loop, p_jump
+
+
+
+    def _use_tied_trans(self):
+        # for few states a dense product is cheaper than the closed form
+        return self.tied_trans and self.num_states >= self.structured_trans_min_states
+
+
+
+    def _trans_dot_fns(self):
+        """Returns the functions computing alpha x trans and r x trans^T
+           for a batch of row vectors.
+        """
+        if self._use_tied_trans():
+            p_loop, p_jump = self._tied_trans_probs()
+            # tied transition matrix is symmetric
+            f = lambda a: (p_loop - p_jump)*a + p_jump*a.sum(axis=-1, keepdims=True)
+            return f, f
+        trans = self.trans_sparse
+        if trans is not None:
+            trans_t = trans.T.tocsr()
+            return lambda a: trans_t.dot(a.T).T, lambda r: trans.dot(r.T).T
+        trans = self.trans
+        trans_t = np.ascontiguousarray(trans.T)
+        return lambda a: np.dot(a, trans), lambda r: np.dot(r, trans_t)
+
+
+
+    @staticmethod
+    def _as_batch(x):
+        if x.ndim == 2:
+            return x[None]
+        return x
+
+
+
+    @staticmethod
+    def _emission_probs(x):
+        """Converts log-likelihoods to probabilities scaled by their max per frame."""
+        x_max = np.max(x, axis=-1, keepdims=True)
+        return np.exp(x - x_max), x_max[..., 0]
+
+
+
+    def _forward_chunk(self, p, alpha_prev=None):
+        """Scaled forward recursion over a chunk of frames.
+
+        Args:
+          p: Scaled emission probabilities (num_seqs x num_frames x num_states).
+          alpha_prev: Normalized alpha of the frame before the chunk,
+                      None if the chunk starts the sequence.
+
+        Returns:
+          Normalized alphas (num_seqs x num_frames x num_states).
+          Normalization constants (num_seqs x num_frames).
+        """
+        trans_dot, _ = self._trans_dot_fns()
+        alpha = np.zeros(p.shape, dtype=float_cpu())
+        c = np.zeros(p.shape[:2], dtype=float_cpu())
+        if alpha_prev is None:
+            a = self.pi * p[:, 0]
+        else:
+            a = trans_dot(alpha_prev) * p[:, 0]
+        for t in xrange(p.shape[1]):
+            if t > 0:
+                a = trans_dot(alpha[:, t-1]) * p[:, t]
+            c_t = a.sum(axis=-1)
+            c[:, t] = c_t
+            alpha[:, t] = a / c_t[:, None]
+        return alpha, c
+
+
+
+    def _backward_chunk(self, p, c, r_next=None):
+        """Scaled backward recursion over a chunk of frames.
+
+        Args:
+          p: Scaled emission probabilities (num_seqs x num_frames x num_states).
+          c: Normalization constants of the forward recursion (num_seqs x num_frames).
+          r_next: Message p*beta/c of the frame after the chunk,
+                  None if the chunk ends the sequence.
+
+        Returns:
+          Scaled betas (num_seqs x num_frames x num_states).
+        """
+        _, trans_dot_t = self._trans_dot_fns()
+        beta = np.ones(p.shape, dtype=float_cpu())
+        q = p / c[:, :, None]
+        for t in xrange(p.shape[1]-1, -1, -1):
+            if r_next is not None:
+                beta[:, t] = trans_dot_t(r_next)
+            r_next = q[:, t] * beta[:, t]
+        return beta
+
+
+
+    def _forward_backward(self, x, return_Nzz=False, chunk_size=None):
+        """Forward-backward for a batch of sequences of the same length.
+
+        Only the alphas at the chunk boundaries are kept after the forward pass,
+        the backward pass recomputes the alphas of one chunk at a time.
+
+        Returns:
+          State posteriors (num_seqs x num_frames x num_states).
+          Expected transition counts (num_states x num_states) or None.
+          Log-likelihood of each sequence.
+        """
+        num_seqs, num_frames, num_states = x.shape
+        if chunk_size is None:
+            chunk_size = num_frames
+
+        chunks = list(range(0, num_frames, chunk_size))
+        checkpoints = [None]
+        log_c = np.zeros((num_seqs, num_frames), dtype=float_cpu())
+        log_px = np.zeros((num_seqs,), dtype=float_cpu())
+        last_chunk = None
+        for first in chunks:
+            last = min(first + chunk_size, num_frames)
+            p, x_max = self._emission_probs(x[:, first:last])
+            alpha, c = self._forward_chunk(p, checkpoints[-1])
+            log_c[:, first:last] = np.log(c)
+            log_px += np.sum(x_max, axis=-1)
+            checkpoints.append(alpha[:, -1])
+            last_chunk = (p, alpha, c)
+        log_px += np.sum(log_c, axis=-1)
+
+        pz = np.zeros(x.shape, dtype=float_cpu())
+        acc_zz = np.zeros((num_states, num_states), dtype=float_cpu()) if return_Nzz else None
+        r_next = None
+        for k in xrange(len(chunks)-1, -1, -1):
+            first = chunks[k]
+            last = min(first + chunk_size, num_frames)
+            alpha_prev = checkpoints[k]
+            if k == len(chunks) - 1:
+                p, alpha, c = last_chunk
+            else:
+                p, _ = self._emission_probs(x[:, first:last])
+                alpha, c = self._forward_chunk(p, alpha_prev)
+
+            beta = self._backward_chunk(p, c, r_next)
+            pz[:, first:last] = alpha * beta
+            r = p * beta / c[:, :, None]
+            r_next = r[:, 0]
+            if return_Nzz:
+                # sum_t alpha_{t-1}^T r_t computed as a single matrix product
+                acc_zz += np.dot(alpha[:, :-1].reshape(-1, num_states).T,
+                                 r[:, 1:].reshape(-1, num_states))
+                if alpha_prev is not None:
+                    acc_zz += np.dot(alpha_prev.T, r[:, 0])
+
+        Nzz = self.trans * acc_zz if return_Nzz else None
+        return pz, Nzz, log_px
+
+
+
     def fit(self, x, sample_weight=None,
             x_val=None, sample_weight_val=None,
             epochs=10):
-
-
-        N_val_tot = 0
+        """Trains the HMM with EM.
+
+        Args:
+          x: List of sequences of log-likelihoods, each element with shape
+             (num_frames x num_states) or (num_seqs x num_frames x num_states).
+          x_val: Validation sequences.
+          epochs: Number of EM iterations.
+
+        Returns:
+          Log-likelihood of the training data per epoch.
+          Log-likelihood of the training data per frame and epoch.
+          Log-likelihood of the validation data per epoch (only if x_val is not None).
+          Log-likelihood of the validation data per frame and epoch (only if x_val is not None).
+        """
         elbo = np.zeros((epochs,), dtype=float_cpu())
         elbo_val = np.zeros((epochs,), dtype=float_cpu())
-        stats = None
         for epoch in xrange(epochs):
-            for i in xrange(x.shape[0]):
-                stats =self.Estep(x[i], stats)
-                pz, Nzz = stats
-                elbo[epoch] += self.elbo(x[i], pz=pz, Nzz=Nzz)
-                        
+            stats = None
+            for x_i in x:
+                stats, log_px = self.Estep(x_i, stats)
+                elbo[epoch] += np.sum(log_px)
+
             self.Mstep(stats)
 
             if x_val is not None:
-                for i in xrange(x_val.shape[0]):
-                    pz, Nzz = self.Estep(x_val[i])
-                    elbo_val[epoch] += self.elbo(x[i], pz=pz, Nzz=Nzz)
+                for x_i in x_val:
+                    elbo_val[epoch] += np.sum(self.log_prob(x_i))
 
-        N_tot = np.sum([x_i.shape[0] for x_i in x])
+        N_tot = np.sum([np.prod(x_i.shape[:-1]) for x_i in x])
         if x_val is None:
             return elbo, elbo/N_tot
         else:
-            N_val_tot = np.sum([x_i.shape[0] for x_i in x_val])
+            N_val_tot = np.sum([np.prod(x_i.shape[:-1]) for x_i in x_val])
             return elbo, elbo/N_tot, elbo_val, elbo_val/N_val_tot
 
 
 
     def forward(self, x):
-        # x = log P(x|z)
-        N = x.shape[0]
-        log_alpha = np.zeros((N, self.num_states), dtype=float_cpu())
-        log_alpha[0] = self.log_pi + x[0]
-        for n in xrange(1, N):
-            log_alpha[n] = x[n] + logsumexp(log_alpha[n-1][:, None] + self.log_trans, axis=0)
-                             
-        return log_alpha
+        """Computes log alpha_t = log p(x_1,...,x_t, z_t).
 
+        Args:
+          x: Log-likelihoods log p(x_t|z_t) (num_frames x num_states),
+             or (num_seqs x num_frames x num_states).
 
-    
-    def backward(self, x):
-
-        N = x.shape[0]
-        log_beta = np.zeros((N, self.num_states), dtype=float_cpu())
-        log_beta[-1] = 1
-        for n in xrange(N-2, -1, -1):
-            r = log_beta[n+1] + x[n+1] + self.log_trans
-            log_beta[n] = logsumexp(r.T, axis=0)
+        Returns:
+          log alpha with the same shape as x.
+        """
+        x3 = self._as_batch(x)
+        p, x_max = self._emission_probs(x3)
+        alpha, c = self._forward_chunk(p)
+        with np.errstate(divide='ignore'):
+            log_alpha = np.log(alpha) + np.cumsum(np.log(c) + x_max, axis=-1)[:, :, None]
+        return log_alpha.reshape(x.shape)
 
-        return log_beta
-        
 
-    
-    def compute_pz(self, x, return_Nzz=False, return_log_px=False):
-        log_alpha = self.forward(x)
-        log_beta = self.backward(x)
-        log_px = np.sum(log_alpha[-1])
 
-        pz = softmax(log_alpha + log_beta, axis=-1)
-
-        if not(return_Nzz or return_elbo or return_log_px):
+    def backward(self, x):
+        """Computes log beta_t = log p(x_{t+1},...,x_T| z_t).
+
+        Args:
+          x: Log-likelihoods log p(x_t|z_t) (num_frames x num_states),
+             or (num_seqs x num_frames x num_states).
+
+        Returns:
+          log beta with the same shape as x.
+        """
+        x3 = self._as_batch(x)
+        p, x_max = self._emission_probs(x3)
+        _, c = self._forward_chunk(p)
+        beta = self._backward_chunk(p, c)
+        log_c = np.log(c) + x_max
+        # sum of log_c for the frames after t
+        log_c_next = np.cumsum(log_c[:, ::-1], axis=-1)[:, ::-1] - log_c
+        with np.errstate(divide='ignore'):
+            log_beta = np.log(beta) + log_c_next[:, :, None]
+        return log_beta.reshape(x.shape)
+
+
+
+    def compute_pz(self, x, return_Nzz=False, return_log_px=False, chunk_size=None):
+        """Computes the state posteriors with the forward-backward algorithm.
+
+        Args:
+          x: Log-likelihoods log p(x_t|z_t) (num_frames x num_states),
+             or (num_seqs x num_frames x num_states).
+          return_Nzz: If True, returns the expected transition counts
+                      accumulated over frames and sequences.
+          return_log_px: If True, returns log p(x_1,...,x_T).
+          chunk_size: Number of frames processed at once, if None uses
+                      self.chunk_size, if both are None, the full sequence.
+
+        Returns:
+          State posteriors P(z_t|x_1,...,x_T) with the same shape as x.
+          Expected transition counts (num_states x num_states) if return_Nzz.
+          Log-likelihood of each sequence if return_log_px.
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        pz, Nzz, log_px = self._forward_backward(
+            self._as_batch(x), return_Nzz=return_Nzz, chunk_size=chunk_size)
+        pz = pz.reshape(x.shape)
+        if x.ndim == 2:
+            log_px = log_px[0]
+
+        if not(return_Nzz or return_log_px):
             return pz
 
         r = [pz]
-        if return_pzz_acc:
-            x_e = np.expand_dims(axis=1)
-            log_alpha_e = np.expand_dims(axis=-1)
-            log_beta_e = np.expand_dims(axis=1)
-            log_trans_e = np.expand_dims(axis=0)
-            zz = log_alpha_e + x_e + log_trans_e + log_beta_e
-            zz = softmax(zz, axis=-1)
-            Nzz = np.sum(zz, axis=0)
+        if return_Nzz:
             r.append(Nzz)
-
         if return_log_px:
             r.append(log_px)
 
         return tuple(r)
 
 
-    
+
+    def log_prob(self, x):
+        """Computes log p(x_1,...,x_T) for a sequence or a batch of sequences."""
+        x3 = self._as_batch(x)
+        p, x_max = self._emission_probs(x3)
+        _, c = self._forward_chunk(p)
+        log_px = np.sum(np.log(c) + x_max, axis=-1)
+        if x.ndim == 2:
+            return log_px[0]
+        return log_px
+
+
+
     def elbo(self, x, pz=None, Nzz=None):
         if pz is None:
             pz, Nzz = self.compute_pz(x, return_Nzz=True)
 
-        Nz = pz[0]
-        elbo = (np.sum(Nz*self.log_pi) +
-                np.sum(Nzz*self.log_trans) +
-                np.sum(pz*x))
+        pz3 = self._as_batch(pz)
+        Nz = np.sum(pz3[:, 0], axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            h_zz = np.sum(Nzz*self.log_trans)
+        elbo = (np.sum(Nz*self.log_pi) + h_zz + np.sum(pz*x))
         return elbo
 
 
 
-    def Estep(self, x, stats_0=None):
+    def Estep(self, x, stats_0=None, chunk_size=None):
+        """Accumulates the sufficient statistics of a sequence or a batch of
+           sequences of the same length.
 
+        Args:
+          x: Log-likelihoods log p(x_t|z_t).
+          stats_0: Statistics accumulated so far, tuple (Nz, Nzz).
+          chunk_size: Number of frames processed at once.
+
+        Returns:
+          Accumulated statistics, tuple (Nz, Nzz).
+          Log-likelihood of the sequences.
+        """
         if stats_0 is None:
             Nz = np.zeros((self.num_states,), dtype=float_cpu())
             Nzz = np.zeros((self.num_states, self.num_states), dtype=float_cpu())
         else:
             Nz, Nzz = stats_0
 
-        pz, Nzz = self.compute_pz(x, return_Nzz=True)
-        Nz += pz[0]
-        Nzz += pzz
-        stats = (Nz, Nzz)
-        
-        return pz, stats
+        pz, Nzz_i, log_px = self.compute_pz(
+            x, return_Nzz=True, return_log_px=True, chunk_size=chunk_size)
+        Nz += np.sum(self._as_batch(pz)[:, 0], axis=0)
+        Nzz += Nzz_i
+        return (Nz, Nzz), log_px
+
 
 
-    
     def Mstep(self, stats):
         Nz, Nzz = stats
 
-        self.pi = Nz/np.sum(Nz)
-        self.trans = Nzz/np.sum(Nzz, axis=-1, keepdims=True)
+        if self.update_pi:
+            self.pi = Nz/np.sum(Nz)
 
-        if self.tied_trans:
-            p_loop = np.mean(np.diag(self.trans))
-            self.trans[:] = (1-p_loop)/self.num_states
-            self.trans[np.diag_indices(self.num_states)] = p_loop
-        
-        if self.trans_mask is not None:
-            self.trans *= self.trans_mask
-            self.trans /= np.sum(self.trans, axis=-1, keepdims=True)
+        if self.update_trans:
+            if self.tied_trans:
+                p_loop = np.sum(np.diag(Nzz))/np.sum(Nzz)
+                self.trans = np.full((self.num_states, self.num_states),
+                                     (1-p_loop)/max(self.num_states-1, 1),
+                                     dtype=float_cpu())
+                self.trans[np.diag_indices(self.num_states)] = p_loop
+            else:
+                self.trans = Nzz/np.sum(Nzz, axis=-1, keepdims=True)
+
+            if self.trans_mask is not None:
+                self.trans *= self.trans_mask
+                self.trans /= np.sum(self.trans, axis=-1, keepdims=True)
 
         self.reset_aux()
 
 
-        
+
     def log_predictive(self, x):
-        # log p(x_{N+1}|x_1,..,x_N}
+        """Computes log p(x_{t+1}|x_1,...,x_t) for t=1,...,T-1."""
         assert self.is_init
-        
-        log_alpha = self.forward(x)[:-1]
-        log_px = np.sum(log_alpha, axis=-1, keepdims=True)
+        x3 = self._as_batch(x)
+        p, x_max = self._emission_probs(x3)
+        _, c = self._forward_chunk(p)
+        log_pred = (np.log(c) + x_max)[:, 1:]
+        if x.ndim == 2:
+            return log_pred[0]
+        return log_pred
 
-        log_alpha_e = np.expand_dims(log_alpha, axis=-1)
-        log_trans_e = np.expand_dims(self.log_trans, axis=0)
-        
-        log_pred = logsumexp(log_alpha_e+log_trans_e, axis=1)
-        log_pred = logsumexp(log_pred+x[1:], axis=-1) - log_px
 
-        return log_pred
-        
+
+    def _viterbi_step(self, delta, log_trans):
+        """Maximizes over the previous state for a batch of Viterbi scores.
+
+        Args:
+          delta: Viterbi scores of the previous frame (num_seqs x num_states).
+          log_trans: Exact log of the transition matrix, -inf for
+                     forbidden transitions.
+
+        Returns:
+          Best score for each current state (num_seqs x num_states).
+          Best previous state for each current state (num_seqs x num_states).
+        """
+        if not self._use_tied_trans():
+            u = delta[:, :, None] + log_trans
+            psi = np.argmax(u, axis=1)
+            return np.take_along_axis(u, psi[:, None, :], axis=1)[:, 0], psi
+
+        # with tied transitions, the best jump to state i comes from the
+        # best state or, for the best state, from the second best
+        p_loop, p_jump = self._tied_trans_probs()
+        seq_idx = np.arange(delta.shape[0])
+        k1 = np.argmax(delta, axis=-1)
+        delta2 = delta.copy()
+        delta2[seq_idx, k1] = -np.inf
+        k2 = np.argmax(delta2, axis=-1)
+        psi = np.repeat(k1[:, None], delta.shape[1], axis=1)
+        psi[seq_idx, k1] = k2
+        with np.errstate(divide='ignore'):
+            u_jump = np.take_along_axis(delta, psi, axis=1) + np.log(p_jump)
+            u_loop = delta + np.log(p_loop)
+        loop = u_loop >= u_jump
+        psi[loop] = np.nonzero(loop)[1]
+        return np.maximum(u_loop, u_jump), psi
+
 
 
     def viterbi_decode(self, x, nbest=1):
+        """Computes the most likely state sequences.
+
+        Args:
+          x: Log-likelihoods log p(x_t|z_t) (num_frames x num_states),
+             or (num_seqs x num_frames x num_states).
+          nbest: Number of paths to return, the best path ending in
+                 each of the nbest best final states.
+
+        Returns:
+          State paths (nbest x num_frames), or (num_seqs x nbest x num_frames).
+          Log-likelihood log p(x, z) of each path.
+        """
         assert self.is_init
-        idx_aux = np.arange(self.num_states)
-        phi = np.zeros((x.shape[0], self.num_states), dtype=int)
-        w = self.log_pi + x[0]
-        for i in xrange(x.shape[0]):
-            u = w[:,None] + self.log_trans
-            k_max = np.argmax(u, axis=0)
-            w = x[i] + u[k_max,idx_aux]
-            phi[i-1] = k_max
-
-        best = np.fliplr(np.argsort(w))[:nbest]
-        log_pxz = w[best]
-        paths = np.zeros((nbest, x.shape[0]), dtype=int)
-        for n in xrange(nbest):
-            k_max = best[n]
-            paths[n,-1] = k_max
-            for i in xrange(x.shape[0]-2,-1,-1):
-                k_max = phi[i, k_max]
-                paths[n,i] = k_max
-
+        x3 = self._as_batch(x)
+        num_seqs, num_frames, _ = x3.shape
+        psi = np.zeros(x3.shape, dtype=np.int32)
+        # exact logs, the floored log_pi/log_trans would allow
+        # zero probability transitions when the likelihood gaps are large
+        with np.errstate(divide='ignore'):
+            log_pi = np.log(self.pi)
+            log_trans = None if self._use_tied_trans() else np.log(self.trans)
+        delta = log_pi + x3[:, 0]
+        for t in xrange(1, num_frames):
+            delta, psi[:, t] = self._viterbi_step(delta, log_trans)
+            delta += x3[:, t]
+
+        best = np.argsort(-delta, axis=-1, kind='stable')[:, :nbest]
+        log_pxz = np.take_along_axis(delta, best, axis=-1)
+        paths = np.zeros((num_seqs, best.shape[1], num_frames), dtype=int)
+        paths[:, :, -1] = best
+        for t in xrange(num_frames-1, 0, -1):
+            paths[:, :, t-1] = np.take_along_axis(psi[:, t], paths[:, :, t], axis=-1)
+
+        if x.ndim == 2:
+            return paths[0], log_pxz[0]
         return paths, log_pxz
-                
-    
-        
+
+
+
     def sample(self, num_seqs, num_steps, rng=None, seed=1024):
         if rng is None:
             rng = np.random.RandomState(seed)
@@ -266,35 +581,42 @@ class HMM(PDF):
         for t in xrange(1, num_steps):
             for k in xrange(self.num_states):
                 index = x[:,t-1,k] == 1
-                n_k = num.sum(index)
+                n_k = np.sum(index)
                 if n_k == 0:
                     continue
-                x[index] = rng.multinomial(1, self.trans[k], size=(n_k,))
+                x[index, t] = rng.multinomial(1, self.trans[k], size=(n_k,))
 
         return x
-        
 
-    
+
+
     def get_config(self):
         config = {'update_pi': self.update_pi,
                   'update_trans': self.update_trans,
                   'tied_trans': self.tied_trans,
-                  'left_to_right': self.left_to_right}
+                  'left_to_right': self.left_to_right,
+                  'chunk_size': self.chunk_size}
         base_config = super(HMM, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
 
 
 
-    
+
     def save_params(self, f):
         params = {'pi': self.pi,
                   'trans': self.trans}
         self._save_params_from_dict(f, params)
 
 
-        
+
     @classmethod
     def load_params(cls, f, config):
         param_list = ['pi', 'trans']
         params = cls._load_params_to_dict(f, config['name'], param_list)
-        return cls(pi=params['pi'], trans=params['trans'], **config)
+        return cls(x_dim=config['x_dim'], pi=params['pi'], trans=params['trans'],
+                   update_pi=config['update_pi'],
+                   update_trans=config['update_trans'],
+                   tied_trans=config['tied_trans'],
+                   left_to_right=config['left_to_right'],
+                   chunk_size=config.get('chunk_size'),
+                   name=config['name'])
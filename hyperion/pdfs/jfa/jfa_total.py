@@ -7,17 +7,41 @@ from __future__ import print_function
 from __future__ import division
 from six.moves import xrange
 
+import logging
+
 import numpy as np
 from scipy import linalg as sla
 
 from ...hyp_defs import float_cpu
 from ...utils.math import invert_pdmat, invert_trimat, logdet_pdmat, vec2symmat, symmat2vec
+from ...utils.parallel import fork_map, sum_reduce
+from ...clustering import KMeans
 from ..core.pdf import PDF
 
 
 class JFATotal(PDF):
-
-    def __init__(self, K, y_dim=None, T=None, **kwargs):
+    """Total variability model (i-vector extractor).
+
+       The posteriors of the i-vectors are computed for blocks of
+       batch_size utterances at once, the posterior precisions of
+       the block are built as a (batch_size, y_dim, y_dim) tensor and
+       inverted with batched LAPACK calls. In approximate mode, the zero
+       order stats are clustered with k-means and the utterances of
+       a cluster share the posterior precision of the cluster centroid.
+       The E-step distributes the blocks among a pool of worker processes.
+
+    Attributes:
+      K: Number of GMM components.
+      y_dim: I-vector dimension.
+      T: Total variability matrix (y_dim x K*x_dim).
+      batch_size: Number of utterances processed at once.
+      num_clusters: Number of clusters of zero order stats in approximate
+                    mode, if 0, the posteriors are exact.
+      num_workers: Number of processes computing the E-step.
+    """
+
+    def __init__(self, K, y_dim=None, T=None, batch_size=256,
+                 num_clusters=0, num_workers=1, **kwargs):
         super(JFATotal, self).__init__(**kwargs)
         if T is not None:
             y_dim = T.shape[0]
@@ -25,6 +49,9 @@ class JFATotal(PDF):
         self.K = K
         self.y_dim = y_dim
         self.T = T
+        self.batch_size = batch_size
+        self.num_clusters = num_clusters
+        self.num_workers = num_workers
 
         #aux
         self._TT = None
@@ -37,7 +64,7 @@ class JFATotal(PDF):
     
         
     @property
-    def is_init():
+    def is_init(self):
         if self._is_init:
             return True
         if self.T is not None:
@@ -46,29 +73,96 @@ class JFATotal(PDF):
 
 
     def initialize(self, N, F):
-        assert N.shape[0] == self.K
+        assert N.shape[1] == self.K
         
         self.T = np.random.randn(self.y_dim, F.shape[1]).astype(
             float_cpu(), copy=False)
         
 
 
+    def compute_L(self, N):
+        """Computes the posterior precisions of the i-vectors.
+
+        Args:
+          N: Zero order stats (num_utts x K).
+
+        Returns:
+          Precision matrices (num_utts x y_dim x y_dim).
+        """
+        iu = self._upptr
+        L_vec = np.dot(N, self.TT)
+        L = np.zeros((N.shape[0], self.y_dim, self.y_dim), dtype=float_cpu())
+        L[:, iu[0], iu[1]] = L_vec
+        L[:, iu[1], iu[0]] = L_vec
+        diag = np.arange(self.y_dim)
+        L[:, diag, diag] += 1
+        return L
+
+
+
+    @staticmethod
+    def _solve_L(L, TF, compute_inv, return_logdet):
+        """Solves L y = TF for a batch of precisions,
+           if TF is None, it only computes the inverses and log-determinants.
+        """
+        logdet = None
+        if return_logdet:
+            cholL = np.linalg.cholesky(L)
+            logdet = 2*np.sum(np.log(np.diagonal(cholL, axis1=1, axis2=2)), axis=-1)
+        if compute_inv:
+            iL = np.linalg.inv(L)
+            y = None if TF is None else np.einsum('bij,bj->bi', iL, TF)
+            return y, iL, logdet
+        y = np.linalg.solve(L, TF[:, :, None])[:, :, 0]
+        return y, None, logdet
+
+
+
+    def _cluster_N(self, N):
+        """Clusters the zero order stats and computes
+           the posterior precisions of the centroids.
+        """
+        num_clusters = min(self.num_clusters, N.shape[0])
+        kmeans = KMeans(num_clusters)
+        kmeans.fit(N)
+        cluster_idx, _ = kmeans.predict(N)
+        L = self.compute_L(kmeans.mu)
+        _, iL, logdet = self._solve_L(L, None, True, True)
+        return cluster_idx, iL, logdet
+
+
+
     def compute_py_g_x(self, N , F, G=None, return_cov=False, return_elbo=False,
                        return_acc=False):
+        """Computes the posterior of the i-vectors.
+
+        Args:
+          N: Zero order stats (num_utts x K).
+          F: Normalized first order stats (num_utts x K*x_dim).
+          G: Log-likelihood of the stats given the UBM (num_utts,).
+          return_cov: If True, it returns the posterior covariances.
+          return_elbo: If True, it returns the log-likelihood of each utterance.
+          return_acc: If True, it returns the accumulators for the M-step.
+
+        Returns:
+          I-vectors (num_utts x y_dim).
+          Upper triangle of the posterior covariances (num_utts x y_dim*(y_dim+1)/2).
+          Log-likelihoods (num_utts,).
+          Accumulators Ry (K x y_dim*(y_dim+1)/2), Py (y_dim x y_dim).
+        """
         assert self.is_init
-        x_dim = int(F.shape[1]/self.K)
         M = F.shape[0]
         y_dim = self.y_dim
+        iu = self._upptr
         
         compute_inv = return_cov or return_acc
         return_tuple = compute_inv or return_elbo
 
         TF = np.dot(F, self.T.T)
-        L = self.compute_L(self.TT, N, self._upptr)
         y = np.zeros((M, y_dim), dtype=float_cpu())
             
         if return_cov:
-            Sy = np.zeros((M, y_dim*(y_dim+1)/2), dtype=float_cpu())
+            Sy = np.zeros((M, y_dim*(y_dim+1)//2), dtype=float_cpu())
         else:
             Sy = None
 
@@ -77,30 +171,34 @@ class JFATotal(PDF):
             
         if return_acc:
             Py = np.zeros((y_dim, y_dim), dtype=float_cpu())
-            Ry = np.zeros((self.K, y_dim*(y_dim+1)/2), dtype=float_cpu())
-
-        
-        Li = np.zeros((self.y_dim, self.y_dim), dtype=float_cpu())
-        for i in xrange(N.shape[0]):
-            Li[self._upptr] = L[i]
-            r = invert_pdmat(Li, right_inv=True,
-                             return_logdet=return_elbo,
-                             return_inv=compute_inv)
-            mult_iL = r[0]
+            Ry = np.zeros((self.K, y_dim*(y_dim+1)//2), dtype=float_cpu())
+
+        if self.num_clusters > 0:
+            cluster_idx, iL_c, logdet_c = self._cluster_N(N)
+
+        for i1 in xrange(0, M, self.batch_size):
+            i2 = min(i1 + self.batch_size, M)
+            if self.num_clusters > 0:
+                c = cluster_idx[i1:i2]
+                iL = iL_c[c]
+                logdet = logdet_c[c]
+                y_b = np.einsum('bij,bj->bi', iL, TF[i1:i2])
+            else:
+                L = self.compute_L(N[i1:i2])
+                y_b, iL, logdet = self._solve_L(
+                    L, TF[i1:i2], compute_inv, return_elbo)
+
+            y[i1:i2] = y_b
             if return_elbo:
-                elbo[i] = - r[2]/2
-            if compute_inv:
-                iL = r[-1]
-
-            y[i] = mult_iL(TF[i])
+                elbo[i1:i2] = - logdet/2
 
             if return_cov:
-                Sy[i] = iL[self.__upptr]
+                Sy[i1:i2] = iL[:, iu[0], iu[1]]
 
             if return_acc:
-                iL += np.outer(y[i], y[i])
-                Py += iL
-                Ry += iL[self.__uppr]*N[i][:,None]
+                iL += y_b[:, :, None]*y_b[:, None, :]
+                Py += np.sum(iL, axis=0)
+                Ry += np.dot(N[i1:i2].T, iL[:, iu[0], iu[1]])
             
         if not return_tuple:
             return y
@@ -113,7 +211,7 @@ class JFATotal(PDF):
         if return_elbo:
             if G is not None:
                 elbo += G
-            elbo += 0.5*np.sum(VF*y, axis=-1)
+            elbo += 0.5*np.sum(TF*y, axis=-1)
             r += [elbo]
 
         if return_acc:
@@ -123,30 +221,46 @@ class JFATotal(PDF):
     
 
         
-    def Estep(self, N, F, G=None):
-        
+    def _Estep_block(self, N, F, G=None):
         y, elbo, Ry, Py = self.compute_py_g_x(
             N, F, G, return_elbo=True, return_acc=True)
 
         M = y.shape[0]
         y_acc = np.sum(y, axis=0)
-        Cy = np.dot(F, y)
+        Cy = np.dot(F.T, y)
         
         elbo = np.sum(elbo)
 
         stats = (elbo, M,  y_acc, Ry, Cy, Py)
         return stats
+
+
+
+    def Estep(self, N, F, G=None):
+        M = N.shape[0]
+        if self.num_workers <= 1 or M <= self.batch_size:
+            return self._Estep_block(N, F, G)
+
+        # several blocks per worker to balance the load
+        block_size = max(self.batch_size,
+                         int(np.ceil(M/(4*self.num_workers))))
+        blocks = [(i1, min(i1 + block_size, M))
+                  for i1 in xrange(0, M, block_size)]
+        # the workers are forked, so they inherit the stats without copying them
+        estep_block = lambda b: self._Estep_block(
+            N[b[0]:b[1]], F[b[0]:b[1]], None if G is None else G[b[0]:b[1]])
+        return sum_reduce(fork_map(estep_block, blocks, self.num_workers,
+                                   ordered=False))
         
 
 
     def MstepML(self, stats):
         _, M, y_acc, Ry, Cy, _ = stats
         T = np.zeros_like(self.T)
-        Ryk = np.zeros((self.y_dim, self.y_dim), dtype=float_cpu())
-        x_dim = T.shape[1]/self.K
+        x_dim = int(T.shape[1]/self.K)
         for k in xrange(self.K):
             idx = k*x_dim
-            Ryk[self._upptr] = Ry[k]
+            Ryk = vec2symmat(Ry[k])
             iRyk_mult = invert_pdmat(Ryk, right_inv=False)[0]
             T[:, idx:idx+x_dim] = iRyk_mult(Cy[idx:idx+x_dim].T)
 
@@ -158,8 +272,8 @@ class JFATotal(PDF):
     def MstepMD(self, stats):
         _, M, y_acc, Ry, Cy, Py = stats
         mu_y = y_acc/M
-        Cy = Py/M - np.outer(my_y, mu_y)
-        chol_Cy = la.cholesky(Cy, lower=False, overwrite_a=True)
+        Cy = Py/M - np.outer(mu_y, mu_y)
+        chol_Cy = sla.cholesky(Cy, lower=False, overwrite_a=True)
         self.T = np.dot(chol_Cy , self.T)
         
         self.reset_aux()
@@ -181,8 +295,9 @@ class JFATotal(PDF):
             stats = self.Estep(N, F, G)
             elbo[epoch] = stats[0]
             if N_val is not None and F_val is not None:
-                _, elbo_val_e=self.compute_py_x(N, F, G, return_elbo=True)
-                elbo_val[epoch]=np.sum(elbo_val_e)
+                _, elbo_val_e = self.compute_py_g_x(N_val, F_val, return_elbo=True)
+                elbo_val[epoch] = np.sum(elbo_val_e)
+            logging.info('epoch: %d elbo: %f' % (epoch, elbo[epoch]))
 
             if use_ml:
                 self.MstepML(stats)
@@ -190,7 +305,7 @@ class JFATotal(PDF):
                 self.MstepMD(stats)
 
         elbo_norm= elbo/np.sum(N)
-        if x_val is None:
+        if N_val is None:
             return elbo, elbo_norm
         else:
             elbo_val_norm = elbo_val/np.sum(N_val)
@@ -201,40 +316,32 @@ class JFATotal(PDF):
     @property
     def TT(self):
         if self._TT is None:
-            self._TT = self.compute_TT(self.T, self.K)
+            self._TT = self.compute_TT(self.T, self.K, self._upptr)
         return self._TT
 
     
     @property
     def _upptr(self):
         if self.__upptr is None:
-            I = np.eye(self.y_dim, dtype=float_cpu())
-            self.__upptr = np.triu(I).ravel()
+            self.__upptr = np.triu_indices(self.y_dim)
         return self.__upptr
 
 
     
     @staticmethod
-    def compute_TT(self, T, K, upptr):
+    def compute_TT(T, K, upptr):
         x_dim = int(T.shape[1]/K)
         y_dim = T.shape[0]
-        TT = np.zeros((K, y_dim*(y_dim+1)/2), dtype=float_cpu())
+        TT = np.zeros((K, y_dim*(y_dim+1)//2), dtype=float_cpu())
         for k in xrange(K):
             idx = k*x_dim
             T_k = T[:,idx:idx+x_dim]
             TT_k = np.dot(T_k, T_k.T)
-            TT[k] = TT_k[self._upptr]
+            TT[k] = TT_k[upptr]
                       
         return TT
 
 
-    
-    @staticmethod
-    def compute_L(TT, N, upptr):
-        y_dim = self._upptr.shape[0]
-        I = np.eye(y_dim, dtype=float_cpu())[self._upptr]
-        return I+np.dot(N, TT)
-
 
     @staticmethod
     def normalize_T(T, chol_prec):
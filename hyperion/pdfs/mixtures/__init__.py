@@ -9,5 +9,6 @@ from .exp_family_mixture import ExpFamilyMixture
 from .gmm_diag_cov import GMMDiagCov, DiagGMM
 from .gmm_tied_diag_cov import GMMTiedDiagCov, DiagGMMTiedCov 
 from .gmm import GMM
+from .gaussian_selector import GaussianSelector
 
 
@@ -159,6 +159,33 @@ class ExpFamilyMixture(PDF):
 
 
     
+    def compute_pz_nbest(self, x, u_x=None, nbest=20):
+        """Computes the posteriors of the nbest components of each sample,
+           the posteriors are renormalized to sum to one over the
+           selected components.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+          u_x: Sufficient statistics of x, computed if None.
+          nbest: Number of components selected per sample.
+
+        Returns:
+          Posteriors of the selected components (num_samples x nbest).
+          Indices of the selected components (num_samples x nbest).
+        """
+        if u_x is None:
+            u_x = self.compute_suff_stats(x)
+        logr = np.dot(u_x, self.eta.T) - self.A + self.log_pi
+        nbest = min(nbest, self.num_comp)
+        if nbest < self.num_comp:
+            index = np.argpartition(-logr, nbest-1, axis=1)[:, :nbest]
+        else:
+            index = np.tile(np.arange(self.num_comp), (logr.shape[0], 1))
+        logr = np.take_along_axis(logr, index, axis=1)
+        return softmax(logr), index
+
+
+
     def compute_pz_std(self, x):
         return self.compute_pz_nat(x)
 
@@ -209,30 +236,63 @@ class ExpFamilyMixture(PDF):
 
 
     
+    @staticmethod
+    def _accum_segment_sums(acc, a, start, end, offset):
+        """Adds to acc[i] the sum of the rows of a inside segment i.
+
+        Args:
+          acc: Accumulators (num_segments x ...).
+          a: Values of the frames [offset, offset+len(a)).
+          start: First frame of the segments.
+          end: Last frame + 1 of the segments.
+          offset: Index of the first frame of a.
+        """
+        n = a.shape[0]
+        s = np.clip(start - offset, 0, n)
+        e = np.clip(end - offset, 0, n)
+        idx = (e > s).nonzero()[0]
+        if len(idx) == 0:
+            return
+        # reduceat over the (start, end) pairs, the even entries are the
+        # segment sums, a zero row is appended for segments ending at the last frame
+        a_pad = np.concatenate((a, np.zeros((1,) + a.shape[1:], dtype=a.dtype)))
+        acc[idx] += np.add.reduceat(
+            a_pad, np.stack((s[idx], e[idx]), axis=1).ravel(), axis=0)[::2]
+
+
+
     def accum_suff_stats_segments(self, x, segments, u_x=None, sample_weight=None, batch_size=None):
-        K = self.num_comp
+        if u_x is None:
+            u_x = self.compute_suff_stats(x)
+        if batch_size is None:
+            batch_size = x.shape[0]
+
+        segments = np.asarray(segments, dtype=int).reshape(-1, 2)
+        start = segments[:, 0]
+        end = segments[:, 1] + 1
         num_segments = len(segments)
-        N = np.zeros((num_segments, K), dtype=float_cpu())
-        acc_u_x = np.zeros((num_segments, K, self.eta.shape[1]), dtype=float_cpu())
-        u_x_i = None
-        sw_i = None
-        for i in xrange(num_segments):
-            start = int(segments[i][0])
-            end = int(segments[i][1])+1
-            x_i = x[start:end]
-            if u_x is not None:
-                u_x_i = u_x[start:end]
+        N = np.zeros((num_segments, self.num_comp), dtype=float_cpu())
+        acc_u_x = np.zeros((num_segments, self.num_comp, u_x.shape[1]), dtype=float_cpu())
+
+        # the posteriors of each batch are computed once, segments can
+        # overlap, the outer products z u_x' are computed for batch_size/x_dim
+        # frames at once, so they take as much memory as the posteriors
+        outer_size = max(1, batch_size // u_x.shape[1])
+        for i1 in xrange(0, x.shape[0], batch_size):
+            i2 = min(i1 + batch_size, x.shape[0])
+            z = self.compute_pz_nat(x[i1:i2], u_x[i1:i2])
             if sample_weight is not None:
-                sw_i = sample_weight[start:end]
-            N_i, acc_u_x_i = self.accum_suff_stats(
-                x_i, u_x=u_x_i, sample_weight=sw_i, batch_size=batch_size)
-            N[i] = N_i
-            acc_u_x[i] = acc_u_x_i
+                z *= sample_weight[i1:i2, None]
+            self._accum_segment_sums(N, z, start, end, i1)
+            for j1 in xrange(i1, i2, outer_size):
+                j2 = min(j1 + outer_size, i2)
+                zu = z[j1-i1:j2-i1, :, None]*u_x[j1:j2, None, :]
+                self._accum_segment_sums(acc_u_x, zu, start, end, j1)
 
         return N, acc_u_x
 
 
-    
+
     def accum_suff_stats_segments_prob(self, x, prob, u_x=None, sample_weight=None, batch_size=None):
         if u_x is not None or batch_size is None:
             return self._accum_suff_stats_segments_prob_1batch(
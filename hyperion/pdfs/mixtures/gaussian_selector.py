@@ -0,0 +1,250 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+import time
+
+import numpy as np
+
+from ...hyp_defs import float_cpu
+from ...utils.math import softmax, logsumexp
+from ...clustering import KMeans
+from .gmm_diag_cov import GMMDiagCov
+
+
+class GaussianSelector(object):
+    """Gaussian selection to compute approximate posteriors
+       of mixture models with many components.
+
+       The components of the model are clustered with k-means on their means,
+       each cluster is represented by a Gaussian of a coarse diagonal
+       covariance GMM obtained by moment matching of its components.
+       For each frame, the coarse GMM selects the num_sel_clusters best
+       clusters and only the components of those clusters are evaluated
+       with the full model, with one matrix product per cluster.
+
+    Attributes:
+      model: Mixture model (GMMDiagCov, GMMTiedDiagCov, GMM).
+      num_clusters: Number of clusters of components.
+      num_sel_clusters: Number of clusters selected per frame.
+      nbest: Default number of components returned per frame.
+      rng_seed: Seed of the k-means initialization.
+      coarse: Coarse GMMDiagCov with one component per cluster.
+      comp_index: Components sorted by cluster.
+      cluster_offsets: Offsets of the clusters in comp_index.
+      cluster_table: Components of each cluster (num_clusters x max_cluster_size),
+                     padded with the first component of the cluster.
+    """
+
+    def __init__(self, model, num_clusters=64, num_sel_clusters=4, nbest=20,
+                 rng_seed=1024):
+        self.model = model
+        self.num_clusters = num_clusters
+        self.num_sel_clusters = num_sel_clusters
+        self.nbest = nbest
+        self.rng_seed = rng_seed
+        self._build()
+
+
+
+    def _build(self):
+        model = self.model
+        num_clusters = min(self.num_clusters, model.num_comp)
+        mu = model.mu
+        var = model.Sigma
+        if var.ndim == 3:
+            var = np.diagonal(var, axis1=1, axis2=2)
+        var = np.broadcast_to(var, mu.shape)
+
+        kmeans = KMeans(num_clusters, rng_seed=self.rng_seed)
+        _, cluster_idx = kmeans.fit(mu)
+        # k-means can leave empty clusters
+        _, cluster_idx = np.unique(cluster_idx, return_inverse=True)
+        num_clusters = np.max(cluster_idx) + 1
+
+        self.comp_index = np.argsort(cluster_idx, kind='stable')
+        cluster_size = np.bincount(cluster_idx, minlength=num_clusters)
+        self.cluster_offsets = np.concatenate(([0], np.cumsum(cluster_size)))
+        # components of each cluster padded with its first component
+        pos = np.arange(model.num_comp) - self.cluster_offsets[cluster_idx[self.comp_index]]
+        self.cluster_table = np.repeat(
+            self.comp_index[self.cluster_offsets[:-1]][:, None], np.max(cluster_size), axis=1)
+        self.cluster_table[cluster_idx[self.comp_index], pos] = self.comp_index
+
+        # moment matching of the components of each cluster
+        pi = model.pi
+        pi_c = np.bincount(cluster_idx, weights=pi, minlength=num_clusters)
+        w = (pi/pi_c[cluster_idx])[:, None]
+        mu_c = np.zeros((num_clusters, mu.shape[1]), dtype=float_cpu())
+        m2_c = np.zeros((num_clusters, mu.shape[1]), dtype=float_cpu())
+        np.add.at(mu_c, cluster_idx, w*mu)
+        np.add.at(m2_c, cluster_idx, w*(var + mu*mu))
+        var_c = np.maximum(m2_c - mu_c*mu_c, 1e-5)
+        self.coarse = GMMDiagCov(pi=pi_c, mu=mu_c, Lambda=1/var_c, x_dim=mu.shape[1])
+
+
+
+    @property
+    def cluster_size(self):
+        return np.diff(self.cluster_offsets)
+
+
+
+    def _select_clusters(self, x):
+        _, sel = self.coarse.compute_pz_nbest(x, nbest=self.num_sel_clusters)
+        return sel
+
+
+
+    def compute_log_pz_sel(self, x, u_x=None):
+        """Computes the unnormalized log-posteriors of the components
+           of the clusters selected for each frame.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+          u_x: Sufficient statistics of x w.r.t. the full model.
+
+        Returns:
+          Log-posteriors (num_samples x num_sel_clusters*max_cluster_size),
+          the unused entries are -inf.
+          Component indices of the log-posteriors.
+        """
+        model = self.model
+        if u_x is None:
+            u_x = model.compute_suff_stats(x)
+        sel = self._select_clusters(x)
+        max_size = self.cluster_table.shape[1]
+        index = self.cluster_table[sel].reshape(x.shape[0], -1)
+        logr = np.full(index.shape, -np.inf, dtype=float_cpu())
+        for c in xrange(self.cluster_table.shape[0]):
+            frames, ranks = np.nonzero(sel == c)
+            if len(frames) == 0:
+                continue
+            comps = self.comp_index[self.cluster_offsets[c]:self.cluster_offsets[c+1]]
+            logr_c = (np.dot(u_x[frames], model.eta[comps].T) -
+                      model.A[comps] + model.log_pi[comps])
+            for r in np.unique(ranks):
+                mask = ranks == r
+                first = r*max_size
+                logr[frames[mask], first:first+len(comps)] = logr_c[mask]
+
+        return logr, index
+
+
+
+    def compute_pz_nbest(self, x, u_x=None, nbest=None):
+        """Computes the posteriors of the nbest components of each frame
+           among the selected ones, the posteriors are renormalized
+           to sum to one over the returned components.
+           If a frame has less than nbest candidates, the remaining
+           entries have zero posterior.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+          u_x: Sufficient statistics of x w.r.t. the full model.
+          nbest: Number of components per frame, if None, it uses self.nbest.
+
+        Returns:
+          Posteriors of the selected components (num_samples x nbest).
+          Indices of the selected components (num_samples x nbest).
+        """
+        if nbest is None:
+            nbest = self.nbest
+        logr, index = self.compute_log_pz_sel(x, u_x)
+        if nbest < logr.shape[1]:
+            best = np.argpartition(-logr, nbest-1, axis=1)[:, :nbest]
+            logr = np.take_along_axis(logr, best, axis=1)
+            index = np.take_along_axis(index, best, axis=1)
+        return softmax(logr), index
+
+
+
+    def log_prob(self, x, u_x=None):
+        """Approximates the log-likelihood of the full model
+           with the selected components.
+        """
+        logr, _ = self.compute_log_pz_sel(x, u_x)
+        return self.model.log_h(x) + logsumexp(logr)
+
+
+
+    def evaluate(self, x, nbest=None):
+        """Compares the selected posteriors with the posteriors
+           of the full model.
+
+        Args:
+          x: Data samples (num_samples x x_dim).
+          nbest: Number of components per frame, if None, it uses self.nbest.
+
+        Returns:
+          Dictionary with:
+            post_mass: Mean posterior mass of the full model
+                       in the selected components.
+            post_err: Mean L1 distance between the full and selected posteriors.
+            top1_acc: Fraction of frames where the best component is selected.
+            time_full, time_sel: Time to compute full and selected posteriors.
+            speedup: time_full/time_sel.
+        """
+        u_x = self.model.compute_suff_stats(x)
+        t1 = time.time()
+        z_full = self.model.compute_pz_nat(x, u_x)
+        time_full = time.time() - t1
+        t1 = time.time()
+        z, index = self.compute_pz_nbest(x, u_x, nbest)
+        time_sel = time.time() - t1
+
+        num_samples = x.shape[0]
+        # repeated indices always have zero posterior
+        valid = z > 0
+        post_mass = np.sum(np.take_along_axis(z_full, index, axis=1)*valid)/num_samples
+        z_dense = np.zeros_like(z_full)
+        rows = np.repeat(np.arange(num_samples), index.shape[1])
+        np.add.at(z_dense, (rows, index.ravel()), z.ravel())
+        post_err = np.sum(np.abs(z_full - z_dense))/num_samples
+        top1 = index[np.arange(num_samples), np.argmax(z, axis=1)]
+        top1_acc = np.mean(top1 == np.argmax(z_full, axis=1))
+
+        r = {'post_mass': post_mass, 'post_err': post_err, 'top1_acc': top1_acc,
+             'time_full': time_full, 'time_sel': time_sel,
+             'speedup': time_full/max(time_sel, 1e-10)}
+        logging.info('gaussian selection post-mass=%.4f post-err=%.4f top1-acc=%.4f '
+                     'time-full=%.3f s time-sel=%.3f s speedup=%.2f' % (
+                         post_mass, post_err, top1_acc, time_full, time_sel, r['speedup']))
+        return r
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('num_clusters', 'num_sel_clusters', 'nbest')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'num-clusters', dest=(p2+'num_clusters'),
+                            default=64, type=int,
+                            help=('number of clusters of gaussian components'))
+        parser.add_argument(p1+'num-sel-clusters', dest=(p2+'num_sel_clusters'),
+                            default=4, type=int,
+                            help=('number of clusters selected per frame'))
+        parser.add_argument(p1+'nbest', dest=(p2+'nbest'),
+                            default=20, type=int,
+                            help=('number of components per frame'))
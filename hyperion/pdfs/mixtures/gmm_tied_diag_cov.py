@@ -99,6 +99,7 @@ class GMMTiedDiagCov(GMMDiagCov):
                 mu[N0] = 0
                 S[N0] = 1
             self.pi = N/np.sum(N)
+            self._log_pi = None
             
         self._compute_nat_params()
         
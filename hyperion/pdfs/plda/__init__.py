@@ -8,6 +8,7 @@ from .plda_base import PLDABase
 from .frplda import FRPLDA
 from .splda import SPLDA
 from .plda import PLDA
+from .plda_scoring_state import PLDAScoringState
 
 
 
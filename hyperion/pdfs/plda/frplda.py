@@ -263,8 +263,15 @@ class FRPLDA(PLDABase):
 
 
 
-    def llr_1vs1(self, x1, x2):
-
+    def compute_llr_1vs1_consts(self):
+        """Computes the terms of the 1vs1 LLR that only depend on the model.
+
+        Returns:
+          Function that multiplies by the inverse of chol(B + W).
+          Function that multiplies by the inverse of chol(B + 2W).
+          Constant term of the LLR.
+          Matrix W used to project the vectors.
+        """
         assert self.is_init
         
         Lnon = self.B + self.W
@@ -279,29 +286,48 @@ class FRPLDA(PLDABase):
             right_inv=True, return_logdet=True)[:2]
         logLtar = 2*logcholLtar
 
-        WF1 = np.dot(x1, self.W)
-        WF2 = np.dot(x2, self.W)
-        Bmu = np.dot(self.mu, self.B)
+        const = (2*logLnon-logLtar
+                 -logdet_pdmat(self.B)
+                 +np.inner(np.dot(self.mu, self.B), self.mu))
+        return mult_icholLnon, mult_icholLtar, const, self.W
 
-        gamma_non_1 = mult_icholLnon(WF1+Bmu)
-        gamma_non_2 = mult_icholLnon(WF2+Bmu)
 
-        Qnon_1 = np.sum(gamma_non_1*gamma_non_1, axis=1)[:, None]
-        Qnon_2 = np.sum(gamma_non_2*gamma_non_2, axis=1)
+    
+    def project_llr_1vs1(self, x, consts=None):
+        """Projects vectors to the space where the 1vs1 LLR
+           becomes a dot product.
+
+        Args:
+          x: input vectors (num_vectors x x_dim).
+          consts: Output of compute_llr_1vs1_consts, if None it is computed.
+
+        Returns:
+          gamma_tar (num_vectors x y_dim).
+          Q_tar - Q_non (num_vectors,).
+        """
+        assert self.is_init
+        if consts is None:
+            consts = self.compute_llr_1vs1_consts()
+        mult_icholLnon, mult_icholLtar = consts[:2]
+        W = consts[3]
 
-        gamma_tar_1 = mult_icholLtar(WF1+0.5*Bmu)
-        gamma_tar_2 = mult_icholLtar(WF2+0.5*Bmu)
+        WF = np.dot(x, W)
+        Bmu = np.dot(self.mu, self.B)
+        gamma_non = mult_icholLnon(WF+Bmu)
+        gamma_tar = mult_icholLtar(WF+0.5*Bmu)
+        Q = (np.sum(gamma_tar*gamma_tar, axis=1) -
+             np.sum(gamma_non*gamma_non, axis=1))
+        return gamma_tar, Q
 
-        Qtar_1 = np.sum(gamma_tar_1*gamma_tar_1, axis=1)[:, None]
-        Qtar_2 = np.sum(gamma_tar_2*gamma_tar_2, axis=1)
+    
 
-        scores = 2*np.dot(gamma_tar_1, gamma_tar_2.T)
-        scores += (Qtar_1-Qnon_1+Qtar_2-Qnon_2)
-        scores += (2*logLnon-logLtar
-                   -logdet_pdmat(self.B)
-                   +np.inner(np.dot(self.mu, self.B), self.mu))
-        scores *= 0.5
-        return scores
+    def llr_1vs1(self, x1, x2):
+
+        consts = self.compute_llr_1vs1_consts()
+        gamma_tar_1, Q_1 = self.project_llr_1vs1(x1, consts)
+        gamma_tar_2, Q_2 = self.project_llr_1vs1(x2, consts)
+        return self.llr_1vs1_from_proj(
+            gamma_tar_1, Q_1, gamma_tar_2, Q_2, consts[2])
                 
 
     
@@ -25,9 +25,18 @@ class PLDABase(PDF):
         self.update_mu = update_mu
         if mu is not None:
             self.x_dim = mu.shape[0]
+        self._lnorm = None
 
 
             
+    @property
+    def lnorm(self):
+        if self._lnorm is None:
+            self._lnorm = LNorm()
+        return self._lnorm
+
+
+    
     @abstractmethod
     def initialize(self, D):
         pass
@@ -107,6 +116,54 @@ class PLDABase(PDF):
     def llr_1vs1(self, x1, x2):
         pass
 
+
+    @abstractmethod
+    def compute_llr_1vs1_consts(self):
+        pass
+
+
+    @abstractmethod
+    def project_llr_1vs1(self, x, consts=None):
+        pass
+
+    
+
+    @staticmethod
+    def llr_1vs1_from_proj(gamma_tar_1, Q_1, gamma_tar_2, Q_2, const):
+        """Computes the 1vs1 LLR matrix from projected vectors.
+
+        Args:
+          gamma_tar_1: projected enrollment vectors (num_vectors1 x y_dim).
+          Q_1: Q_tar - Q_non of enrollment vectors (num_vectors1,).
+          gamma_tar_2: projected test vectors (num_vectors2 x y_dim).
+          Q_2: Q_tar - Q_non of test vectors (num_vectors2,).
+          const: Constant term of the LLR.
+
+        Returns:
+          Score matrix (num_vectors1 x num_vectors2).
+        """
+        scores = 2*np.dot(gamma_tar_1, gamma_tar_2.T)
+        scores += Q_1[:, None]
+        scores += Q_2 + const
+        scores *= 0.5
+        return scores
+
+
+
+    @staticmethod
+    def llr_1vs1_trials_from_proj(gamma_tar_1, Q_1, gamma_tar_2, Q_2, const):
+        """Computes the 1vs1 LLR of a list of trials from projected vectors,
+           the i-th trial compares the i-th row of gamma_tar_1 with 
+           the i-th row of gamma_tar_2.
+
+        Returns:
+          Score vector (num_trials,).
+        """
+        scores = 2*np.sum(gamma_tar_1*gamma_tar_2, axis=1)
+        scores += Q_1 + Q_2 + const
+        scores *= 0.5
+        return scores
+
     
     @abstractmethod
     def llr_NvsM_book(self, D1, D2):
@@ -270,9 +327,8 @@ class PLDABase(PDF):
         x1=D1[1]/np.expand_dims(D1[0], axis=-1)
         x2=D2[1]/np.expand_dims(D2[0], axis=-1)
         if do_lnorm:
-            lnorm=LNorm()
-            x1=lnorm.predict(x1)
-            x2=lnorm.predict(x2)
+            x1=self.lnorm.predict(x1)
+            x2=self.lnorm.predict(x2)
 
         return self.llr_1vs1(x1, x2)
 
@@ -307,9 +363,8 @@ class PLDABase(PDF):
     def llr_Nvs1_vavg(self, D1, x2, do_lnorm=True):
         x1=D1[1]/np.expand_dims(D1[0], axis=-1)
         if do_lnorm:
-            lnorm=LNorm()
-            x1=lnorm.predict(x1)
-            x2=lnorm.predict(x2)
+            x1=self.lnorm.predict(x1)
+            x2=self.lnorm.predict(x2)
 
         return self.llr_1vs1(x1, x2)
 
@@ -0,0 +1,175 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ...hyp_defs import float_cpu
+
+
+class PLDAScoringState(object):
+    """Keeps the terms of the PLDA 1vs1 LLR that only depend on the model
+       (Cholesky factors and log-determinants) and a LRU cache of
+       projected enrollment vectors indexed by model id.
+       Once a model is in the cache, scoring it against N test vectors
+       costs a single matrix product.
+
+       The state needs to be reset if the PLDA parameters change.
+
+    Attributes:
+      model: PLDA, SPLDA or FRPLDA object.
+      cache_size: Maximum number of enrollment models in the cache.
+    """
+
+    def __init__(self, model, cache_size=10000):
+        self.model = model
+        self.cache_size = cache_size
+        self.consts = None
+        self._cache = OrderedDict()
+        self.reset()
+
+
+
+    def reset(self):
+        """Recomputes the model constants and empties the cache."""
+        self.consts = self.model.compute_llr_1vs1_consts()
+        self._cache.clear()
+
+
+
+    @property
+    def const(self):
+        return self.consts[2]
+
+
+
+    @property
+    def cache_len(self):
+        return len(self._cache)
+
+
+
+    def __contains__(self, model_id):
+        return model_id in self._cache
+
+
+
+    def project(self, x):
+        """Projects vectors using the precomputed model constants.
+
+        Returns:
+          gamma_tar (num_vectors x y_dim).
+          Q_tar - Q_non (num_vectors,).
+        """
+        return self.model.project_llr_1vs1(x, self.consts)
+
+
+
+    def add_enroll(self, model_ids, x):
+        """Projects enrollment vectors and adds them to the cache.
+
+        Args:
+          model_ids: List of model ids of the rows of x.
+          x: Enrollment vectors (num_models x x_dim).
+        """
+        gamma, Q = self.project(x)
+        self._add_to_cache(model_ids, gamma, Q)
+
+
+
+    def _add_to_cache(self, model_ids, gamma, Q):
+        # copy the rows so the cache doesn't keep the whole batch alive
+        for i, model_id in enumerate(model_ids):
+            self._cache[model_id] = (gamma[i].copy(), Q[i].copy())
+            self._cache.move_to_end(model_id)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+
+    def get_enroll(self, model_ids):
+        """Gets projected enrollment vectors from the cache.
+
+        Args:
+          model_ids: List of model ids.
+
+        Returns:
+          gamma_tar (num_models x y_dim).
+          Q_tar - Q_non (num_models,).
+        """
+        gamma = []
+        Q = np.zeros((len(model_ids),), dtype=float_cpu())
+        for i, model_id in enumerate(model_ids):
+            gamma_i, Q[i] = self._cache[model_id]
+            self._cache.move_to_end(model_id)
+            gamma.append(gamma_i)
+        return np.vstack(gamma), Q
+
+
+
+    def llr_1vs1(self, x1, x2):
+        """Same as PLDA llr_1vs1 but using the precomputed constants."""
+        gamma_1, Q_1 = self.project(x1)
+        gamma_2, Q_2 = self.project(x2)
+        return self.model.llr_1vs1_from_proj(
+            gamma_1, Q_1, gamma_2, Q_2, self.const)
+
+
+
+    def llr_enroll_vs_test(self, model_ids, x_t, x_e=None):
+        """Scores enrollment models against test vectors,
+           the projections of the enrollment models are
+           taken from the cache when available.
+
+        Args:
+          model_ids: List of model ids.
+          x_t: Test vectors (num_tests x x_dim).
+          x_e: Enrollment vectors (num_models x x_dim), needed
+               only if some of the models are not in the cache.
+
+        Returns:
+          Score matrix (num_models x num_tests).
+        """
+        missing = np.array([model_id not in self._cache for model_id in model_ids], dtype=bool)
+        if np.any(missing):
+            assert x_e is not None, 'some models are not in the cache'
+            gamma_e = np.zeros((len(model_ids), self.model.y_dim), dtype=float_cpu())
+            Q_e = np.zeros((len(model_ids),), dtype=float_cpu())
+            idx = missing.nonzero()[0]
+            gamma_e[idx], Q_e[idx] = self.project(x_e[idx])
+            idx = np.logical_not(missing).nonzero()[0]
+            if len(idx) > 0:
+                gamma_e[idx], Q_e[idx] = self.get_enroll([model_ids[i] for i in idx])
+            idx = missing.nonzero()[0]
+            self._add_to_cache([model_ids[i] for i in idx], gamma_e[idx], Q_e[idx])
+        else:
+            gamma_e, Q_e = self.get_enroll(model_ids)
+
+        gamma_t, Q_t = self.project(x_t)
+        return self.model.llr_1vs1_from_proj(
+            gamma_e, Q_e, gamma_t, Q_t, self.const)
+
+
+
+    def llr_Nvs1_vavg(self, D1, x2, do_lnorm=True):
+        """Same as PLDA llr_Nvs1_vavg but using the precomputed constants."""
+        x1 = D1[1]/np.expand_dims(D1[0], axis=-1)
+        if do_lnorm:
+            x1 = self.model.lnorm.predict(x1)
+            x2 = self.model.lnorm.predict(x2)
+        return self.llr_1vs1(x1, x2)
+
+
+
+    def llr_NvsM_vavg(self, D1, D2, do_lnorm=True):
+        """Same as PLDA llr_NvsM_vavg but using the precomputed constants."""
+        x2 = D2[1]/np.expand_dims(D2[0], axis=-1)
+        return self.llr_Nvs1_vavg(D1, x2, do_lnorm)
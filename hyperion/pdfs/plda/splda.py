@@ -280,8 +280,15 @@ class SPLDA(PLDABase):
     
 
     
-    def llr_1vs1(self, x1, x2):
-
+    def compute_llr_1vs1_consts(self):
+        """Computes the terms of the 1vs1 LLR that only depend on the model.
+
+        Returns:
+          Function that multiplies by the inverse of chol(I + V'WV).
+          Function that multiplies by the inverse of chol(I + 2V'WV).
+          Constant term of the LLR.
+          Matrix WV' used to project the vectors.
+        """
         WV = np.dot(self.W, self.V.T)
         VV = np.dot(self.V, WV)
         I = np.eye(self.y_dim, dtype=float_cpu())
@@ -298,26 +305,43 @@ class SPLDA(PLDABase):
             right_inv=True, return_logdet=True)[:2]
         logLtar = 2*logcholLtar
 
-        VWF1 = np.dot(x1-self.mu, WV)
-        VWF2 = np.dot(x2-self.mu, WV)
+        return mult_icholLnon, mult_icholLtar, 2*logLnon-logLtar, WV
 
-        gamma_non_1 = mult_icholLnon(VWF1)
-        gamma_non_2 = mult_icholLnon(VWF2)
 
-        Qnon_1 = np.sum(gamma_non_1*gamma_non_1, axis=1)[:, None]
-        Qnon_2 = np.sum(gamma_non_2*gamma_non_2, axis=1)
+    
+    def project_llr_1vs1(self, x, consts=None):
+        """Projects vectors to the space where the 1vs1 LLR
+           becomes a dot product.
+
+        Args:
+          x: input vectors (num_vectors x x_dim).
+          consts: Output of compute_llr_1vs1_consts, if None it is computed.
+
+        Returns:
+          gamma_tar (num_vectors x y_dim).
+          Q_tar - Q_non (num_vectors,).
+        """
+        if consts is None:
+            consts = self.compute_llr_1vs1_consts()
+        mult_icholLnon, mult_icholLtar = consts[:2]
+        WV = consts[3]
+
+        VWF = np.dot(x-self.mu, WV)
+        gamma_non = mult_icholLnon(VWF)
+        gamma_tar = mult_icholLtar(VWF)
+        Q = (np.sum(gamma_tar*gamma_tar, axis=1) -
+             np.sum(gamma_non*gamma_non, axis=1))
+        return gamma_tar, Q
 
-        gamma_tar_1 = mult_icholLtar(VWF1)
-        gamma_tar_2 = mult_icholLtar(VWF2)
+    
 
-        Qtar_1 = np.sum(gamma_tar_1*gamma_tar_1, axis=1)[:, None]
-        Qtar_2 = np.sum(gamma_tar_2*gamma_tar_2, axis=1)
+    def llr_1vs1(self, x1, x2):
 
-        scores = 2*np.dot(gamma_tar_1, gamma_tar_2.T)
-        scores += (Qtar_1-Qnon_1+Qtar_2-Qnon_2)
-        scores += (2*logLnon-logLtar)
-        scores *= 0.5
-        return scores
+        consts = self.compute_llr_1vs1_consts()
+        gamma_tar_1, Q_1 = self.project_llr_1vs1(x1, consts)
+        gamma_tar_2, Q_2 = self.project_llr_1vs1(x2, consts)
+        return self.llr_1vs1_from_proj(
+            gamma_tar_1, Q_1, gamma_tar_2, Q_2, consts[2])
                 
             
     def llr_NvsM_book(self, D1, D2):
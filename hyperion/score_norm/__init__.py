@@ -10,5 +10,7 @@ from .zt_norm import ZTNorm
 from .tz_norm import TZNorm
 from .s_norm import SNorm
 from .adapt_s_norm import AdaptSNorm
+from .chunked_score_norm import ChunkedScoreNorm
+from .lazy_score_matrix import LazyScoreMatrix
 
 
@@ -0,0 +1,423 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import logging
+
+import numpy as np
+
+from ..hyp_defs import float_cpu
+from ..utils.trial_scores_writer import TrialScoresWriter
+from .score_norm import ScoreNorm
+from .lazy_score_matrix import LazyScoreMatrix
+
+
+class ChunkedScoreNorm(ScoreNorm):
+    """Score normalization engine that processes the score matrices
+       by chunks, so the cohort score matrices don't need to fit in memory.
+
+       Score matrices can be numpy arrays or any object that supports
+       slicing like h5py datasets or memory maps,
+       only chunk_size rows/columns are read at once.
+
+       Cohort statistics of the enrollment side (Z stats) are computed
+       once and cached, so they are reused when normalizing
+       several batches of test segments.
+       Statistics of the test side (T stats) are computed for each
+       chunk of test segments.
+
+       If nbest is not None, the statistics of each enrollment/test
+       are computed only with its nbest closest cohort
+       (adaptive normalization). The nbest cohort is
+       selected with np.argpartition instead of sorting.
+       Note that, as in Matejka et al. 2017, each side uses its own
+       nbest cohort, which makes the statistics cacheable,
+       while AdaptSNorm selects the cohort of one side using the
+       scores of the other side.
+
+    Attributes:
+      norm_type: Normalization type in
+                 ['t-norm', 'z-norm', 'zt-norm', 'tz-norm', 's-norm'].
+      nbest: Number of cohort scores used to compute the statistics,
+             if None it uses all the cohort.
+      nbest_discard: Number of top cohort scores discarded before
+                     selecting the nbest.
+      chunk_size: Number of models/test segments processed at once.
+      std_floor: Minimum standard deviation.
+    """
+    valid_norm_types = ['t-norm', 'z-norm', 'zt-norm', 'tz-norm', 's-norm']
+
+    def __init__(self, norm_type='s-norm', nbest=None, nbest_discard=0,
+                 chunk_size=1000, **kwargs):
+        super(ChunkedScoreNorm, self).__init__(**kwargs)
+        assert norm_type in self.valid_norm_types, (
+            'wrong norm_type %s' % norm_type)
+        self.norm_type = norm_type
+        self.nbest = nbest
+        self.nbest_discard = nbest_discard
+        self.chunk_size = chunk_size
+        self.reset()
+
+
+
+    def reset(self):
+        """Clears the cached cohort statistics."""
+        self.z_stats = None
+        self.z_stats_coh = None
+        self.t_stats_coh = None
+
+
+
+    @property
+    def use_z(self):
+        return self.norm_type in ['z-norm', 'zt-norm', 'tz-norm', 's-norm']
+
+
+
+    @property
+    def use_t(self):
+        return self.norm_type in ['t-norm', 'zt-norm', 'tz-norm', 's-norm']
+
+
+
+    def _select_nbest(self, scores, mask):
+        num_coh = scores.shape[1]
+        assert self.nbest_discard < num_coh
+        nbest = min(self.nbest, num_coh - self.nbest_discard)
+        k = self.nbest_discard + nbest
+
+        if mask is None:
+            scores_sel = scores
+        else:
+            scores_sel = np.where(mask, scores, -np.inf)
+
+        if k < num_coh:
+            idx = np.argpartition(-scores_sel, k-1, axis=1)[:, :k]
+        else:
+            idx = np.tile(np.arange(num_coh), (scores.shape[0], 1))
+
+        if self.nbest_discard > 0:
+            top_scores = np.take_along_axis(scores_sel, idx, axis=1)
+            idx_nbest = np.argpartition(
+                -top_scores, self.nbest_discard-1, axis=1)[:, self.nbest_discard:]
+            idx = np.take_along_axis(idx, idx_nbest, axis=1)
+
+        scores = np.take_along_axis(scores, idx, axis=1)
+        if mask is not None:
+            mask = np.take_along_axis(mask, idx, axis=1)
+        return scores, mask
+
+
+
+    def _chunk_stats(self, scores, mask):
+        # scores: num_rows x num_coh
+        if self.nbest is not None:
+            scores, mask = self._select_nbest(scores, mask)
+
+        if mask is None:
+            mu = np.mean(scores, axis=1)
+            s = np.std(scores, axis=1)
+        else:
+            mask = mask.astype(float_cpu())
+            n = np.maximum(np.sum(mask, axis=1), 1)
+            mu = np.sum(scores*mask, axis=1)/n
+            s = np.sqrt(np.maximum(
+                np.sum(scores**2*mask, axis=1)/n - mu**2, 0))
+
+        s[s < self.std_floor] = self.std_floor
+        return mu, s
+
+
+
+    def compute_stats(self, scores, axis, mask=None, norm_stats=None):
+        """Computes the cohort statistics by chunks.
+
+        Args:
+          scores: Cohort score matrix.
+          axis: Axis of the cohort,
+                1 for enrollment vs cohort scores (Z stats),
+                0 for cohort vs test scores (T stats).
+          mask: Mask of the valid cohort scores.
+          norm_stats: Optional mean and std. vectors (with the size of the cohort)
+                      used to normalize the cohort scores before
+                      computing the statistics (needed for ZT and TZ norm).
+
+        Returns:
+          Mean vector.
+          Standard deviation vector.
+        """
+        num_rows = scores.shape[1-axis]
+        mu = np.zeros((num_rows,), dtype=float_cpu())
+        s = np.zeros((num_rows,), dtype=float_cpu())
+        for i in xrange(0, num_rows, self.chunk_size):
+            i_end = min(i + self.chunk_size, num_rows)
+            if axis == 1:
+                scores_i = np.asarray(scores[i:i_end], dtype=float_cpu())
+                mask_i = None if mask is None else np.asarray(mask[i:i_end], dtype=bool)
+            else:
+                scores_i = np.asarray(scores[:, i:i_end], dtype=float_cpu()).T
+                mask_i = None if mask is None else np.asarray(mask[:, i:i_end], dtype=bool).T
+
+            if norm_stats is not None:
+                scores_i = (scores_i - norm_stats[0])/norm_stats[1]
+
+            mu[i:i_end], s[i:i_end] = self._chunk_stats(scores_i, mask_i)
+
+        return mu, s
+
+
+
+    def compute_z_stats(self, scores_enr_coh, mask_enr_coh=None,
+                        scores_coh_coh=None, mask_coh_coh=None):
+        """Computes and caches the enrollment side statistics.
+
+        Args:
+          scores_enr_coh: Enrollment vs cohort scores (num_enroll x num_coh).
+          mask_enr_coh: Mask of the valid enrollment vs cohort scores.
+          scores_coh_coh: Cohort vs cohort scores (num_coh x num_coh),
+                          needed for ZT and TZ norm.
+          mask_coh_coh: Mask of the valid cohort vs cohort scores.
+        """
+        if self.norm_type == 'tz-norm':
+            assert scores_coh_coh is not None
+            self.t_stats_coh = self.compute_stats(scores_coh_coh, 0, mask_coh_coh)
+            self.z_stats = self.compute_stats(
+                scores_enr_coh, 1, mask_enr_coh, self.t_stats_coh)
+            return
+
+        self.z_stats = self.compute_stats(scores_enr_coh, 1, mask_enr_coh)
+        if self.norm_type == 'zt-norm':
+            assert scores_coh_coh is not None
+            self.z_stats_coh = self.compute_stats(scores_coh_coh, 1, mask_coh_coh)
+
+
+
+    def compute_t_stats(self, scores_coh_test, mask_coh_test=None):
+        """Computes the test side statistics.
+
+        Args:
+          scores_coh_test: Cohort vs test scores (num_coh x num_test).
+          mask_coh_test: Mask of the valid cohort vs test scores.
+
+        Returns:
+          Mean vector.
+          Standard deviation vector.
+        """
+        norm_stats = self.z_stats_coh if self.norm_type == 'zt-norm' else None
+        return self.compute_stats(scores_coh_test, 0, mask_coh_test, norm_stats)
+
+
+
+    def _normalize(self, scores, z_stats, t_stats):
+        if self.use_z:
+            mu_z = z_stats[0][:, None]
+            s_z = z_stats[1][:, None]
+
+        if self.norm_type == 't-norm':
+            return (scores - t_stats[0])/t_stats[1]
+        if self.norm_type == 'z-norm':
+            return (scores - mu_z)/s_z
+        if self.norm_type == 'zt-norm':
+            return ((scores - mu_z)/s_z - t_stats[0])/t_stats[1]
+        if self.norm_type == 'tz-norm':
+            return ((scores - t_stats[0])/t_stats[1] - mu_z)/s_z
+
+        scores_z_norm = (scores - mu_z)/s_z
+        scores_t_norm = (scores - t_stats[0])/t_stats[1]
+        return (scores_z_norm + scores_t_norm)/np.sqrt(2)
+
+
+
+    def predict_blocks(self, scores, scores_coh_test=None,
+                       mask_coh_test=None, score_mask=None):
+        """Generator that normalizes the scores by chunks of test segments
+           using the cached Z stats.
+
+        Args:
+          scores: Enrollment vs test scores (num_enroll x num_test).
+          scores_coh_test: Cohort vs test scores (num_coh x num_test),
+                           needed if the norm. uses T stats.
+          mask_coh_test: Mask of the valid cohort vs test scores.
+          score_mask: Mask of the enrollment vs test trials.
+
+        Returns:
+          Index of the first test segment of the chunk.
+          Normalized scores of the chunk.
+          Score mask of the chunk (None if score_mask is None).
+        """
+        if self.use_z:
+            assert self.z_stats is not None, 'Z stats have not been computed'
+            assert self.z_stats[0].shape[0] == scores.shape[0]
+        if self.use_t:
+            assert scores_coh_test is not None
+            assert scores_coh_test.shape[1] == scores.shape[1]
+
+        num_tests = scores.shape[1]
+        t_stats = None
+        for j in xrange(0, num_tests, self.chunk_size):
+            j_end = min(j + self.chunk_size, num_tests)
+            if self.use_t:
+                t_stats = self.compute_t_stats(
+                    scores_coh_test[:, j:j_end],
+                    None if mask_coh_test is None else mask_coh_test[:, j:j_end])
+
+            scores_j = np.asarray(scores[:, j:j_end], dtype=float_cpu())
+            scores_j = self._normalize(scores_j, self.z_stats, t_stats)
+            if score_mask is None:
+                mask_j = None
+            else:
+                mask_j = np.asarray(score_mask[:, j:j_end], dtype=bool)
+                scores_j[np.logical_not(mask_j)] = 0
+            yield j, scores_j, mask_j
+
+
+
+    def predict(self, scores, scores_coh_test=None, scores_enr_coh=None,
+                scores_coh_coh=None, mask_coh_test=None, mask_enr_coh=None,
+                mask_coh_coh=None, score_mask=None):
+        """Normalizes the scores.
+
+        Args:
+          scores: Enrollment vs test scores (num_enroll x num_test).
+          scores_coh_test: Cohort vs test scores (num_coh x num_test).
+          scores_enr_coh: Enrollment vs cohort scores (num_enroll x num_coh),
+                          if None it uses the cached Z stats.
+          scores_coh_coh: Cohort vs cohort scores (num_coh x num_coh).
+          mask_*: Masks of the valid scores.
+
+        Returns:
+          Normalized score matrix (num_enroll x num_test).
+        """
+        if self.use_z and scores_enr_coh is not None:
+            self.compute_z_stats(scores_enr_coh, mask_enr_coh,
+                                 scores_coh_coh, mask_coh_coh)
+
+        scores_norm = np.zeros(scores.shape, dtype=float_cpu())
+        for j, scores_j, _ in self.predict_blocks(
+                scores, scores_coh_test, mask_coh_test, score_mask):
+            scores_norm[:, j:j+scores_j.shape[1]] = scores_j
+        return scores_norm
+
+
+
+    def predict_to_file(self, score_file, model_set, seg_set, scores,
+                        scores_coh_test=None, scores_enr_coh=None,
+                        scores_coh_coh=None, mask_coh_test=None, mask_enr_coh=None,
+                        mask_coh_coh=None, score_mask=None):
+        """Normalizes the scores and writes them by chunks to h5 file.
+
+        Args:
+          score_file: Output h5 score file.
+          model_set: Model names of the rows of scores.
+          seg_set: Segment names of the columns of scores.
+          Rest of args: Same as predict.
+        """
+        if self.use_z and scores_enr_coh is not None:
+            self.compute_z_stats(scores_enr_coh, mask_enr_coh,
+                                 scores_coh_coh, mask_coh_coh)
+
+        with TrialScoresWriter(score_file, model_set, seg_set) as w:
+            for j, scores_j, mask_j in self.predict_blocks(
+                    scores, scores_coh_test, mask_coh_test, score_mask):
+                w.write(0, j, scores_j, mask_j)
+                logging.debug('normalized test segments [%d,%d)'
+                              % (j, j + scores_j.shape[1]))
+
+
+
+    def _lazy_scores(self, scorer, x_e, x_t, x_coh, use_cached_z_stats):
+        scores = {'scores': LazyScoreMatrix(scorer, x_e, x_t)}
+        if self.use_t:
+            scores['scores_coh_test'] = LazyScoreMatrix(scorer, x_coh, x_t)
+        if self.use_z and not use_cached_z_stats:
+            scores['scores_enr_coh'] = LazyScoreMatrix(scorer, x_e, x_coh)
+            if self.norm_type in ['zt-norm', 'tz-norm']:
+                scores['scores_coh_coh'] = LazyScoreMatrix(scorer, x_coh, x_coh)
+        return scores
+
+
+
+    def predict_from_vectors(self, scorer, x_e, x_t, x_coh,
+                             score_mask=None, use_cached_z_stats=False):
+        """Computes the trial and cohort scores on the fly
+           and normalizes them. Cohort scores are computed by chunks
+           only when needed for the statistics.
+
+        Args:
+          scorer: Function scorer(x1, x2) that returns the score matrix
+                  (len(x1) x len(x2)), e.g., plda.llr_1vs1.
+          x_e: Enrollment vectors (num_enroll x x_dim).
+          x_t: Test vectors (num_test x x_dim).
+          x_coh: Cohort vectors (num_coh x x_dim).
+          score_mask: Mask of the enrollment vs test trials.
+          use_cached_z_stats: If True, it uses the Z stats computed
+                              in a previous call with the same enrollment.
+
+        Returns:
+          Normalized score matrix (num_enroll x num_test).
+        """
+        scores = self._lazy_scores(scorer, x_e, x_t, x_coh, use_cached_z_stats)
+        return self.predict(score_mask=score_mask, **scores)
+
+
+
+    def predict_from_vectors_to_file(self, score_file, model_set, seg_set,
+                                     scorer, x_e, x_t, x_coh,
+                                     score_mask=None, use_cached_z_stats=False):
+        """Same as predict_from_vectors but it writes the scores to h5 file
+           by chunks.
+
+        Args:
+          score_file: Output h5 score file.
+          model_set: Model names of the rows of x_e.
+          seg_set: Segment names of the rows of x_t.
+          Rest of args: Same as predict_from_vectors.
+        """
+        scores = self._lazy_scores(scorer, x_e, x_t, x_coh, use_cached_z_stats)
+        self.predict_to_file(score_file, model_set, seg_set,
+                             score_mask=score_mask, **scores)
+
+
+
+    @staticmethod
+    def filter_args(prefix=None, **kwargs):
+        if prefix is None:
+            p = ''
+        else:
+            p = prefix + '_'
+        valid_args = ('norm_type', 'nbest', 'nbest_discard', 'chunk_size', 'std_floor')
+        return dict((k, kwargs[p+k])
+                    for k in valid_args if p+k in kwargs)
+
+
+    @staticmethod
+    def add_argparse_args(parser, prefix=None):
+        if prefix is None:
+            p1 = '--'
+            p2 = ''
+        else:
+            p1 = '--' + prefix + '-'
+            p2 = prefix + '_'
+        parser.add_argument(p1+'norm-type', dest=(p2+'norm_type'),
+                            default='s-norm',
+                            choices=ChunkedScoreNorm.valid_norm_types,
+                            help=('score normalization type'))
+        parser.add_argument(p1+'adapt-coh', dest=(p2+'nbest'),
+                            default=None, type=int,
+                            help=('number of closest cohort scores used for '
+                                  'adaptive normalization, if None it uses all the cohort'))
+        parser.add_argument(p1+'adapt-coh-discard', dest=(p2+'nbest_discard'),
+                            default=0, type=int,
+                            help=('number of top cohort scores discarded '
+                                  'in adaptive normalization'))
+        parser.add_argument(p1+'chunk-size', dest=(p2+'chunk_size'),
+                            default=1000, type=int,
+                            help=('number of models/test segments normalized at once'))
+        parser.add_argument(p1+'std-floor', dest=(p2+'std_floor'),
+                            default=1e-5, type=float,
+                            help=('minimum standard deviation of the cohort scores'))
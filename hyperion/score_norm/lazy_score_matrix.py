@@ -0,0 +1,98 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import numpy as np
+
+from ..hyp_defs import float_cpu
+
+
+class LazyScoreMatrix(object):
+    """Score matrix that is computed on demand.
+
+       It behaves like a read-only numpy array of shape
+       (num_rows x num_cols), when it is sliced
+       only the scores of the requested block are computed
+       with the scorer.
+       It can be passed to ChunkedScoreNorm instead of the
+       enroll-cohort, cohort-test or cohort-cohort score matrices,
+       so the cohort scores are computed on the fly
+       by chunks and never written to disk.
+
+    Attributes:
+      scorer: Function scorer(x1, x2) that returns the score matrix
+              (len(x1) x len(x2)), e.g., plda.llr_1vs1.
+      x_rows: Vectors of the rows of the matrix.
+      x_cols: Vectors of the columns of the matrix.
+      num_blocks: Number of blocks computed so far.
+    """
+
+    def __init__(self, scorer, x_rows, x_cols):
+        self.scorer = scorer
+        self.x_rows = x_rows
+        self.x_cols = x_cols
+        self.num_blocks = 0
+
+
+
+    @property
+    def shape(self):
+        return (self.x_rows.shape[0], self.x_cols.shape[0])
+
+
+
+    @property
+    def ndim(self):
+        return 2
+
+
+
+    @property
+    def dtype(self):
+        return float_cpu()
+
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+
+    @staticmethod
+    def _to_index(key):
+        # integer indexes are converted to slices to keep 2 dims
+        if isinstance(key, (int, np.integer)):
+            return slice(key, key+1), True
+        return key, False
+
+
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        assert len(key) == 2, 'only 2d indexing is supported'
+        row_idx, squeeze_row = self._to_index(key[0])
+        col_idx, squeeze_col = self._to_index(key[1])
+
+        self.num_blocks += 1
+        scores = self.scorer(self.x_rows[row_idx], self.x_cols[col_idx])
+        if squeeze_row:
+            scores = scores[0]
+            if squeeze_col:
+                scores = scores[0]
+        elif squeeze_col:
+            scores = scores[:, 0]
+        return scores
+
+
+
+    def __array__(self, dtype=None):
+        scores = self[:, :]
+        if dtype is not None:
+            scores = scores.astype(dtype, copy=False)
+        return scores
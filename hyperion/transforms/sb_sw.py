@@ -7,23 +7,26 @@ from __future__ import print_function
 from __future__ import division
 from six.moves import xrange
 
+import logging
+
 import numpy as np
 import h5py
 
 import scipy.linalg as la
-from sklearn.neighbors import BallTree
 
 from ..hyp_model import HypModel
 from ..hyp_defs import float_cpu
+from ..utils.parallel import fork_map
+
 
 class SbSw(HypModel):
     """Class to compute between and within class matrices
     """
     def __init__(self, Sb=None, Sw=None, mu=None, num_classes=0, **kwargs):
         super(SbSw, self).__init__(**kwargs)
-        self.Sb = None
-        self.Sw = None
-        self.mu = None
+        self.Sb = Sb
+        self.Sw = Sw
+        self.mu = mu
         self.num_classes = num_classes
 
         
@@ -82,72 +85,207 @@ class SbSw(HypModel):
 
         
     @classmethod
-    def load(cls, file_path):
-        with h5py.File(file_path,'r') as f:
-            config = self.load_config_from_json(f['config'])
-            param_list = ['mu', 'Sb', 'Sw', 'num_classes']
-            params = cls._load_params_to_dict(f, config['name'], param_list)
-            kwargs = dict(list(config.items()) + list(params.items()))
-            return cls(**kwargs)
+    def load_params(cls, f, config):
+        param_list = ['mu', 'Sb', 'Sw', 'num_classes']
+        dtypes = {'mu': float_cpu(), 'Sb': float_cpu(), 'Sw': float_cpu(),
+                  'num_classes': int}
+        params = cls._load_params_to_dict(f, config['name'], param_list, dtypes)
+        kwargs = dict(list(config.items()) + list(params.items()))
+        return cls(**kwargs)
         
         
 
         
 class NSbSw(SbSw):
+    """Class to compute the nearest neighbour between and within class
+       matrices of Nonparametric Discriminant Analysis (NDA).
+
+       For each sample and class, the K nearest neighbours of the sample
+       in the class are found with distances computed by matrix products
+       between blocks of samples and the samples of the class.
+       The scatter matrices are accumulated as delta^T (w delta) products.
+       The between class matrix needs the sum of the weights per class
+       to normalize, so the neighbours of the other classes are searched
+       in two passes: the first pass computes the weights and
+       the second one accumulates the scatter.
+       The classes are distributed among a pool of worker processes.
+
+    Attributes:
+      K: Number of nearest neighbours.
+      alpha: Exponent of the distances in the weights.
+      num_neighbor_classes: If not None, the between class scatter of
+                            a class only uses its num_neighbor_classes
+                            classes with the closest means, which approximates
+                            the full matrix for large numbers of classes.
+      chunk_size: Number of samples whose neighbours are searched at once.
+      num_workers: Number of worker processes.
+    """
 
-    def __init__(self, K=10, alpha=1, **kwargs):
+    def __init__(self, K=10, alpha=1, num_neighbor_classes=None,
+                 chunk_size=4096, num_workers=1, **kwargs):
         super(NSbSw, self).__init__(**kwargs)
         self.K = K
         self.alpha = alpha
+        self.num_neighbor_classes = num_neighbor_classes
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
 
 
-        
-    def fit(self, x, class_ids, sample_weight=None, class_weights=None, normalize=True):
-        dim = x.shape[1]
-        self.Sb = np.zeros((dim, dim), dtype=float_cpu())
-        self.Sw = np.zeros((dim, dim), dtype=float_cpu())
-        self.mu = np.zeros((dim,), dtype=float_cpu())
 
-        u_ids = np.unique(class_ids)
-        self.num_classes = np.max(u_ids)+1
+    def _knn(self, x_q, x_c, x2_c, return_mean):
+        """Finds the K nearest neighbours of x_q in x_c.
+
+        Returns:
+          Distance to the K-th neighbour.
+          Mean of the K neighbours if return_mean is True.
+        """
+        k = min(self.K, x_c.shape[0])
+        d2 = x2_c - 2*np.dot(x_q, x_c.T)
+        if return_mean:
+            nn = np.argpartition(d2, k-1, axis=1)[:, :k]
+            d2_k = np.max(np.take_along_axis(d2, nn, axis=1), axis=1)
+            mu = np.mean(x_c[nn], axis=1)
+        else:
+            d2_k = np.partition(d2, k-1, axis=1)[:, k-1]
+            mu = None
+        d2_k += np.sum(x_q*x_q, axis=1)
+        return np.sqrt(np.maximum(d2_k, 0)), mu
+
+
+
+    @staticmethod
+    def _class_samples(state, i):
+        return state['class_index'][state['class_offsets'][i]:state['class_offsets'][i+1]]
 
-        d = np.zeros((self.num_classes, x.shape[0]), dtype=float_cpu())
-        delta = np.zeros((self.num_classes,) + x.shape, dtype=float_cpu())
-        for i in u_ids:
-            idx_i = (class_ids==i)
 
-            mu_i = np.mean(x[idx_i,:], axis=0)
-            self.mu += mu_i
 
+    def _own_class_stats(self, state, classes):
+        # neighbours of the samples in their own class
+        x = state['x']
+        dim = x.shape[1]
+        mu = np.zeros((dim,), dtype=float_cpu())
+        Sw = np.zeros((dim, dim), dtype=float_cpu())
+        index = []
+        d = []
+        for i in classes:
+            idx_i = self._class_samples(state, i)
             x_i = x[idx_i]
-            tree = BallTree(x_i)
-            d_i, NN_i = tree.query(x, k=self.K, dualtree=True, sort_results=True)
-            d[i] = d_i[:,-1]
-            for l in xrange(x.shape[0]):
-                delta[i,l] = x[l] - np.mean(x_i[NN_i[l]], axis=0)
+            x2_i = np.sum(x_i*x_i, axis=1)
+            mu += np.mean(x_i, axis=0)
+            for first in xrange(0, len(idx_i), self.chunk_size):
+                x_q = x_i[first:first+self.chunk_size]
+                d_i, mu_nn = self._knn(x_q, x_i, x2_i, True)
+                delta = x_q - mu_nn
+                Sw += np.dot(delta.T, delta)/len(idx_i)
+                d.append(d_i)
+            index.append(idx_i)
+        return mu, Sw, np.concatenate(index), np.concatenate(d)
+
 
-        d = d**self.alpha
-        for i in u_ids:
-            idx_i = (class_ids==i).nonzero()[0]
-            N_i = len(idx_i)
-            w_i = 0
-            Sb_i = np.zeros(self.Sb.shape, dtype=float_cpu())
-            
-            for j in xrange(self.num_classes):
-                w_ij = np.minimum(d[i], d[j])/(d[i]+d[j])
-                for l in idx_i:
-                    S = np.outer(delta[j,l], delta[j,l])
-                    if i==j:
-                        self.Sw += S/N_i
-                    else:
-                        Sb_i += w_ij[l]*S
-                        w_i += w_ij[l]
-            self.Sb += Sb_i/w_i
+
+    def _query_samples(self, state, j):
+        """Samples of the classes whose between class scatter uses class j."""
+        if state['class_nbrs'] is None:
+            return (state['class_ids'] != j).nonzero()[0]
+        classes = state['class_nbrs_inv'][j]
+        return np.concatenate(
+            [self._class_samples(state, i) for i in classes] + [np.zeros((0,), dtype=int)])
+
+
+
+    def _other_class_stats(self, state, classes, w_class=None):
+        """Computes the sum of the weights per class if w_class is None,
+           otherwise it accumulates the normalized between class scatter.
+        """
+        x = state['x']
+        class_ids = state['class_ids']
+        d_own = state['d_own']
+        num_classes = len(state['class_offsets']) - 1
+        if w_class is None:
+            acc = np.zeros((num_classes,), dtype=float_cpu())
+        else:
+            acc = np.zeros((x.shape[1], x.shape[1]), dtype=float_cpu())
+
+        for j in classes:
+            x_j = x[self._class_samples(state, j)]
+            x2_j = np.sum(x_j*x_j, axis=1)
+            query = self._query_samples(state, j)
+            for first in xrange(0, len(query), self.chunk_size):
+                idx = query[first:first+self.chunk_size]
+                x_q = x[idx]
+                d_j, mu_nn = self._knn(x_q, x_j, x2_j, w_class is not None)
+                d_j = d_j**self.alpha
+                w = np.minimum(d_own[idx], d_j)/np.maximum(d_own[idx] + d_j, 1e-20)
+                if w_class is None:
+                    acc += np.bincount(class_ids[idx], weights=w, minlength=num_classes)
+                else:
+                    w = w/w_class[class_ids[idx]]
+                    delta = x_q - mu_nn
+                    acc += np.dot(delta.T, w[:, None]*delta)
+        return acc
+
+
+
+    def _class_nbrs(self, class_means):
+        """Finds the classes with the closest means to each class."""
+        num_classes = class_means.shape[0]
+        num_nbrs = min(self.num_neighbor_classes, num_classes-1)
+        mu2 = np.sum(class_means*class_means, axis=1)
+        d2 = mu2 - 2*np.dot(class_means, class_means.T)
+        d2[np.arange(num_classes), np.arange(num_classes)] = np.inf
+        nbrs = np.argpartition(d2, num_nbrs-1, axis=1)[:, :num_nbrs]
+        # classes that use class j as neighbour
+        order = np.argsort(nbrs.ravel(), kind='stable')
+        sources = np.repeat(np.arange(num_classes), num_nbrs)[order]
+        offsets = np.searchsorted(nbrs.ravel()[order], np.arange(num_classes+1))
+        return nbrs, [sources[offsets[j]:offsets[j+1]] for j in xrange(num_classes)]
+
+
+
+    def fit(self, x, class_ids, sample_weight=None, class_weights=None, normalize=True):
+        u_ids, class_ids = np.unique(class_ids, return_inverse=True)
+        self.num_classes = len(u_ids)
+        class_index = np.argsort(class_ids, kind='stable')
+        class_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(class_ids, minlength=self.num_classes))))
+
+        state = {'x': x, 'class_ids': class_ids,
+                 'class_index': class_index, 'class_offsets': class_offsets,
+                 'class_nbrs': None}
+        num_blocks = min(self.num_classes, 4*max(self.num_workers, 1))
+        blocks = np.array_split(np.arange(self.num_classes), num_blocks)
+
+        # workers are forked, so they inherit the data without copying it
+        results = list(fork_map(lambda b: self._own_class_stats(state, b),
+                                blocks, self.num_workers))
+
+        self.mu = np.sum([r[0] for r in results], axis=0)
+        self.Sw = np.sum([r[1] for r in results], axis=0)
+        d_own = np.zeros((x.shape[0],), dtype=float_cpu())
+        for r in results:
+            d_own[r[2]] = r[3]
+        state['d_own'] = d_own**self.alpha
+
+        if self.num_neighbor_classes is not None:
+            class_means = np.stack(
+                [np.mean(x[class_index[class_offsets[i]:class_offsets[i+1]]], axis=0)
+                 for i in xrange(self.num_classes)])
+            state['class_nbrs'], state['class_nbrs_inv'] = self._class_nbrs(class_means)
+
+        # forked again to share d_own and w_class with the workers
+        w_class = np.sum(
+            list(fork_map(lambda b: self._other_class_stats(state, b),
+                          blocks, self.num_workers)), axis=0)
+        logging.debug('NSbSw weights computed')
+        self.Sb = np.sum(
+            list(fork_map(lambda b: self._other_class_stats(state, b, w_class),
+                          blocks, self.num_workers)), axis=0)
 
         if normalize:
             self.normalize()
 
 
+
     def normalize(self):
         self.mu /= self.num_classes
         self.Sb /= self.num_classes
@@ -157,6 +295,7 @@ class NSbSw(SbSw):
         
     def get_config(self):
         config = { 'K': self.K, 
-                   'alpha': self.alpha }
+                   'alpha': self.alpha,
+                   'num_neighbor_classes': self.num_neighbor_classes }
         base_config = super(NSbSw, self).get_config()
         return dict(list(base_config.items()) + list(config.items()))
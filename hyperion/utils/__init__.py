@@ -7,10 +7,15 @@ from __future__ import absolute_import
 from .trial_ndx import TrialNdx
 from .trial_key import TrialKey
 from .trial_scores import TrialScores
+from .sparse_trial_ndx import SparseTrialNdx
+from .sparse_trial_key import SparseTrialKey
+from .sparse_trial_scores import SparseTrialScores
+from .trial_scores_writer import TrialScoresWriter
 from .scp_list import SCPList
 from .utt2info import Utt2Info
 from .ext_segment_list import ExtSegmentList
 from .segment_list import SegmentList
+from .segment_store import SegmentStore
 from .kaldi_matrix import KaldiMatrix, KaldiCompressedMatrix
 from .rttm import RTTM
 
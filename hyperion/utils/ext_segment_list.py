@@ -17,6 +17,7 @@ import numpy as np
 import pandas as pd
 
 from .list_utils import *
+from .segment_store import SegmentStore
 
 
 class ExtSegmentList(object):
@@ -555,94 +556,42 @@ class ExtSegmentList(object):
 
     
     def merge_adjacent_segments(self, max_segments=0):
-        if max_segments == 0:
-            max_segments = len(self.segments)
-            
-        segm = pd.merge(self.segments, self.ext_segments,
-                        on='ext_segment_id', how='inner')
-        segm_1 = segm.shift(1)
+        """Merges consecutive segments of the same file and name
+           into extended segments, the new ext_segment_id is
+           the concatenation of the segment_ids separated by @.
 
-        index = ((segm.file_id == segm_1.file_id) &
-                 (segm.name == segm_1.name))
-
-        count = 1
-        first_idx = 0
-        last_idx = 0
-        d = OrderedDict()
-        # logging.debug('MERGE')
-        # logging.debug(self.ext_segments)
-        for i in xrange(1, len(self.segments)+1):
-            if (i==len(self.segments) or not index.iloc[i] or 
-                count==max_segments):
-                #logging.debug(i,first_idx, last_idx)
-                new_ext_segment_id = self.segments[
-                    first_idx:last_idx+1].segment_id.str.cat(sep='@')
-                old_ext_segment_ids = np.array(self.segments[
-                    first_idx:last_idx+1].ext_segment_id.unique())
-
-                self.segments.iloc[first_idx:last_idx+1,
-                                   self.segments.columns.get_loc(
-                                       'ext_segment_id')] = new_ext_segment_id
-                #logging.debug(old_ext_segment_ids)
-                #logging.debug('A',self.ext_segments.ext_segment_id)
-                # logging.debug('OLD SEGMENTS')
-                # logging.debug(old_ext_segment_ids)
-                # logging.debug('NEW SEGMENTS')
-                # logging.debug(new_ext_segment_id)
-                # logging.debug('NEW SEGMENTS FULL')
-                # logging.debug(self.segments[:last_idx+1])
-                d[new_ext_segment_id] = self.ext_segments.loc[old_ext_segment_ids[0], 'name']
-                
-                #logging.debug(old_ext_segment_ids[1:])
-                #logging.debug(old_ext_segment_ids[1:])
-                #logging.debug(self.ext_segments)
-                # self.ext_segments.drop(old_ext_segment_ids[1:], inplace=True)
-                # for osid in old_ext_segment_ids[1:]:
-                #     kk = self.segments.ext_segment_id == osid
-                #     if np.sum(kk) > 0:
-                #         logging.debug(first_segment)
-                #         logging.debug(last_segment)
-                #         logging.debug(self.segments[kk])
-                #         logging.debug(new_ext_segment_id)
-                #         raise Exception()
-                #logging.debug('C',self.ext_segments)
-                # if len(self.ext_segments.ext_segment_id.unique()) != len(self.ext_segments.ext_segment_id):
-                #     logging.debug(first_segment)
-                #     logging.debug(last_segment)
-                #     logging.debug(new_ext_segment_id)
-                #     r.save('rrrr')
-                #     self.save('pppp')
-
-                count = 1
-                first_idx = last_idx+1
-                last_idx = first_idx
-            else:
-                count += 1
-                last_idx = i
-
-                
-        ext_segment_id = [k for k,v in d.items()]
-        name = [v for k,v in d.items()]
+        Args:
+          max_segments: Maximum number of segments per extended segment,
+                        if 0 there is no limit.
+        """
+        name = np.asarray(self.ext_segments.loc[self.ext_segment_id, 'name'])
+        # segments without name are never merged
+        name_idx, names = pd.factorize(name)
+        no_name = name_idx < 0
+        name_idx[no_name] = len(names) + np.arange(np.sum(no_name))
+        file_ids, file_idx = np.unique(self.file_id, return_inverse=True)
+        store = SegmentStore(file_ids, file_idx, self.tbeg, self.tend,
+                             np.arange(np.max(name_idx, initial=-1)+1), name_idx)
+        merged, group = store.merge_adjacent_segments(max_segments=max_segments)
+
+        # extended segments in order of their first segment
+        group_order = np.argsort(merged.order, kind='stable')
+        group_rank = np.argsort(group_order)
+        segment_id = self.segment_id[store.order]
+        first = np.searchsorted(group, np.arange(len(merged)+1))
+        ext_segment_id = np.asarray(
+            ['@'.join(segment_id[first[g]:first[g+1]]) for g in group_order])
+
+        new_ext_segment_id = np.zeros((len(store),), dtype=ext_segment_id.dtype)
+        new_ext_segment_id[store.order] = ext_segment_id[group_rank[group]]
+        self.segments = self.segments.assign(ext_segment_id=new_ext_segment_id)
         self.ext_segments = pd.DataFrame(
             {'ext_segment_id': ext_segment_id,
-             'name': name})
-        #logging.debug('DICT', d)
-        # for k,v in d.items():
-        #     logging.debug(k)
-        #     logging.debug(v)
-        #     logging.debug(self.ext_segments[k])
-        #     self.ext_segments.loc[k,'ext_segment_id'] = v
-        # self.ext_segments.reset_index(drop=True, inplace=True)
-        # drop_index = (~self.ext_segments.ext_segment_id.isin(self.segments.ext_segment_id))
-        # drop_index = self.ext_segments.index[drop_index]
-        # self.ext_segments.drop(drop_index, inplace=True)
+             'name': name[merged.order[group_order]]})
         self.ext_segments = self.ext_segments.set_index(self.ext_segments.ext_segment_id, drop=False)
-        #logging.debug(self.ext_segments)
-        # assert len(self.ext_segments.ext_segment_id.unique()) == len(self.ext_segments.ext_segment_id)
-        # #logging.debug('E',self.ext_segments)
 
 
-        
+
     def assign_names(self, ext_segments_ids, names, scores=None):
         assert len(names) == len(ext_segments_ids)
         if scores is not None:
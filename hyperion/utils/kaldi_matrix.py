@@ -484,13 +484,12 @@ class KaldiCompressedMatrix(object):
         M = cls()
         header = M._compute_global_header(mat, method)
         cols_header = bytes()
-        data = bytes()
         if M.data_format == 1:
-            for col in xrange(M.num_cols):
-                col_header, col_data = M._compress_column(mat[:,col])
-                cols_header += col_header
-                data += col_data
-
+            perc = M._compute_column_headers(mat)
+            cols_header = perc.astype('<u2').tobytes()
+            p = M._uint16_to_float(perc)
+            # data is stored column by column
+            data = M._float_to_char(mat, p).T.tobytes()
         elif M.data_format == 2:
             data = M._float_to_uint16(mat).tobytes()
         else:
@@ -517,151 +516,186 @@ class KaldiCompressedMatrix(object):
 
 
     
-    def _uint16_to_float(self, byte_data):
-        return self.min_value + self.data_range * 1.52590218966964e-05 * np.frombuffer(
-            byte_data, dtype=np.uint16).astype(float_cpu())
+    def _uint16_to_float(self, x):
+        return self.min_value + self.data_range * 1.52590218966964e-05 * x.astype(float_cpu())
         
 
 
-    def _uint8_to_float(self, byte_data):
-        return self.min_value + self.data_range/255.0 * np.frombuffer(
-            byte_data, dtype=np.uint8).astype(float_cpu())
+    def _uint8_to_float(self, x):
+        return self.min_value + self.data_range/255.0 * x.astype(float_cpu())
 
 
     
-    def _compute_column_header(self, v):
+    def _compute_column_headers(self, mat):
         """ Creates the column headers for the speech-feat compression.
 
         Args:
-          v: numpy array with the column to compress.
+          mat: numpy array with the matrix to compress.
 
         Returns:
-          Byte array with the header of the column containg the 0, 25, 75 and 100 percentile values.
+          uint16 array (num_cols x 4) with the 0, 25, 75 and 100 percentile values
+          of each column.
         """
+        num_rows = self.num_rows
+        if num_rows >= 5:
+            quarter_nr = int(num_rows/4)
+            idx = (0, quarter_nr, 3*quarter_nr, num_rows-1)
+            v_sort = np.partition(mat, idx, axis=0)[idx, :]
+        else:
+            v_sort = np.sort(mat, axis=0)
+
+        u = np.reshape(self._float_to_uint16(v_sort), v_sort.shape)
         one = np.uint16(1)
-        if self.num_rows >= 5:
-            quarter_nr = int(self.num_rows/4)
-            v_sort = np.partition(v, (0, quarter_nr, 3*quarter_nr, -1))
-            perc_0 = min(self._float_to_uint16(v_sort[0])[0], np.uint16(65532))
-            perc_25 = min(max(self._float_to_uint16(v_sort[quarter_nr])[0], perc_0 + one), np.uint16(65533))
-            perc_75 = min(max(self._float_to_uint16(v_sort[3*quarter_nr])[0], perc_25 + one), np.uint16(65534))
-            perc_100 = max(self._float_to_uint16(v_sort[-1])[0], perc_75 + one)
+        perc = np.zeros((self.num_cols, 4), dtype=np.uint16)
+        perc[:, 0] = np.minimum(u[0], np.uint16(65532))
+        if num_rows > 1:
+            perc[:, 1] = np.minimum(np.maximum(u[1], perc[:, 0] + one), np.uint16(65533))
         else:
-            v_sort = np.sort(v)
-            perc_0 = min(self._float_to_uint16(v_sort[0])[0], np.uint16(65532))
-            if self.num_rows > 1:
-                perc_25 = min(max(self._float_to_uint16(v_sort[1])[0], perc_0 + one), np.uint16(65533))
-            else:
-                perc_25 = perc_0 + one
-            if self.num_rows > 2:
-                perc_75 = min(max(self._float_to_uint16(v_sort[2])[0], perc_25 + one), np.uint16(65534))
-            else:
-                perc_75 = perc_25 + one
+            perc[:, 1] = perc[:, 0] + one
+        if num_rows > 2:
+            perc[:, 2] = np.minimum(np.maximum(u[2], perc[:, 1] + one), np.uint16(65534))
+        else:
+            perc[:, 2] = perc[:, 1] + one
+        if num_rows > 3:
+            perc[:, 3] = np.maximum(u[3], perc[:, 2] + one)
+        else:
+            perc[:, 3] = perc[:, 2] + one
+        return perc
 
-            if self.num_rows > 3:
-                perc_100 = max(self._float_to_uint16(v_sort[3])[0], perc_75 + one)
-            else:
-                perc_100 = perc_75 + one
-        return struct.pack('<HHHH', perc_0, perc_25, perc_75, perc_100)
+    
+
+    @staticmethod
+    def _float_to_char(mat, p):
+        """Codes the matrix from float to bytes using the given percentiles.
+
+        Args:
+          mat: numpy array with the matrix to compress.
+          p: Percentiles 0, 25, 75, 100 of each column (num_cols x 4).
 
+        Returns:
+          uint8 array with the codes of the matrix.
+        """
+        # percentile differences are computed in the precision of p, then
+        # everything is cast to the precision of mat, as numpy does with scalars
+        p0, p25, p75, p100 = p.T
+        d = np.stack((p25-p0, p75-p25, p100-p75))
+        if mat.dtype.kind == 'f':
+            p = p.astype(mat.dtype, copy=False)
+            d = d.astype(mat.dtype, copy=False)
+            p0, p25, p75, p100 = p.T
+        c = np.clip(((mat - p0)/d[0]*64+0.5).astype(np.int32), 0, 64)
+        c2 = np.clip(64 + ((mat - p25)/d[1]*128+0.5).astype(np.int32), 64, 192)
+        c3 = np.clip(192 + ((mat - p75)/d[2]*63+0.5).astype(np.int32), 192, 255)
+        c = np.where(mat < p25, c, np.where(mat < p75, c2, c3))
+        return c.astype(np.uint8)
 
     
-    def _compress_column(self, v):
-        """ Compress column for the speech-feat compression.
+
+    @staticmethod
+    def _char_to_float_table(p):
+        """Creates the table to decode the bytes of each column to floats.
 
         Args:
-          v: numpy array with the column to compress.
+          p: Percentiles 0, 25, 75, 100 of each column (num_cols x 4).
 
         Returns:
-          Byte array with the header of the column containg the 0, 25, 75 and 100 percentile values.
-          Byte array with the coded column.
+          Table (num_cols x 256) with the float value of each code in each column.
         """
+        c = np.arange(256, dtype=float_cpu())
+        p0, p25, p75, p100 = [p_i[:, None] for p_i in p.T]
+        table = np.empty((p.shape[0], 256), dtype=float_cpu())
+        table[:, :65] = p0 + (p25-p0)*c[:65]/64.0
+        table[:, 65:193] = p25 + (p75-p25)*(c[65:193] - 64)/128.0
+        table[:, 193:] = p75 + (p100-p75)*(c[193:] - 192)/63.0
+        return table
 
-        col_header = self._compute_column_header(v)
-        p0, p25, p75, p100 = self._uint16_to_float(col_header)
-        return col_header, self._float_to_char(v, p0, p25, p75, p100).tobytes()
 
 
-    
-    def _uncompress_column(self, col_header, col_data):
-        """ Compress column for the speech-feat compression.
+    def _decode(self, codes, perc=None):
+        """Decodes the coded values with lookup tables.
 
         Args:
-          col_header: Byte array with the header of the column containg the 0, 25, 75 and 100 percentile values.
-          col_data: Byte array with the coded column.
+          codes: uint8/uint16 array (num_rows x num_cols) with the codes,
+                 it can be a non-contiguous view of the compressed data.
+          perc: uint16 array (num_cols x 4) with the column percentiles for 
+                data_format=1.
 
         Returns:
-          numpy array with the uncompressed column 
+          numpy array with uncompressed matrix.
         """
-        p0, p25, p75, p100 = self._uint16_to_float(col_header)
-        return self._char_to_float(col_data, p0, p25, p75, p100)
-        
-    
+        if self.data_format == 1:
+            table = self._char_to_float_table(self._uint16_to_float(perc))
+            return table[np.arange(codes.shape[1]), codes]
+        if self.data_format == 2:
+            table = self._uint16_to_float(np.arange(65536))
+        else:
+            table = self._uint8_to_float(np.arange(256))
+        return table[codes]
 
-    @staticmethod
-    def _float_to_char(v, p0, p25, p75, p100):
-        """Codes the column from float to bytes using the given percentiles"""
-        v_out = np.zeros(v.shape, dtype=np.int32)
-        idx = v < p25
-        f = (v[idx] - p0)/(p25-p0)
-        c = (f*64+0.5).astype(np.int32)
-        c[c<0] = 0
-        c[c>64] = 64
-        v_out[idx] = c
-        idx = np.logical_and(v >= p25, v < p75)
-        f = (v[idx] - p25)/(p75-p25)
-        c = 64 + (f*128+0.5).astype(np.int32)
-        c[c<64] = 64
-        c[c>192] = 192
-        v_out[idx] = c
-        idx = v >= p75
-        f = (v[idx] - p75)/(p100-p75)
-        c = 192 + (f*63+0.5).astype(np.int32)
-        c[c<192] = 192
-        c[c>255] = 255
-        v_out[idx] = c
-        return v_out.astype(np.uint8)
 
-    
 
-    @staticmethod
-    def _char_to_float(v, p0, p25, p75, p100):
-        """Decodes the column from bytes to float using the given percentiles"""
-        v_in = np.frombuffer(v, dtype=np.uint8).astype(float_cpu())
-        v_out = np.zeros(v_in.shape, dtype=float_cpu())
-        idx = v_in <= 64
-        v_out[idx] = p0 + (p25-p0)*v_in[idx]/64.0
-        idx = np.logical_and(v_in>64, v_in<=192)
-        v_out[idx] = p25 + (p75-p25)*(v_in[idx] - 64)/128.0
-        idx = v_in > 192
-        v_out[idx] = p75 + (p100-p75)*(v_in[idx] - 192)/63.0
-        return v_out
+    def to_ndarray(self, row_offset=0, num_rows=0):
+        """Uncompresses matrix to numpy array.
 
+        Args:
+          row_offset: Uncompresses matrix starting from a given row instead of row 0.
+          num_rows: Num. of rows to uncompress, if 0 it uncompresses all the rows.
 
-    
-    def to_ndarray(self):
-        """Uncompresses matrix to numpy array.
         Returns:
           numpy array with uncompressed matrix.
         """
+        if num_rows == 0:
+            num_rows = self.num_rows - row_offset
+        assert row_offset + num_rows <= self.num_rows, (
+            'requested rows (%d:%d) > available rows (%d)' %
+            (row_offset, row_offset + num_rows, self.num_rows))
+        
+        header_offset = 20
         if self.data_format == 1:
-            mat = np.zeros((self.num_rows, self.num_cols), dtype=float_cpu())
-            header_offset = 20
             data_offset = header_offset+self.num_cols*8
-            for i in xrange(self.num_cols):
-                mat[:,i] = self._uncompress_column(
-                    self.data[header_offset:header_offset+8],
-                    self.data[data_offset:data_offset+self.num_rows])
-                header_offset += 8
-                data_offset += self.num_rows
-        elif self.data_format == 2:
-            mat = np.reshape(self._uint16_to_float(self.data[20:]),
-                             (self.num_rows, self.num_cols)).astype(float_cpu(), copy=False)
+            perc = np.frombuffer(
+                self.data, dtype='<u2', count=4*self.num_cols,
+                offset=header_offset).reshape(self.num_cols, 4)
+            codes = np.frombuffer(
+                self.data, dtype=np.uint8, count=self.num_cols*self.num_rows,
+                offset=data_offset).reshape(self.num_cols, self.num_rows)
+            codes = codes[:, row_offset:row_offset+num_rows].T
+            return self._decode(codes, perc)
+
+        if self.data_format == 2:
+            dtype = np.dtype('<u2')
         else:
-            mat = np.reshape(self._uint8_to_float(self.data[20:]),
-                             (self.num_rows, self.num_cols)).astype(float_cpu(), copy=False)
+            dtype = np.dtype(np.uint8)
+        codes = np.frombuffer(
+            self.data, dtype=dtype, count=num_rows*self.num_cols,
+            offset=header_offset + row_offset*self.num_cols*dtype.itemsize)
+        return self._decode(np.reshape(codes, (num_rows, self.num_cols)))
+
 
-        return mat
+
+    @classmethod
+    def data_attrs_to_ndarray(cls, data, attrs):
+        """Uncompresses coded values and attributes to numpy array,
+           without building the KaldiCompressedMatrix bytes.
+
+        Args:
+          data: Coded matrix values in 2D format, it can be a slice of rows
+                of the coded matrix.
+          attrs: Dictionary object with data attributes: data_format, min_value, data_range, percentiles.
+        
+        Returns:
+          numpy array with uncompressed matrix.
+        """
+        M = cls()
+        M.data_format = attrs['data_format']
+        # values are rounded as if they were stored in the float32 header
+        M.min_value = float(np.float32(attrs['min_value']))
+        M.data_range = float(np.float32(attrs['data_range']))
+        M.num_rows, M.num_cols = data.shape
+        perc = None
+        if M.data_format == 1:
+            perc = np.reshape(np.asarray(attrs['perc'], dtype=np.uint16), (-1, 4))
+        return M._decode(data, perc)
 
 
     
@@ -0,0 +1,183 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+ Utilities to map functions over pools of forked worker processes.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+from collections import deque
+import multiprocessing as mp
+
+
+# function evaluated by the worker processes
+_worker_func = None
+
+
+def _init_worker(func):
+    global _worker_func
+    _worker_func = func
+
+
+
+def _call_worker(task):
+    return _worker_func(task)
+
+
+
+class _Result(object):
+    """Result of a task evaluated in the main process."""
+    def __init__(self, value):
+        self.value = value
+
+
+    def get(self):
+        return self.value
+
+
+
+class ForkPool(object):
+    """Pool of worker processes that evaluate func(task).
+
+       The workers are forked, so they inherit func and the data that
+       it references (models, feature matrices, shared memory blocks)
+       without copying or pickling them, func can be a closure or
+       a bound method of a non-picklable object. Only the tasks and
+       the results are pickled, so they should be small, e.g., block
+       indices and accumulators.
+
+       If num_workers is 0, the tasks are evaluated in the main process.
+
+    Attributes:
+      func: Function evaluated on each task.
+      num_workers: Number of worker processes.
+    """
+
+    def __init__(self, func, num_workers=1):
+        self.func = func
+        self.num_workers = num_workers
+        self._pool = None
+        if num_workers > 0:
+            self._pool = mp.get_context('fork').Pool(
+                num_workers, initializer=_init_worker, initargs=(func,))
+
+
+
+    def submit(self, task):
+        """Submits a task to the pool.
+
+        Args:
+          task: Argument of func.
+
+        Returns:
+          Object whose get() method returns func(task).
+        """
+        if self._pool is None:
+            return _Result(self.func(task))
+        return self._pool.apply_async(_call_worker, (task,))
+
+
+
+    def imap(self, tasks, ordered=True, max_pending=None):
+        """Generator that evaluates func on all the tasks.
+
+        Args:
+          tasks: Iterable of tasks.
+          ordered: If False, the results are returned as soon as they are ready.
+          max_pending: Maximum number of tasks submitted and not returned yet,
+                       the tasks are pulled lazily from the iterable, so it
+                       bounds the memory when the tasks carry data.
+                       If None, all the tasks are submitted at once.
+                       If given, the results are always returned in order.
+
+        Returns:
+          func(task) for each task.
+        """
+        if self._pool is None:
+            for task in tasks:
+                yield self.func(task)
+            return
+
+        if max_pending is None:
+            imap = self._pool.imap if ordered else self._pool.imap_unordered
+            for r in imap(_call_worker, tasks):
+                yield r
+            return
+
+        pending = deque()
+        for task in tasks:
+            pending.append(self.submit(task))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while len(pending) > 0:
+            yield pending.popleft().get()
+
+
+
+    def close(self):
+        """Stops the worker processes."""
+        if self._pool is None:
+            return
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+
+
+
+    def __enter__(self):
+        return self
+
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+def fork_map(func, tasks, num_workers=1, ordered=True, max_pending=None):
+    """Generator that evaluates func on the tasks with a ForkPool,
+       the pool is forked when the first result is requested and
+       stopped when the generator finishes.
+
+    Args:
+      func: Function evaluated on each task.
+      tasks: Iterable of tasks.
+      num_workers: Number of worker processes, if <= 1 the tasks are
+                   evaluated in the main process.
+      ordered: If False, the results are returned as soon as they are ready.
+      max_pending: Maximum number of tasks submitted and not returned yet
+                   (see ForkPool.imap).
+
+    Returns:
+      func(task) for each task.
+    """
+    # a single worker would only add overhead to the main process
+    if num_workers <= 1:
+        num_workers = 0
+    with ForkPool(func, num_workers) as pool:
+        for r in pool.imap(tasks, ordered=ordered, max_pending=max_pending):
+            yield r
+
+
+
+def sum_reduce(results):
+    """Element-wise sum of tuples of accumulators,
+       e.g., the sufficient statistics of several blocks of data.
+
+    Args:
+      results: Iterable of tuples with the same length.
+
+    Returns:
+      Tuple with the sums or None if results is empty.
+    """
+    acc = None
+    for r in results:
+        if acc is None:
+            acc = list(r)
+        else:
+            for i in xrange(len(acc)):
+                acc[i] = acc[i] + r[i]
+    return None if acc is None else tuple(acc)
@@ -17,6 +17,7 @@ import pandas as pd
 
 from .list_utils import *
 from .segment_list import SegmentList
+from .segment_store import SegmentStore
 
 
 class RTTM(object):
@@ -201,8 +202,9 @@ class RTTM(object):
     
     @property
     def num_spks_per_file(self):
-        return {file_id: len(self.segments[(self.segments['segment_type']=='SPEAKER') &
-                                           (self.segments['file_id']==file_id)].name.unique())
+        segments = self.segments[self.segments['segment_type']=='SPEAKER']
+        num_spks = segments.groupby('file_id', sort=False)['name'].nunique()
+        return {file_id: num_spks.get(file_id, 0)
                 for file_id in self.unique_file_id}
     
 
@@ -327,41 +329,40 @@ class RTTM(object):
 
     
 
+    def _make_store(self, rows):
+        """Creates a SegmentStore with some rows of the segments table."""
+        segments = self.segments.iloc[rows]
+        tbeg = np.asarray(segments['tbeg'], dtype=float)
+        tend = tbeg + np.asarray(segments['tdur'], dtype=float)
+        return SegmentStore.create(np.asarray(segments['file_id']), tbeg, tend,
+                                   np.asarray(segments['name']))
+
+
+
+    def _segment_type_rows(self):
+        segment_type = np.asarray(self.segments['segment_type'])
+        for t in np.unique(segment_type):
+            yield (segment_type == t).nonzero()[0]
+
+
+
     def merge_adjacent_segments(self, t_margin=0):
-        segm = self.segments
-        segm_1 = self.segments.shift(1)
-        delta = segm.tbeg - segm_1.tbeg - segm_1.tdur
-        index = ((segm.file_id == segm_1.file_id) &
-                 (segm.segment_type == segm_1.segment_type) &
-                 (segm.name == segm_1.name) & (delta <= t_margin))
-        # ix=self.segments['name'] == 'DH_0006_1'
-        # logging.debug(self.segments[ix])
-        # logging.debug(index[ix])
-        # logging.debug(segm[ix].tbeg)
-        # logging.debug(segm[ix].tbeg+segm[ix].tdur)
-        for i in xrange(len(self.segments)-1, 0, -1):
-            if index.iloc[i]:
-                tbeg = segm.iloc[i-1].tbeg
-                tend = segm.iloc[i].tbeg + segm.iloc[i].tdur
-                self.segments.iloc[i-1, self.segments.columns.get_loc('tdur')] = tend - tbeg
-                self.segments.iloc[i, self.segments.columns.get_loc('segment_type')] = 'DROP'
-        #logging.debug(self.segments[ix])
-        self.segments = self.segments[self.segments.segment_type != 'DROP']
-
-        # for i in xrange(len(self.segments)-1, 0, -1):
-        #     row_i = self.segments.iloc[i]
-        #     row_i_1 = self.segments.iloc[i-1]
-        #     if (row_i.segment_type == row_i_1.segment_type and
-        #         row_i.file_id == row_i_1.file_id and
-        #         row_i.name == row_i_1.name and
-        #         row_i.tbeg - row_i_1.tbeg - row_i_1.tdur <= t_margin):
-        #         tend = row_i.tbeg + row_i.tdur
-        #         self.segments.iloc[i-1, self.segments.columns.get_loc('tdur')] = tend - row_i_1.tbeg
-        #         self.segments.iloc[i, self.segments.columns.get_loc('segment_type')] = 'DROP'
-        # self.segments = self.segments[self.segments.segment_type != 'DROP']
+        """Merges consecutive segments of the same file, segment type and name
+           separated by less than t_margin seconds.
+        """
+        tdur = np.array(self.segments['tdur'], dtype=float)
+        keep = []
+        for rows in self._segment_type_rows():
+            merged, _ = self._make_store(rows).merge_adjacent_segments(t_margin)
+            rows = rows[merged.order]
+            tdur[rows] = merged.tend - merged.tbeg
+            keep.append(rows)
+
+        keep = np.sort(np.concatenate(keep + [np.zeros((0,), dtype=int)]))
+        self.segments = self.segments.assign(tdur=tdur).iloc[keep]
+
 
 
-    
     def __eq__(self, other):
         """Equal operator"""
         eq = self.segments.equals(other.segments)
@@ -412,37 +413,25 @@ class RTTM(object):
 
 
     def get_segment_names(self, segment_list, sep='@', segment_type='SPEAKER'):
-        num_segm = len(segment_list)
-        names = []
-        num_names = np.zeros((num_segm,), dtype=int)
-        segments = self.segments[self.segments['segment_type'] == segment_type]
-        prev_file_id = ''
-        for i in xrange(num_segm):
-            file_id = segment_list.file_id[i]
-            tbeg = segment_list.tbeg[i]
-            tend = segment_list.tend[i]
-            if file_id != prev_file_id:
-                segments_f = segments[segments['file_id'] == file_id]
-                tbeg_f = segments_f['tbeg']
-                tend_f = segments_f['tbeg'] + segments_f['tdur']
-                prev_file_id = file_id
+        """Finds the names of the rttm segments that contain the
+           start or the end of each segment in segment_list.
 
-            segments_i = segments_f[((tbeg_f<=tbeg) & (tend_f > tbeg)) |
-                                    ((tbeg_f < tend) & (tend_f >=tend))]
+        Args:
+          segment_list: SegmentList object.
+          sep: Separator between names.
+          segment_type: Type of the rttm segments.
 
-            num_segm_i = len(segments_i)
-            if num_segm_i == 0:
-                num_names[i] = 0
-                names.append('<NA>')
-            else:
-                names_i = list(segments_i['name'].unique())
-                num_names[i] = len(names_i)
-                names.append(sep.join(names_i))
+        Returns:
+          Names of each segment joined by sep, '<NA>' if there are none.
+          Number of names of each segment.
+        """
+        rows = (np.asarray(self.segments['segment_type']) == segment_type).nonzero()[0]
+        store = self._make_store(rows)
+        return store.get_segment_names(segment_list.file_id, segment_list.tbeg,
+                                       segment_list.tend, sep=sep)
 
-        return np.asarray(names), num_names
 
 
-    
     def get_files_with_names_diff_to_file(self, file_id, segment_type='SPEAKER'):
         segments = self.segments[self.segments['segment_type'] == segment_type]
         names = segments[segments['file_id'] == file_id].name.unique()
@@ -457,46 +446,39 @@ class RTTM(object):
 
 
     def eliminate_overlaps(self):
-        segm = self.segments
-        segm_1 = self.segments.shift(1)
-        tend_1 = segm_1.tbeg + segm_1.tdur
-        tbeg = segm.tbeg
-        tend = segm.tbeg + segm.tdur
-        tavg = (tbeg + tend_1)/2
-        index = ((segm.file_id == segm_1.file_id) &
-                 (segm.segment_type == segm_1.segment_type) &
-                 (tbeg < tend_1))
-        # logging.debug(index)
-        # logging.debug(self.segments.loc[index])
-        # logging.debug(self.segments.loc[index])
-        self.segments.loc[index, 'tbeg'] = tavg[index]
-        # logging.debug(self.segments.loc[index])
-        index_1 = index.shift(-1)
-        index_1[index_1.isnull()] = False
-        # logging.debug(self.segments.loc[index_1])
-        self.segments.loc[index_1, 'tdur'] = tavg[index] - tbeg[index_1]
-        # logging.debug(self.segments.loc[index_1])
-        self.segments.loc[index, 'tdur'] = tend[index] - tavg[index]
+        """Moves the boundary between consecutive overlapping segments
+           of the same file and segment type to the middle of the overlap.
+        """
+        tbeg = np.array(self.segments['tbeg'], dtype=float)
+        tdur = np.array(self.segments['tdur'], dtype=float)
+        for rows in self._segment_type_rows():
+            store = self._make_store(rows).eliminate_overlaps()
+            rows = rows[store.order]
+            tbeg[rows] = store.tbeg
+            tdur[rows] = store.tend - store.tbeg
+        self.segments = self.segments.assign(tbeg=tbeg, tdur=tdur)
 
 
 
-    
     def to_matrix(self, file_id, frame_shift=0.001):
+        """Converts the segments of a file to a frame by speaker matrix.
+
+        Args:
+          file_id: File name.
+          frame_shift: Frame shift in seconds.
+
+        Returns:
+          Binary matrix (num_frames x num_names_in_file).
+          Names of the columns.
+        """
         if self.index_by_file:
-            segments = self.segments[file_id]
+            rows = self.segments.index.get_indexer_for([file_id])
         else:
-            segments = self.segments[self.segments['file_id'] == file_id]
+            rows = (np.asarray(self.segments['file_id']) == file_id).nonzero()[0]
+        return self._make_store(rows).to_matrix(file_id, frame_shift)
 
-        u_names, name_ids = np.unique(segments['name'], return_inverse=True)
-        tbeg = np.round(segments['tbeg']/frame_shift).astype(dtype=int)
-        tend = np.round((segments['tbeg']+segments['tdur'])/frame_shift).astype(dtype=int)
 
-        M = np.zeros((tend[-1], len(u_names)), dtype=int)
-        for i in xrange(len(u_names)):
-            M[tbeg[i]:tend[i], name_ids[i]] = 1
 
-
-            
     def compute_stats(self, nbins_dur=None):
 
         # segment durations
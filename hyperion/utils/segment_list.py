@@ -16,6 +16,7 @@ import numpy as np
 import pandas as pd
 
 from .list_utils import *
+from .segment_store import SegmentStore
 
 
 class SegmentList(object):
@@ -43,7 +44,7 @@ class SegmentList(object):
         
     @classmethod
     def create(cls, segment_id, file_id, tbeg, tend, index_by_file=True):
-        segments = pd.Dataframe({'segment_id': segment_id,
+        segments = pd.DataFrame({'segment_id': segment_id,
                                  'file_id': file_id,
                                  'tbeg': tbeg,
                                  'tend': tend})
@@ -290,25 +291,14 @@ class SegmentList(object):
           else if returns VAD for one given segment
 
         """
-        tbeg = np.round(np.array(self.segments.loc[key]['tbeg'], dtype=float, ndmin=1)
-                        * 1000/frame_shift).astype(dtype=int)
-        tend = np.round(np.array(self.segments.loc[key]['tend'], dtype=float, ndmin=1)
-                        * 1000/frame_shift).astype(dtype=int)
-
-        if num_frames is None:
-            if self.index_by_file:
-                num_frames=tend[-1]
-            else:
-                file_id = self.segments.loc[key]['file_id']
-                sel_idx = self.segments['file_id'] == file_id
-                num_frames = int(np.round(self.segments[sel_idx]['tend'].max() * 1000/self.frame_shift))
-                
-        tend = np.minimum(num_frames-1, tend)                
-        vad = np.zeros((num_frames,), dtype=int)
-        for j in xrange(len(tbeg)):
-            vad[tbeg[j]:tend[j]+1] = 1
-
-        return vad
+        segments = self.segments.loc[[key]]
+        if num_frames is None and not self.index_by_file:
+            file_id = segments['file_id'].iloc[0]
+            tend = self.tend[self.file_id == file_id]
+            num_frames = int(np.round(np.max(tend) * 1000/frame_shift))
+
+        return SegmentStore.bin_vad(segments['tbeg'], segments['tend'],
+                                    frame_shift, num_frames)
 
         
         
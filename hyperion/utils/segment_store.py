@@ -0,0 +1,309 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import numpy as np
+
+
+class SegmentStore(object):
+    """Columnar storage of the segments of a set of files.
+
+       The segments are kept in NumPy arrays sorted by file and start time,
+       the segments of each file are contiguous and located with the
+       file offsets. The operations are vectorized over all the segments
+       or per file, instead of iterating over DataFrame rows.
+       RTTM, SegmentList and ExtSegmentList use it for their
+       heavy operations.
+
+    Attributes:
+      file_ids: Sorted unique file names.
+      names: Sorted unique segment names.
+      file_idx: Index in file_ids of the file of each segment.
+      tbeg: Start time of each segment.
+      tend: End time of each segment.
+      name_idx: Index in names of the name of each segment.
+      order: Row of each segment in the table used to create the store.
+      file_offsets: The segments of file f are in [file_offsets[f], file_offsets[f+1]).
+    """
+
+    def __init__(self, file_ids, file_idx, tbeg, tend,
+                 names=None, name_idx=None, order=None):
+        file_idx = np.asarray(file_idx, dtype=int)
+        tbeg = np.asarray(tbeg, dtype=float)
+        tend = np.asarray(tend, dtype=float)
+        if names is None:
+            names = np.asarray(['<NA>'])
+            name_idx = np.zeros(file_idx.shape, dtype=int)
+        if order is None:
+            order = np.arange(len(file_idx))
+
+        index = np.lexsort((tbeg, file_idx))
+        self.file_ids = np.asarray(file_ids)
+        self.names = np.asarray(names)
+        self.file_idx = file_idx[index]
+        self.tbeg = tbeg[index]
+        self.tend = tend[index]
+        self.name_idx = np.asarray(name_idx, dtype=int)[index]
+        self.order = np.asarray(order, dtype=int)[index]
+        self.file_offsets = np.searchsorted(
+            self.file_idx, np.arange(len(self.file_ids)+1))
+
+
+
+    @classmethod
+    def create(cls, file_id, tbeg, tend, name=None):
+        """Creates the store from the columns of a segment table.
+
+        Args:
+          file_id: File name of each segment.
+          tbeg: Start time of each segment.
+          tend: End time of each segment.
+          name: Name of each segment, e.g., speaker, or None.
+
+        Returns:
+          SegmentStore object.
+        """
+        file_ids, file_idx = np.unique(np.asarray(file_id), return_inverse=True)
+        names = None
+        name_idx = None
+        if name is not None:
+            names, name_idx = np.unique(np.asarray(name).astype('U'), return_inverse=True)
+        return cls(file_ids, file_idx, tbeg, tend, names, name_idx)
+
+
+
+    def __len__(self):
+        """Returns the number of segments."""
+        return len(self.tbeg)
+
+
+
+    @property
+    def num_files(self):
+        return len(self.file_ids)
+
+
+
+    def file_index(self, file_id):
+        """Returns the index of the files in file_ids, -1 if not found."""
+        file_id = np.asarray(file_id)
+        if self.num_files == 0:
+            return np.full(file_id.shape, -1, dtype=int)
+        f = np.minimum(np.searchsorted(self.file_ids, file_id), self.num_files-1)
+        return np.where(self.file_ids[f] == file_id, f, -1)
+
+
+
+    def file_segments(self, file_id):
+        """Returns the first and last+1 segments of a file."""
+        f = self.file_index(file_id)
+        if f < 0:
+            return 0, 0
+        return self.file_offsets[f], self.file_offsets[f+1]
+
+
+
+    def _group_starts(self, t_margin=None, max_segments=0):
+        start = np.ones((len(self),), dtype=bool)
+        start[1:] = ((self.file_idx[1:] != self.file_idx[:-1]) |
+                     (self.name_idx[1:] != self.name_idx[:-1]))
+        if t_margin is not None:
+            start[1:] |= self.tbeg[1:] - self.tend[:-1] > t_margin
+        if max_segments > 0:
+            run_start = np.flatnonzero(start)
+            pos = np.arange(len(self)) - run_start[np.cumsum(start) - 1]
+            start |= pos % max_segments == 0
+        return start
+
+
+
+    def merge_adjacent_segments(self, t_margin=None, max_segments=0):
+        """Merges consecutive segments of the same file and name.
+
+        Args:
+          t_margin: Maximum gap between merged segments, if None
+                    the gap is not checked.
+          max_segments: Maximum number of segments merged together,
+                        if 0 there is no limit.
+
+        Returns:
+          SegmentStore with the merged segments, the order of each merged
+          segment is the order of its first segment.
+          Index of the merged segment of each segment of this store.
+        """
+        if len(self) == 0:
+            return self, np.zeros((0,), dtype=int)
+        start = self._group_starts(t_margin, max_segments)
+        first = np.flatnonzero(start)
+        group = np.cumsum(start) - 1
+        tend = np.maximum.reduceat(self.tend, first)
+        merged = SegmentStore(self.file_ids, self.file_idx[first],
+                              self.tbeg[first], tend, self.names,
+                              self.name_idx[first], self.order[first])
+        return merged, group
+
+
+
+    def eliminate_overlaps(self):
+        """Moves the boundary between consecutive overlapping segments
+           of the same file to the middle of the overlap.
+
+        Returns:
+          SegmentStore without overlaps.
+        """
+        tbeg = self.tbeg.copy()
+        tend = self.tend.copy()
+        idx = np.flatnonzero((self.file_idx[1:] == self.file_idx[:-1]) &
+                             (self.tbeg[1:] < self.tend[:-1])) + 1
+        tavg = (self.tbeg[idx] + self.tend[idx-1])/2
+        tbeg[idx] = tavg
+        tend[idx-1] = tavg
+        return SegmentStore(self.file_ids, self.file_idx, tbeg, tend,
+                            self.names, self.name_idx, self.order)
+
+
+
+    def _candidates(self, file_idx, tbeg, tend):
+        """Finds the range of segments of the same file that can overlap
+           each query interval with a binary search per file.
+        """
+        # a segment ending after tbeg can not start before tbeg - max_dur
+        max_dur = np.zeros((self.num_files,), dtype=float)
+        nonempty = np.diff(self.file_offsets) > 0
+        if np.any(nonempty):
+            max_dur[nonempty] = np.maximum.reduceat(
+                self.tend - self.tbeg, self.file_offsets[:-1][nonempty])
+
+        lo = np.zeros(tbeg.shape, dtype=int)
+        hi = np.zeros(tbeg.shape, dtype=int)
+        q_index = np.argsort(file_idx, kind='stable')
+        q_offsets = np.searchsorted(file_idx[q_index], np.arange(-1, self.num_files+1))
+        for f in np.flatnonzero(np.diff(q_offsets[1:]) > 0):
+            q = q_index[q_offsets[f+1]:q_offsets[f+2]]
+            first = self.file_offsets[f]
+            tbeg_f = self.tbeg[first:self.file_offsets[f+1]]
+            lo[q] = first + np.searchsorted(tbeg_f, tbeg[q] - max_dur[f], side='left')
+            hi[q] = first + np.maximum(np.searchsorted(tbeg_f, tend[q], side='left'),
+                                       np.searchsorted(tbeg_f, tbeg[q], side='right'))
+        return lo, np.maximum(hi, lo)
+
+
+
+    def get_segment_names(self, file_id, tbeg, tend, sep='@'):
+        """Finds the names of the segments that contain the start or the end
+           of each query segment.
+
+        Args:
+          file_id: File name of each query segment.
+          tbeg: Start time of each query segment.
+          tend: End time of each query segment.
+          sep: Separator between names.
+
+        Returns:
+          Names of each query segment joined by sep in order of appearance,
+          '<NA>' if there are none.
+          Number of names of each query segment.
+        """
+        tbeg = np.asarray(tbeg, dtype=float)
+        tend = np.asarray(tend, dtype=float)
+        num_queries = len(tbeg)
+        lo, hi = self._candidates(self.file_index(file_id), tbeg, tend)
+
+        count = hi - lo
+        q = np.repeat(np.arange(num_queries), count)
+        c = np.arange(np.sum(count)) + np.repeat(lo - np.cumsum(count) + count, count)
+        tbeg_q = tbeg[q]
+        tend_q = tend[q]
+        hit = (((self.tbeg[c] <= tbeg_q) & (self.tend[c] > tbeg_q)) |
+               ((self.tbeg[c] < tend_q) & (self.tend[c] >= tend_q)))
+        q = q[hit]
+        name_idx = self.name_idx[c[hit]]
+
+        # unique names of each query in order of appearance
+        _, first = np.unique(q*len(self.names) + name_idx, return_index=True)
+        first = np.sort(first)
+        q = q[first]
+        seg_names = self.names[name_idx[first]]
+        num_names = np.bincount(q, minlength=num_queries)
+        pos = np.concatenate(([0], np.cumsum(num_names)))
+
+        names = np.full((num_queries,), '<NA>', dtype=object)
+        single = num_names == 1
+        names[single] = seg_names[pos[:-1][single]]
+        for i in np.flatnonzero(num_names > 1):
+            names[i] = sep.join(seg_names[pos[i]:pos[i+1]])
+        return names.astype('U'), num_names
+
+
+
+    @staticmethod
+    def bin_vad(tbeg, tend, frame_shift=10, num_frames=None):
+        """Converts segments to binary VAD, the end frames are included.
+
+        Args:
+          tbeg: Start times in seconds.
+          tend: End times in seconds.
+          frame_shift: Frame shift in milliseconds.
+          num_frames: Number of frames, if None it takes the maximum tend.
+
+        Returns:
+          Binary VAD vector (num_frames,).
+        """
+        tbeg = np.round(np.asarray(tbeg, dtype=float)*1000/frame_shift).astype(dtype=int)
+        tend = np.round(np.asarray(tend, dtype=float)*1000/frame_shift).astype(dtype=int)
+        if num_frames is None:
+            num_frames = np.max(tend) if len(tend) > 0 else 0
+
+        tend = np.minimum(num_frames-1, tend)
+        valid = tend >= tbeg
+        delta = np.zeros((num_frames+1,), dtype=int)
+        np.add.at(delta, tbeg[valid], 1)
+        np.add.at(delta, tend[valid]+1, -1)
+        return (np.cumsum(delta[:-1]) > 0).astype(dtype=int)
+
+
+
+    def to_bin_vad(self, file_id, frame_shift=10, num_frames=None):
+        """Converts the segments of a file to binary VAD.
+
+        Args:
+          file_id: File name.
+          frame_shift: Frame shift in milliseconds.
+          num_frames: Number of frames, if None it takes the maximum tend.
+
+        Returns:
+          Binary VAD vector (num_frames,).
+        """
+        first, last = self.file_segments(file_id)
+        return self.bin_vad(self.tbeg[first:last], self.tend[first:last],
+                            frame_shift, num_frames)
+
+
+
+    def to_matrix(self, file_id, frame_shift=0.001):
+        """Converts the segments of a file to a frame by name activity matrix.
+
+        Args:
+          file_id: File name.
+          frame_shift: Frame shift in seconds.
+
+        Returns:
+          Binary matrix (num_frames x num_names_in_file).
+          Names of the columns.
+        """
+        first, last = self.file_segments(file_id)
+        u_idx, cols = np.unique(self.name_idx[first:last], return_inverse=True)
+        tbeg = np.round(self.tbeg[first:last]/frame_shift).astype(dtype=int)
+        tend = np.round(self.tend[first:last]/frame_shift).astype(dtype=int)
+        num_frames = np.max(tend) if last > first else 0
+
+        delta = np.zeros((num_frames+1, len(u_idx)), dtype=int)
+        np.add.at(delta, (tbeg, cols), 1)
+        np.add.at(delta, (tend, cols), -1)
+        M = (np.cumsum(delta[:-1], axis=0) > 0).astype(dtype=int)
+        return M, self.names[u_idx]
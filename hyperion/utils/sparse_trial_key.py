@@ -0,0 +1,363 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os.path as path
+
+import numpy as np
+import scipy.sparse as sparse
+import h5py
+
+from .list_utils import *
+from .trial_io import read_trial_list, write_trial_list
+from .trial_key import TrialKey
+from .sparse_trial_ndx import SparseTrialNdx, reindex_sparse
+
+
+class SparseTrialKey(TrialKey):
+    """ Contains the trial key for speaker recognition trials,
+        with the target and non-target masks stored as CSR sparse matrices.
+        Trial conditions are not supported, model and segment
+        conditions are kept as dense matrices.
+
+    Attributes:
+      model_set: List of model names.
+      seg_set: List of test segment names.
+      tar: Sparse boolean matrix with target trials (num_models x num_segments).
+      non: Sparse boolean matrix with non-target trials (num_models x num_segments).
+      model_cond: Conditions related to the model.
+      seg_cond: Conditions related to the test segment.
+      model_cond_name: String list with the names of the model conditions.
+      seg_cond_name: String list with the names of the segment conditions.
+    """
+
+    def __init__(self, model_set=None, seg_set=None, tar=None, non=None,
+                 model_cond=None, seg_cond=None,
+                 model_cond_name=None, seg_cond_name=None):
+        super(SparseTrialKey, self).__init__(
+            model_set, seg_set, tar, non, model_cond, seg_cond, None,
+            model_cond_name, seg_cond_name, None)
+
+
+
+    @classmethod
+    def from_trial_key(cls, key):
+        """Creates a SparseTrialKey from a TrialKey."""
+        assert key.trial_cond is None, 'trial conditions are not supported'
+        return cls(key.model_set, key.seg_set,
+                   sparse.csr_matrix(key.tar), sparse.csr_matrix(key.non),
+                   key.model_cond, key.seg_cond,
+                   key.model_cond_name, key.seg_cond_name)
+
+
+
+    def to_trial_key(self):
+        """Converts to a dense TrialKey."""
+        return TrialKey(self.model_set, self.seg_set,
+                        self.tar.toarray(), self.non.toarray(),
+                        self.model_cond, self.seg_cond, None,
+                        self.model_cond_name, self.seg_cond_name)
+
+
+
+    def _copy_with(self, model_set, seg_set, tar, non, model_idx, seg_idx):
+        model_cond = None
+        seg_cond = None
+        if self.model_cond is not None:
+            model_cond = self.model_cond[:, model_idx]
+        if self.seg_cond is not None:
+            seg_cond = self.seg_cond[:, seg_idx]
+        return SparseTrialKey(model_set, seg_set, tar, non,
+                              model_cond, seg_cond,
+                              self.model_cond_name, self.seg_cond_name)
+
+
+
+    def sort(self):
+        """Sorts the object by model and test segment names."""
+        model_set, m_idx = sort(self.model_set, return_index=True)
+        seg_set, s_idx = sort(self.seg_set, return_index=True)
+        key = self._copy_with(model_set, seg_set, self.tar[m_idx][:, s_idx],
+                              self.non[m_idx][:, s_idx], m_idx, s_idx)
+        self.__dict__.update(key.__dict__)
+
+
+
+    def save_h5(self, file_path):
+        """Saves object to h5 file in sparse format.
+
+        Args:
+          file_path: File to write the list.
+        """
+        trial_mask = self.tar.astype('int8') - self.non.astype('int8')
+        trial_mask.eliminate_zeros()
+        trial_mask = trial_mask.tocoo()
+        with h5py.File(file_path, 'w') as f:
+            f.create_dataset('ID/row_ids', data=self.model_set.astype('S'))
+            f.create_dataset('ID/column_ids', data=self.seg_set.astype('S'))
+            f.create_dataset('trials/model_idx', data=trial_mask.row.astype('int32'))
+            f.create_dataset('trials/seg_idx', data=trial_mask.col.astype('int32'))
+            f.create_dataset('trials/label', data=trial_mask.data)
+            if self.model_cond is not None:
+                f.create_dataset('model_cond', data=self.model_cond.astype('uint8'))
+            if self.seg_cond is not None:
+                f.create_dataset('seg_cond', data=self.seg_cond.astype('uint8'))
+            if self.model_cond_name is not None:
+                f.create_dataset('model_cond_name', data=self.model_cond_name.astype('S'))
+            if self.seg_cond_name is not None:
+                f.create_dataset('seg_cond_name', data=self.seg_cond_name.astype('S'))
+
+
+
+    def save_txt(self, file_path):
+        """Saves object to txt file.
+
+        Args:
+          file_path: File to write the list.
+        """
+        tar_seg_idx, tar_model_idx = self.tar.T.tocsr().nonzero()
+        non_seg_idx, non_model_idx = self.non.T.tocsr().nonzero()
+        label = np.repeat(['target', 'nontarget'], [len(tar_seg_idx), len(non_seg_idx)])
+        write_trial_list(file_path, self.model_set, self.seg_set,
+                         np.concatenate((tar_model_idx, non_model_idx)),
+                         np.concatenate((tar_seg_idx, non_seg_idx)), [label])
+
+
+
+    @classmethod
+    def load(cls, file_path):
+        """Loads object from txt/h5 file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialKey object.
+        """
+        file_base, file_ext = path.splitext(file_path)
+        if file_ext == '.txt' :
+            return cls.load_txt(file_path)
+        return cls.load_h5(file_path)
+
+
+
+    @staticmethod
+    def _make_tar_non(model_idx, seg_idx, is_tar, shape):
+        is_non = np.logical_not(is_tar)
+        tar = sparse.csr_matrix(
+            (np.ones(np.sum(is_tar), dtype='bool'), (model_idx[is_tar], seg_idx[is_tar])),
+            shape=shape)
+        non = sparse.csr_matrix(
+            (np.ones(np.sum(is_non), dtype='bool'), (model_idx[is_non], seg_idx[is_non])),
+            shape=shape)
+        return tar, non
+
+
+
+    @classmethod
+    def load_h5(cls, file_path):
+        """Loads object from h5 file in sparse or dense format.
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialKey object.
+        """
+        with h5py.File(file_path, 'r') as f:
+            if 'trials' not in f:
+                return cls.from_trial_key(TrialKey.load_h5(file_path))
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
+            model_idx = np.asarray(f['trials/model_idx'], dtype=int)
+            seg_idx = np.asarray(f['trials/seg_idx'], dtype=int)
+            is_tar = np.asarray(f['trials/label']) > 0
+            tar, non = cls._make_tar_non(
+                model_idx, seg_idx, is_tar, (len(model_set), len(seg_set)))
+
+            model_cond = None
+            seg_cond = None
+            model_cond_name = None
+            seg_cond_name = None
+            if 'model_cond' in f:
+                model_cond = np.asarray(f['model_cond'], dtype='bool')
+            if 'seg_cond' in f:
+                seg_cond = np.asarray(f['seg_cond'], dtype='bool')
+            if 'model_cond_name' in f:
+                model_cond_name = np.asarray(f['model_cond_name'], dtype='U')
+            if 'seg_cond_name' in f:
+                seg_cond_name = np.asarray(f['seg_cond_name'], dtype='U')
+
+        return cls(model_set, seg_set, tar, non, model_cond, seg_cond,
+                   model_cond_name, seg_cond_name)
+
+
+
+    @classmethod
+    def load_txt(cls, file_path):
+        """Loads object from txt file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialKey object.
+        """
+        model_set, seg_set, model_idx, seg_idx, fields = read_trial_list(
+            file_path, num_fields=3)
+        tar, non = cls._make_tar_non(model_idx, seg_idx, fields[0] == 'target',
+                                     (len(model_set), len(seg_set)))
+        return cls(model_set, seg_set, tar, non)
+
+
+
+    @classmethod
+    def merge(cls, key_list):
+        """Merges several key objects.
+
+        Args:
+          key_list: List of SparseTrialKey objects.
+
+        Returns:
+          Merged SparseTrialKey object.
+        """
+        model_set = key_list[0].model_set
+        seg_set = key_list[0].seg_set
+        for key_i in key_list[1:]:
+            model_set = np.union1d(model_set, key_i.model_set)
+            seg_set = np.union1d(seg_set, key_i.seg_set)
+
+        shape = (len(model_set), len(seg_set))
+        tar = sparse.csr_matrix(shape, dtype='bool')
+        non = sparse.csr_matrix(shape, dtype='bool')
+        model_cond = key_list[0].model_cond
+        seg_cond = key_list[0].seg_cond
+        if model_cond is not None:
+            model_cond = np.zeros((model_cond.shape[0], shape[0]), dtype='bool')
+        if seg_cond is not None:
+            seg_cond = np.zeros((seg_cond.shape[0], shape[1]), dtype='bool')
+
+        for key_i in key_list:
+            model_idx = np.searchsorted(model_set, key_i.model_set)
+            seg_idx = np.searchsorted(seg_set, key_i.seg_set)
+            tar = tar + reindex_sparse(key_i.tar, model_idx, seg_idx, shape)
+            non = non + reindex_sparse(key_i.non, model_idx, seg_idx, shape)
+            if model_cond is not None:
+                model_cond[:, model_idx] |= key_i.model_cond
+            if seg_cond is not None:
+                seg_cond[:, seg_idx] |= key_i.seg_cond
+
+        return cls(model_set, seg_set, tar, non, model_cond, seg_cond,
+                   key_list[0].model_cond_name, key_list[0].seg_cond_name)
+
+
+
+    def filter(self, model_set, seg_set, keep=True):
+        """Removes elements from SparseTrialKey object.
+
+        Args:
+          model_set: List of models to keep or remove.
+          seg_set: List of test segments to keep or remove.
+          keep: If True, we keep the elements in model_set/seg_set,
+                if False, we remove the elements in model_set/seg_set.
+
+        Returns:
+          Filtered SparseTrialKey object.
+        """
+        if not(keep):
+            model_set = np.setdiff1d(self.model_set, model_set)
+            seg_set = np.setdiff1d(self.seg_set, seg_set)
+
+        f, mod_idx = ismember(model_set, self.model_set)
+        assert(np.all(f))
+        f, seg_idx = ismember(seg_set, self.seg_set)
+        assert(np.all(f))
+        return self._copy_with(self.model_set[mod_idx], self.seg_set[seg_idx],
+                               self.tar[mod_idx][:, seg_idx],
+                               self.non[mod_idx][:, seg_idx], mod_idx, seg_idx)
+
+
+
+    def split(self, model_idx, num_model_parts, seg_idx, num_seg_parts):
+        """Splits the SparseTrialKey into num_model_parts x num_seg_parts
+           and returns part (model_idx, seg_idx).
+
+        Args:
+          model_idx: Model index of the part to return from 1 to num_model_parts.
+          num_model_parts: Number of parts to split the model list.
+          seg_idx: Segment index of the part to return from 1 to num_model_parts.
+          num_seg_parts: Number of parts to split the test segment list.
+
+        Returns:
+          Subpart of the SparseTrialKey
+        """
+        model_set, model_idx1 = split_list(self.model_set,
+                                           model_idx, num_model_parts)
+        seg_set, seg_idx1 = split_list(self.seg_set,
+                                       seg_idx, num_seg_parts)
+        return self._copy_with(model_set, seg_set,
+                               self.tar[model_idx1][:, seg_idx1],
+                               self.non[model_idx1][:, seg_idx1], model_idx1, seg_idx1)
+
+
+
+    def to_ndx(self):
+        """Converts SparseTrialKey object into SparseTrialNdx object.
+
+        Returns:
+          SparseTrialNdx object.
+        """
+        return SparseTrialNdx(self.model_set, self.seg_set, self.tar + self.non)
+
+
+
+    def validate(self):
+        """Validates the attributes of the SparseTrialKey object.
+        """
+        self.model_set = list2ndarray(self.model_set)
+        self.seg_set = list2ndarray(self.seg_set)
+
+        shape = (len(self.model_set), len(self.seg_set))
+        assert(len(np.unique(self.model_set)) == shape[0])
+        assert(len(np.unique(self.seg_set)) == shape[1])
+
+        if (self.tar is None) or (self.non is None):
+            self.tar = sparse.csr_matrix(shape, dtype='bool')
+            self.non = sparse.csr_matrix(shape, dtype='bool')
+        else:
+            self.tar = sparse.csr_matrix(self.tar, dtype='bool')
+            self.non = sparse.csr_matrix(self.non, dtype='bool')
+            assert(self.tar.shape == shape)
+            assert(self.non.shape == shape)
+
+        if self.model_cond is not None:
+            assert(self.model_cond.shape[1] == shape[0])
+        if self.seg_cond is not None:
+            assert(self.seg_cond.shape[1] == shape[1])
+        if self.model_cond_name is not None:
+            self.model_cond_name = list2ndarray(self.model_cond_name)
+        if self.seg_cond_name is not None:
+            self.seg_cond_name = list2ndarray(self.seg_cond_name)
+
+
+
+    def __eq__(self, other):
+        """Equal operator"""
+        eq = self.model_set.shape == other.model_set.shape
+        eq = eq and np.all(self.model_set == other.model_set)
+        eq = eq and (self.seg_set.shape == other.seg_set.shape)
+        eq = eq and np.all(self.seg_set == other.seg_set)
+        eq = eq and (sparse.csr_matrix(other.tar, dtype='bool') != self.tar).nnz == 0
+        eq = eq and (sparse.csr_matrix(other.non, dtype='bool') != self.non).nnz == 0
+
+        eq = eq and ((self.model_cond is None) == (other.model_cond is None))
+        eq = eq and ((self.seg_cond is None) == (other.seg_cond is None))
+        if self.model_cond is not None:
+            eq = eq and np.all(self.model_cond == other.model_cond)
+        if self.seg_cond is not None:
+            eq = eq and np.all(self.seg_cond == other.seg_cond)
+        return eq
@@ -0,0 +1,271 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os.path as path
+
+import numpy as np
+import scipy.sparse as sparse
+import h5py
+
+from .list_utils import *
+from .trial_io import read_trial_list, write_trial_list
+from .trial_ndx import TrialNdx
+
+
+def reindex_sparse(mat, row_map, col_map, shape):
+    """Moves the elements of a sparse matrix to new rows and columns,
+       the elements mapped to -1 are removed.
+
+    Args:
+      mat: Sparse matrix.
+      row_map: New row of each row of mat.
+      col_map: New column of each column of mat.
+      shape: Shape of the new matrix.
+
+    Returns:
+      CSR matrix.
+    """
+    mat = mat.tocoo()
+    row = row_map[mat.row]
+    col = col_map[mat.col]
+    keep = np.logical_and(row >= 0, col >= 0)
+    return sparse.csr_matrix((mat.data[keep], (row[keep], col[keep])), shape=shape)
+
+
+
+class SparseTrialNdx(TrialNdx):
+    """ Contains the trial index to run speaker recognition trials,
+        with the trial mask stored as a CSR sparse matrix.
+        For evaluations where only a small fraction of the model x segment
+        pairs are trials, the operations work on the indices of the trials
+        instead of on dense matrices.
+
+    Attributes:
+      model_set: List of model names.
+      seg_set: List of test segment names.
+      trial_mask: Sparse boolean matrix with the trials to execute (num_models x num_segments).
+    """
+
+    def __init__(self, model_set=None, seg_set=None, trial_mask=None):
+        super(SparseTrialNdx, self).__init__(model_set, seg_set, trial_mask)
+
+
+
+    @classmethod
+    def from_trial_ndx(cls, ndx):
+        """Creates a SparseTrialNdx from a TrialNdx."""
+        return cls(ndx.model_set, ndx.seg_set, sparse.csr_matrix(ndx.trial_mask))
+
+
+
+    def to_trial_ndx(self):
+        """Converts to a dense TrialNdx."""
+        return TrialNdx(self.model_set, self.seg_set, self.trial_mask.toarray())
+
+
+
+    @property
+    def num_trials(self):
+        return self.trial_mask.nnz
+
+
+
+    def sort(self):
+        """Sorts the object by model and test segment names."""
+        self.model_set, m_idx = sort(self.model_set, return_index=True)
+        self.seg_set, s_idx = sort(self.seg_set, return_index=True)
+        self.trial_mask = self.trial_mask[m_idx][:, s_idx]
+
+
+
+    def save_h5(self, file_path):
+        """Saves object to h5 file in sparse format.
+
+        Args:
+          file_path: File to write the list.
+        """
+        model_idx, seg_idx = self.trial_mask.nonzero()
+        with h5py.File(file_path, 'w') as f:
+            f.create_dataset('ID/row_ids', data=self.model_set.astype('S'))
+            f.create_dataset('ID/column_ids', data=self.seg_set.astype('S'))
+            f.create_dataset('trials/model_idx', data=model_idx.astype('int32'))
+            f.create_dataset('trials/seg_idx', data=seg_idx.astype('int32'))
+
+
+
+    def save_txt(self, file_path):
+        """Saves object to txt file.
+
+        Args:
+          file_path: File to write the list.
+        """
+        seg_idx, model_idx = self.trial_mask.T.tocsr().nonzero()
+        write_trial_list(file_path, self.model_set, self.seg_set, model_idx, seg_idx)
+
+
+
+    @classmethod
+    def load(cls, file_path):
+        """Loads object from txt/h5 file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialNdx object.
+        """
+        file_base, file_ext = path.splitext(file_path)
+        if file_ext == '.txt' :
+            return cls.load_txt(file_path)
+        return cls.load_h5(file_path)
+
+
+
+    @classmethod
+    def load_h5(cls, file_path):
+        """Loads object from h5 file in sparse or dense format.
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialNdx object.
+        """
+        with h5py.File(file_path, 'r') as f:
+            if 'trials' not in f:
+                return cls.from_trial_ndx(TrialNdx.load_h5(file_path))
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
+            model_idx = np.asarray(f['trials/model_idx'], dtype=int)
+            seg_idx = np.asarray(f['trials/seg_idx'], dtype=int)
+        trial_mask = sparse.csr_matrix(
+            (np.ones(len(model_idx), dtype='bool'), (model_idx, seg_idx)),
+            shape=(len(model_set), len(seg_set)))
+        return cls(model_set, seg_set, trial_mask)
+
+
+
+    @classmethod
+    def load_txt(cls, file_path):
+        """Loads object from txt file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialNdx object.
+        """
+        model_set, seg_set, model_idx, seg_idx, _ = read_trial_list(file_path)
+        trial_mask = sparse.csr_matrix(
+            (np.ones(len(model_idx), dtype='bool'), (model_idx, seg_idx)),
+            shape=(len(model_set), len(seg_set)))
+        return cls(model_set, seg_set, trial_mask)
+
+
+
+    @classmethod
+    def merge(cls, ndx_list):
+        """Merges several index objects.
+
+        Args:
+          ndx_list: List of SparseTrialNdx objects.
+
+        Returns:
+          Merged SparseTrialNdx object.
+        """
+        model_set = ndx_list[0].model_set
+        seg_set = ndx_list[0].seg_set
+        for ndx_i in ndx_list[1:]:
+            model_set = np.union1d(model_set, ndx_i.model_set)
+            seg_set = np.union1d(seg_set, ndx_i.seg_set)
+
+        shape = (len(model_set), len(seg_set))
+        trial_mask = sparse.csr_matrix(shape, dtype='bool')
+        for ndx_i in ndx_list:
+            trial_mask = trial_mask + reindex_sparse(
+                ndx_i.trial_mask,
+                np.searchsorted(model_set, ndx_i.model_set),
+                np.searchsorted(seg_set, ndx_i.seg_set), shape)
+
+        return cls(model_set, seg_set, trial_mask)
+
+
+
+    def filter(self, model_set, seg_set, keep=True):
+        """Removes elements from SparseTrialNdx object.
+
+        Args:
+          model_set: List of models to keep or remove.
+          seg_set: List of test segments to keep or remove.
+          keep: If True, we keep the elements in model_set/seg_set,
+                if False, we remove the elements in model_set/seg_set.
+
+        Returns:
+          Filtered SparseTrialNdx object.
+        """
+        if not(keep):
+            model_set = np.setdiff1d(self.model_set, model_set)
+            seg_set = np.setdiff1d(self.seg_set, seg_set)
+
+        f, mod_idx = ismember(model_set, self.model_set)
+        assert np.all(f)
+        f, seg_idx = ismember(seg_set, self.seg_set)
+        assert np.all(f)
+        trial_mask = self.trial_mask[mod_idx][:, seg_idx]
+        return SparseTrialNdx(self.model_set[mod_idx], self.seg_set[seg_idx], trial_mask)
+
+
+
+    def split(self, model_idx, num_model_parts, seg_idx, num_seg_parts):
+        """Splits the SparseTrialNdx into num_model_parts x num_seg_parts
+           and returns part (model_idx, seg_idx).
+
+        Args:
+          model_idx: Model index of the part to return from 1 to num_model_parts.
+          num_model_parts: Number of parts to split the model list.
+          seg_idx: Segment index of the part to return from 1 to num_model_parts.
+          num_seg_parts: Number of parts to split the test segment list.
+
+        Returns:
+          Subpart of the SparseTrialNdx
+        """
+        model_set, model_idx1 = split_list(self.model_set,
+                                           model_idx, num_model_parts)
+        seg_set, seg_idx1 = split_list(self.seg_set,
+                                       seg_idx, num_seg_parts)
+        trial_mask = self.trial_mask[model_idx1][:, seg_idx1]
+        return SparseTrialNdx(model_set, seg_set, trial_mask)
+
+
+
+    def validate(self):
+        """Validates the attributes of the SparseTrialNdx object.
+        """
+        self.model_set = list2ndarray(self.model_set)
+        self.seg_set = list2ndarray(self.seg_set)
+
+        shape = (len(self.model_set), len(self.seg_set))
+        assert(len(np.unique(self.model_set)) == shape[0])
+        assert(len(np.unique(self.seg_set)) == shape[1])
+        if self.trial_mask is None:
+            self.trial_mask = sparse.csr_matrix(np.ones(shape, dtype='bool'))
+        else:
+            self.trial_mask = sparse.csr_matrix(self.trial_mask, dtype='bool')
+            assert(self.trial_mask.shape == shape)
+
+
+
+    def __eq__(self, other):
+        """Equal operator"""
+        eq = self.model_set.shape == other.model_set.shape
+        eq = eq and np.all(self.model_set == other.model_set)
+        eq = eq and (self.seg_set.shape == other.seg_set.shape)
+        eq = eq and np.all(self.seg_set == other.seg_set)
+        eq = eq and (sparse.csr_matrix(other.trial_mask, dtype='bool') !=
+                     self.trial_mask).nnz == 0
+        return eq
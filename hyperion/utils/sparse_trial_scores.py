@@ -0,0 +1,419 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os.path as path
+import logging
+
+import numpy as np
+import scipy.sparse as sparse
+import h5py
+
+from ..hyp_defs import float_cpu
+from .list_utils import *
+from .trial_io import read_trial_list, write_trial_list
+from .trial_ndx import TrialNdx
+from .trial_scores import TrialScores
+from .sparse_trial_ndx import reindex_sparse
+
+
+class SparseTrialScores(TrialScores):
+    """ Contains the scores for the speaker recognition trials,
+        with the scores and the score mask stored as CSR sparse matrices.
+
+    Attributes:
+      model_set: List of model names.
+      seg_set: List of test segment names.
+      scores: Sparse matrix with the scores (num_models x num_segments).
+      score_mask: Sparse boolean matrix with the trials with valid scores to True (num_models x num_segments).
+    """
+
+    def __init__(self, model_set=None, seg_set=None, scores=None, score_mask=None):
+        super(SparseTrialScores, self).__init__(model_set, seg_set, scores, score_mask)
+
+
+
+    @classmethod
+    def from_trial_scores(cls, scr):
+        """Creates a SparseTrialScores from a TrialScores."""
+        return cls._from_mask(scr.model_set, scr.seg_set, scr.score_mask,
+                              scr.scores[scr.score_mask.nonzero()])
+
+
+
+    def to_trial_scores(self):
+        """Converts to a dense TrialScores."""
+        return TrialScores(self.model_set, self.seg_set,
+                           self.scores.toarray(), self.score_mask.toarray())
+
+
+
+    @classmethod
+    def _from_mask(cls, model_set, seg_set, score_mask, values):
+        """Creates the object from a score mask and the scores of its
+           non-zero elements in the order given by score_mask.nonzero().
+        """
+        score_mask = sparse.csr_matrix(score_mask, dtype='bool')
+        score_mask.eliminate_zeros()
+        scores = sparse.csr_matrix(
+            (np.asarray(values, dtype=float_cpu()), score_mask.indices, score_mask.indptr),
+            shape=score_mask.shape)
+        return cls(model_set, seg_set, scores, score_mask)
+
+
+
+    def _get_values(self, mask):
+        """Returns the scores of the non-zero elements of a mask."""
+        model_idx, seg_idx = mask.nonzero()
+        return np.asarray(self.scores[model_idx, seg_idx]).ravel()
+
+
+
+    def sort(self):
+        """Sorts the object by model and test segment names."""
+        self.model_set, m_idx = sort(self.model_set, return_index=True)
+        self.seg_set, s_idx = sort(self.seg_set, return_index=True)
+        self.scores = self.scores[m_idx][:, s_idx]
+        self.score_mask = self.score_mask[m_idx][:, s_idx]
+
+
+
+    def save_h5(self, file_path):
+        """Saves object to h5 file in sparse format.
+
+        Args:
+          file_path: File to write the list.
+        """
+        model_idx, seg_idx = self.score_mask.nonzero()
+        with h5py.File(file_path, 'w') as f:
+            f.create_dataset('ID/row_ids', data=self.model_set.astype('S'))
+            f.create_dataset('ID/column_ids', data=self.seg_set.astype('S'))
+            f.create_dataset('trials/model_idx', data=model_idx.astype('int32'))
+            f.create_dataset('trials/seg_idx', data=seg_idx.astype('int32'))
+            f.create_dataset('trials/scores', data=self._get_values(self.score_mask))
+
+
+
+    def save_txt(self, file_path):
+        """Saves object to txt file.
+
+        Args:
+          file_path: File to write the list.
+        """
+        seg_idx, model_idx = self.score_mask.T.tocsr().nonzero()
+        write_trial_list(file_path, self.model_set, self.seg_set, model_idx, seg_idx,
+                         [np.asarray(self.scores[model_idx, seg_idx]).ravel()])
+
+
+
+    @classmethod
+    def load(cls, file_path):
+        """Loads object from txt/h5 file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialScores object.
+        """
+        file_base, file_ext = path.splitext(file_path)
+        if file_ext == '.txt' :
+            return cls.load_txt(file_path)
+        return cls.load_h5(file_path)
+
+
+
+    @classmethod
+    def _from_trials(cls, model_set, seg_set, model_idx, seg_idx, values):
+        shape = (len(model_set), len(seg_set))
+        scores = sparse.csr_matrix(
+            (np.asarray(values, dtype=float_cpu()), (model_idx, seg_idx)), shape=shape)
+        score_mask = sparse.csr_matrix(
+            (np.ones(len(model_idx), dtype='bool'), (model_idx, seg_idx)), shape=shape)
+        return cls(model_set, seg_set, scores, score_mask)
+
+
+
+    @classmethod
+    def load_h5(cls, file_path):
+        """Loads object from h5 file in sparse or dense format.
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialScores object.
+        """
+        with h5py.File(file_path, 'r') as f:
+            if 'trials' not in f:
+                return cls.from_trial_scores(TrialScores.load_h5(file_path))
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
+            model_idx = np.asarray(f['trials/model_idx'], dtype=int)
+            seg_idx = np.asarray(f['trials/seg_idx'], dtype=int)
+            values = np.asarray(f['trials/scores'])
+        return cls._from_trials(model_set, seg_set, model_idx, seg_idx, values)
+
+
+
+    @classmethod
+    def load_txt(cls, file_path):
+        """Loads object from txt file
+
+        Args:
+          file_path: File to read the list.
+
+        Returns:
+          SparseTrialScores object.
+        """
+        model_set, seg_set, model_idx, seg_idx, fields = read_trial_list(
+            file_path, num_fields=3, dtypes={2: float_cpu()})
+        return cls._from_trials(model_set, seg_set, model_idx, seg_idx, fields[0])
+
+
+
+    @classmethod
+    def merge(cls, scr_list):
+        """Merges several score objects.
+
+        Args:
+          scr_list: List of SparseTrialScores objects.
+
+        Returns:
+          Merged SparseTrialScores object.
+        """
+        model_set = scr_list[0].model_set
+        seg_set = scr_list[0].seg_set
+        for scr_i in scr_list[1:]:
+            model_set = np.union1d(model_set, scr_i.model_set)
+            seg_set = np.union1d(seg_set, scr_i.seg_set)
+
+        model_idx = []
+        seg_idx = []
+        values = []
+        for scr_i in scr_list:
+            mask_i = scr_i.score_mask.tocoo()
+            model_idx.append(np.searchsorted(model_set, scr_i.model_set)[mask_i.row])
+            seg_idx.append(np.searchsorted(seg_set, scr_i.seg_set)[mask_i.col])
+            values.append(np.asarray(scr_i.scores[mask_i.row, mask_i.col]).ravel())
+
+        model_idx = np.concatenate(model_idx)
+        seg_idx = np.concatenate(seg_idx)
+        scr = cls._from_trials(model_set, seg_set, model_idx, seg_idx,
+                               np.concatenate(values))
+        assert scr.score_mask.nnz == len(model_idx), 'merged scores overlap'
+        return scr
+
+
+
+    def filter(self, model_set, seg_set, keep=True, raise_missing=True):
+        """Removes elements from SparseTrialScores object.
+
+        Args:
+          model_set: List of models to keep or remove.
+          seg_set: List of test segments to keep or remove.
+          keep: If True, we keep the elements in model_set/seg_set,
+                if False, we remove the elements in model_set/seg_set.
+          raise_missing: Raises exception if there are elements in model_set or
+                         seg_set that are not in the object.
+        Returns:
+          Filtered SparseTrialScores object.
+        """
+        if not(keep):
+            model_set = np.setdiff1d(self.model_set, model_set)
+            seg_set = np.setdiff1d(self.seg_set, seg_set)
+
+        model_set = list2ndarray(model_set)
+        seg_set = list2ndarray(seg_set)
+        f_mod, mod_idx = ismember(model_set, self.model_set)
+        f_seg, seg_idx = ismember(seg_set, self.seg_set)
+
+        if np.all(f_mod) and np.all(f_seg):
+            return SparseTrialScores(self.model_set[mod_idx], self.seg_set[seg_idx],
+                                     self.scores[mod_idx][:, seg_idx],
+                                     self.score_mask[mod_idx][:, seg_idx])
+
+        for i in (f_mod==0).nonzero()[0]:
+            logging.info('model %s not found' % model_set[i])
+        for i in (f_seg==0).nonzero()[0]:
+            logging.info('segment %s not found' % seg_set[i])
+        if raise_missing:
+            raise Exception('some scores were not computed')
+
+        # maps the rows and columns of self to the new ones, the missing
+        # models and segments remain without scores
+        row_map = np.full((len(self.model_set),), -1, dtype=int)
+        row_map[mod_idx[f_mod]] = f_mod.nonzero()[0]
+        col_map = np.full((len(self.seg_set),), -1, dtype=int)
+        col_map[seg_idx[f_seg]] = f_seg.nonzero()[0]
+        shape = (len(model_set), len(seg_set))
+        return SparseTrialScores(
+            model_set, seg_set,
+            reindex_sparse(self.scores, row_map, col_map, shape),
+            reindex_sparse(self.score_mask, row_map, col_map, shape))
+
+
+
+    def split(self, model_idx, num_model_parts, seg_idx, num_seg_parts):
+        """Splits the SparseTrialScores into num_model_parts x num_seg_parts
+           and returns part (model_idx, seg_idx).
+
+        Args:
+          model_idx: Model index of the part to return from 1 to num_model_parts.
+          num_model_parts: Number of parts to split the model list.
+          seg_idx: Segment index of the part to return from 1 to num_model_parts.
+          num_seg_parts: Number of parts to split the test segment list.
+
+        Returns:
+          Subpart of the SparseTrialScores
+        """
+        model_set, model_idx1 = split_list(self.model_set,
+                                           model_idx, num_model_parts)
+        seg_set, seg_idx1 = split_list(self.seg_set,
+                                       seg_idx, num_seg_parts)
+        return SparseTrialScores(model_set, seg_set,
+                                 self.scores[model_idx1][:, seg_idx1],
+                                 self.score_mask[model_idx1][:, seg_idx1])
+
+
+
+    def validate(self):
+        """Validates the attributes of the SparseTrialScores object.
+        """
+        self.model_set = list2ndarray(self.model_set)
+        self.seg_set = list2ndarray(self.seg_set)
+
+        shape = (len(self.model_set), len(self.seg_set))
+        assert(len(np.unique(self.model_set)) == shape[0])
+        assert(len(np.unique(self.seg_set)) == shape[1])
+        if self.scores is None:
+            self.scores = sparse.csr_matrix(shape, dtype=float_cpu())
+        else:
+            self.scores = sparse.csr_matrix(self.scores)
+            assert(self.scores.shape == shape)
+            assert(np.all(np.isfinite(self.scores.data)))
+
+        if self.score_mask is None:
+            self.score_mask = sparse.csr_matrix(self.scores, dtype='bool')
+        else:
+            self.score_mask = sparse.csr_matrix(self.score_mask, dtype='bool')
+            assert(self.score_mask.shape == shape)
+
+
+
+    @staticmethod
+    def _ndx_mask(ndx):
+        if isinstance(ndx, TrialNdx):
+            return sparse.csr_matrix(ndx.trial_mask, dtype='bool')
+        return (sparse.csr_matrix(ndx.tar, dtype='bool') +
+                sparse.csr_matrix(ndx.non, dtype='bool'))
+
+
+
+    def align_with_ndx(self, ndx, raise_missing=True):
+        """Aligns scores, model_set and seg_set with a trial index or key,
+           dense or sparse.
+
+        Args:
+          ndx: TrialNdx, TrialKey, SparseTrialNdx or SparseTrialKey object.
+          raise_missing: Raises exception if there are trials in ndx that are not
+                         in the score object.
+
+        Returns:
+          Aligned SparseTrialScores object.
+        """
+        scr = self.filter(ndx.model_set, ndx.seg_set, keep=True, raise_missing=raise_missing)
+        mask = self._ndx_mask(ndx)
+        score_mask = mask.multiply(scr.score_mask).tocsr()
+        score_mask.eliminate_zeros()
+        scr = SparseTrialScores._from_mask(scr.model_set, scr.seg_set, score_mask,
+                                           scr._get_values(score_mask))
+
+        missing_trials = mask - score_mask
+        missing_trials.eliminate_zeros()
+        if missing_trials.nnz > 0:
+            for i, j in zip(*missing_trials.nonzero()):
+                logging.info('missing-scores for %s %s' %
+                             (scr.model_set[i], scr.seg_set[j]))
+
+            if raise_missing:
+                raise Exception('some scores were not computed')
+        return scr
+
+
+
+    def get_tar_non(self, key):
+        """Returns target and non target scores.
+
+        Args:
+          key: TrialKey or SparseTrialKey object.
+
+        Returns:
+          Numpy array with target scores.
+          Numpy array with non-target scores.
+        """
+        scr = self.align_with_ndx(key)
+        tar_mask = scr.score_mask.multiply(sparse.csr_matrix(key.tar, dtype='bool'))
+        non_mask = scr.score_mask.multiply(sparse.csr_matrix(key.non, dtype='bool'))
+        tar_mask = tar_mask.tocsr()
+        non_mask = non_mask.tocsr()
+        tar_mask.eliminate_zeros()
+        non_mask.eliminate_zeros()
+        return scr._get_values(tar_mask), scr._get_values(non_mask)
+
+
+
+    def set_missing_to_value(self, ndx, val):
+        """Aligns the scores with a trial index and sets the trials with missing
+        scores to the same value.
+
+        Args:
+          ndx: TrialNdx, TrialKey, SparseTrialNdx or SparseTrialKey object.
+          val: Value for the missing scores.
+
+        Returns:
+          Aligned SparseTrialScores object.
+        """
+        scr = self.align_with_ndx(ndx, raise_missing=False)
+        mask = self._ndx_mask(ndx)
+        missing = mask - scr.score_mask
+        missing.eliminate_zeros()
+        score_mask = scr.score_mask + missing
+        values = np.where(np.asarray(missing[score_mask.nonzero()]).ravel(),
+                          val, scr._get_values(score_mask))
+        return SparseTrialScores._from_mask(scr.model_set, scr.seg_set, score_mask, values)
+
+
+
+    def transform(self, f):
+        """Applies a function to the valid scores of the object.
+
+        Args:
+          f: function handle.
+        """
+        scr = SparseTrialScores._from_mask(self.model_set, self.seg_set, self.score_mask,
+                                           f(self._get_values(self.score_mask)))
+        self.scores = scr.scores
+        self.score_mask = scr.score_mask
+
+
+
+    def __eq__(self, other):
+        """Equal operator"""
+        eq = self.model_set.shape == other.model_set.shape
+        eq = eq and np.all(self.model_set == other.model_set)
+        eq = eq and (self.seg_set.shape == other.seg_set.shape)
+        eq = eq and np.all(self.seg_set == other.seg_set)
+        if not eq:
+            return False
+        other_mask = sparse.csr_matrix(other.score_mask, dtype='bool')
+        eq = (other_mask != self.score_mask).nnz == 0
+        other_scores = sparse.csr_matrix(other.scores).multiply(other_mask)
+        eq = eq and np.all(np.isclose(
+            self._get_values(self.score_mask),
+            np.asarray(other_scores[self.score_mask.nonzero()]).ravel(), atol=1e-5))
+        return eq
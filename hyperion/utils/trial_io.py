@@ -0,0 +1,84 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+
+ Fast reading and writing of trial lists in text format.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+
+def encode_ids(ids):
+    """Converts a list of names into integer codes with a hash table.
+
+    Args:
+      ids: Array or list of names.
+
+    Returns:
+      Sorted unique names, like np.unique.
+      Index of each name in the unique names.
+    """
+    codes, uniques = pd.factorize(np.asarray(ids), sort=True)
+    return np.asarray(uniques).astype('U'), codes
+
+
+
+def read_trial_list(file_path, num_fields=2, dtypes=None):
+    """Reads a text trial list with lines "model segment [field ...]"
+       with the pandas C parser.
+
+    Args:
+      file_path: File to read.
+      num_fields: Number of fields per line to read.
+      dtypes: Dictionary with the dtype of the fields after the second,
+              by default they are read as strings.
+
+    Returns:
+      Sorted unique model names.
+      Sorted unique test segment names.
+      Model index of each trial.
+      Segment index of each trial.
+      List with the remaining fields of each trial.
+    """
+    dtype = dict((i, str) for i in range(num_fields))
+    if dtypes is not None:
+        dtype.update(dtypes)
+    df = pd.read_csv(file_path, sep=r'\s+', header=None, usecols=range(num_fields),
+                     dtype=dtype, na_filter=False, engine='c')
+    model_set, model_idx = encode_ids(df[0].values)
+    seg_set, seg_idx = encode_ids(df[1].values)
+    fields = [df[i].values for i in range(2, num_fields)]
+    return model_set, seg_set, model_idx, seg_idx, fields
+
+
+
+def write_trial_list(file_path, model_set, seg_set, model_idx, seg_idx,
+                     fields=[], float_format='%f', chunk_size=100000):
+    """Writes a text trial list with lines "model segment [field ...]".
+
+    Args:
+      file_path: File to write.
+      model_set: Model names.
+      seg_set: Test segment names.
+      model_idx: Model index of each trial.
+      seg_idx: Segment index of each trial.
+      fields: List with the remaining fields of each trial.
+      float_format: Format of the float fields.
+      chunk_size: Number of lines formatted at once.
+    """
+    model_set = np.asarray(model_set)
+    seg_set = np.asarray(seg_set)
+    fields = [np.asarray(field) for field in fields]
+    fmt = ' '.join(['%s', '%s'] + [
+        float_format if field.dtype.kind == 'f' else '%s' for field in fields]) + '\n'
+    with open(file_path, 'w') as f:
+        for first in range(0, len(model_idx), chunk_size):
+            last = first + chunk_size
+            columns = [model_set[model_idx[first:last]].tolist(),
+                       seg_set[seg_idx[first:last]].tolist()] + [
+                           field[first:last].tolist() for field in fields]
+            f.write(''.join([fmt % line for line in zip(*columns)]))
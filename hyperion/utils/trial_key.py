@@ -15,6 +15,7 @@ import h5py
 
 from .list_utils import *
 from .trial_ndx import TrialNdx
+from .trial_io import read_trial_list, write_trial_list
 
 class TrialKey(object):
     """ Contains the trial key for speaker recognition trials.
@@ -135,15 +136,12 @@ class TrialKey(object):
         Args:
           file_path: File to write the list.
         """
-        with open(file_path, 'w') as f:
-            idx=(self.tar.T == True).nonzero()
-            for item in zip(idx[0], idx[1]):
-                f.write('%s %s target\n' %
-                        (self.model_set[item[1]], self.seg_set[item[0]]))
-            idx=(self.non.T == True).nonzero()
-            for item in zip(idx[0], idx[1]):
-                f.write('%s %s nontarget\n' %
-                        (self.model_set[item[1]], self.seg_set[item[0]]))
+        tar_seg_idx, tar_model_idx = self.tar.T.nonzero()
+        non_seg_idx, non_model_idx = self.non.T.nonzero()
+        label = np.repeat(['target', 'nontarget'], [len(tar_seg_idx), len(non_seg_idx)])
+        write_trial_list(file_path, self.model_set, self.seg_set,
+                         np.concatenate((tar_model_idx, non_model_idx)),
+                         np.concatenate((tar_seg_idx, non_seg_idx)), [label])
                     
 
     @classmethod
@@ -174,10 +172,16 @@ class TrialKey(object):
           TrialKey object.
         """
         with h5py.File(file_path, 'r') as f:
-            model_set = [t.decode('utf-8') for t in f['ID/row_ids']]
-            seg_set = [t.decode('utf-8') for t in f['ID/column_ids']]
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
             
-            trial_mask=np.asarray(f['trial_mask'], dtype='int8')
+            if 'trials' in f:
+                # sparse format, only the labels of the trials are stored
+                trial_mask = np.zeros((len(model_set), len(seg_set)), dtype='int8')
+                trial_mask[np.asarray(f['trials/model_idx']),
+                           np.asarray(f['trials/seg_idx'])] = np.asarray(f['trials/label'])
+            else:
+                trial_mask=np.asarray(f['trial_mask'], dtype='int8')
             tar = (trial_mask > 0).astype('bool')
             non = (trial_mask < 0).astype('bool')
             
@@ -215,22 +219,14 @@ class TrialKey(object):
         Returns:
           TrialKey object.
         """
-        with open(file_path, 'r') as f:
-            fields = [line.split() for line in f]
-        models = [i[0] for i in fields]
-        segments = [i[1] for i in fields]
-        is_tar = [i[2] == 'target' for i in fields]
-        model_set, _, model_idx = np.unique(
-            models, return_index=True, return_inverse=True)
-        seg_set, _, seg_idx = np.unique(
-            segments, return_index=True, return_inverse=True)
+        model_set, seg_set, model_idx, seg_idx, fields = read_trial_list(
+            file_path, num_fields=3)
+        is_tar = fields[0] == 'target'
         tar = np.zeros((len(model_set), len(seg_set)), dtype='bool')
         non = np.zeros((len(model_set), len(seg_set)), dtype='bool')
-        for item in zip(model_idx, seg_idx, is_tar):
-            if item[2]:
-                tar[item[0], item[1]] = True
-            else:
-                non[item[0], item[1]] = True
+        tar[model_idx[is_tar], seg_idx[is_tar]] = True
+        is_non = np.logical_not(is_tar)
+        non[model_idx[is_non], seg_idx[is_non]] = True
         return cls(model_set, seg_set, tar, non)
 
 
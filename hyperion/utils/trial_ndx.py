@@ -14,6 +14,7 @@ import numpy as np
 import h5py
 
 from .list_utils import *
+from .trial_io import read_trial_list, write_trial_list
 
 
 class TrialNdx(object):
@@ -97,10 +98,8 @@ class TrialNdx(object):
         Args:
           file_path: File to write the list.
         """
-        idx=(self.trial_mask.T == True).nonzero()
-        with open(file_path, 'w') as f:
-            for item in zip(idx[0], idx[1]):
-                f.write('%s %s\n' % (self.model_set[item[1]], self.seg_set[item[0]]))
+        seg_idx, model_idx = self.trial_mask.T.nonzero()
+        write_trial_list(file_path, self.model_set, self.seg_set, model_idx, seg_idx)
                     
 
     @classmethod
@@ -131,9 +130,15 @@ class TrialNdx(object):
           TrialNdx object.
         """
         with h5py.File(file_path, 'r') as f:
-            model_set = [t.decode('utf-8') for t in f['ID/row_ids']]
-            seg_set = [t.decode('utf-8') for t in f['ID/column_ids']]
-            trial_mask = np.asarray(f['trial_mask'], dtype='bool')
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
+            if 'trials' in f:
+                # sparse format, only the indices of the trials are stored
+                trial_mask = np.zeros((len(model_set), len(seg_set)), dtype='bool')
+                trial_mask[np.asarray(f['trials/model_idx']),
+                           np.asarray(f['trials/seg_idx'])] = True
+            else:
+                trial_mask = np.asarray(f['trial_mask'], dtype='bool')
         return cls(model_set, seg_set, trial_mask)
 
 
@@ -147,17 +152,9 @@ class TrialNdx(object):
         Returns:
           TrialNdx object.
         """
-        with open(file_path, 'r') as f:
-            fields = [line.split() for line in f]
-        models = [i[0] for i in fields]
-        segments = [i[1] for i in fields]
-        model_set, _, model_idx = np.unique(
-            models, return_index=True, return_inverse=True)
-        seg_set, _, seg_idx = np.unique(
-            segments, return_index=True, return_inverse=True)
+        model_set, seg_set, model_idx, seg_idx, _ = read_trial_list(file_path)
         trial_mask = np.zeros((len(model_set), len(seg_set)), dtype='bool')
-        for item in zip(model_idx, seg_idx):
-            trial_mask[item[0], item[1]] = True
+        trial_mask[model_idx, seg_idx] = True
         return cls(model_set, seg_set, trial_mask)
 
 
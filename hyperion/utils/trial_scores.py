@@ -16,6 +16,7 @@ import h5py
 
 from ..hyp_defs import float_cpu
 from .list_utils import *
+from .trial_io import read_trial_list, write_trial_list
 from .trial_ndx import TrialNdx
 from .trial_key import TrialKey
 
@@ -102,12 +103,9 @@ class TrialScores(object):
         Args:
           file_path: File to write the list.
         """
-        idx=(self.score_mask.T == True).nonzero()
-        with open(file_path, 'w') as f:
-            for item in zip(idx[0], idx[1]):
-                f.write('%s %s %f\n' %
-                        (self.model_set[item[1]], self.seg_set[item[0]],
-                         self.scores[item[1], item[0]]))
+        seg_idx, model_idx = self.score_mask.T.nonzero()
+        write_trial_list(file_path, self.model_set, self.seg_set, model_idx, seg_idx,
+                         [self.scores[model_idx, seg_idx]])
 
                 
 
@@ -140,10 +138,19 @@ class TrialScores(object):
           TrialScores object.
         """
         with h5py.File(file_path, 'r') as f:
-            model_set = [t.decode('utf-8') for t in f['ID/row_ids']]
-            seg_set = [t.decode('utf-8') for t in f['ID/column_ids']]
-            scores = np.asarray(f['scores'], dtype=float_cpu())
-            score_mask = np.asarray(f['score_mask'], dtype='bool')
+            model_set = np.asarray(f['ID/row_ids']).astype('U')
+            seg_set = np.asarray(f['ID/column_ids']).astype('U')
+            if 'trials' in f:
+                # sparse format, only the scores of the trials are stored
+                model_idx = np.asarray(f['trials/model_idx'])
+                seg_idx = np.asarray(f['trials/seg_idx'])
+                scores = np.zeros((len(model_set), len(seg_set)), dtype=float_cpu())
+                score_mask = np.zeros(scores.shape, dtype='bool')
+                scores[model_idx, seg_idx] = np.asarray(f['trials/scores'])
+                score_mask[model_idx, seg_idx] = True
+            else:
+                scores = np.asarray(f['scores'], dtype=float_cpu())
+                score_mask = np.asarray(f['score_mask'], dtype='bool')
         return cls(model_set, seg_set, scores, score_mask)
 
 
@@ -157,22 +164,12 @@ class TrialScores(object):
         Returns:
           TrialScores object.
         """
-        with open(file_path, 'r') as f:
-            fields = [line.split() for line in f]
-        models = [i[0] for i in fields]
-        segments = [i[1] for i in fields]
-        scores_v = np.array([i[2] for i in fields])
-        
-        model_set, _, model_idx = np.unique(
-            models, return_index=True, return_inverse=True)
-        seg_set, _, seg_idx = np.unique(
-            segments, return_index=True, return_inverse=True)
-
-        scores = np.zeros((len(model_set), len(seg_set)))
+        model_set, seg_set, model_idx, seg_idx, fields = read_trial_list(
+            file_path, num_fields=3, dtypes={2: float_cpu()})
+        scores = np.zeros((len(model_set), len(seg_set)), dtype=float_cpu())
         score_mask = np.zeros(scores.shape, dtype='bool')
-        for item in zip(model_idx, seg_idx, scores_v):
-            score_mask[item[0], item[1]] = True
-            scores[item[0], item[1]]=item[2]
+        score_mask[model_idx, seg_idx] = True
+        scores[model_idx, seg_idx] = fields[0]
         return cls(model_set, seg_set, scores, score_mask)
 
     
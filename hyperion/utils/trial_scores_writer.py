@@ -0,0 +1,80 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import numpy as np
+import h5py
+
+from ..hyp_defs import float_cpu
+from .list_utils import list2ndarray
+
+
+class TrialScoresWriter(object):
+    """Writes TrialScores to h5 file by blocks of models x segments,
+       without keeping the full score matrix in memory.
+       The output file has the same format as TrialScores.save_h5
+       and can be read with TrialScores.load.
+
+    Attributes:
+      file_path: Output h5 file.
+      model_set: List of model names.
+      seg_set: List of test segment names.
+      chunks: h5 chunk shape of the score matrix, if True h5py chooses it.
+    """
+
+    def __init__(self, file_path, model_set, seg_set, chunks=True):
+        self.file_path = file_path
+        self.model_set = list2ndarray(model_set)
+        self.seg_set = list2ndarray(seg_set)
+        shape = (len(self.model_set), len(self.seg_set))
+
+        self.f = h5py.File(file_path, 'w')
+        self.f.create_dataset('ID/row_ids', data=self.model_set.astype('S'))
+        self.f.create_dataset('ID/column_ids', data=self.seg_set.astype('S'))
+        self._scores = self.f.create_dataset(
+            'scores', shape=shape, dtype=float_cpu(), chunks=chunks, fillvalue=0)
+        self._score_mask = self.f.create_dataset(
+            'score_mask', shape=shape, dtype='uint8', chunks=chunks, fillvalue=0)
+
+
+
+    def __enter__(self):
+        return self
+
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+    def close(self):
+        """Closes the output file"""
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+
+    def write(self, model_first, seg_first, scores, score_mask=None):
+        """Writes a block of scores.
+
+        Args:
+          model_first: Index of the first model of the block.
+          seg_first: Index of the first test segment of the block.
+          scores: Score matrix of the block (num_models_block x num_segs_block).
+          score_mask: Boolean matrix with the valid scores of the block,
+                      if None all the scores are valid.
+        """
+        model_last = model_first + scores.shape[0]
+        seg_last = seg_first + scores.shape[1]
+        self._scores[model_first:model_last, seg_first:seg_last] = scores
+        if score_mask is None:
+            score_mask = np.ones(scores.shape, dtype='uint8')
+        self._score_mask[model_first:model_last, seg_first:seg_last] = score_mask.astype(
+            'uint8', copy=False)
@@ -0,0 +1,85 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy.spatial.distance import squareform
+
+from hyperion.clustering import AHC
+
+num_spks = 5
+num_segs = 60
+
+
+def create_scores():
+    rng = np.random.RandomState(seed=1024)
+    labels = rng.randint(num_spks, size=(num_segs,))
+    x = 3*rng.normal(size=(num_spks, 10))[labels] + rng.normal(size=(num_segs, 10))
+    scores = - np.sum(np.square(x[:, None, :] - x[None, :, :]), axis=-1)
+    return scores, labels
+
+
+def flat_clusters_ref(Z, num_merges):
+    N = Z.shape[0] + 1
+    flat_clusters = np.arange(N, dtype=int)
+    for i in xrange(num_merges):
+        segm_idx = np.logical_or(flat_clusters==Z[i,0],
+                                 flat_clusters==Z[i,1])
+        flat_clusters[segm_idx] = N + i
+
+    _, flat_clusters = np.unique(flat_clusters, return_inverse=True)
+    return flat_clusters
+
+
+def test_flat_clusters():
+    scores, labels = create_scores()
+    ahc = AHC(method='average', metric='llr')
+    ahc.fit(scores)
+
+    for num_clusters in xrange(1, num_segs+1):
+        flat_clusters = ahc.get_flat_clusters(num_clusters, criterion='num_clusters')
+        assert np.all(flat_clusters == flat_clusters_ref(ahc.Z, num_segs-num_clusters))
+
+    ahc.compute_flat_clusters()
+    assert ahc.flat_clusters.shape == (num_segs, num_segs)
+    for i in xrange(num_segs):
+        assert np.all(ahc.flat_clusters[i] == flat_clusters_ref(ahc.Z, i))
+
+    flat_clusters = ahc.get_flat_clusters(num_spks, criterion='num_clusters')
+    assert np.max(flat_clusters) == num_spks - 1
+
+
+def test_fit_condensed():
+    scores, labels = create_scores()
+    mask = np.ones_like(scores, dtype=bool)
+    mask[:3, 5:8] = False
+    mask[5:8, :3] = False
+    ahc1 = AHC(method='average', metric='llr')
+    ahc1.fit(scores, mask)
+    ahc2 = AHC(method='average', metric='llr')
+    ahc2.fit(squareform(scores, checks=False), squareform(mask, checks=False))
+    assert_allclose(ahc1.Z, ahc2.Z)
+
+
+def test_sweep_flat_clusters():
+    scores, labels = create_scores()
+    ahc = AHC(method='average', metric='llr')
+    ahc.fit(scores)
+
+    thr = [-10, -200, -50, -1000, -100]
+    thr_out = []
+    for t, flat_clusters in ahc.sweep_flat_clusters(thr):
+        thr_out.append(t)
+        assert np.all(flat_clusters == ahc.get_flat_clusters(t))
+    assert thr_out == sorted(thr, reverse=True)
+
+    h, c = ahc.evaluate_impurity_det(labels)
+    assert h[-1] > 0 and c[0] > 0
+    assert_allclose([h[0], c[-1]], [0, 0], atol=1e-8)
@@ -0,0 +1,66 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.clustering import KMeans
+
+num_clusters = 4
+x_dim = 3
+num_samples = 4000
+
+
+def create_data():
+    rng = np.random.RandomState(seed=1024)
+    mu = 10*rng.normal(size=(num_clusters, x_dim))
+    labels = rng.randint(num_clusters, size=(num_samples,))
+    x = mu[labels] + rng.normal(size=(num_samples, x_dim))
+    return x, mu, labels
+
+
+def check_clusters(mu_est, mu):
+    # every true centroid has an estimated centroid close to it
+    d = np.sum(np.square(mu[:, None, :] - mu_est[None, :, :]), axis=-1)
+    assert np.all(np.min(d, axis=1) < 0.1)
+
+
+def test_predict():
+    x, mu, labels = create_data()
+    kmeans = KMeans(num_clusters=num_clusters, mu=mu, chunk_size=333)
+    index, err2 = kmeans.predict(x)
+
+    err2_ref = np.sum(np.square(x[:, None, :] - mu[None, :, :]), axis=-1)
+    assert np.all(index == np.argmin(err2_ref, axis=-1))
+    assert_allclose(err2, np.min(err2_ref, axis=-1), atol=1e-8)
+
+
+@pytest.mark.parametrize('init_method', KMeans.valid_init_methods)
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_fit(init_method, num_workers):
+    x, mu, labels = create_data()
+    kmeans = KMeans(num_clusters=num_clusters, init_method=init_method,
+                    chunk_size=333, num_workers=num_workers)
+    loss, index = kmeans.fit(x)
+
+    check_clusters(kmeans.mu, mu)
+    assert np.all(np.diff(loss) <= 1e-8)
+    index2, _ = kmeans.predict(x)
+    assert np.all(index == index2)
+
+
+def test_fit_minibatch():
+    x, mu, labels = create_data()
+    batches = [x[i:i+500] for i in xrange(0, num_samples, 500)]
+    kmeans = KMeans(num_clusters=num_clusters)
+    loss = kmeans.fit_minibatch(batches, epochs=2)
+
+    check_clusters(kmeans.mu, mu)
+    assert loss[1] <= loss[0]
@@ -0,0 +1,50 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.hyp_defs import float_cpu
+from hyperion.feats import MFCC, BatchFeatureExtractor
+
+fs = 16000
+
+
+def generate_signals(num_signals=11):
+    rng = np.random.RandomState(seed=1024)
+    return [('utt%02d' % i, (2**10)*rng.randn(fs//2+i*1000).astype(float_cpu()), fs)
+            for i in xrange(num_signals)]
+
+
+@pytest.mark.parametrize('num_threads', [1, 3])
+def test_extract(num_threads):
+
+    mfcc = MFCC()
+    signals = generate_signals()
+    extractor = BatchFeatureExtractor(mfcc, batch_size=3, max_batch_samples=4*fs,
+                                      num_threads=num_threads)
+    feats = list(extractor.extract(iter(signals)))
+    assert len(feats) == len(signals)
+    for (key, y), (key_ref, x, _) in zip(feats, signals):
+        assert key == key_ref
+        y_ref = mfcc.compute(x)
+        mfcc.reset()
+        assert_allclose(y, y_ref, rtol=1e-5)
+
+
+def test_extract_reader_error():
+
+    def reader():
+        yield 'utt00', np.ones((fs,), dtype=float_cpu()), fs
+        raise IOError('bad file')
+
+    extractor = BatchFeatureExtractor(MFCC(), batch_size=1)
+    with pytest.raises(IOError):
+        list(extractor.extract(reader()))
@@ -38,3 +38,21 @@ def test_vad():
 
     assert np.mean(vad[:len(vad_est)]==vad_est) > 0.9
     
+
+
+@pytest.mark.parametrize('vad_frames_context', [0, 3])
+def test_vad_push(vad_frames_context):
+    # with mean scale 0, the threshold doesn't depend on the mean
+    # and streaming VAD is the same as offline VAD
+    e_vad = EnergyVAD(vad_energy_mean_scale=0, vad_energy_threshold=12,
+                      vad_frames_context=vad_frames_context)
+    vad_est = e_vad.compute(s)
+
+    e_vad.reset(num_samples=len(s))
+    vad_est2 = []
+    for first in xrange(0, len(s), 7000):
+        vad_est2.append(e_vad.push(s[first:first+7000]))
+    vad_est2.append(e_vad.flush())
+    vad_est2 = np.concatenate(vad_est2)
+
+    assert np.all(vad_est == vad_est2)
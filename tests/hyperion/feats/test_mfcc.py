@@ -94,3 +94,38 @@ def test_mfcc_from_logfb():
 
     
     
+
+
+@pytest.mark.parametrize('output_step', ['logfb', 'cepstrum'])
+def test_mfcc_batch(output_step):
+
+    mfcc = MFCC(window_type=window_type, output_step=output_step)
+    x = [s, s[:3*fs], s[fs:fs+1000]]
+    P = []
+    for x_i in x:
+        P.append(mfcc.compute(x_i))
+        mfcc.reset()
+
+    P2 = mfcc.compute_batch(x)
+    assert len(P2) == len(P)
+    for P_i, P2_i in zip(P, P2):
+        assert_allclose(P_i, P2_i, rtol=1e-5)
+
+
+@pytest.mark.parametrize('raw_energy', [True, False])
+def test_mfcc_push(raw_energy):
+
+    mfcc = MFCC(window_type=window_type, raw_energy=raw_energy)
+    P = mfcc.compute(s)
+
+    mfcc.reset(num_samples=len(s))
+    chunk_sizes = [10, 300, 1000, 5000, 7, 20000]
+    P2 = []
+    first = 0
+    for chunk_size in chunk_sizes:
+        P2.append(mfcc.push(s[first:first+chunk_size]))
+        first += chunk_size
+    P2.append(mfcc.push(s[first:]))
+    P2 = np.vstack(P2)
+
+    assert_allclose(P, P2, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,101 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.utils import Utt2Info
+from hyperion.io import H5DataWriter
+from hyperion.generators.adapt_sequence_batch_generator import AdaptSequenceBatchGenerator as ASBG
+from hyperion.generators.prefetch_batch_generator import PrefetchBatchGenerator
+
+output_dir = './tests/data_out/generators'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+h5_file = output_dir + '/adapt_seqbg.h5'
+key_file = output_dir + '/adapt_seqbg.scp'
+key_file_adapt = output_dir + '/adapt_seqbg_adapt.scp'
+
+num_seqs = 10
+num_seqs_adapt = 4
+dim = 2
+
+
+def create_dataset():
+
+    rng = np.random.RandomState(seed=0)
+    file_path = ['t%d' % i for i in xrange(num_seqs)]
+    key = ['c%d' % (i % 3) for i in xrange(num_seqs)]
+    file_path_adapt = ['a%d' % i for i in xrange(num_seqs_adapt)]
+    key_adapt = ['c%d' % (i % 2 + 2) for i in xrange(num_seqs_adapt)]
+
+    Utt2Info.create(file_path, key).save(key_file, sep=' ')
+    Utt2Info.create(file_path_adapt, key_adapt).save(key_file_adapt, sep=' ')
+
+    x = {}
+    h = H5DataWriter(h5_file)
+    for k in file_path + file_path_adapt:
+        x[k] = rng.randn(rng.randint(100, 200), dim)
+        h.write(k, x[k])
+    h.close()
+
+    key2class = dict(zip(file_path + file_path_adapt, key + key_adapt))
+    return x, key2class
+
+
+
+@pytest.mark.parametrize('gen_method', ['full_seqs', 'random', 'sequential'])
+def test_read(gen_method):
+
+    x, key2class = create_dataset()
+    batch_size = 5
+    r_adapt = 2
+    sr = ASBG(h5_file, key_file, key_file_adapt, r_adapt=r_adapt,
+              batch_size=batch_size, gen_method=gen_method,
+              min_seq_length=20, max_seq_length=50)
+    assert sr.num_classes == 4
+    classes = ['c%d' % i for i in xrange(4)]
+
+    for i in xrange(sr.steps_per_epoch + 1):
+        index, first_frames, seq_lengths = sr.plan_batch()
+        assert index.dtype.kind == 'i'
+        keys_i = sr.keys[index]
+        # training sequences first, adaptation sequences last
+        assert np.all([k[0] == 't' for k in keys_i[:batch_size-r_adapt]])
+        assert np.all([k[0] == 'a' for k in keys_i[batch_size-r_adapt:]])
+
+        keys_i, x_i, y_i = sr.read_batch(index, first_frames, seq_lengths, squeeze=False)
+        assert len(x_i) == batch_size
+        for j, k in enumerate(keys_i):
+            assert classes[np.argmax(y_i[j])] == key2class[k]
+            if gen_method == 'full_seqs':
+                assert_allclose(x_i[j], x[k], rtol=1e-5)
+            else:
+                f = first_frames[j]
+                assert_allclose(x_i[j], x[k][f:f+seq_lengths[j]], rtol=1e-5)
+
+
+
+def test_read_prefetch():
+
+    create_dataset()
+    kwargs = dict(r_adapt=2, batch_size=5, gen_method='random',
+                  min_seq_length=20, max_seq_length=50)
+    sr = ASBG(h5_file, key_file, key_file_adapt, **kwargs)
+    sr_ref = ASBG(h5_file, key_file, key_file_adapt, **kwargs)
+    with PrefetchBatchGenerator(sr, num_workers=2, queue_size=2) as pf:
+        for i in xrange(4):
+            key_i, x_i, sw_i, y_i = pf.read()
+            key_ref, x_ref, sw_ref, y_ref = sr_ref.read()
+            assert key_i == key_ref
+            assert_allclose(x_i, x_ref)
+            assert_allclose(y_i, y_ref)
@@ -0,0 +1,84 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.generators import BucketBatchSampler
+
+
+def create_lengths():
+    rng = np.random.RandomState(seed=1024)
+    return rng.randint(low=200, high=60000, size=(1000,))
+
+
+
+def test_make_batches():
+    seq_lengths = create_lengths()
+    sampler = BucketBatchSampler(batch_size=16)
+    batches = sampler.make_batches(seq_lengths, rng=np.random.RandomState(seed=0))
+
+    index = np.sort(np.concatenate(batches))
+    assert np.all(index == np.arange(len(seq_lengths)))
+    assert np.all([len(b) <= 16 for b in batches])
+    assert len(batches) == int(np.ceil(len(seq_lengths)/16))
+
+    # random batches of the same size have much more padding
+    rng = np.random.RandomState(seed=1)
+    random_batches = np.array_split(rng.permutation(len(seq_lengths)), len(batches))
+    random_ratio = sampler.compute_padding_ratio(seq_lengths, random_batches)
+    assert sampler.padding_ratio < 0.1
+    assert random_ratio > 0.3
+    assert_allclose(sampler.padding_ratio,
+                    sampler.compute_padding_ratio(seq_lengths, batches))
+
+
+
+def test_make_batches_max_frames():
+    seq_lengths = create_lengths()
+    max_batch_frames = 200000
+    sampler = BucketBatchSampler(batch_size=64, max_batch_frames=max_batch_frames)
+    batches = sampler.make_batches(seq_lengths)
+
+    index = np.sort(np.concatenate(batches))
+    assert np.all(index == np.arange(len(seq_lengths)))
+    for b in batches:
+        assert len(b) <= 64
+        assert len(b)*np.max(seq_lengths[b]) <= max_batch_frames
+
+    # short sequences go in larger batches
+    first_len = [np.min(seq_lengths[b]) for b in batches]
+    num_seqs = [len(b) for b in batches]
+    assert num_seqs[np.argmin(first_len)] > num_seqs[np.argmax(first_len)]
+
+
+
+def test_make_batches_shuffle():
+    seq_lengths = create_lengths()
+    sampler = BucketBatchSampler(batch_size=16)
+    batches1 = sampler.make_batches(seq_lengths, rng=np.random.RandomState(seed=0))
+    batches2 = sampler.make_batches(seq_lengths, rng=np.random.RandomState(seed=0))
+    batches3 = sampler.make_batches(seq_lengths, rng=np.random.RandomState(seed=1))
+    assert len(batches1) == len(batches2)
+    assert all(np.array_equal(b1, b2) for b1, b2 in zip(batches1, batches2))
+    # batches can have different lengths, compare the orders and the lengths
+    same_order = np.array_equal(np.concatenate(batches1), np.concatenate(batches3))
+    same_lengths = [len(b) for b in batches1] == [len(b) for b in batches3]
+    assert not (same_order and same_lengths)
+
+    sampler = BucketBatchSampler(batch_size=16, shuffle=False)
+    batches = sampler.make_batches(seq_lengths)
+    max_len = [np.max(seq_lengths[b]) for b in batches]
+    assert np.all(np.diff(max_len) >= 0)
+
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -16,6 +16,7 @@ from numpy.testing import assert_allclose
 from hyperion.utils import Utt2Info
 from hyperion.io import H5DataWriter
 from hyperion.generators.sequence_batch_generator_v1 import SequenceBatchGeneratorV1 as SBG
+from hyperion.generators.prefetch_batch_generator import PrefetchBatchGenerator
 
 output_dir = './tests/data_out/generators'
 if not os.path.exists(output_dir):
@@ -347,8 +348,55 @@ def test_read_sequential_unbalanced():
 
         
     
-if __name__ == '__main__':
-    pytest.main([__file__])
 
 
 
+
+
+@pytest.mark.parametrize('gen_method', ['full_seqs', 'random', 'sequential'])
+def test_read_prefetch(gen_method):
+
+    create_dataset()
+    kwargs = dict(gen_method=gen_method, batch_size=5)
+    if gen_method != 'full_seqs':
+        kwargs.update(min_seq_length=10, max_seq_length=20)
+    sr = SBG(h5_file, key_file, **kwargs)
+    sr_ref = SBG(h5_file, key_file, **kwargs)
+
+    num_steps = 2*sr.steps_per_epoch + 1
+    with PrefetchBatchGenerator(sr, num_workers=2, queue_size=3) as pf:
+        for i in xrange(num_steps):
+            key_i, x_i, sw_i, y_i = pf.read()
+            key_ref, x_ref, sw_ref, y_ref = sr_ref.read()
+            assert key_i == key_ref
+            assert_allclose(x_i, x_ref)
+            assert_allclose(sw_i, sw_ref)
+            assert_allclose(y_i, y_ref)
+
+
+
+@pytest.mark.parametrize('max_batch_frames', [None, 400])
+def test_read_bucketing(max_batch_frames):
+
+    u2c = create_dataset()
+    sr = SBG(h5_file, key_file, gen_method='full_seqs', batch_size=3,
+             bucketing=True, max_batch_frames=max_batch_frames)
+
+    for epoch in xrange(2):
+        key_e = []
+        for i in xrange(sr.steps_per_epoch):
+            key_i, x_i, sw_i, y_i = sr.read()
+            sl_i = np.sum(sw_i, axis=-1).astype(int)
+            assert x_i.shape[1] == np.max(sl_i)
+            assert len(key_i) <= 3
+            if max_batch_frames is not None:
+                assert x_i.shape[0]*x_i.shape[1] <= max_batch_frames
+            key_e += key_i
+        assert sorted(key_e) == sorted(u2c.key)
+
+    assert sr.padding_ratio < 0.1
+
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
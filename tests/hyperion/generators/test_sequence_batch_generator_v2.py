@@ -223,6 +223,25 @@ def test_read_2epc_2epu():
     read_func(16,2,2)
 
         
+def test_read_labels():
+
+    u2c = create_dataset()
+    sr = SBG(h5_file, key_file, batch_size=8, num_egs_per_class=2,
+             num_egs_per_utt=2, return_utt1hot=True,
+             min_seq_length=10, max_seq_length=20)
+    key2class = dict(zip(u2c.key, u2c.info))
+    classes = np.unique(u2c.info)
+
+    for i in xrange(5):
+        key_i, x_i, sw_i, y_i, z_i = sr.read()
+        assert np.all(classes[np.argmax(y_i, axis=-1)] == [key2class[k] for k in key_i])
+        # same utterance <=> same utterance one-hot column
+        utt_i = np.argmax(z_i, axis=-1)
+        same_key = np.array(key_i)[:, None] == np.array(key_i)[None, :]
+        assert np.all(same_key == (utt_i[:, None] == utt_i[None, :]))
+
+
+        
 if __name__ == '__main__':
     pytest.main([__file__])
 
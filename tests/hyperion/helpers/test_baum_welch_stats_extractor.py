@@ -0,0 +1,120 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import os
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.pdfs import GMMDiagCov, GMMTiedDiagCov, GaussianSelector
+from hyperion.io import H5DataWriter, RandomAccessDataReaderFactory as RF
+from hyperion.helpers import BaumWelchStatsExtractor as BWSE
+
+output_dir = './tests/data_out/helpers/baum_welch_stats_extractor'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+x_dim = 3
+num_comp = 8
+
+
+def create_data(num_utts=20):
+    rng = np.random.RandomState(seed=1024)
+    mu = rng.normal(size=(num_comp, x_dim))
+    Lambda = 1/rng.uniform(0.5, 1.5, size=(num_comp, x_dim))
+    pi = np.ones((num_comp,))/num_comp
+    gmm = GMMDiagCov(pi=pi, mu=mu, Lambda=Lambda, x_dim=x_dim)
+    keys = ['utt%03d' % i for i in xrange(num_utts)]
+    x = [rng.normal(size=(rng.randint(1, 100), x_dim)) for i in xrange(num_utts)]
+    return gmm, keys, x
+
+
+def stats_ref(gmm, x):
+    N = []
+    F = []
+    for x_i in x:
+        N_i, u_x_i = gmm.accum_suff_stats(x_i)
+        F_i, _ = gmm.unstack_suff_stats(u_x_i)
+        N.append(N_i)
+        F.append(F_i.ravel())
+    return np.vstack(N), np.vstack(F)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_compute(num_workers):
+    gmm, keys, x = create_data()
+    N_gt, F_gt = stats_ref(gmm, x)
+
+    bwse = BWSE(gmm, max_block_frames=200, chunk_size=64)
+    N, F = bwse.compute(x)
+    assert_allclose(N, N_gt, rtol=1e-5, atol=1e-6)
+    assert_allclose(F, F_gt, rtol=1e-5, atol=1e-6)
+
+    bwse = BWSE(gmm, nbest=num_comp, max_block_frames=200, chunk_size=64)
+    N, F = bwse.compute(x)
+    assert_allclose(N, N_gt, rtol=1e-5, atol=1e-6)
+
+    bwse = BWSE(gmm, nbest=num_comp-1, max_block_frames=200,
+                chunk_size=64, num_workers=num_workers)
+    results = list(bwse.extract(zip(keys, x)))
+    assert [r[0] for r in results] == keys
+    N = np.vstack([r[1] for r in results])
+    F = np.vstack([r[2] for r in results])
+    # drops the component with the lowest posterior
+    N_gt = []
+    F_gt = []
+    for x_i in x:
+        z = gmm.compute_pz_nat(x_i)
+        z[np.arange(len(z)), np.argmin(z, axis=1)] = 0
+        z /= np.sum(z, axis=1, keepdims=True)
+        N_gt.append(np.sum(z, axis=0))
+        F_gt.append(np.dot(z.T, x_i).ravel())
+    assert_allclose(N, np.vstack(N_gt), rtol=1e-5, atol=1e-6)
+    assert_allclose(F, np.vstack(F_gt), rtol=1e-5, atol=1e-6)
+
+
+def test_normalize():
+    gmm, keys, x = create_data()
+    gmm = GMMTiedDiagCov(pi=gmm.pi, mu=gmm.mu, Lambda=gmm.Lambda[0], x_dim=x_dim)
+    N_gt, F_gt = stats_ref(gmm, x)
+    F_gt = F_gt.reshape(-1, num_comp, x_dim)
+    F_gt = gmm.cholLambda*(F_gt - N_gt[:, :, None]*gmm.mu)
+
+    bwse = BWSE(gmm, normalize=True, max_block_frames=100)
+    N, F = bwse.compute(x)
+    assert_allclose(N, N_gt, rtol=1e-5, atol=1e-6)
+    assert_allclose(F, F_gt.reshape(len(x), -1), rtol=1e-5, atol=1e-6)
+
+
+def test_gselect():
+    gmm, keys, x = create_data()
+    N_gt, F_gt = stats_ref(gmm, x)
+    gselect = GaussianSelector(gmm, num_clusters=4, num_sel_clusters=4, nbest=num_comp)
+    bwse = BWSE(gmm, max_block_frames=200, gselect=gselect)
+    N, F = bwse.compute(x)
+    assert_allclose(N, N_gt, rtol=1e-5, atol=1e-6)
+    assert_allclose(F, F_gt, rtol=1e-5, atol=1e-6)
+
+
+def test_write():
+    gmm, keys, x = create_data()
+    N_gt, F_gt = stats_ref(gmm, x)
+    file_path = output_dir + '/stats.h5'
+    bwse = BWSE(gmm, max_block_frames=150, num_workers=2)
+    with H5DataWriter(file_path) as w:
+        bwse.write(zip(keys, x), w)
+
+    r = RF.create(file_path)
+    N, F = BWSE.split_stats(np.vstack(r.read(keys)), num_comp)
+    assert_allclose(N, N_gt, rtol=1e-5, atol=1e-6)
+    assert_allclose(F, F_gt, rtol=1e-5, atol=1e-6)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
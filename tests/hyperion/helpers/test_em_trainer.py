@@ -0,0 +1,122 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import os
+import shutil
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.pdfs import GMMDiagCov, JFATotal
+from hyperion.io import H5DataWriter
+from hyperion.helpers import MixtureEMTrainer, JFATotalEMTrainer
+
+output_dir = './tests/data_out/helpers/em_trainer'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+x_dim = 3
+num_comp = 4
+num_shards = 3
+
+
+def create_gmm():
+    rng = np.random.RandomState(seed=1024)
+    mu = 2*rng.normal(size=(num_comp, x_dim))
+    return GMMDiagCov(pi=np.ones((num_comp,))/num_comp, mu=mu,
+                      Lambda=np.ones((num_comp, x_dim)), x_dim=x_dim)
+
+
+def create_feat_shards():
+    gmm = create_gmm()
+    rng = np.random.RandomState(seed=1025)
+    shards = []
+    x = []
+    for s in xrange(num_shards):
+        file_path = '%s/feats.%d.h5' % (output_dir, s)
+        with H5DataWriter(file_path) as w:
+            for i in xrange(5):
+                x_i = gmm.sample(rng.randint(50, 150), rng=rng)
+                w.write(['s%d-%d' % (s, i)], [x_i])
+                x.append(x_i)
+        shards.append(file_path)
+    return shards, np.concatenate(x, axis=0)
+
+
+def init_gmm():
+    gmm = create_gmm()
+    gmm.mu = gmm.mu + 0.5
+    gmm.Lambda = 0.5*gmm.Lambda
+    gmm._compute_nat_params()
+    return gmm
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_mixture(num_workers):
+    shards, x = create_feat_shards()
+    gmm = init_gmm()
+    elbo_gt, _ = gmm.fit(x, epochs=3)
+
+    gmm = init_gmm()
+    trainer = MixtureEMTrainer(gmm, batch_size=200, num_workers=num_workers)
+    elbo, elbo_norm = trainer.fit(shards, epochs=3)
+    assert_allclose(elbo, elbo_gt, rtol=1e-5)
+    assert_allclose(elbo_norm, elbo/x.shape[0], rtol=1e-5)
+
+
+def test_mixture_resume():
+    shards, x = create_feat_shards()
+    checkpoint_dir = output_dir + '/mixture_checkpoints'
+    if os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    trainer = MixtureEMTrainer(init_gmm(), checkpoint_dir=checkpoint_dir)
+    trainer.fit(shards, epochs=2)
+    assert os.path.isfile(checkpoint_dir + '/model.0001.h5')
+
+    trainer = MixtureEMTrainer(init_gmm(), checkpoint_dir=checkpoint_dir)
+    elbo, _ = trainer.fit(shards, epochs=4)
+
+    trainer_gt = MixtureEMTrainer(init_gmm())
+    elbo_gt, _ = trainer_gt.fit(shards, epochs=4)
+    assert_allclose(elbo, elbo_gt, rtol=1e-5)
+    assert_allclose(trainer.model.mu, trainer_gt.model.mu, rtol=1e-5)
+
+
+def test_jfa_total():
+    K = 4
+    y_dim = 2
+    rng = np.random.RandomState(seed=1024)
+    T = rng.normal(size=(y_dim, K*x_dim))
+    shards = []
+    N = []
+    F = []
+    for s in xrange(num_shards):
+        file_path = '%s/stats.%d.h5' % (output_dir, s)
+        N_s = rng.uniform(0, 20, size=(10, K))
+        F_s = rng.normal(size=(10, K*x_dim))*np.sqrt(np.repeat(N_s, x_dim, axis=1))
+        with H5DataWriter(file_path) as w:
+            w.write(['s%d-%d' % (s, i) for i in xrange(10)], np.hstack((N_s, F_s)))
+        shards.append(file_path)
+        N.append(N_s)
+        F.append(F_s)
+    N = np.vstack(N)
+    F = np.vstack(F)
+
+    model = JFATotal(K, T=np.copy(T))
+    elbo_gt, _ = model.fit(N, F, epochs=3)
+
+    model2 = JFATotal(K, T=np.copy(T))
+    trainer = JFATotalEMTrainer(model2, num_workers=2)
+    elbo, _ = trainer.fit(shards, epochs=3)
+    assert_allclose(elbo, elbo_gt, rtol=1e-5)
+    assert_allclose(model2.T, model.T, rtol=1e-4, atol=1e-6)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
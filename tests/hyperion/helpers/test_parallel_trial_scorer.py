@@ -0,0 +1,57 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.utils.trial_ndx import TrialNdx
+from hyperion.helpers import ParallelTrialScorer
+
+
+def create_trials(num_models=30, num_segs=50, x_dim=4):
+    rng = np.random.RandomState(seed=1024)
+    x_e = rng.normal(size=(num_models, x_dim))
+    x_t = rng.normal(size=(num_segs, x_dim))
+    model_set = ['m%03d' % i for i in xrange(num_models)]
+    seg_set = ['s%03d' % i for i in xrange(num_segs)]
+    mask = rng.uniform(size=(num_models, num_segs)) < 0.3
+    ndx = TrialNdx(model_set, seg_set, mask)
+    return x_e, x_t, model_set, seg_set, ndx
+
+
+def cosine_scorer(x_e, x_t):
+    return np.dot(x_e, x_t.T)
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_score(num_workers):
+    x_e, x_t, model_set, seg_set, ndx = create_trials()
+    scores_gt = cosine_scorer(x_e, x_t)
+
+    scorer = ParallelTrialScorer(cosine_scorer, num_model_parts=3,
+                                 num_seg_parts=4, num_workers=num_workers)
+    scr = scorer.score(x_e, x_t, model_set, seg_set, ndx)
+    assert np.all(scr.score_mask == ndx.trial_mask)
+    assert_allclose(scr.scores, scores_gt*ndx.trial_mask)
+    assert len(scorer.block_stats) == 12
+    assert np.sum([s[4] for s in scorer.block_stats]) == np.sum(ndx.trial_mask)
+
+    scr = scorer.score(x_e, x_t, model_set, seg_set)
+    assert np.all(scr.score_mask)
+    assert_allclose(scr.scores, scores_gt)
+
+
+def test_score_classifier():
+    _, x_t, model_set, seg_set, _ = create_trials()
+    W = np.random.RandomState(seed=1025).normal(size=(x_t.shape[1], len(model_set)))
+    scorer = ParallelTrialScorer(lambda idx, x: np.dot(x, W[:, idx]).T,
+                                 num_model_parts=2, num_seg_parts=2, num_workers=2)
+    scr = scorer.score(None, x_t, model_set, seg_set)
+    assert_allclose(scr.scores, np.dot(x_t, W).T)
@@ -0,0 +1,82 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy import linalg as la
+
+from hyperion.pdfs import FRPLDA, SPLDA, PLDA
+from hyperion.utils.trial_ndx import TrialNdx
+from hyperion.utils.trial_scores import TrialScores
+from hyperion.helpers import PLDABlockScorer
+
+output_dir = './tests/data_out/helpers'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+x_dim = 5
+
+
+def create_pldas():
+    rng = np.random.RandomState(seed=1024)
+    A = rng.normal(size=(x_dim, x_dim))
+    Sb = np.dot(A, A.T) + np.eye(x_dim)
+    A = rng.normal(size=(x_dim, x_dim))
+    Sw = np.dot(A, A.T) + np.eye(x_dim)
+    mu = rng.normal(size=(x_dim,))
+    pldas = [FRPLDA(mu=mu, B=la.inv(Sb), W=la.inv(Sw)),
+             SPLDA(mu=mu, V=rng.normal(size=(3, x_dim)), W=la.inv(Sw)),
+             PLDA(mu=mu, V=rng.normal(size=(3, x_dim)),
+                  U=rng.normal(size=(2, x_dim)), D=1+rng.uniform(size=(x_dim,)))]
+    return pldas
+
+
+def create_trials(num_models=23, num_segs=57, density=0.3):
+    rng = np.random.RandomState(seed=1025)
+    x_e = rng.normal(size=(num_models, x_dim))
+    x_t = rng.normal(size=(num_segs, x_dim))
+    model_set = ['m%03d' % i for i in xrange(num_models)]
+    seg_set = ['s%03d' % i for i in xrange(num_segs)]
+    mask = rng.uniform(size=(num_models, num_segs)) < density
+    ndx = TrialNdx(model_set, seg_set, mask)
+    return x_e, x_t, model_set, seg_set, ndx
+
+
+@pytest.mark.parametrize('min_block_density', [0, 1.1])
+def test_score(min_block_density):
+    x_e, x_t, model_set, seg_set, ndx = create_trials()
+    for plda in create_pldas():
+        scores_gt = plda.llr_1vs1(x_e, x_t)
+        scorer = PLDABlockScorer(plda, model_block_size=10, seg_block_size=20,
+                                 min_block_density=min_block_density)
+        scr = scorer.score(x_e, x_t, model_set, seg_set, ndx)
+        assert np.all(scr.score_mask == ndx.trial_mask)
+        assert_allclose(scr.scores[ndx.trial_mask], scores_gt[ndx.trial_mask])
+        assert np.all(scr.scores[np.logical_not(ndx.trial_mask)] == 0)
+
+        scr = scorer.score(x_e, x_t, model_set, seg_set)
+        assert np.all(scr.score_mask)
+        assert_allclose(scr.scores, scores_gt)
+
+
+def test_score_to_file():
+    x_e, x_t, model_set, seg_set, ndx = create_trials(density=0.02)
+    file_path = output_dir + '/plda_block_scores.h5'
+    for plda in create_pldas():
+        scores_gt = plda.llr_1vs1(x_e, x_t)
+        scorer = PLDABlockScorer(plda, model_block_size=7, seg_block_size=11)
+        num_trials = scorer.score_to_file(x_e, x_t, model_set, seg_set, file_path, ndx)
+        assert num_trials == np.sum(ndx.trial_mask)
+        scr = TrialScores.load(file_path)
+        assert np.all(scr.model_set == ndx.model_set)
+        assert np.all(scr.seg_set == ndx.seg_set)
+        assert np.all(scr.score_mask == ndx.trial_mask)
+        assert_allclose(scr.scores[ndx.trial_mask], scores_gt[ndx.trial_mask])
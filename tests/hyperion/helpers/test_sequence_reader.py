@@ -157,6 +157,24 @@ def test_read_full_seq():
         
 
 
+def test_read_full_seq_bucketing():
+
+    create_dataset()
+    sr = SequenceReader(h5_file, key_file, batch_size=3, bucketing=True,
+                        max_batch_frames=400)
+
+    keys = []
+    for i in xrange(sr.num_batches):
+        x_i, sw_i, keys_i = sr.read(return_3d=True)
+        assert x_i.shape[0]*x_i.shape[1] <= 400
+        assert x_i.shape[1] == np.max(np.sum(sw_i, axis=-1))
+        keys += keys_i
+
+    assert sorted(keys) == sorted(sr.scp.file_path)
+    assert sr.padding_ratio < 0.1
+
+
+
 def test_read_sequential():
     
 
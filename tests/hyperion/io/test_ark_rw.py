@@ -1777,6 +1777,52 @@ def test_write_squeeze_vec():
         assert k1 == k2
         assert_allclose(d1, d2)
 
+def test_read_random_feat_mmap():
+
+    r = RDRF.create(feat_scp_b, path_prefix=input_prefix)
+    key1 = list(r.scp.key)
+    data1 = r.read(key1)
+    shapes1 = r.read_shapes(key1)
+
+    r = RDRF.create(feat_scp_b, path_prefix=input_prefix, use_mmap=True)
+    data2 = r.read(key1)
+    assert r.read_shapes(key1) == shapes1
+    for d1,d2 in zip(data1, data2):
+        assert_allclose(d1, d2)
+        assert not d2.flags.writeable
+
+    row_offset = [i for i in xrange(len(key1))]
+    data2 = r.read(key1, row_offset=row_offset, num_rows=10)
+    for i, (d1,d2) in enumerate(zip(data1, data2)):
+        assert_allclose(d1[i:i+10], d2)
+    r.close()
+
+    # ranges in scp file
+    r = RDRF.create(feat_range_b, path_prefix=input_prefix)
+    data1 = r.read(key1)
+    r = RDRF.create(feat_range_b, path_prefix=input_prefix, use_mmap=True)
+    data2 = r.read(key1)
+    for d1,d2 in zip(data1, data2):
+        assert_allclose(d1, d2)
+
+    # compressed matrices are read without mmap
+    r = RDRF.create(feat_scp_c[0], path_prefix=input_prefix)
+    data1 = r.read(key1)
+    r = RDRF.create(feat_scp_c[0], path_prefix=input_prefix, use_mmap=True)
+    data2 = r.read(key1)
+    for d1,d2 in zip(data1, data2):
+        assert_allclose(d1, d2)
+
+    # vectors
+    r = RDRF.create(vec_scp_b, path_prefix=input_prefix)
+    key1 = list(r.scp.key)
+    data1 = r.read(key1, squeeze=True)
+    r = RDRF.create(vec_scp_b, path_prefix=input_prefix, use_mmap=True)
+    data2 = r.read(key1, squeeze=True)
+    assert_allclose(data1, data2)
+
+
+
 # read compressed
 # write compressed
 # read compressed range x3
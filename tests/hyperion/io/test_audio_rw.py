@@ -151,3 +151,75 @@ def test_read_rar_with_segments():
 
     for s_i, s1_i in zip(s_seg, s1):
         assert_allclose(s_i, s1_i, atol=1)
+
+
+def test_read_sar_pipe_with_segments():
+
+    cat_scp_file = audio_path + '/cat.scp'
+    with open(cat_scp_file,'w') as f:
+        for i, k in enumerate(keys):
+            f.write('%s cat %s/%s.wav |\n' %(k, audio_path, k))
+
+    with SAR(cat_scp_file, segments_file, wav_cache_size=1) as r:
+        keys1 = []
+        for k_i, s_i, fs_i in r:
+            keys1.append(k_i)
+            assert_allclose(s_seg[keys_seg.index(k_i)], s_i, atol=1)
+            assert len(r._wav_cache) <= 1
+        assert len(r._wav_cache) == 0
+
+    assert keys1 == keys_seg
+
+
+
+def test_read_rar_pipe_with_segments():
+
+    cat_scp_file = audio_path + '/cat.scp'
+    with RAR(cat_scp_file, segments_file, wav_cache_size=2) as r:
+        s1, fs1 = r.read(keys_seg[::-1])
+        assert len(r._wav_cache) == 2
+
+    for s_i, s1_i in zip(s_seg[::-1], s1):
+        assert_allclose(s_i, s1_i, atol=1)
+
+
+
+@pytest.mark.parametrize('wav_cache_size, num_decoded', [(1, 6), (2, 4), (3, 3)])
+def test_read_sar_pipe_with_interleaved_segments(monkeypatch, wav_cache_size, num_decoded):
+
+    cat_scp_file = audio_path + '/cat.scp'
+    with open(cat_scp_file,'w') as f:
+        for i, k in enumerate(keys):
+            f.write('%s cat %s/%s.wav |\n' %(k, audio_path, k))
+
+    # segments of the 3 recordings interleaved
+    idx = [i*2 + j for j in xrange(2) for i in xrange(3)]
+    keys_seg_i = [keys_seg[i] for i in idx]
+    segments_i_file = audio_path + '/segments_interleaved'
+    with open(segments_file, 'r') as f_in:
+        lines = f_in.readlines()
+    with open(segments_i_file, 'w') as f_out:
+        for i in idx:
+            f_out.write(lines[i])
+
+    read_wavspecifier = SAR.read_wavspecifier
+    decoded = []
+    def counting_read_wavspecifier(wavspecifier, scale=2**15):
+        decoded.append(wavspecifier)
+        return read_wavspecifier(wavspecifier, scale)
+
+    monkeypatch.setattr(SAR, 'read_wavspecifier', staticmethod(counting_read_wavspecifier))
+    with SAR(cat_scp_file, segments_i_file, wav_cache_size=wav_cache_size) as r:
+        keys1 = []
+        s1 = []
+        for k_i, s_i, fs_i in r:
+            keys1.append(k_i)
+            s1.append(s_i)
+            assert len(r._wav_cache) <= wav_cache_size
+        assert len(r._wav_cache) == 0
+
+    # the recording needed furthest ahead is evicted first
+    assert len(decoded) == num_decoded
+    assert keys1 == keys_seg_i
+    for i, s1_i in zip(idx, s1):
+        assert_allclose(s_seg[i], s1_i, atol=1)
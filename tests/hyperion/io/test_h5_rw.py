@@ -1611,6 +1611,25 @@ def test_write_squeeze_vec():
         assert k1 == k2
         assert_allclose(d1, d2)
 
+def test_read_random_feat_mmap():
+
+    for rspec in [feat_h5_ho[0], feat_scp_ho, feat_scp_hco[0]]:
+        r = RDRF.create(rspec)
+        key1 = list(r.f.keys()) if rspec[:3] == 'h5:' else list(r.scp.key)
+        data1 = r.read(key1)
+        r = RDRF.create(rspec, use_mmap=True)
+        data2 = r.read(key1)
+        for d1,d2 in zip(data1, data2):
+            assert_allclose(d1, d2)
+
+        row_offset = [i for i in xrange(len(key1))]
+        data2 = r.read(key1, row_offset=row_offset, num_rows=10)
+        for i, (d1,d2) in enumerate(zip(data1, data2)):
+            assert_allclose(d1[i:i+10], d2)
+        r.close()
+
+
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,89 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.metrics import ScoreEvaluator
+from hyperion.metrics.roc import compute_roc
+from hyperion.metrics.eer import compute_eer, compute_prbep
+from hyperion.metrics.dcf import compute_min_dcf, compute_act_dcf
+from hyperion.metrics.cllr import compute_cllr
+from hyperion.metrics.utils import opt_loglr
+from hyperion.utils.trial_key import TrialKey
+from hyperion.utils.trial_scores import TrialScores
+
+
+def create_scores(num_tar=200, num_non=2000, do_round=False):
+    rng = np.random.RandomState(seed=1024)
+    tar = rng.normal(size=(num_tar,)) + 2
+    non = rng.normal(size=(num_non,))
+    if do_round:
+        tar = np.round(tar, 1)
+        non = np.round(non, 1)
+    return tar, non
+
+
+@pytest.mark.parametrize('do_round', [False, True])
+def test_eval(do_round):
+    tar, non = create_scores(do_round=do_round)
+    prior = [0.01, 0.05, 0.5]
+    e = ScoreEvaluator.from_tar_non(tar, non)
+
+    p_miss, p_fa = compute_roc(tar, non)
+    p_miss_2, p_fa_2 = e.roc()
+    assert_allclose(p_miss, p_miss_2)
+    assert_allclose(p_fa, p_fa_2)
+
+    assert_allclose(e.eer(), compute_eer(tar, non))
+    assert_allclose(e.prbep(), compute_prbep(tar, non))
+    assert_allclose(e.min_dcf(prior)[0], compute_min_dcf(tar, non, prior)[0])
+    assert_allclose(e.act_dcf(prior)[0], compute_act_dcf(tar, non, prior)[0])
+    assert_allclose(e.cllr(), compute_cllr(tar, non))
+    assert_allclose(e.min_cllr(), compute_cllr(*opt_loglr(tar, non, 'raw')), rtol=1e-5)
+
+
+def test_eval_conditions():
+    tar, non = create_scores()
+    prior = [0.01, 0.05]
+    e = ScoreEvaluator.from_tar_non(tar, non)
+    is_tar = np.zeros((len(tar)+len(non),), dtype=bool)
+    is_tar[:len(tar)] = True
+    rng = np.random.RandomState(seed=1025)
+    masks = [rng.uniform(size=is_tar.shape) < 0.5 for i in xrange(3)]
+
+    r = e.eval_conditions(masks, prior)
+    for i, mask in enumerate(masks):
+        tar_i = tar[mask[:len(tar)]]
+        non_i = non[mask[len(tar):]]
+        assert_allclose(r['eer'][i], compute_eer(tar_i, non_i))
+        assert_allclose(r['min_dcf'][i], compute_min_dcf(tar_i, non_i, prior)[0])
+        assert_allclose(r['act_dcf'][i], compute_act_dcf(tar_i, non_i, prior)[0])
+        assert_allclose(r['cllr'][i], compute_cllr(tar_i, non_i))
+
+
+def test_from_key():
+    rng = np.random.RandomState(seed=1026)
+    model_set = ['m%d' % i for i in xrange(10)]
+    seg_set = ['s%d' % i for i in xrange(50)]
+    tar = rng.uniform(size=(10, 50)) < 0.2
+    non = np.logical_and(np.logical_not(tar), rng.uniform(size=(10, 50)) < 0.8)
+    key = TrialKey(model_set, seg_set, tar, non)
+    scores = rng.normal(size=(10, 50)) + 2*tar
+    scr = TrialScores(model_set, seg_set, scores)
+
+    e = ScoreEvaluator.from_key(scr, key)
+    assert_allclose(e.eer(), compute_eer(scores[tar], scores[non]))
+
+    cond = np.zeros((10, 50), dtype=bool)
+    cond[:5] = True
+    e_c = e.select(cond)
+    assert_allclose(e_c.eer(), compute_eer(scores[:5][tar[:5]], scores[:5][non[:5]]))
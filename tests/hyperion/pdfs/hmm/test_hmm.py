@@ -0,0 +1,211 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy.special import logsumexp
+
+from hyperion.pdfs import HMM
+
+
+def create_hmm(num_states=4, tied_trans=False, seed=1024):
+    rng = np.random.RandomState(seed=seed)
+    pi = rng.dirichlet(np.ones(num_states))
+    if tied_trans:
+        trans = np.full((num_states, num_states), 0.1/(num_states-1))
+        trans[np.diag_indices(num_states)] = 0.9
+    else:
+        trans = rng.dirichlet(np.ones(num_states), size=(num_states,))
+    return HMM(pi=pi, trans=trans, tied_trans=tied_trans)
+
+
+
+def create_banded_hmm(num_states=40):
+    # left-to-right model with transitions to the next two states
+    trans = np.zeros((num_states, num_states))
+    for k in xrange(num_states):
+        band = min(3, num_states - k)
+        trans[k, k:k+band] = 1./band
+    pi = np.zeros((num_states,))
+    pi[:5] = 0.2
+    return HMM(pi=pi, trans=trans, left_to_right=True)
+
+
+
+def create_llk(num_seqs, num_frames, num_states, seed=1025):
+    rng = np.random.RandomState(seed=seed)
+    return 10*rng.normal(size=(num_seqs, num_frames, num_states))
+
+
+
+def forward_backward_ref(model, x):
+    # log-domain reference
+    log_pi = np.log(model.pi)
+    with np.errstate(divide='ignore'):
+        log_trans = np.log(model.trans)
+    N = x.shape[0]
+    log_alpha = np.zeros_like(x)
+    log_beta = np.zeros_like(x)
+    log_alpha[0] = log_pi + x[0]
+    for n in xrange(1, N):
+        log_alpha[n] = x[n] + logsumexp(log_alpha[n-1][:, None] + log_trans, axis=0)
+    for n in xrange(N-2, -1, -1):
+        log_beta[n] = logsumexp(log_trans + x[n+1] + log_beta[n+1], axis=1)
+    log_px = logsumexp(log_alpha[-1])
+    pz = np.exp(log_alpha + log_beta - log_px)
+    log_zz = (log_alpha[:-1, :, None] + log_trans + x[1:, None, :]
+              + log_beta[1:, None, :] - log_px)
+    Nzz = np.sum(np.exp(log_zz), axis=0)
+    return log_alpha, log_beta, pz, Nzz, log_px
+
+
+
+def viterbi_ref(model, x):
+    with np.errstate(divide='ignore'):
+        log_trans = np.log(model.trans)
+        delta = np.log(model.pi) + x[0]
+    psi = np.zeros(x.shape, dtype=int)
+    for n in xrange(1, x.shape[0]):
+        u = delta[:, None] + log_trans
+        psi[n] = np.argmax(u, axis=0)
+        delta = np.max(u, axis=0) + x[n]
+    path = np.zeros((x.shape[0],), dtype=int)
+    path[-1] = np.argmax(delta)
+    for n in xrange(x.shape[0]-1, 0, -1):
+        path[n-1] = psi[n, path[n]]
+    return path, np.max(delta)
+
+
+
+def _test_forward_backward(model, x):
+    pz, Nzz, log_px = model.compute_pz(x, return_Nzz=True, return_log_px=True)
+    pz_c, Nzz_c, log_px_c = model.compute_pz(
+        x, return_Nzz=True, return_log_px=True, chunk_size=7)
+    log_alpha = model.forward(x)
+    log_beta = model.backward(x)
+
+    Nzz_ref = 0
+    for i in xrange(x.shape[0]):
+        log_alpha_ref, log_beta_ref, pz_ref, Nzz_i, log_px_ref = forward_backward_ref(
+            model, x[i])
+        Nzz_ref += Nzz_i
+        f = np.isfinite(log_alpha_ref)
+        assert_allclose(log_alpha[i][f], log_alpha_ref[f], rtol=1e-5)
+        f = np.isfinite(log_beta_ref)
+        assert_allclose(log_beta[i][f], log_beta_ref[f], rtol=1e-5, atol=1e-5)
+        assert_allclose(pz[i], pz_ref, atol=1e-6)
+        assert_allclose(log_px[i], log_px_ref, rtol=1e-6)
+
+        assert_allclose(model.compute_pz(x[i]), pz_ref, atol=1e-6)
+
+    assert_allclose(Nzz, Nzz_ref, atol=1e-6)
+    assert_allclose(pz_c, pz, atol=1e-6)
+    assert_allclose(Nzz_c, Nzz, atol=1e-6)
+    assert_allclose(log_px_c, log_px, rtol=1e-6)
+
+
+
+def test_forward_backward():
+    model = create_hmm()
+    _test_forward_backward(model, create_llk(3, 50, 4))
+
+
+
+def test_forward_backward_tied():
+    model = create_hmm(num_states=40, tied_trans=True)
+    _test_forward_backward(model, create_llk(3, 50, 40))
+
+
+
+def test_forward_backward_sparse():
+    model = create_banded_hmm()
+    assert model.trans_sparse is not None
+    x = create_llk(2, 30, 40)
+    _test_forward_backward(model, x)
+
+
+
+def _test_viterbi(model, x):
+    paths, log_pxz = model.viterbi_decode(x, nbest=2)
+    assert paths.shape == (x.shape[0], 2, x.shape[1])
+    for i in xrange(x.shape[0]):
+        path_ref, log_pxz_ref = viterbi_ref(model, x[i])
+        assert np.all(paths[i, 0] == path_ref)
+        assert_allclose(log_pxz[i, 0], log_pxz_ref, rtol=1e-6)
+        assert log_pxz[i, 1] <= log_pxz[i, 0]
+
+    path, log_pxz = model.viterbi_decode(x[0])
+    assert np.all(path[0] == paths[0, 0])
+
+
+
+def test_viterbi():
+    model = create_hmm()
+    _test_viterbi(model, create_llk(3, 50, 4))
+
+
+
+def test_viterbi_tied():
+    model = create_hmm(num_states=40, tied_trans=True)
+    _test_viterbi(model, create_llk(3, 50, 40))
+
+
+
+def test_viterbi_left_to_right():
+    num_states = 40
+    trans = np.zeros((num_states, num_states))
+    for k in xrange(num_states-1):
+        trans[k, k] = 0.7
+        trans[k, k+1] = 0.3
+    trans[-1, -1] = 1
+    pi = np.zeros((num_states,))
+    pi[0] = 1
+    model = HMM(pi=pi, trans=trans, left_to_right=True)
+
+    # log-likelihood gaps much larger than log(1e-15)
+    x = 50*create_llk(2, 60, num_states)
+    paths, log_pxz = model.viterbi_decode(x)
+    for i in xrange(x.shape[0]):
+        path = paths[i, 0]
+        assert path[0] == 0
+        assert np.all(trans[path[:-1], path[1:]] > 0)
+        path_ref, log_pxz_ref = viterbi_ref(model, x[i])
+        assert np.all(path == path_ref)
+        assert_allclose(log_pxz[i, 0], log_pxz_ref, rtol=1e-6)
+
+
+
+def test_log_predictive():
+    model = create_hmm()
+    x = create_llk(1, 20, 4)[0]
+    log_pred = model.log_predictive(x)
+    log_px = np.asarray([forward_backward_ref(model, x[:n])[-1] for n in xrange(1, 21)])
+    assert_allclose(log_pred, np.diff(log_px), rtol=1e-5)
+
+
+
+def test_fit():
+    model_ref = create_hmm(tied_trans=True)
+    rng = np.random.RandomState(seed=1026)
+    z = model_ref.sample(10, 100, rng=rng)
+    # noisy log-likelihoods of the sampled states
+    x = [4*z_i + rng.normal(size=z_i.shape) for z_i in z]
+    x = [np.stack(x[:5]), np.stack(x[5:])]
+
+    model = create_hmm(seed=1027)
+    elbo, elbo_norm = model.fit(x, epochs=5)
+    assert np.all(np.diff(elbo) > -1e-3)
+
+    model = create_hmm(tied_trans=True, seed=1027)
+    model.trans = np.full((4, 4), 0.25)
+    elbo, elbo_norm = model.fit(x, epochs=5)
+    assert np.all(np.diff(elbo) > -1e-3)
+    assert_allclose(np.sum(model.trans, axis=-1), 1)
+    assert np.abs(model.trans[0, 0] - 0.9) < 0.05
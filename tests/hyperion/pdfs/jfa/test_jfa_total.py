@@ -0,0 +1,95 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.pdfs import JFATotal
+
+K = 8
+x_dim = 3
+y_dim = 5
+
+
+def create_stats(num_utts=50):
+    rng = np.random.RandomState(seed=1024)
+    T = rng.normal(size=(y_dim, K*x_dim))
+    N = rng.uniform(0, 20, size=(num_utts, K))
+    F = rng.normal(size=(num_utts, K*x_dim))*np.sqrt(np.repeat(N, x_dim, axis=1))
+    return T, N, F
+
+
+def py_g_x_ref(T, N, F):
+    # per-utterance posteriors
+    y = []
+    Sy = []
+    elbo = []
+    for i in xrange(N.shape[0]):
+        L = np.eye(y_dim)
+        for k in xrange(K):
+            T_k = T[:, k*x_dim:(k+1)*x_dim]
+            L += N[i, k]*np.dot(T_k, T_k.T)
+        iL = np.linalg.inv(L)
+        TF = np.dot(T, F[i])
+        y.append(np.dot(iL, TF))
+        Sy.append(iL)
+        elbo.append(-0.5*np.linalg.slogdet(L)[1] + 0.5*np.dot(TF, y[-1]))
+    return np.array(y), np.array(Sy), np.array(elbo)
+
+
+def test_compute_py_g_x():
+    T, N, F = create_stats()
+    y_gt, Sy_gt, elbo_gt = py_g_x_ref(T, N, F)
+    model = JFATotal(K, T=T, batch_size=16)
+    y, Sy, elbo, Ry, Py = model.compute_py_g_x(
+        N, F, return_cov=True, return_elbo=True, return_acc=True)
+    assert_allclose(y, y_gt, rtol=1e-5, atol=1e-6)
+    iu = np.triu_indices(y_dim)
+    assert_allclose(Sy, Sy_gt[:, iu[0], iu[1]], rtol=1e-5, atol=1e-6)
+    assert_allclose(elbo, elbo_gt, rtol=1e-5)
+
+    R_gt = Sy_gt + y_gt[:, :, None]*y_gt[:, None, :]
+    assert_allclose(Py, np.sum(R_gt, axis=0), rtol=1e-5)
+    Ry_gt = np.einsum('ik,iab->kab', N, R_gt)[:, iu[0], iu[1]]
+    assert_allclose(Ry, Ry_gt, rtol=1e-5)
+
+    assert_allclose(model.compute_py_g_x(N, F), y_gt, rtol=1e-5, atol=1e-6)
+
+
+def test_compute_py_g_x_clusters():
+    # utterances with only 3 different zero order stats
+    T, N, F = create_stats()
+    N = N[np.arange(N.shape[0]) % 3]
+    y_gt, Sy_gt, elbo_gt = py_g_x_ref(T, N, F)
+    model = JFATotal(K, T=T, batch_size=16, num_clusters=3)
+    y, elbo = model.compute_py_g_x(N, F, return_elbo=True)
+    assert_allclose(y, y_gt, rtol=1e-5, atol=1e-6)
+    assert_allclose(elbo, elbo_gt, rtol=1e-5)
+
+
+def test_estep_workers():
+    T, N, F = create_stats(200)
+    model1 = JFATotal(K, T=T, batch_size=16)
+    model2 = JFATotal(K, T=T, batch_size=16, num_workers=3)
+    stats1 = model1.Estep(N, F)
+    stats2 = model2.Estep(N, F)
+    for s1, s2 in zip(stats1, stats2):
+        assert_allclose(s1, s2, rtol=1e-5)
+
+
+def test_fit():
+    T, N, F = create_stats(200)
+    model = JFATotal(K, y_dim=y_dim, batch_size=64)
+    elbo, _ = model.fit(N, F, epochs=5)
+    assert np.all(np.diff(elbo) > 0)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,77 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.pdfs import GMMDiagCov, GMMTiedDiagCov, GaussianSelector
+
+x_dim = 4
+num_comp = 64
+
+
+def create_pdf(tied=False):
+    rng = np.random.RandomState(seed=1024)
+    centers = 4*rng.normal(size=(8, x_dim))
+    mu = centers[rng.randint(8, size=num_comp)] + 0.5*rng.normal(size=(num_comp, x_dim))
+    pi = rng.uniform(0.5, 1, size=(num_comp,))
+    pi /= np.sum(pi)
+    if tied:
+        return GMMTiedDiagCov(pi=pi, mu=mu, Lambda=np.ones((x_dim,)), x_dim=x_dim)
+    Lambda = 1/rng.uniform(0.5, 1.5, size=(num_comp, x_dim))
+    return GMMDiagCov(pi=pi, mu=mu, Lambda=Lambda, x_dim=x_dim)
+
+
+def create_data(model, num_samples=1000):
+    rng = np.random.RandomState(seed=1025)
+    k = rng.randint(num_comp, size=num_samples)
+    return model.mu[k] + rng.normal(size=(num_samples, x_dim))
+
+
+def test_clusters():
+    model = create_pdf()
+    gs = GaussianSelector(model, num_clusters=8)
+    assert np.sum(gs.cluster_size) == num_comp
+    assert np.all(np.sort(gs.comp_index) == np.arange(num_comp))
+    assert_allclose(np.sum(gs.coarse.pi), 1)
+    for c in xrange(len(gs.cluster_size)):
+        comps = gs.comp_index[gs.cluster_offsets[c]:gs.cluster_offsets[c+1]]
+        assert set(gs.cluster_table[c]) == set(comps)
+
+
+@pytest.mark.parametrize('tied', [False, True])
+def test_compute_pz_all_clusters(tied):
+    # selecting all the clusters gives the exact posteriors
+    model = create_pdf(tied)
+    x = create_data(model)
+    gs = GaussianSelector(model, num_clusters=8, num_sel_clusters=8, nbest=num_comp)
+    z, index = gs.compute_pz_nbest(x)
+    z_dense = np.zeros((x.shape[0], num_comp))
+    np.add.at(z_dense, (np.repeat(np.arange(x.shape[0]), index.shape[1]), index.ravel()), z.ravel())
+    assert_allclose(z_dense, model.compute_pz_nat(x), atol=1e-6)
+    assert_allclose(gs.log_prob(x), model.log_prob(x), rtol=1e-5)
+
+
+def test_evaluate():
+    model = create_pdf()
+    x = create_data(model)
+    gs = GaussianSelector(model, num_clusters=8, num_sel_clusters=2, nbest=10)
+    z, index = gs.compute_pz_nbest(x)
+    assert z.shape == (x.shape[0], 10)
+    assert_allclose(np.sum(z, axis=1), 1, rtol=1e-5)
+
+    r = gs.evaluate(x)
+    assert r['post_mass'] > 0.95
+    assert r['top1_acc'] > 0.95
+    assert r['post_err'] < 0.1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -255,6 +255,21 @@ def test_suff_stats_segments():
 
 
 
+def test_suff_stats_segments_overlap():
+
+    model1 = create_pdf()
+    x = model1.sample(num_samples)
+    # overlapping segments that cross the batch boundaries
+    segments = np.array([[0, 9], [5, 612], [240, 260], [300, 300], [100, num_samples-1]])
+
+    N, u_x = model1.accum_suff_stats_segments(x, segments, batch_size=97)
+    for i, (t1, t2) in enumerate(segments):
+        N_i, u_x_i = model1.accum_suff_stats(x[t1:t2+1])
+        assert_allclose(N[i], N_i, rtol=1e-5, atol=1e-8)
+        assert_allclose(u_x[i], u_x_i, rtol=1e-5, atol=1e-8)
+
+
+
 def test_suff_stats_segments_prob():
 
     model1 = create_pdf()
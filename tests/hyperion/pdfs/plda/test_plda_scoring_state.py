@@ -0,0 +1,80 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy import linalg as la
+
+from hyperion.pdfs import FRPLDA, SPLDA, PLDA, PLDAScoringState
+
+x_dim = 5
+
+
+def create_pldas():
+    rng = np.random.RandomState(seed=1024)
+    A = rng.normal(size=(x_dim, x_dim))
+    Sb = np.dot(A, A.T) + np.eye(x_dim)
+    A = rng.normal(size=(x_dim, x_dim))
+    Sw = np.dot(A, A.T) + np.eye(x_dim)
+    mu = rng.normal(size=(x_dim,))
+    pldas = [FRPLDA(mu=mu, B=la.inv(Sb), W=la.inv(Sw)),
+             SPLDA(mu=mu, V=rng.normal(size=(3, x_dim)), W=la.inv(Sw)),
+             PLDA(mu=mu, V=rng.normal(size=(3, x_dim)),
+                  U=rng.normal(size=(2, x_dim)), D=1+rng.uniform(size=(x_dim,)))]
+    return pldas
+
+
+def test_llr_1vs1():
+    rng = np.random.RandomState(seed=1025)
+    x_e = rng.normal(size=(10, x_dim))
+    x_t = rng.normal(size=(20, x_dim))
+    for plda in create_pldas():
+        state = PLDAScoringState(plda)
+        assert len(state.consts) == 4
+        assert_allclose(state.llr_1vs1(x_e, x_t), plda.llr_1vs1(x_e, x_t))
+
+
+def test_llr_enroll_vs_test():
+    rng = np.random.RandomState(seed=1025)
+    x_e = rng.normal(size=(10, x_dim))
+    x_t = rng.normal(size=(20, x_dim))
+    model_ids = ['m%d' % i for i in xrange(10)]
+    for plda in create_pldas():
+        scores_gt = plda.llr_1vs1(x_e, x_t)
+        state = PLDAScoringState(plda, cache_size=6)
+        state.add_enroll(model_ids[:4], x_e[:4])
+        assert state.cache_len == 4
+        # cached projections don't reference the projected batch
+        assert state._cache['m0'][0].base is None
+
+        # some models in cache, some not
+        scores = state.llr_enroll_vs_test(model_ids[2:8], x_t, x_e[2:8])
+        assert_allclose(scores, scores_gt[2:8])
+        assert state.cache_len == 6
+        assert 'm0' not in state and 'm1' not in state
+        
+        # all models from cache
+        scores = state.llr_enroll_vs_test(model_ids[4:8], x_t[:5])
+        assert_allclose(scores, scores_gt[4:8,:5])
+
+        with pytest.raises(AssertionError):
+            state.llr_enroll_vs_test(model_ids[:2], x_t)
+
+
+def test_llr_Nvs1_vavg():
+    rng = np.random.RandomState(seed=1025)
+    x_e = rng.normal(size=(30, x_dim))
+    x_t = rng.normal(size=(20, x_dim))
+    ids_e = np.repeat(np.arange(10), 3)
+    for plda in create_pldas():
+        state = PLDAScoringState(plda)
+        D_e = plda.compute_stats_hard(x_e, ids_e)
+        assert_allclose(state.llr_Nvs1_vavg(D_e, x_t),
+                        plda.llr_Nvs1(x_e, x_t, ids1=ids_e))
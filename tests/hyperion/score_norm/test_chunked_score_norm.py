@@ -0,0 +1,165 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+import h5py
+
+from hyperion.score_norm import TNorm, ZNorm, SNorm, ChunkedScoreNorm, LazyScoreMatrix
+from hyperion.utils.trial_scores import TrialScores
+
+output_dir = './tests/data_out/score_norm'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+num_enr = 13
+num_test = 37
+num_coh = 51
+
+
+def create_scores():
+    rng = np.random.RandomState(seed=1024)
+    scores = rng.normal(size=(num_enr, num_test))
+    scores_coh_test = rng.normal(size=(num_coh, num_test)) + 0.1
+    scores_enr_coh = rng.normal(size=(num_enr, num_coh)) - 0.1
+    scores_coh_coh = rng.normal(size=(num_coh, num_coh))
+    return scores, scores_coh_test, scores_enr_coh, scores_coh_coh
+
+
+def compute_ref(norm_type, scores, scores_coh_test, scores_enr_coh, scores_coh_coh):
+    t_norm = TNorm()
+    z_norm = ZNorm()
+    if norm_type == 't-norm':
+        return t_norm.predict(scores, scores_coh_test)
+    if norm_type == 'z-norm':
+        return z_norm.predict(scores, scores_enr_coh)
+    if norm_type == 'zt-norm':
+        scores_z = z_norm.predict(scores, scores_enr_coh)
+        scores_coh_test_z = z_norm.predict(scores_coh_test, scores_coh_coh)
+        return t_norm.predict(scores_z, scores_coh_test_z)
+    if norm_type == 'tz-norm':
+        scores_t = t_norm.predict(scores, scores_coh_test)
+        scores_enr_coh_t = t_norm.predict(scores_enr_coh, scores_coh_coh)
+        return z_norm.predict(scores_t, scores_enr_coh_t)
+    return SNorm().predict(scores, scores_coh_test, scores_enr_coh)
+
+
+@pytest.mark.parametrize('norm_type', ChunkedScoreNorm.valid_norm_types)
+def test_predict(norm_type):
+    scores, scores_coh_test, scores_enr_coh, scores_coh_coh = create_scores()
+    scores_ref = compute_ref(norm_type, scores, scores_coh_test,
+                             scores_enr_coh, scores_coh_coh)
+
+    norm = ChunkedScoreNorm(norm_type=norm_type, chunk_size=10)
+    scores_norm = norm.predict(scores, scores_coh_test, scores_enr_coh, scores_coh_coh)
+    assert_allclose(scores_norm, scores_ref)
+
+    # reuse cached Z stats with batches of test segments
+    for j in xrange(0, num_test, 15):
+        scores_norm = norm.predict(scores[:, j:j+15], scores_coh_test[:, j:j+15])
+        assert_allclose(scores_norm, scores_ref[:, j:j+15])
+
+
+def test_predict_mask():
+    scores, scores_coh_test, scores_enr_coh, scores_coh_coh = create_scores()
+    rng = np.random.RandomState(seed=1025)
+    mask_coh_test = rng.uniform(size=scores_coh_test.shape) > 0.2
+    mask_enr_coh = rng.uniform(size=scores_enr_coh.shape) > 0.2
+    scores_ref = SNorm().predict(scores, scores_coh_test.copy(), scores_enr_coh.copy(),
+                                 mask_coh_test, mask_enr_coh)
+
+    norm = ChunkedScoreNorm(norm_type='s-norm', chunk_size=10)
+    scores_norm = norm.predict(scores, scores_coh_test, scores_enr_coh,
+                               mask_coh_test=mask_coh_test, mask_enr_coh=mask_enr_coh)
+    assert_allclose(scores_norm, scores_ref)
+
+
+@pytest.mark.parametrize('nbest_discard', [0, 3])
+def test_predict_adaptive(nbest_discard):
+    scores, scores_coh_test, scores_enr_coh, scores_coh_coh = create_scores()
+    nbest = 20
+    scores_coh_test_sorted = -np.sort(-scores_coh_test, axis=0)
+    scores_coh_test_sorted = scores_coh_test_sorted[nbest_discard:nbest_discard+nbest]
+    scores_enr_coh_sorted = -np.sort(-scores_enr_coh, axis=1)
+    scores_enr_coh_sorted = scores_enr_coh_sorted[:, nbest_discard:nbest_discard+nbest]
+    scores_ref = SNorm().predict(scores, scores_coh_test_sorted, scores_enr_coh_sorted)
+
+    norm = ChunkedScoreNorm(norm_type='s-norm', nbest=nbest,
+                            nbest_discard=nbest_discard, chunk_size=10)
+    scores_norm = norm.predict(scores, scores_coh_test, scores_enr_coh)
+    assert_allclose(scores_norm, scores_ref)
+
+
+def test_predict_to_file():
+    scores, scores_coh_test, scores_enr_coh, scores_coh_coh = create_scores()
+    scores_ref = compute_ref('zt-norm', scores, scores_coh_test,
+                             scores_enr_coh, scores_coh_coh)
+
+    coh_file = output_dir + '/coh_scores.h5'
+    with h5py.File(coh_file, 'w') as f:
+        f.create_dataset('coh_test', data=scores_coh_test)
+        f.create_dataset('enr_coh', data=scores_enr_coh)
+        f.create_dataset('coh_coh', data=scores_coh_coh)
+
+    model_set = ['m%d' % i for i in xrange(num_enr)]
+    seg_set = ['s%d' % i for i in xrange(num_test)]
+    score_file = output_dir + '/zt_norm_scores.h5'
+    norm = ChunkedScoreNorm(norm_type='zt-norm', chunk_size=10)
+    with h5py.File(coh_file, 'r') as f:
+        norm.predict_to_file(score_file, model_set, seg_set, scores,
+                             f['coh_test'], f['enr_coh'], f['coh_coh'])
+
+    scr = TrialScores.load(score_file)
+    assert np.all(scr.model_set == model_set)
+    assert np.all(scr.seg_set == seg_set)
+    assert np.all(scr.score_mask)
+    assert_allclose(scr.scores, scores_ref, rtol=1e-5)
+
+
+def test_lazy_score_matrix():
+    rng = np.random.RandomState(seed=1026)
+    x1 = rng.normal(size=(num_enr, 4))
+    x2 = rng.normal(size=(num_test, 4))
+    scores = np.dot(x1, x2.T)
+    lazy_scores = LazyScoreMatrix(lambda a, b: np.dot(a, b.T), x1, x2)
+    assert lazy_scores.shape == scores.shape
+    assert_allclose(lazy_scores[2:5], scores[2:5])
+    assert_allclose(lazy_scores[:, 3:7], scores[:, 3:7])
+    assert_allclose(lazy_scores[1, 3:7], scores[1, 3:7])
+    assert_allclose(np.asarray(lazy_scores), scores)
+    assert lazy_scores.num_blocks == 4
+
+
+@pytest.mark.parametrize('norm_type', ChunkedScoreNorm.valid_norm_types)
+def test_predict_from_vectors(norm_type):
+    rng = np.random.RandomState(seed=1027)
+    x_e = rng.normal(size=(num_enr, 4))
+    x_t = rng.normal(size=(num_test, 4))
+    x_coh = rng.normal(size=(num_coh, 4))
+    scorer = lambda a, b: np.dot(a, b.T)
+    scores_ref = compute_ref(norm_type, scorer(x_e, x_t), scorer(x_coh, x_t),
+                             scorer(x_e, x_coh), scorer(x_coh, x_coh))
+
+    norm = ChunkedScoreNorm(norm_type=norm_type, chunk_size=10)
+    scores_norm = norm.predict_from_vectors(scorer, x_e, x_t, x_coh)
+    assert_allclose(scores_norm, scores_ref)
+
+    scores_norm = norm.predict_from_vectors(
+        scorer, x_e, x_t[:10], x_coh, use_cached_z_stats=True)
+    assert_allclose(scores_norm, scores_ref[:, :10])
+
+    score_file = output_dir + '/lazy_norm_scores.h5'
+    model_set = ['m%d' % i for i in xrange(num_enr)]
+    seg_set = ['s%d' % i for i in xrange(num_test)]
+    norm.predict_from_vectors_to_file(
+        score_file, model_set, seg_set, scorer, x_e, x_t, x_coh)
+    scr = TrialScores.load(score_file)
+    assert_allclose(scr.scores, scores_ref, rtol=1e-5)
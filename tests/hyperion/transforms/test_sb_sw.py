@@ -0,0 +1,114 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import os
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+from sklearn.neighbors import BallTree
+
+from hyperion.transforms import NSbSw
+
+output_dir = './tests/data_out/transforms/sb_sw'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+x_dim = 4
+num_classes = 6
+K = 5
+
+
+def create_data():
+    rng = np.random.RandomState(seed=1024)
+    class_ids = np.repeat(np.arange(num_classes), rng.randint(10, 20, size=(num_classes,)))
+    rng.shuffle(class_ids)
+    mu = 2*rng.normal(size=(num_classes, x_dim))
+    x = mu[class_ids] + rng.normal(size=(len(class_ids), x_dim))
+    return x, class_ids
+
+
+
+def nsbsw_ref(x, class_ids, alpha):
+    # sample by sample computation with a BallTree per class
+    dim = x.shape[1]
+    Sb = np.zeros((dim, dim))
+    Sw = np.zeros((dim, dim))
+    mu = np.zeros((dim,))
+    d = np.zeros((num_classes, x.shape[0]))
+    delta = np.zeros((num_classes,) + x.shape)
+    for i in xrange(num_classes):
+        x_i = x[class_ids == i]
+        mu += np.mean(x_i, axis=0)
+        d_i, nn_i = BallTree(x_i).query(x, k=K)
+        d[i] = d_i[:, -1]
+        for l in xrange(x.shape[0]):
+            delta[i, l] = x[l] - np.mean(x_i[nn_i[l]], axis=0)
+
+    d = d**alpha
+    for i in xrange(num_classes):
+        idx_i = (class_ids == i).nonzero()[0]
+        w_i = 0
+        Sb_i = np.zeros((dim, dim))
+        for j in xrange(num_classes):
+            w_ij = np.minimum(d[i], d[j])/(d[i] + d[j])
+            for l in idx_i:
+                S = np.outer(delta[j, l], delta[j, l])
+                if i == j:
+                    Sw += S/len(idx_i)
+                else:
+                    Sb_i += w_ij[l]*S
+                    w_i += w_ij[l]
+        Sb += Sb_i/w_i
+
+    return mu/num_classes, Sb/num_classes, Sw/num_classes
+
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_nsbsw(num_workers):
+    x, class_ids = create_data()
+    mu, Sb, Sw = nsbsw_ref(x, class_ids, alpha=2)
+
+    s_mat = NSbSw(K=K, alpha=2, chunk_size=7, num_workers=num_workers)
+    s_mat.fit(x, class_ids)
+    assert_allclose(s_mat.mu, mu, atol=1e-10)
+    assert_allclose(s_mat.Sb, Sb, rtol=1e-6)
+    assert_allclose(s_mat.Sw, Sw, rtol=1e-6)
+
+
+
+def test_nsbsw_neighbor_classes():
+    x, class_ids = create_data()
+    s_full = NSbSw(K=K)
+    s_full.fit(x, class_ids)
+
+    # with all the other classes as neighbours it is exact
+    s_mat = NSbSw(K=K, num_neighbor_classes=num_classes-1)
+    s_mat.fit(x, class_ids)
+    assert_allclose(s_mat.Sb, s_full.Sb, rtol=1e-6)
+    assert_allclose(s_mat.Sw, s_full.Sw, rtol=1e-6)
+
+    s_mat = NSbSw(K=K, num_neighbor_classes=2)
+    s_mat.fit(x, class_ids)
+    assert_allclose(s_mat.Sw, s_full.Sw, rtol=1e-6)
+    assert np.all(np.linalg.eigvalsh(s_mat.Sb) > 0)
+
+
+
+def test_save_load():
+    x, class_ids = create_data()
+    s_mat = NSbSw(K=K, num_neighbor_classes=3)
+    s_mat.fit(x, class_ids)
+
+    file_path = output_dir + '/nsbsw.h5'
+    s_mat.save(file_path)
+    s_mat2 = NSbSw.load(file_path)
+    assert_allclose(s_mat2.Sb, s_mat.Sb)
+    assert_allclose(s_mat2.Sw, s_mat.Sw)
+    assert_allclose(s_mat2.mu, s_mat.mu)
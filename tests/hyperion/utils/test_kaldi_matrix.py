@@ -12,6 +12,7 @@ import os
 import numpy as np
 from numpy.testing import assert_allclose
 
+from hyperion.hyp_defs import float_cpu
 from hyperion.utils.kaldi_matrix import KaldiMatrix as KM
 from hyperion.utils.kaldi_matrix import KaldiCompressedMatrix as KCM
 
@@ -339,6 +340,51 @@ def test_kcm_getbuild_data_attrs_slice():
 
     
 
+def uncompress_speech_feat_ref(cmat):
+    # column by column decoding
+    mat = np.zeros((cmat.num_rows, cmat.num_cols), dtype=float_cpu())
+    perc = np.frombuffer(cmat.data[20:20+8*cmat.num_cols], dtype=np.uint16)
+    perc = cmat.min_value + cmat.data_range * 1.52590218966964e-05 * perc.astype(float_cpu())
+    codes = np.frombuffer(cmat.data[20+8*cmat.num_cols:], dtype=np.uint8).astype(float_cpu())
+    for i in xrange(cmat.num_cols):
+        p0, p25, p75, p100 = perc[4*i:4*i+4]
+        v_in = codes[i*cmat.num_rows:(i+1)*cmat.num_rows]
+        idx = v_in <= 64
+        mat[idx, i] = p0 + (p25-p0)*v_in[idx]/64.0
+        idx = np.logical_and(v_in>64, v_in<=192)
+        mat[idx, i] = p25 + (p75-p25)*(v_in[idx] - 64)/128.0
+        idx = v_in > 192
+        mat[idx, i] = p75 + (p100-p75)*(v_in[idx] - 192)/63.0
+    return mat
+
+
+
+def test_kcm_uncompress_ref():
+
+    for num_rows in [1, 3, 100]:
+        cmat = KCM.compress(create_matrix(num_rows, 13), 'speech-feat')
+        assert np.all(cmat.to_ndarray() == uncompress_speech_feat_ref(cmat))
+        codes = np.frombuffer(cmat.data[20+8*13:], dtype=np.uint8)
+        if num_rows > 1:
+            assert np.any(codes < 64) and np.any(codes > 192)
+
+
+
+def test_kcm_to_ndarray_rows():
+
+    mat1 = KM(create_matrix(20, 6).astype('float32'))
+    for method in ['speech-feat', '2byte-auto', '1byte-auto']:
+        cmat2 = KCM.compress(mat1, method)
+        mat2 = cmat2.to_ndarray()
+        assert np.all(cmat2.to_ndarray(row_offset=5) == mat2[5:])
+        assert np.all(cmat2.to_ndarray(row_offset=3, num_rows=7) == mat2[3:10])
+        
+        data, attrs = cmat2.get_data_attrs()
+        mat3 = KCM.data_attrs_to_ndarray(data[3:10], attrs)
+        assert np.all(mat3 == mat2[3:10])
+
+
+    
 
 if __name__ == '__main__':
     pytest.main([__file__])
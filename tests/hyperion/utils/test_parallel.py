@@ -0,0 +1,59 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.utils.parallel import ForkPool, fork_map, sum_reduce
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_fork_map(num_workers):
+    x = np.arange(20)
+    # closures are inherited by the workers, they are not pickled
+    f = lambda i: (i, x[i]**2, os.getpid())
+
+    results = list(fork_map(f, xrange(20), num_workers))
+    assert [r[0] for r in results] == list(xrange(20))
+    assert_allclose([r[1] for r in results], x**2)
+    pids = set(r[2] for r in results)
+    if num_workers == 1:
+        assert pids == set([os.getpid()])
+    else:
+        assert os.getpid() not in pids
+
+    results = list(fork_map(f, xrange(20), num_workers, ordered=False))
+    assert sorted(r[0] for r in results) == list(xrange(20))
+
+
+
+def test_max_pending():
+    num_read = [0]
+    def tasks():
+        for i in xrange(20):
+            num_read[0] += 1
+            yield i
+
+    with ForkPool(lambda i: i, 2) as pool:
+        for n, r in enumerate(pool.imap(tasks(), max_pending=3)):
+            assert r == n
+            # the tasks are pulled lazily
+            assert num_read[0] <= n + 3
+
+
+
+def test_sum_reduce():
+    rng = np.random.RandomState(seed=1024)
+    stats = [(rng.normal(size=(3,)), float(i)) for i in xrange(5)]
+    s = sum_reduce(stats)
+    assert_allclose(s[0], np.sum([r[0] for r in stats], axis=0))
+    assert s[1] == 10
+    assert sum_reduce([]) is None
@@ -0,0 +1,172 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+from hyperion.utils.segment_store import SegmentStore
+from hyperion.utils import RTTM, SegmentList, ExtSegmentList
+
+
+def create_rttm():
+    rng = np.random.RandomState(seed=1024)
+    file_id = []
+    tbeg = []
+    tdur = []
+    spk_id = []
+    for f in ['f3', 'f1', 'f2']:
+        num_segs = 30
+        t = np.cumsum(rng.uniform(0.1, 2, size=(num_segs,)))
+        file_id += [f]*num_segs
+        tbeg.append(t)
+        tdur.append(rng.uniform(0.1, 3, size=(num_segs,)))
+        spk_id += ['%s_spk%d' % (f, s) for s in rng.randint(3, size=(num_segs,))]
+
+    return RTTM.create_spkdiar(file_id, np.concatenate(tbeg), np.concatenate(tdur), spk_id)
+
+
+
+def create_segment_list(num_segs=40):
+    rng = np.random.RandomState(seed=1025)
+    file_id = np.repeat(['f1', 'f2', 'f3', 'f4'], num_segs)
+    tbeg = np.concatenate([np.cumsum(rng.uniform(0.2, 2, size=(num_segs,)))
+                           for i in xrange(4)])
+    tend = tbeg + rng.uniform(0.1, 1, size=(len(tbeg),))
+    segment_id = ['%s-%04d' % (f, i) for i, f in enumerate(file_id)]
+    df = pd.DataFrame({'segment_id': segment_id, 'file_id': file_id,
+                       'tbeg': tbeg, 'tend': tend})
+    return SegmentList(df)
+
+
+
+def test_store_sorted():
+    store = SegmentStore.create(['b', 'a', 'b', 'a'], [2, 3, 1, 0], [3, 4, 2, 1],
+                                ['x', 'y', 'x', 'x'])
+    assert np.all(store.file_ids == ['a', 'b'])
+    assert np.all(store.file_offsets == [0, 2, 4])
+    assert_allclose(store.tbeg, [0, 3, 1, 2])
+    assert np.all(store.order == [3, 1, 2, 0])
+    assert store.file_segments('b') == (2, 4)
+    assert store.file_segments('c') == (0, 0)
+
+
+
+def test_merge_adjacent_segments():
+    store = SegmentStore.create(['a']*5 + ['b']*2,
+                                [0, 1, 2.5, 3, 4, 0, 1],
+                                [1, 2, 3, 4, 5, 1, 2],
+                                ['x', 'x', 'x', 'y', 'y', 'x', 'x'])
+    merged, group = store.merge_adjacent_segments(t_margin=0)
+    assert_allclose(merged.tbeg, [0, 2.5, 3, 0])
+    assert_allclose(merged.tend, [2, 3, 5, 2])
+    assert np.all(group == [0, 0, 1, 2, 2, 3, 3])
+    assert np.all(merged.order == [0, 2, 3, 5])
+
+    merged, group = store.merge_adjacent_segments(max_segments=2)
+    assert np.all(group == [0, 0, 1, 2, 2, 3, 3])
+    merged, group = store.merge_adjacent_segments()
+    assert np.all(group == [0, 0, 0, 1, 1, 2, 2])
+
+
+
+def test_eliminate_overlaps():
+    store = SegmentStore.create(['a']*3 + ['b'], [0, 1, 3, 0.5], [2, 4, 5, 1])
+    store = store.eliminate_overlaps()
+    assert_allclose(store.tbeg, [0, 1.5, 3.5, 0.5])
+    assert_allclose(store.tend, [1.5, 3.5, 5, 1])
+
+
+
+def test_bin_vad():
+    vad = SegmentStore.bin_vad([0.02, 0.05], [0.03, 0.2], frame_shift=10, num_frames=10)
+    assert np.all(vad == [0, 0, 1, 1, 0, 1, 1, 1, 1, 1])
+
+    segments = create_segment_list()
+    for file_id in ['f1', 'f3']:
+        vad_ref = np.zeros((1000,), dtype=int)
+        seg_f = segments.segments.loc[file_id]
+        tbeg = np.round(np.asarray(seg_f['tbeg'])*100).astype(int)
+        tend = np.round(np.asarray(seg_f['tend'])*100).astype(int)
+        for b, e in zip(tbeg, tend):
+            vad_ref[b:e+1] = 1
+        vad = segments.to_bin_vad(file_id, num_frames=1000)
+        assert np.all(vad == vad_ref)
+
+
+
+def test_to_matrix():
+    rttm = create_rttm()
+    M, names = rttm.to_matrix('f2', frame_shift=0.01)
+    seg_f = rttm.segments.loc['f2']
+    tbeg = np.round(np.asarray(seg_f['tbeg'])*100).astype(int)
+    tend = np.round(np.asarray(seg_f['tbeg'] + seg_f['tdur'])*100).astype(int)
+    M_ref = np.zeros((np.max(tend), len(names)), dtype=int)
+    for b, e, n in zip(tbeg, tend, seg_f['name']):
+        M_ref[b:e, list(names).index(n)] = 1
+    assert np.all(M == M_ref)
+
+
+
+def test_rttm_get_segment_names():
+    rttm = create_rttm()
+    segments = create_segment_list()
+    segments.segments['file_id'] = np.repeat(['f1', 'f2', 'f3', 'f5'], 40)
+    names_ref, num_names_ref = rttm.get_segment_names_slow(segments)
+    names, num_names = rttm.get_segment_names(segments)
+    assert np.all(num_names == num_names_ref)
+    assert np.all(names == names_ref)
+
+
+
+def test_rttm_merge_adjacent_segments():
+    rttm = create_rttm()
+    # reference merging consecutive rows
+    tbeg = rttm.tbeg
+    tend = tbeg + rttm.tdur
+    file_id = rttm.file_id
+    name = rttm.name
+    tbeg_ref = [tbeg[0]]
+    tend_ref = [tend[0]]
+    for i in xrange(1, len(tbeg)):
+        if (file_id[i] == file_id[i-1] and name[i] == name[i-1] and
+            tbeg[i] - tend[i-1] <= 0.5):
+            tend_ref[-1] = max(tend_ref[-1], tend[i])
+        else:
+            tbeg_ref.append(tbeg[i])
+            tend_ref.append(tend[i])
+
+    rttm.merge_adjacent_segments(t_margin=0.5)
+    assert_allclose(rttm.tbeg, tbeg_ref)
+    assert_allclose(rttm.tbeg + rttm.tdur, tend_ref)
+    assert np.all(rttm.segments.index == rttm.file_id)
+
+
+
+def test_ext_segment_list_merge_adjacent_segments():
+    segment_id = ['s%d' % i for i in xrange(7)]
+    df = pd.DataFrame({'segment_id': segment_id,
+                       'file_id': ['f2']*4 + ['f1']*3,
+                       'tbeg': [0, 1, 2, 3, 0, 1, 2],
+                       'tend': [1, 2, 3, 4, 1, 2, 3],
+                       'ext_segment_id': segment_id})
+    ext_segments = pd.DataFrame({'ext_segment_id': segment_id,
+                                 'name': ['a', 'a', 'a', 'b', np.nan, np.nan, 'a'],
+                                 'score': np.nan})
+    segments = ExtSegmentList(df, ext_segments)
+    segments.merge_adjacent_segments(max_segments=2)
+    assert np.all(segments.ext_segment_id ==
+                  ['s0@s1', 's0@s1', 's2', 's3', 's4', 's5', 's6'])
+    assert np.all(segments.ext_segments.ext_segment_id ==
+                  ['s0@s1', 's2', 's3', 's4', 's5', 's6'])
+    name = list(segments.ext_segments.name)
+    assert name[:3] == ['a', 'a', 'b']
+    assert np.all(pd.isnull(name[3:5]))
+    assert name[5] == 'a'
@@ -0,0 +1,174 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.utils import TrialNdx, TrialKey, TrialScores
+from hyperion.utils import SparseTrialNdx, SparseTrialKey, SparseTrialScores
+
+output_dir = './tests/data_out/utils/sparse_trial'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+
+def create_key(num_models=20, num_segs=50):
+    rng = np.random.RandomState(seed=1024)
+    model_set = np.asarray(['m%03d' % i for i in xrange(num_models)])
+    seg_set = np.asarray(['s%03d' % i for i in xrange(num_segs)])
+    u = rng.uniform(size=(num_models, num_segs))
+    key = TrialKey(model_set, seg_set, u < 0.05, u > 0.9)
+    # shuffle the names to test sorting
+    m_idx = rng.permutation(num_models)
+    s_idx = rng.permutation(num_segs)
+    return key.filter(model_set[m_idx], seg_set[s_idx])
+
+
+
+def create_scores(key):
+    rng = np.random.RandomState(seed=1025)
+    mask = np.logical_or(key.tar, key.non)
+    scores = np.round(rng.normal(size=mask.shape), 4)*mask
+    return TrialScores(key.model_set, key.seg_set, scores, mask)
+
+
+
+def test_ndx():
+    ndx1 = create_key().to_ndx()
+    sndx1 = SparseTrialNdx.from_trial_ndx(ndx1)
+    assert sndx1.num_trials == np.sum(ndx1.trial_mask)
+    assert sndx1.to_trial_ndx() == ndx1
+
+    ndx2 = ndx1.copy()
+    ndx2.sort()
+    sndx2 = sndx1.copy()
+    sndx2.sort()
+    assert sndx2 == ndx2
+
+    ndx_list = []
+    for i in xrange(3):
+        for j in xrange(2):
+            ndx_ij = sndx2.split(i+1, 3, j+1, 2)
+            assert ndx_ij == ndx2.split(i+1, 3, j+1, 2)
+            ndx_list.append(ndx_ij)
+    assert SparseTrialNdx.merge(ndx_list) == ndx2
+
+    ndx3 = ndx1.filter(ndx1.model_set[:5], ndx1.seg_set[10:])
+    assert sndx1.filter(ndx1.model_set[:5], ndx1.seg_set[10:]) == ndx3
+
+    file_h5 = output_dir + '/ndx.h5'
+    sndx2.save(file_h5)
+    assert SparseTrialNdx.load(file_h5) == sndx2
+    assert TrialNdx.load(file_h5) == ndx2
+    ndx2.save(file_h5)
+    assert SparseTrialNdx.load(file_h5) == sndx2
+
+    file_txt = output_dir + '/ndx.txt'
+    sndx2.save(file_txt)
+    ndx_txt = SparseTrialNdx.load(file_txt)
+    # models and segments without trials are not in the txt file
+    assert ndx_txt == sndx2.filter(ndx_txt.model_set, ndx_txt.seg_set)
+
+
+
+def test_key():
+    key1 = create_key()
+    skey1 = SparseTrialKey.from_trial_key(key1)
+    assert skey1.to_trial_key() == key1
+    assert skey1.to_ndx() == key1.to_ndx()
+
+    key2 = key1.copy()
+    key2.sort()
+    skey2 = skey1.copy()
+    skey2.sort()
+    assert skey2 == key2
+
+    key_list = []
+    for i in xrange(2):
+        for j in xrange(3):
+            key_ij = skey2.split(i+1, 2, j+1, 3)
+            assert key_ij == key2.split(i+1, 2, j+1, 3)
+            key_list.append(key_ij)
+    assert SparseTrialKey.merge(key_list) == key2
+
+    key3 = key1.filter(key1.model_set[:5], key1.seg_set[10:], keep=False)
+    assert skey1.filter(key1.model_set[:5], key1.seg_set[10:], keep=False) == key3
+
+    file_h5 = output_dir + '/key.h5'
+    skey2.save(file_h5)
+    assert SparseTrialKey.load(file_h5) == skey2
+    assert TrialKey.load(file_h5) == key2
+
+    file_txt = output_dir + '/key.txt'
+    skey2.save(file_txt)
+    key_txt = SparseTrialKey.load(file_txt)
+    # models and segments without trials are not in the txt file
+    assert key_txt == skey2.filter(key_txt.model_set, key_txt.seg_set)
+
+
+
+def test_scores():
+    key = create_key()
+    scr1 = create_scores(key)
+    sscr1 = SparseTrialScores.from_trial_scores(scr1)
+    assert sscr1.to_trial_scores() == scr1
+
+    scr2 = scr1.copy()
+    scr2.sort()
+    sscr2 = sscr1.copy()
+    sscr2.sort()
+    assert sscr2 == scr2
+
+    scr_list = []
+    for i in xrange(3):
+        for j in xrange(3):
+            scr_ij = sscr2.split(i+1, 3, j+1, 3)
+            assert scr_ij == scr2.split(i+1, 3, j+1, 3)
+            scr_list.append(scr_ij)
+    assert SparseTrialScores.merge(scr_list) == scr2
+    with pytest.raises(AssertionError):
+        SparseTrialScores.merge([sscr2, sscr2])
+
+    scr3 = scr1.filter(key.model_set[:5], key.seg_set[10:])
+    assert sscr1.filter(key.model_set[:5], key.seg_set[10:]) == scr3
+
+    # filter and align with missing models and segments
+    sscr3 = sscr2.filter(key.model_set[:10], key.seg_set[:20])
+    scr3 = scr2.filter(key.model_set[:10], key.seg_set[:20])
+    with pytest.raises(Exception):
+        sscr3.align_with_ndx(key)
+    assert sscr3.align_with_ndx(key, raise_missing=False) == scr3.align_with_ndx(
+        key, raise_missing=False)
+    assert sscr3.set_missing_to_value(key, -10) == scr3.set_missing_to_value(key, -10)
+
+    tar_ref, non_ref = scr2.get_tar_non(key)
+    for k in [key, SparseTrialKey.from_trial_key(key)]:
+        tar, non = sscr2.get_tar_non(k)
+        assert_allclose(np.sort(tar), np.sort(tar_ref))
+        assert_allclose(np.sort(non), np.sort(non_ref))
+
+    f = lambda x: 3*x + 1
+    scr4 = scr2.copy()
+    scr4.transform(f)
+    sscr4 = sscr2.copy()
+    sscr4.transform(f)
+    assert sscr4 == scr4
+
+    file_h5 = output_dir + '/scores.h5'
+    sscr2.save(file_h5)
+    assert SparseTrialScores.load(file_h5) == sscr2
+    assert TrialScores.load(file_h5) == scr2
+
+    file_txt = output_dir + '/scores.txt'
+    sscr2.save(file_txt)
+    scores_txt = SparseTrialScores.load(file_txt)
+    # models and segments without trials are not in the txt file
+    assert scores_txt == sscr2.filter(scores_txt.model_set, scores_txt.seg_set)
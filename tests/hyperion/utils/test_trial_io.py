@@ -0,0 +1,89 @@
+"""
+ Copyright 2018 Johns Hopkins University  (Author: Jesus Villalba)
+ Apache 2.0  (http://www.apache.org/licenses/LICENSE-2.0)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from six.moves import xrange
+
+import pytest
+import os
+import numpy as np
+from numpy.testing import assert_allclose
+
+from hyperion.utils.trial_io import read_trial_list, encode_ids
+from hyperion.utils.trial_key import TrialKey
+from hyperion.utils.trial_ndx import TrialNdx
+from hyperion.utils.trial_scores import TrialScores
+
+output_dir = './tests/data_out/utils/trial_io'
+if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+
+def create_key(num_models=20, num_segs=50):
+    rng = np.random.RandomState(seed=1024)
+    model_set = np.asarray(['m%03d' % i for i in xrange(num_models)])
+    # numeric names have to be kept as strings
+    seg_set = np.asarray(['%05d' % i for i in xrange(num_segs)])
+    u = rng.uniform(size=(num_models, num_segs))
+    tar = u < 0.1
+    non = u > 0.7
+    return TrialKey(model_set, seg_set, tar, non)
+
+
+
+def test_encode_ids():
+    ids = ['b', 'a', 'c', 'a', 'b']
+    uniques, codes = encode_ids(ids)
+    uniques_ref, codes_ref = np.unique(ids, return_inverse=True)
+    assert np.all(uniques == uniques_ref)
+    assert np.all(codes == codes_ref)
+
+
+
+def test_read_trial_list():
+    file_path = output_dir + '/trials.txt'
+    with open(file_path, 'w') as f:
+        f.write('m2 s1 target 1.5\nm1  s2 nontarget -2\nm2\ts2 nontarget 0.25\n')
+
+    model_set, seg_set, model_idx, seg_idx, fields = read_trial_list(
+        file_path, num_fields=4, dtypes={3: float})
+    assert np.all(model_set == ['m1', 'm2'])
+    assert np.all(seg_set == ['s1', 's2'])
+    assert np.all(model_idx == [1, 0, 1])
+    assert np.all(seg_idx == [0, 1, 1])
+    assert np.all(fields[0] == ['target', 'nontarget', 'nontarget'])
+    assert_allclose(fields[1], [1.5, -2, 0.25])
+
+
+
+def test_key_load_save_txt():
+    key1 = create_key()
+    file_path = output_dir + '/key.txt'
+    key1.save_txt(file_path)
+    key2 = TrialKey.load_txt(file_path)
+    assert key1 == key2
+
+
+
+def test_ndx_load_save_txt():
+    ndx1 = create_key().to_ndx()
+    file_path = output_dir + '/ndx.txt'
+    ndx1.save_txt(file_path)
+    ndx2 = TrialNdx.load_txt(file_path)
+    assert ndx1 == ndx2
+
+
+
+def test_scores_load_save_txt():
+    key = create_key()
+    mask = np.logical_or(key.tar, key.non)
+    rng = np.random.RandomState(seed=1025)
+    scr1 = TrialScores(key.model_set, key.seg_set,
+                       np.round(rng.normal(size=mask.shape), 4)*mask, mask)
+    file_path = output_dir + '/scores.txt'
+    scr1.save_txt(file_path)
+    scr2 = TrialScores.load_txt(file_path)
+    assert scr1 == scr2